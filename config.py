@@ -6,6 +6,85 @@ class Config:
     DEBUG = False
     TESTING = False
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Leases per committed chunk for the reminder job (0 = single transaction, no checkpoint)
+    REMINDER_JOB_CHUNK_SIZE = int(os.environ.get('REMINDER_JOB_CHUNK_SIZE', 500))
+    # Oldest day the reminder jobs catch up on after missed runs (an explicit --since is not limited)
+    REMINDER_CATCH_UP_MAX_DAYS = int(os.environ.get('REMINDER_CATCH_UP_MAX_DAYS', 31))
+
+    # Notification dispatcher: backend per channel ('smtp'/'http' send for real, 'memory' only records)
+    NOTIFICATION_EMAIL_BACKEND = os.environ.get('NOTIFICATION_EMAIL_BACKEND', 'smtp')
+    NOTIFICATION_SMS_BACKEND = os.environ.get('NOTIFICATION_SMS_BACKEND', 'http')
+    NOTIFICATION_DISPATCH_BATCH_SIZE = int(os.environ.get('NOTIFICATION_DISPATCH_BATCH_SIZE', 200))
+    # Concurrent sends per channel (gateway rate limits differ per channel)
+    NOTIFICATION_CHANNEL_CONCURRENCY = {
+        'EMAIL': int(os.environ.get('NOTIFICATION_EMAIL_CONCURRENCY', 8)),
+        'SMS': int(os.environ.get('NOTIFICATION_SMS_CONCURRENCY', 4)),
+        'IN_APP': 1,
+    }
+    # Claims older than this are considered abandoned by a crashed worker and are claimed again
+    NOTIFICATION_CLAIM_TIMEOUT_SECONDS = int(os.environ.get('NOTIFICATION_CLAIM_TIMEOUT_SECONDS', 600))
+    # Digests: due notifications of one recipient and channel within a window are sent as one message
+    NOTIFICATION_DIGEST_ENABLED = os.environ.get('NOTIFICATION_DIGEST_ENABLED', 'false').lower() == 'true'
+    NOTIFICATION_DIGEST_WINDOW_MINUTES = int(os.environ.get('NOTIFICATION_DIGEST_WINDOW_MINUTES', 60))
+    NOTIFICATION_DIGEST_MIN_GROUP_SIZE = int(os.environ.get('NOTIFICATION_DIGEST_MIN_GROUP_SIZE', 3))
+    NOTIFICATION_DIGEST_CHANNELS = ['EMAIL', 'SMS']
+    # Digest template per channel, e.g. {'SMS': 12}; else the channel's active NOTIFICATION_DIGEST template
+    NOTIFICATION_DIGEST_TEMPLATE_IDS = {}
+    # Server push (SSE / long-poll): 'memory' reaches clients of this process only, so in-app notifications
+    # sent by the CLI dispatcher or workers are not pushed; 'database' goes through the push_events table and
+    # reaches clients of every process; or 'package.module:BackendClass'
+    EVENT_BUS_BACKEND = os.environ.get('EVENT_BUS_BACKEND', 'memory')
+    EVENT_BUS_HISTORY_SIZE = int(os.environ.get('EVENT_BUS_HISTORY_SIZE', 50)) # Events replayed per user on reconnect
+    EVENT_BUS_HISTORY_USERS = int(os.environ.get('EVENT_BUS_HISTORY_USERS', 10000)) # 'memory' only
+    EVENT_BUS_POLL_SECONDS = float(os.environ.get('EVENT_BUS_POLL_SECONDS', 1)) # 'database': delay for events from other processes
+    EVENT_BUS_RETENTION_SECONDS = int(os.environ.get('EVENT_BUS_RETENTION_SECONDS', 3600)) # 'database': rows kept for reconnects
+    EVENT_STREAM_MAX_QUEUED_EVENTS = int(os.environ.get('EVENT_STREAM_MAX_QUEUED_EVENTS', 100)) # Per connection
+    EVENT_STREAM_MAX_SECONDS = int(os.environ.get('EVENT_STREAM_MAX_SECONDS', 300)) # Clients reconnect with Last-Event-ID
+    EVENT_STREAM_HEARTBEAT_SECONDS = int(os.environ.get('EVENT_STREAM_HEARTBEAT_SECONDS', 15))
+    EVENT_LONG_POLL_TIMEOUT_SECONDS = int(os.environ.get('EVENT_LONG_POLL_TIMEOUT_SECONDS', 25))
+    # Read-through cache of properties, leases and users by id: 'memory' (per process), 'shared', 'none' or 'package.module:BackendClass'
+    ENTITY_CACHE_BACKEND = os.environ.get('ENTITY_CACHE_BACKEND', 'memory')
+    ENTITY_CACHE_TTL_SECONDS = int(os.environ.get('ENTITY_CACHE_TTL_SECONDS', 60))
+    ENTITY_CACHE_MAX_ENTRIES = int(os.environ.get('ENTITY_CACHE_MAX_ENTRIES', 10000))
+    ENTITY_CACHE_REDIS_URL = os.environ.get('ENTITY_CACHE_REDIS_URL') # For 'shared'; without it a process-local stand-in is used
+    # M-Pesa STK callbacks: stored raw by the endpoint, applied in batches by `flask run-mpesa-callback-worker`
+    MPESA_CALLBACK_TOKEN = os.environ.get('MPESA_CALLBACK_TOKEN') # If set, callback URLs must carry ?token=<value>
+    MPESA_CALLBACK_MAX_BYTES = int(os.environ.get('MPESA_CALLBACK_MAX_BYTES', 64 * 1024))
+    MPESA_CALLBACK_BATCH_SIZE = int(os.environ.get('MPESA_CALLBACK_BATCH_SIZE', 500))
+    MPESA_CALLBACK_WORKERS = int(os.environ.get('MPESA_CALLBACK_WORKERS', 1)) # Worker processes draining the inbox
+    MPESA_CALLBACK_CLAIM_TIMEOUT_SECONDS = int(os.environ.get('MPESA_CALLBACK_CLAIM_TIMEOUT_SECONDS', 300))
+    MPESA_CALLBACK_MAX_ATTEMPTS = int(os.environ.get('MPESA_CALLBACK_MAX_ATTEMPTS', 5))
+    # Channels of the payment confirmation / failure notifications queued for the tenant and landlord
+    MPESA_PAYMENT_NOTIFICATION_CHANNELS = ['IN_APP', 'SMS']
+    # Gateway webhook deduplication: keys of accepted deliveries are kept this long, fronted by a per-process Bloom filter
+    WEBHOOK_DEDUP_TTL_SECONDS = int(os.environ.get('WEBHOOK_DEDUP_TTL_SECONDS', 7 * 24 * 3600))
+    WEBHOOK_DEDUP_BLOOM_CAPACITY = int(os.environ.get('WEBHOOK_DEDUP_BLOOM_CAPACITY', 200000))
+    WEBHOOK_DEDUP_BLOOM_ERROR_RATE = float(os.environ.get('WEBHOOK_DEDUP_BLOOM_ERROR_RATE', 0.001))
+    # Gateway reconciliation (`flask run-gateway-reconciliation`): status adapter per gateway, 'pesapal' or 'package.module:AdapterClass'
+    GATEWAY_STATUS_ADAPTERS = {'PESAPAL': 'pesapal'}
+    GATEWAY_STATUS_CONCURRENCY = {'PESAPAL': int(os.environ.get('PESAPAL_STATUS_CONCURRENCY', 4))} # Parallel status queries
+    GATEWAY_STATUS_RATE_LIMITS = {'PESAPAL': float(os.environ.get('PESAPAL_STATUS_RATE_LIMIT', 10))} # Status queries per second
+    GATEWAY_RECONCILE_BATCH_SIZE = int(os.environ.get('GATEWAY_RECONCILE_BATCH_SIZE', 200))
+    GATEWAY_RECONCILE_CALLBACK_GRACE_SECONDS = int(os.environ.get('GATEWAY_RECONCILE_CALLBACK_GRACE_SECONDS', 120))
+    GATEWAY_RECONCILE_MAX_STATUS_CHECKS = int(os.environ.get('GATEWAY_RECONCILE_MAX_STATUS_CHECKS', 20))
+    GATEWAY_HTTP_TIMEOUT_SECONDS = int(os.environ.get('GATEWAY_HTTP_TIMEOUT_SECONDS', 10))
+    GATEWAY_HTTP_MAX_IDLE_CONNECTIONS = int(os.environ.get('GATEWAY_HTTP_MAX_IDLE_CONNECTIONS', 8)) # Kept-alive connections per gateway host
+    PESAPAL_BASE_URL = os.environ.get('PESAPAL_BASE_URL', 'https://cybqa.pesapal.com/pesapalv3')
+    PESAPAL_CONSUMER_KEY = os.environ.get('PESAPAL_CONSUMER_KEY') # Without it Pesapal transactions are not reconciled
+    PESAPAL_CONSUMER_SECRET = os.environ.get('PESAPAL_CONSUMER_SECRET')
+    # Monthly rent billing (hermitta_app.jobs.billing_jobs): leases per INSERT ... SELECT, and the
+    # prefix of the generated payment reference codes ("RENT-<lease_id>-<YYYYMM>")
+    RENT_BILLING_CHUNK_SIZE = int(os.environ.get('RENT_BILLING_CHUNK_SIZE', 20000))
+    RENT_REFERENCE_CODE_PREFIX = os.environ.get('RENT_REFERENCE_CODE_PREFIX', 'RENT')
+    MAIL_SERVER = os.environ.get('MAIL_SERVER', 'localhost')
+    MAIL_PORT = int(os.environ.get('MAIL_PORT', 25))
+    MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
+    MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
+    MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS', 'false').lower() == 'true'
+    MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER', 'no-reply@hermitta.co.ke')
+    SMS_GATEWAY_URL = os.environ.get('SMS_GATEWAY_URL', 'http://localhost:8025/sms')
+    SMS_GATEWAY_API_KEY = os.environ.get('SMS_GATEWAY_API_KEY')
+    SMS_SENDER_ID = os.environ.get('SMS_SENDER_ID', 'HERMITTA')
 
 class DevelopmentConfig(Config):
     """Development configuration."""
@@ -16,6 +95,8 @@ class TestingConfig(Config):
     """Testing configuration."""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL', 'sqlite:///hermitta_test.db')
+    NOTIFICATION_EMAIL_BACKEND = 'memory'
+    NOTIFICATION_SMS_BACKEND = 'memory'
     # Add other test-specific configs, e.g., WTF_CSRF_ENABLED = False
 
 class ProductionConfig(Config):
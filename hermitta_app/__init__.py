@@ -29,14 +29,34 @@ def create_app(config_name=None):
     from models.maintenance_request import MaintenanceRequest
     # Import other models as they are created/converted
 
+    # Pub/sub bus for server push; also registers the publish-on-commit listeners
+    from hermitta_app.services.event_bus import event_bus
+    event_bus.init_app(app)
+    # Read-through cache of hot lookups by id; also registers the invalidate-on-commit listeners
+    from hermitta_app.services.entity_cache import entity_cache
+    entity_cache.init_app(app)
+    # Recognises gateway webhook retries before they are processed
+    from hermitta_app.services.webhook_dedup import webhook_deduplicator
+    webhook_deduplicator.init_app(app)
+
     # Register blueprints
     from hermitta_app.routes.user_routes import user_bp
     from hermitta_app.routes.property_routes import property_bp
     from hermitta_app.routes.auth_routes import auth_bp # Import the new auth blueprint
+    from hermitta_app.routes.notification_routes import notification_bp
+    from hermitta_app.routes.event_routes import event_bp
+    from hermitta_app.routes.building_routes import building_bp
+    from hermitta_app.routes.mpesa_routes import mpesa_bp
+    from hermitta_app.routes.metrics_routes import metrics_bp
 
     app.register_blueprint(user_bp) # url_prefix is defined in the blueprint itself
     app.register_blueprint(property_bp) # url_prefix is defined in the blueprint itself
     app.register_blueprint(auth_bp) # Register the auth blueprint
+    app.register_blueprint(notification_bp) # In-app notification inbox
+    app.register_blueprint(event_bp) # Server push of notifications and messages
+    app.register_blueprint(building_bp) # Buildings and their occupancy rollups
+    app.register_blueprint(mpesa_bp) # M-Pesa STK callbacks, stored for the inbox worker
+    app.register_blueprint(metrics_bp) # Cache and webhook dedup counters, for admins
 
     # Simple test route
     @app.route('/health')
@@ -0,0 +1,56 @@
+"""
+Conditional GET support: ETag / Last-Modified validators and early 304 responses.
+
+Routes compute a resource's validators from cheap version data (e.g. updated_at, or a
+collection's count and max(updated_at)), answer `If-None-Match` / `If-Modified-Since`
+with 304 before loading and serializing the resource, and otherwise attach the
+validators to the full response.
+"""
+import hashlib
+from datetime import datetime, timezone
+from typing import Any, Optional
+from flask import Response, request
+
+# Clients may keep responses but must revalidate them on every use
+CACHE_CONTROL = 'private, no-cache'
+
+
+def make_etag(*parts: Any) -> str:
+    """Opaque ETag value of a representation, from its version data and the request options shaping it."""
+    return hashlib.blake2b("\x1f".join(str(part) for part in parts).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _as_utc(value: datetime) -> datetime:
+    # Timestamps are stored as naive UTC (datetime.utcnow); HTTP dates have whole seconds
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.replace(microsecond=0)
+
+
+def _with_validators(response: Response, etag: str, last_modified: Optional[datetime]) -> Response:
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = _as_utc(last_modified)
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    return response
+
+
+def not_modified(etag: str, last_modified: Optional[datetime] = None) -> Optional[Response]:
+    """
+    A 304 response if the request's validators match, else None. If-None-Match takes
+    precedence over If-Modified-Since; pass last_modified only when every change to
+    the resource moves it forward (not for collections, where deletes do not).
+    """
+    if request.if_none_match:
+        matched = request.if_none_match.contains_weak(etag)
+    elif last_modified is not None and request.if_modified_since is not None:
+        matched = _as_utc(last_modified) <= request.if_modified_since
+    else:
+        matched = False
+    return _with_validators(Response(status=304), etag, last_modified) if matched else None
+
+
+def add_validators(response, etag: str, last_modified: Optional[datetime] = None):
+    """Attaches ETag, Last-Modified and Cache-Control to a response (or a (response, status) tuple)."""
+    _with_validators(response[0] if isinstance(response, tuple) else response, etag, last_modified)
+    return response
@@ -0,0 +1,154 @@
+import calendar
+import time as timer
+from datetime import datetime, date
+from typing import Optional, Dict, Any
+import sqlalchemy as sa
+from flask import current_app
+from hermitta_app import db
+from hermitta_app.jobs.lease_jobs import ACTIVE_LEASE_STATUSES
+from models import Lease, Payment
+from services.batching import add_timing
+from models.enums import PaymentStatus
+
+# Leases (by lease_id range) billed with one INSERT ... SELECT and committed together
+DEFAULT_BILLING_CHUNK_SIZE = 20000
+
+# Prefix of the generated payment_reference_codes: "<prefix>-<lease_id>-<YYYYMM>"
+DEFAULT_REFERENCE_CODE_PREFIX = "RENT"
+
+
+def billing_period(value: Optional[date] = None) -> date:
+    """First day of the month containing `value` (default: today)."""
+    value = value or date.today()
+    return value.replace(day=1)
+
+
+def rent_reference_code(lease_id: int, period: date, prefix: str = DEFAULT_REFERENCE_CODE_PREFIX) -> str:
+    """The payment_reference_code of a lease's rent for a period, as generated by the billing job."""
+    return f"{prefix}-{lease_id}-{period:%Y%m}"
+
+
+def _period_columns(period: date, prefix: str) -> Dict[str, Any]:
+    """
+    SQL expressions for the period's due date, expected amount and reference code of each
+    lease row. All date math is done once per period, in Python, into lookup CASEs keyed
+    by rent_due_day and by the rent start day, so the database evaluates them for every
+    lease in a chunk and no lease is handled in a Python loop:
+
+    - the due day is clamped to the month's length (rent_due_day 31 is due on Feb 28/29),
+      and moves to the rent start date when rent starts after it in the period;
+    - rent starting within the period is prorated by the days left in the month, to the cent.
+    """
+    days_in_month = calendar.monthrange(period.year, period.month)[1]
+    period_end = period.replace(day=days_in_month)
+    rent_start = sa.func.coalesce(Lease.rent_start_date, Lease.start_date)
+
+    due_on_day = sa.case(
+        {day: sa.literal(period.replace(day=min(day, days_in_month)), sa.Date) for day in range(1, 32)},
+        value=Lease.rent_due_day, else_=sa.literal(period_end, sa.Date)
+    )
+    due_date = sa.case((rent_start > due_on_day, rent_start), else_=due_on_day)
+
+    days_billed = sa.case(
+        {period.replace(day=day): days_in_month - day + 1 for day in range(2, days_in_month + 1)},
+        value=rent_start, else_=days_in_month
+    )
+    # The 1.0 keeps the division decimal (not integer) on every backend
+    prorated = sa.func.round(Lease.rent_amount * days_billed * sa.literal_column("1.0") / days_in_month, 2)
+    expected_amount = sa.case((rent_start > period, prorated), else_=Lease.rent_amount)
+
+    reference_code = sa.literal(f"{prefix}-") + sa.cast(Lease.lease_id, sa.String) + sa.literal(f"-{period:%Y%m}")
+    return {"due_date": due_date, "expected_amount": expected_amount, "payment_reference_code": reference_code,
+            "period_end": period_end}
+
+
+def _billable_leases(period: date, period_end: date):
+    """Predicate of the leases billed for a period: active, and renting for at least part of it."""
+    rent_start = sa.func.coalesce(Lease.rent_start_date, Lease.start_date)
+    return sa.and_(Lease.status.in_(ACTIVE_LEASE_STATUSES), rent_start <= period_end, Lease.end_date >= period)
+
+
+def generate_rent_payments_job(period: Optional[date] = None, chunk_size: Optional[int] = None,
+                               reference_prefix: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Creates the EXPECTED rent `Payment` of every active lease for a billing period (a month).
+
+    Leases are processed in lease_id ranges of `chunk_size`. Each range is billed with a
+    single INSERT ... SELECT that computes the due date, prorated amount and reference code
+    in the database (see `_period_columns`), and is committed on its own. A lease that already
+    has a payment due within the period (or holding the period's reference code) is skipped,
+    so the job is idempotent per lease and period: re-running it, even with another reference
+    prefix, or resuming after a crash, only creates the missing payments.
+
+    Run monthly, ahead of the due dates, with `flask generate-rent-payments`.
+
+    Args:
+        period (Optional[date]): Any day of the month to bill. Defaults to the current month.
+        chunk_size (Optional[int]): Lease ids per statement; defaults to RENT_BILLING_CHUNK_SIZE.
+        reference_prefix (Optional[str]): Defaults to RENT_REFERENCE_CODE_PREFIX.
+
+    Returns:
+        Dict[str, Any]: Counters ("leases_billable", "payments_created", "skipped_existing",
+                        "chunks_committed") and per-phase timings (in seconds).
+    """
+    config = current_app.config
+    period = billing_period(period)
+    chunk_size = chunk_size or config.get('RENT_BILLING_CHUNK_SIZE', DEFAULT_BILLING_CHUNK_SIZE)
+    prefix = reference_prefix or config.get('RENT_REFERENCE_CODE_PREFIX', DEFAULT_REFERENCE_CODE_PREFIX)
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1.")
+
+    summary = {"period": period, "leases_billable": 0, "payments_created": 0, "skipped_existing": 0,
+               "chunks_committed": 0, "timings": {}}
+    current_app.logger.info(f"Starting rent billing job for period {period:%Y-%m}")
+
+    columns = _period_columns(period, prefix)
+    billable = _billable_leases(period, columns["period_end"])
+    now = datetime.utcnow()
+    select_payments = sa.select(
+        Lease.lease_id, columns["expected_amount"], columns["due_date"], sa.literal(PaymentStatus.EXPECTED, Payment.status.type),
+        columns["payment_reference_code"], sa.literal(now, sa.DateTime), sa.literal(now, sa.DateTime),
+    ).where(
+        billable,
+        # A lease is billed once per period, whatever the reference code prefix was or whoever created its payment
+        ~sa.exists().where(Payment.lease_id == Lease.lease_id, Payment.due_date.between(period, columns["period_end"])),
+        ~sa.exists().where(Payment.payment_reference_code == columns["payment_reference_code"])
+    )
+    payment_columns = ["lease_id", "expected_amount", "due_date", "status", "payment_reference_code", "created_at", "updated_at"]
+
+    last_lease_id = 0
+    while True:
+        started = timer.perf_counter()
+        # Upper bound of the next range: the chunk_size-th lease id after the last range
+        upper = db.session.scalar(
+            sa.select(Lease.lease_id).where(Lease.lease_id > last_lease_id)
+            .order_by(Lease.lease_id).offset(chunk_size - 1).limit(1)
+        )
+        in_range = Lease.lease_id > last_lease_id if upper is None else Lease.lease_id.between(last_lease_id + 1, upper)
+        billable_in_range = db.session.scalar(sa.select(sa.func.count()).select_from(Lease).where(billable, in_range))
+        add_timing(summary["timings"], "select", started)
+
+        started = timer.perf_counter()
+        if billable_in_range:
+            try:
+                created = db.session.execute(sa.insert(Payment).from_select(payment_columns, select_payments.where(in_range))).rowcount
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                current_app.logger.error(f"Rent billing for period {period:%Y-%m} failed after lease ID {last_lease_id}", exc_info=True)
+                raise
+            summary["leases_billable"] += billable_in_range
+            summary["payments_created"] += created
+            summary["skipped_existing"] += billable_in_range - created
+            summary["chunks_committed"] += 1
+        add_timing(summary["timings"], "insert", started)
+        if upper is None:
+            break
+        last_lease_id = upper
+
+    current_app.logger.info(
+        f"Rent billing job for period {period:%Y-%m} completed: {summary['payments_created']} payments created, "
+        f"{summary['skipped_existing']} already billed. "
+        f"Timings: {', '.join(f'{phase}={seconds:.3f}s' for phase, seconds in summary['timings'].items())}"
+    )
+    return summary
@@ -0,0 +1,309 @@
+import time as timer
+import uuid
+from datetime import datetime, timedelta, time
+from typing import Optional, Dict, Any, List, Iterable, Tuple
+from flask import current_app
+from sqlalchemy import and_, or_
+from hermitta_app import db
+from hermitta_app.jobs.notification_jobs import DUE_STATUSES, _load_recipients, _template_language
+from hermitta_app.services.template_renderer import CompiledTemplate, template_renderer
+from models import Notification, NotificationTemplate
+from models.enums import NotificationStatus, NotificationChannel, NotificationType
+from services.batching import chunked, add_timing
+
+# Pending notifications of one recipient and channel due within the same window are coalesced
+DEFAULT_DIGEST_WINDOW_MINUTES = 60
+
+# Groups smaller than this are sent as they are
+DEFAULT_DIGEST_MIN_GROUP_SIZE = 3
+
+# IN_APP notifications cost nothing to send, so they are never coalesced
+DEFAULT_DIGEST_CHANNELS = (NotificationChannel.EMAIL, NotificationChannel.SMS)
+
+# Digests created (and their notifications updated) per commit
+DIGEST_GROUPS_PER_COMMIT = 200
+
+# Recipients whose due notifications are loaded and grouped at a time
+DIGEST_USERS_PER_PAGE = 500
+
+# Used when no NOTIFICATION_DIGEST template exists for the channel. Placeholders:
+# recipient_name, count, items (one line per notification), window_start, window_end
+DEFAULT_DIGEST_SUBJECT_EN = "You have {{count}} new notifications"
+DEFAULT_DIGEST_BODY_EN = "Hello {{recipient_name}}, you have {{count}} new notifications:\n{{items}}"
+DEFAULT_DIGEST_SUBJECT_SW = "Una arifa {{count}} mpya"
+DEFAULT_DIGEST_BODY_SW = "Habari {{recipient_name}}, una arifa {{count}} mpya:\n{{items}}"
+
+
+def _default_digest_template(channel: NotificationChannel) -> CompiledTemplate:
+    # Compiled from an unsaved template, so its template_id is None
+    return CompiledTemplate(NotificationTemplate(
+        name="Default notification digest", template_type=NotificationType.NOTIFICATION_DIGEST, channel=channel,
+        subject_template_en=DEFAULT_DIGEST_SUBJECT_EN, body_template_en=DEFAULT_DIGEST_BODY_EN,
+        subject_template_sw=DEFAULT_DIGEST_SUBJECT_SW, body_template_sw=DEFAULT_DIGEST_BODY_SW,
+    ))
+
+
+def _window_start(moment: datetime, window_minutes: int) -> datetime:
+    """Start of the window `moment` falls in. Windows are aligned to midnight."""
+    minutes = (moment.hour * 60 + moment.minute) // window_minutes * window_minutes
+    return datetime.combine(moment.date(), time()) + timedelta(minutes=minutes)
+
+
+def _digest_templates(channels: Iterable[NotificationChannel], digest_template_ids: Dict[NotificationChannel, int]) -> Dict[NotificationChannel, CompiledTemplate]:
+    """
+    The digest template of each channel: the configured template id, else the first active
+    NOTIFICATION_DIGEST template of the channel, else the built-in default.
+    """
+    template_ids = dict(digest_template_ids)
+    for channel in channels:
+        if channel not in template_ids:
+            template = db.session.query(NotificationTemplate.template_id).filter(
+                NotificationTemplate.template_type == NotificationType.NOTIFICATION_DIGEST,
+                NotificationTemplate.channel == channel,
+                NotificationTemplate.is_active.is_(True)
+            ).order_by(NotificationTemplate.template_id).first()
+            if template:
+                template_ids[channel] = template.template_id
+
+    compiled = template_renderer.compiled_templates(template_ids.values())
+    templates = {}
+    for channel in channels:
+        template_id = template_ids.get(channel)
+        if template_id is not None and template_id not in compiled:
+            raise ValueError(f"Digest NotificationTemplate ID {template_id} for channel {channel.value} not found.")
+        templates[channel] = compiled[template_id] if template_id is not None else _default_digest_template(channel)
+    return templates
+
+
+def _find_groups(run_time: datetime, channels: List[NotificationChannel], window_minutes: int, min_group_size: int,
+                 after_user_id: Optional[int] = None, max_users: int = DIGEST_USERS_PER_PAGE
+                 ) -> Tuple[List[Tuple[Tuple[int, NotificationChannel, datetime], List[int]]], Optional[int]]:
+    """
+    Groups the due notifications of the next `max_users` recipients after `after_user_id` by
+    (user_id, channel, window start) and keeps the groups worth a digest. Returns the groups
+    and the last recipient of the page, to pass as `after_user_id` (None when no recipient is left).
+    """
+    due = and_(
+        Notification.status.in_(DUE_STATUSES),
+        Notification.channel.in_(channels),
+        Notification.digest_id.is_(None),
+        Notification.notification_type != NotificationType.NOTIFICATION_DIGEST,
+        or_(Notification.scheduled_send_time.is_(None), Notification.scheduled_send_time <= run_time)
+    )
+    users = db.session.query(Notification.user_id).filter(due)
+    if after_user_id is not None:
+        users = users.filter(Notification.user_id > after_user_id)
+    user_ids = [row.user_id for row in users.distinct().order_by(Notification.user_id).limit(max_users)]
+    if not user_ids:
+        return [], None
+
+    rows = db.session.query(
+        Notification.notification_id, Notification.user_id, Notification.channel, Notification.scheduled_send_time
+    ).filter(
+        due, Notification.user_id.between(user_ids[0], user_ids[-1])
+    ).order_by(Notification.user_id, Notification.channel, Notification.scheduled_send_time, Notification.notification_id).all()
+
+    groups = {}
+    for row in rows:
+        key = (row.user_id, row.channel, _window_start(row.scheduled_send_time or run_time, window_minutes))
+        groups.setdefault(key, []).append(row.notification_id)
+    return [(key, ids) for key, ids in groups.items() if len(ids) >= min_group_size], user_ids[-1]
+
+
+def _status_claim_token(claim_token: str, status: NotificationStatus) -> str:
+    # The claim records the status a notification was taken from, to restore it if the notification is released
+    return f"{claim_token}:{status.value}"
+
+
+def _take_notifications(notification_ids: List[int], claim_token: str, run_time: datetime) -> Dict[int, NotificationStatus]:
+    """
+    Marks the notifications DIGESTED in one conditional UPDATE per due status and chunk, so
+    a dispatcher that claimed some of them in the meantime keeps them. Returns the ids
+    actually taken, with the status each was taken from.
+    """
+    for status in DUE_STATUSES:
+        for chunk in chunked(notification_ids):
+            db.session.query(Notification).filter(
+                Notification.notification_id.in_(chunk),
+                Notification.status == status,
+                Notification.digest_id.is_(None)
+            ).update({
+                Notification.status: NotificationStatus.DIGESTED,
+                Notification.claimed_by: _status_claim_token(claim_token, status),
+                Notification.claimed_at: run_time,
+            }, synchronize_session=False)
+    original_status = {_status_claim_token(claim_token, status): status for status in DUE_STATUSES}
+    return {row.notification_id: original_status[row.claimed_by] for row in db.session.query(
+        Notification.notification_id, Notification.claimed_by
+    ).filter(Notification.claimed_by.in_(list(original_status)))}
+
+
+def _release_notifications(taken: Dict[int, NotificationStatus], notification_ids: List[int], claim_token: str) -> None:
+    """Hands notifications taken by this digest back to the dispatcher, with the status they had."""
+    for status in DUE_STATUSES:
+        for chunk in chunked([notification_id for notification_id in notification_ids if taken[notification_id] == status]):
+            db.session.query(Notification).filter(
+                Notification.notification_id.in_(chunk),
+                Notification.claimed_by == _status_claim_token(claim_token, status)
+            ).update({
+                Notification.status: status, Notification.claimed_by: None, Notification.claimed_at: None,
+            }, synchronize_session=False)
+
+
+def _digest_item(template: Optional[CompiledTemplate], row, language: str) -> str:
+    """One line of the digest: the notification's subject for emails, its text otherwise."""
+    subject, body = row.subject, row.content
+    if template is not None:
+        rendered = template.render(row.template_context or {}, language)
+        subject, body = rendered["subject"], rendered["body"]
+    text = subject if row.channel == NotificationChannel.EMAIL and subject else body
+    return f"- {' '.join((text or '').split())}"
+
+
+def _coalesce_groups(groups: List[Tuple[Tuple[int, NotificationChannel, datetime], List[int]]], digest_templates: Dict[NotificationChannel, CompiledTemplate],
+                     run_time: datetime, window_minutes: int, min_group_size: int, summary: Dict[str, Any]) -> None:
+    """
+    Creates the digests of one chunk of groups and links their notifications to them, in one
+    transaction. A group that cannot be rendered (e.g. a template lacks the recipient's
+    language) is handed back to the dispatcher, which records the error on each notification.
+    """
+    timings = summary["timings"]
+    claim_token = f"digest:{uuid.uuid4().hex[:12]}"
+
+    started = timer.perf_counter()
+    taken = _take_notifications([notification_id for _, ids in groups for notification_id in ids], claim_token, run_time)
+    groups = [(key, [notification_id for notification_id in ids if notification_id in taken]) for key, ids in groups]
+    # Groups that shrank below the minimum because a dispatcher got there first are handed back
+    _release_notifications(taken, [notification_id for _, ids in groups if len(ids) < min_group_size for notification_id in ids], claim_token)
+    groups = [(key, ids) for key, ids in groups if len(ids) >= min_group_size]
+    add_timing(timings, "claim", started)
+    if not groups:
+        db.session.commit()
+        return
+
+    started = timer.perf_counter()
+    rows = {}
+    for chunk in chunked(sorted(notification_id for _, ids in groups for notification_id in ids)):
+        for row in db.session.query(
+            Notification.notification_id, Notification.channel, Notification.template_id, Notification.template_context,
+            Notification.subject, Notification.content
+        ).filter(Notification.notification_id.in_(chunk)):
+            rows[row.notification_id] = row
+    templates = template_renderer.compiled_templates({row.template_id for row in rows.values() if row.template_id})
+    recipients = _load_recipients({user_id for (user_id, _, _), _ in groups})
+    add_timing(timings, "load", started)
+
+    started = timer.perf_counter()
+    digests, unrendered = [], []
+    for (user_id, channel, window_start), ids in groups:
+        recipient = recipients.get(user_id)
+        language = _template_language(recipient.preferred_language if recipient else None)
+        digest_template = digest_templates[channel]
+        try:
+            context = {
+                "recipient_name": f"{recipient.first_name} {recipient.last_name}" if recipient else "",
+                "count": len(ids),
+                "items": "\n".join(_digest_item(templates.get(rows[notification_id].template_id), rows[notification_id], language) for notification_id in ids),
+                "window_start": window_start.strftime("%Y-%m-%d %H:%M"),
+                "window_end": (window_start + timedelta(minutes=window_minutes)).strftime("%Y-%m-%d %H:%M"),
+            }
+            digest = Notification(
+                user_id=user_id, notification_type=NotificationType.NOTIFICATION_DIGEST, channel=channel,
+                status=NotificationStatus.PENDING, scheduled_send_time=min(window_start, run_time),
+                template_id=digest_template.template_id, template_context=context,
+            )
+            if digest_template.template_id is None:
+                # The built-in template is not stored, so the digest is rendered now
+                rendered = digest_template.render(context, language)
+                digest.subject, digest.content = rendered["subject"], rendered["body"]
+        except ValueError as e:
+            current_app.logger.warning(f"Digest of User ID {user_id} ({channel.value}) not created, its notifications are sent one by one: {e}")
+            unrendered.extend(ids)
+            summary["groups_failed"] += 1
+            continue
+        digests.append((digest, ids))
+    _release_notifications(taken, unrendered, claim_token)
+    db.session.add_all([digest for digest, _ in digests])
+    db.session.flush()
+    add_timing(timings, "build", started)
+
+    started = timer.perf_counter()
+    db.session.bulk_update_mappings(Notification, [
+        {"notification_id": notification_id, "digest_id": digest.notification_id, "claimed_by": None, "claimed_at": None}
+        for digest, ids in digests for notification_id in ids
+    ])
+    db.session.commit()
+    add_timing(timings, "update", started)
+
+    summary["digests_created"] += len(digests)
+    summary["notifications_digested"] += sum(len(ids) for _, ids in digests)
+
+
+def coalesce_pending_notifications_job(run_time: Optional[datetime] = None, window_minutes: Optional[int] = None,
+                                       min_group_size: Optional[int] = None, channels: Optional[Iterable[NotificationChannel]] = None,
+                                       digest_template_ids: Optional[Dict[NotificationChannel, int]] = None) -> Dict[str, Any]:
+    """
+    Coalesces the due notifications of each recipient into digests, so a landlord with
+    hundreds of reminders on the same day gets one email or SMS instead of hundreds.
+
+    Due notifications (the ones the dispatcher would send next) are grouped by
+    `user_id`, `channel` and the `window_minutes` window their `scheduled_send_time`
+    falls in. Each group of at least `min_group_size` becomes one PENDING
+    NOTIFICATION_DIGEST notification, rendered with the channel's digest template.
+    The grouped notifications are kept for audit with status DIGESTED and `digest_id`
+    pointing at their digest. Runs before the dispatcher (see `dispatch_due_notifications_job`).
+
+    Triggered via the Flask CLI command: `flask run-notification-digest`
+
+    Args:
+        run_time (Optional[datetime]): Notifications due up to this moment are coalesced. Defaults to now (UTC).
+        window_minutes (Optional[int]): Width of the grouping windows. Defaults to NOTIFICATION_DIGEST_WINDOW_MINUTES.
+        min_group_size (Optional[int]): Smallest group turned into a digest. Defaults to NOTIFICATION_DIGEST_MIN_GROUP_SIZE.
+        channels (Optional[Iterable[NotificationChannel]]): Channels to coalesce. Defaults to NOTIFICATION_DIGEST_CHANNELS.
+        digest_template_ids (Optional[Dict]): Digest template per channel. Defaults to NOTIFICATION_DIGEST_TEMPLATE_IDS,
+                                              then to the channel's active NOTIFICATION_DIGEST template.
+
+    Returns:
+        Dict[str, Any]: Counters (groups, groups_failed, digests_created, notifications_digested, gateway_calls_saved)
+                        and timings.
+    """
+    config = current_app.config
+    run_time = run_time or datetime.utcnow()
+    window_minutes = window_minutes or config.get('NOTIFICATION_DIGEST_WINDOW_MINUTES', DEFAULT_DIGEST_WINDOW_MINUTES)
+    min_group_size = max(2, min_group_size or config.get('NOTIFICATION_DIGEST_MIN_GROUP_SIZE', DEFAULT_DIGEST_MIN_GROUP_SIZE))
+    if channels is None:
+        channels = [NotificationChannel(channel) for channel in config.get('NOTIFICATION_DIGEST_CHANNELS', [c.value for c in DEFAULT_DIGEST_CHANNELS])]
+    channels = list(channels)
+    if digest_template_ids is None:
+        digest_template_ids = {NotificationChannel(channel): template_id for channel, template_id in config.get('NOTIFICATION_DIGEST_TEMPLATE_IDS', {}).items()}
+
+    summary = {"run_time": run_time, "groups": 0, "groups_failed": 0, "digests_created": 0, "notifications_digested": 0,
+               "gateway_calls_saved": 0, "timings": {}}
+    if not channels:
+        return summary
+
+    digest_templates = None
+    last_user_id = None
+    while True:
+        started = timer.perf_counter()
+        groups, last_user_id = _find_groups(run_time, channels, window_minutes, min_group_size, after_user_id=last_user_id)
+        summary["groups"] += len(groups)
+        add_timing(summary["timings"], "group", started)
+        if last_user_id is None:
+            break
+        if groups and digest_templates is None:
+            digest_templates = _digest_templates(channels, digest_template_ids)
+        for chunk in chunked(groups, DIGEST_GROUPS_PER_COMMIT):
+            try:
+                _coalesce_groups(chunk, digest_templates, run_time, window_minutes, min_group_size, summary)
+            except Exception:
+                # Nothing stays DIGESTED without its digest
+                db.session.rollback()
+                raise
+    summary["gateway_calls_saved"] = summary["notifications_digested"] - summary["digests_created"]
+
+    current_app.logger.info(
+        f"Notification digest completed: {summary['notifications_digested']} notifications coalesced into "
+        f"{summary['digests_created']} digests ({summary['gateway_calls_saved']} gateway calls saved)."
+    )
+    return summary
@@ -0,0 +1,327 @@
+import time as timer
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from typing import Optional, Dict, Any, List, Tuple
+from flask import current_app
+from sqlalchemy import and_, or_, select
+from hermitta_app import db
+from hermitta_app.jobs.mpesa_jobs import SETTLED_PAYMENT_STATUSES
+from hermitta_app.services.gateway_status import (
+    BearerTokenCache, GatewayStatusAdapter, GatewayStatusError, GatewayStatusResult, KeepAliveHttpPool, RateLimiter,
+    build_status_adapters
+)
+from models import GatewayTransaction, Payment
+from models.enums import GatewayTransactionStatus, GatewayType, PaymentMethod, PaymentStatus
+from services.batching import add_timing
+
+# Pending transactions a worker claims and queries per batch
+DEFAULT_RECONCILE_BATCH_SIZE = 200
+
+# Transactions younger than this are left to their callback before their status is queried
+DEFAULT_CALLBACK_GRACE_SECONDS = 120
+
+# Seconds a worker holds its claimed transactions; afterwards they are due again (the worker crashed mid-batch)
+DEFAULT_CLAIM_TIMEOUT_SECONDS = 300
+
+# Still-pending transactions are checked again after RETRY_BASE * 2^(checks - 1) seconds, at most RETRY_MAX
+DEFAULT_RETRY_BASE_SECONDS = 60
+DEFAULT_RETRY_MAX_SECONDS = 3600
+
+# Checks after which a transaction without a final status is marked UNKNOWN for manual follow-up
+DEFAULT_MAX_STATUS_CHECKS = 20
+
+DEFAULT_GATEWAY_CONCURRENCY = 4
+
+# Statuses the reconciler settles a transaction with
+FINAL_RESULT_STATUSES = (GatewayTransactionStatus.SUCCESSFUL, GatewayTransactionStatus.FAILED,
+                         GatewayTransactionStatus.CANCELLED, GatewayTransactionStatus.REFUNDED)
+
+
+def _payment_method(gateway_method: Optional[str]) -> PaymentMethod:
+    method = (gateway_method or '').lower()
+    if any(name in method for name in ('mpesa', 'airtel', 'mobile')):
+        return PaymentMethod.GATEWAY_MOBILE_MONEY
+    if any(name in method for name in ('visa', 'mastercard', 'card', 'amex')):
+        return PaymentMethod.GATEWAY_CARD
+    return PaymentMethod.GATEWAY_OTHER
+
+
+def _amount(value) -> Optional[Decimal]:
+    try:
+        return Decimal(str(value)) if value is not None else None
+    except InvalidOperation:
+        return None
+
+
+class GatewayReconciler:
+    """
+    Settles PENDING gateway transactions by querying their gateway's status API, instead of
+    each webhook verifying its transaction inline.
+
+    Batches are claimed with one conditional UPDATE that sets `status_check_claimed_by` and
+    pushes `next_status_check_at` to the claim's expiry, so concurrent workers never query
+    the same transaction and a crashed worker's claims become due again by themselves.
+
+    Each gateway's transactions are queried on a thread pool capped at the gateway's
+    concurrency limit, through its adapter (a shared keep-alive connection pool and cached
+    bearer tokens, see hermitta_app.services.gateway_status) and its rate limiter. Results
+    are written with one bulk update of transactions and one of payments per batch, after
+    re-reading (and locking) the batch: transactions a callback settled while the gateways
+    were queried are skipped, and payments are only updated from their current status.
+    Transactions that are still pending are rescheduled with exponential backoff.
+    """
+
+    def __init__(self, adapters: Dict[GatewayType, GatewayStatusAdapter], batch_size: int = DEFAULT_RECONCILE_BATCH_SIZE,
+                 concurrency: Optional[Dict[GatewayType, int]] = None, rate_limits: Optional[Dict[GatewayType, float]] = None,
+                 callback_grace_seconds: int = DEFAULT_CALLBACK_GRACE_SECONDS, claim_timeout_seconds: int = DEFAULT_CLAIM_TIMEOUT_SECONDS,
+                 retry_base_seconds: int = DEFAULT_RETRY_BASE_SECONDS, retry_max_seconds: int = DEFAULT_RETRY_MAX_SECONDS,
+                 max_status_checks: int = DEFAULT_MAX_STATUS_CHECKS, worker_id: Optional[str] = None):
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1.")
+        self.adapters = adapters
+        self.batch_size = batch_size
+        self.concurrency = concurrency or {}
+        self.rate_limiters = {gateway: RateLimiter(rate) for gateway, rate in (rate_limits or {}).items()}
+        self.callback_grace_seconds = callback_grace_seconds
+        self.claim_timeout_seconds = claim_timeout_seconds
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.max_status_checks = max_status_checks
+        self.worker_id = worker_id or uuid.uuid4().hex[:12]
+
+    def _due(self, now: datetime):
+        return and_(
+            GatewayTransaction.status == GatewayTransactionStatus.PENDING,
+            GatewayTransaction.gateway_type.in_(list(self.adapters)),
+            GatewayTransaction.initiated_at <= now - timedelta(seconds=self.callback_grace_seconds),
+            or_(GatewayTransaction.next_status_check_at.is_(None), GatewayTransaction.next_status_check_at <= now)
+        )
+
+    def claim_batch(self, now: datetime) -> Tuple[str, List[Any]]:
+        """Claims up to `batch_size` due transactions and returns (claim token, claimed rows with their payment)."""
+        due = self._due(now)
+        candidate_ids = [row.transaction_id for row in db.session.query(GatewayTransaction.transaction_id).filter(
+            due
+        ).order_by(
+            GatewayTransaction.next_status_check_at, GatewayTransaction.transaction_id
+        ).limit(self.batch_size).with_for_update(skip_locked=True).all()]
+        if not candidate_ids:
+            db.session.rollback()
+            return None, []
+
+        claim_token = f"{self.worker_id}:{uuid.uuid4().hex[:8]}"
+        db.session.query(GatewayTransaction).filter(
+            GatewayTransaction.transaction_id.in_(candidate_ids), due
+        ).update({
+            GatewayTransaction.status_check_claimed_by: claim_token,
+            GatewayTransaction.next_status_check_at: now + timedelta(seconds=self.claim_timeout_seconds),
+        }, synchronize_session=False)
+        db.session.commit()
+
+        claimed = db.session.query(
+            GatewayTransaction.transaction_id, GatewayTransaction.gateway_type, GatewayTransaction.gateway_specific_transaction_id,
+            GatewayTransaction.internal_merchant_ref, GatewayTransaction.status_check_attempts,
+            Payment.payment_id, Payment.status.label("payment_status"), Payment.expected_amount
+        ).join(
+            Payment, Payment.payment_id == GatewayTransaction.payment_id
+        ).filter(GatewayTransaction.status_check_claimed_by == claim_token).order_by(GatewayTransaction.transaction_id).all()
+        return claim_token, claimed
+
+    def _query_one(self, gateway: GatewayType, transaction) -> Any:
+        limiter = self.rate_limiters.get(gateway)
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            return self.adapters[gateway].query_status(transaction)
+        except GatewayStatusError as e:
+            return e
+        except Exception as e:
+            current_app.logger.error(f"Unexpected error querying GatewayTransaction ID {transaction.transaction_id}: {e}", exc_info=True)
+            return GatewayStatusError(f"Unexpected error: {e}")
+
+    def _query(self, claimed) -> Dict[int, Any]:
+        """Queries every gateway concurrently, each on its own pool sized to the gateway's limit."""
+        by_gateway = {}
+        for transaction in claimed:
+            by_gateway.setdefault(transaction.gateway_type, []).append(transaction)
+
+        executors, futures = [], {}
+        try:
+            for gateway, transactions in by_gateway.items():
+                executor = ThreadPoolExecutor(max_workers=max(1, self.concurrency.get(gateway, DEFAULT_GATEWAY_CONCURRENCY)),
+                                              thread_name_prefix=f"reconcile-{gateway.value.lower()}")
+                executors.append(executor)
+                for transaction in transactions:
+                    futures[transaction.transaction_id] = executor.submit(self._query_one, gateway, transaction)
+            return {transaction_id: future.result() for transaction_id, future in futures.items()}
+        finally:
+            for executor in executors:
+                executor.shutdown(wait=True)
+
+    def _retry_at(self, now: datetime, checks: int) -> datetime:
+        return now + timedelta(seconds=min(self.retry_max_seconds, self.retry_base_seconds * 2 ** max(0, checks - 1)))
+
+    def _settle(self, transaction, payment_status: PaymentStatus, result: GatewayStatusResult, update: Dict[str, Any],
+                now: datetime) -> Optional[Dict[str, Any]]:
+        """
+        Fills the transaction update of a final result and returns the payment update (None to
+        leave the payment). `payment_status` is the payment's current (locked) status.
+        """
+        update.update(status=result.status, callback_payload=result.payload, next_status_check_at=None,
+                      error_code=result.error_code, error_message=result.error_message)
+        if result.payment_method:
+            update["payment_method_detail"] = result.payment_method
+        if payment_status in SETTLED_PAYMENT_STATUSES and result.status != GatewayTransactionStatus.REFUNDED:
+            return None
+        payment_update = {"payment_id": transaction.payment_id, "gateway_transaction_id": transaction.transaction_id, "updated_at": now}
+        if result.status == GatewayTransactionStatus.SUCCESSFUL:
+            amount = _amount(result.amount)
+            payment_update.update(
+                status=PaymentStatus.PARTIALLY_PAID if amount is not None and amount < transaction.expected_amount else PaymentStatus.COMPLETED,
+                amount_paid=amount, payment_date=now.date(), payment_method=_payment_method(result.payment_method),
+                reference_number=result.confirmation_code or None,
+            )
+        elif result.status == GatewayTransactionStatus.REFUNDED:
+            payment_update["status"] = PaymentStatus.REFUNDED
+        elif payment_status == PaymentStatus.PARTIALLY_PAID:
+            return None # A failed retry does not undo a partial payment
+        else:
+            payment_update["status"] = PaymentStatus.CANCELLED if result.status == GatewayTransactionStatus.CANCELLED else PaymentStatus.FAILED
+        return payment_update
+
+    def reconcile_batch(self, summary: Dict[str, Any], now: Optional[datetime] = None) -> int:
+        """Claims, queries and updates one batch. Returns the number of transactions claimed."""
+        timings = summary["timings"]
+        now = now or datetime.utcnow()
+        started = timer.perf_counter()
+        claim_token, claimed = self.claim_batch(now)
+        add_timing(timings, "claim", started)
+        if not claimed:
+            return 0
+        summary["claimed"] += len(claimed)
+
+        started = timer.perf_counter()
+        results = self._query(claimed)
+        add_timing(timings, "query", started)
+
+        started = timer.perf_counter()
+        checked_at = datetime.utcnow()
+        # Re-read under lock what the gateways were queried about: a callback may have settled the
+        # transaction or its payment meanwhile, and those are left as the callback wrote them
+        payment_statuses = dict(db.session.execute(select(GatewayTransaction.transaction_id, Payment.status).join(
+            Payment, Payment.payment_id == GatewayTransaction.payment_id
+        ).where(
+            GatewayTransaction.status_check_claimed_by == claim_token, GatewayTransaction.status == GatewayTransactionStatus.PENDING
+        ).with_for_update()).all())
+        transaction_updates, payment_updates = [], []
+        for transaction in claimed:
+            if transaction.transaction_id not in payment_statuses:
+                summary["superseded"] += 1
+                continue
+            result = results[transaction.transaction_id]
+            checks = transaction.status_check_attempts + 1
+            update = {"transaction_id": transaction.transaction_id, "status_check_claimed_by": None,
+                      "status_check_attempts": checks, "last_status_check_at": checked_at, "last_updated_at": checked_at}
+            transaction_updates.append(update)
+            if isinstance(result, GatewayStatusResult) and result.status in FINAL_RESULT_STATUSES:
+                payment_update = self._settle(transaction, payment_statuses[transaction.transaction_id], result, update, checked_at)
+                if payment_update is not None:
+                    payment_updates.append(payment_update)
+                summary[result.status.value.lower()] += 1
+                continue
+            if isinstance(result, GatewayStatusError):
+                update["error_message"] = f"Status check failed: {result}"
+                summary["errors"] += 1
+            else:
+                summary["still_pending"] += 1
+            if (isinstance(result, GatewayStatusError) and not result.retryable) or checks >= self.max_status_checks:
+                update.update(status=GatewayTransactionStatus.UNKNOWN, next_status_check_at=None)
+                update.setdefault("error_message", f"No final status from the gateway after {checks} checks.")
+                summary["gave_up"] += 1
+            else:
+                update["next_status_check_at"] = self._retry_at(now, checks)
+
+        db.session.bulk_update_mappings(GatewayTransaction, transaction_updates)
+        db.session.bulk_update_mappings(Payment, payment_updates)
+        db.session.commit()
+        add_timing(timings, "update", started)
+        summary["batches"] += 1
+        return len(claimed)
+
+    def run(self, max_batches: Optional[int] = None, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Reconciles batches until nothing is due (or `max_batches` batches were processed)."""
+        summary = {
+            "worker_id": self.worker_id,
+            "batches": 0,
+            "claimed": 0,
+            "successful": 0,
+            "failed": 0,
+            "cancelled": 0,
+            "refunded": 0,
+            "still_pending": 0,
+            "errors": 0,
+            "gave_up": 0,
+            "superseded": 0,
+            "timings": {},
+        }
+        try:
+            while max_batches is None or summary["batches"] < max_batches:
+                if not self.reconcile_batch(summary, now=now):
+                    break
+        finally:
+            for adapter in self.adapters.values():
+                adapter.close()
+        return summary
+
+
+def reconcile_pending_gateway_transactions_job(worker_id: Optional[str] = None, batch_size: Optional[int] = None,
+                                               max_batches: Optional[int] = None,
+                                               adapters: Optional[Dict[GatewayType, GatewayStatusAdapter]] = None) -> Dict[str, Any]:
+    """
+    Queries the gateways for the status of PENDING transactions whose callback has not
+    settled them, e.g. Pesapal IPNs that still need their GetTransactionStatus check.
+    Several workers can run this job at the same time (see `GatewayReconciler`).
+
+    Triggered via the Flask CLI command: `flask run-gateway-reconciliation`
+
+    Args:
+        worker_id (Optional[str]): Prefix of this worker's claim tokens. Generated if not provided.
+        batch_size (Optional[int]): Transactions per batch. Defaults to GATEWAY_RECONCILE_BATCH_SIZE.
+        max_batches (Optional[int]): Stops after this many batches. By default runs until nothing is due.
+        adapters (Optional[Dict]): Status adapter per gateway. Built from GATEWAY_STATUS_ADAPTERS if not provided.
+
+    Returns:
+        Dict[str, Any]: Counters (claimed, successful, failed, cancelled, refunded, still_pending, errors, gave_up,
+                        superseded), per-phase timings (in seconds) and the HTTP connections opened and token
+                        requests made.
+    """
+    config = current_app.config
+    pool = KeepAliveHttpPool(max_idle_per_host=config.get('GATEWAY_HTTP_MAX_IDLE_CONNECTIONS', 8),
+                             timeout=config.get('GATEWAY_HTTP_TIMEOUT_SECONDS', 10))
+    token_cache = BearerTokenCache()
+    reconciler = GatewayReconciler(
+        adapters if adapters is not None else build_status_adapters(config, pool, token_cache),
+        batch_size=batch_size or config.get('GATEWAY_RECONCILE_BATCH_SIZE', DEFAULT_RECONCILE_BATCH_SIZE),
+        concurrency={GatewayType(gateway): limit for gateway, limit in config.get('GATEWAY_STATUS_CONCURRENCY', {}).items()},
+        rate_limits={GatewayType(gateway): rate for gateway, rate in config.get('GATEWAY_STATUS_RATE_LIMITS', {}).items()},
+        callback_grace_seconds=config.get('GATEWAY_RECONCILE_CALLBACK_GRACE_SECONDS', DEFAULT_CALLBACK_GRACE_SECONDS),
+        max_status_checks=config.get('GATEWAY_RECONCILE_MAX_STATUS_CHECKS', DEFAULT_MAX_STATUS_CHECKS),
+        worker_id=worker_id,
+    )
+    current_app.logger.info(f"Starting gateway reconciliation (worker: {reconciler.worker_id}, gateways: "
+                            f"{', '.join(gateway.value for gateway in reconciler.adapters) or 'none'}).")
+    try:
+        summary = reconciler.run(max_batches=max_batches)
+    finally:
+        pool.close()
+    summary["http_connections_opened"] = pool.connections_opened
+    summary["token_requests"] = token_cache.requests
+    timings = ", ".join(f"{phase}={seconds:.3f}s" for phase, seconds in summary["timings"].items())
+    current_app.logger.info(
+        f"Gateway reconciliation (worker: {reconciler.worker_id}) completed: {summary['successful']} successful, "
+        f"{summary['failed']} failed, {summary['still_pending']} still pending, {summary['errors']} errors, "
+        f"{summary['http_connections_opened']} connections, {summary['token_requests']} token requests. Timings: {timings}"
+    )
+    return summary
@@ -1,192 +1,704 @@
+import calendar
+import time as timer
 import uuid
 from datetime import datetime, date, timedelta, time
-from typing import Optional # Added import for Optional
+from typing import Optional, Dict, Any, List, Iterable, Tuple, Set # Added import for Optional
 from flask import current_app
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
 from hermitta_app import db
+from hermitta_app.services.template_renderer import template_renderer
 from models import (
-    LandlordReminderRule, Lease, Notification, NotificationTemplate,
-    NotificationTriggerLog, User, Property
+    LandlordReminderRule, Lease, Notification,
+    NotificationTriggerLog, User, Property, ReminderJobCheckpoint
 )
 # Corrected import for LeaseStatusType
 from models.lease import LeaseStatusType
 from models.enums import (
-    ReminderRuleEvent, ReminderTimeUnit,
-    NotificationStatus, NotificationChannel # MessageType is not used in this job currently
+    ReminderRuleEvent, ReminderTimeUnit, ReminderRecipientType,
+    NotificationStatus, NotificationChannel, # MessageType is not used in this job currently
+    JobRunStatus
 )
+from services.batching import IN_CLAUSE_CHUNK_SIZE, chunked, add_timing
 
-def process_lease_renewal_reminders_job(job_run_id: Optional[str] = None):
+# Name recorded on ReminderJobCheckpoint rows created by this job
+REMINDER_JOB_NAME = "lease_renewal_reminders"
+
+# NotificationTriggerLog.target_entity_type recorded for lease reminders
+LEASE_ENTITY_TYPE = "LEASE"
+
+# Lease statuses for which renewal reminders are still relevant
+ACTIVE_LEASE_STATUSES = (LeaseStatusType.ACTIVE, LeaseStatusType.ACTIVE_PENDING_MOVE_IN)
+
+# Keys of the template_context built for lease renewal reminders. Templates are checked
+# against them once, when they are loaded, instead of leaving placeholders unfilled per message.
+LEASE_REMINDER_CONTEXT_KEYS = frozenset((
+    "tenant_name", "landlord_name", "lease_end_date", "event_date", "days_offset", "property_address", "property_unit",
+))
+
+# Oldest day a run goes back to when rules have missed runs
+DEFAULT_CATCH_UP_MAX_DAYS = 31
+
+# Offset units that move a reminder by whole calendar days. MINUTES and HOURS are not supported by the daily jobs.
+DATE_OFFSET_UNITS = (ReminderTimeUnit.DAYS, ReminderTimeUnit.WEEKS, ReminderTimeUnit.MONTHS)
+
+
+def _add_months(value: date, months: int) -> date:
+    """Adds calendar months, clamping the day to the end of shorter months (Jan 31 + 1 month = Feb 28/29)."""
+    month_index = value.month - 1 + months
+    year, month = value.year + month_index // 12, month_index % 12 + 1
+    return value.replace(year=year, month=month, day=min(value.day, calendar.monthrange(year, month)[1]))
+
+
+def _offset_date(event_date: date, offset_value: int, offset_unit: ReminderTimeUnit) -> date:
+    """Returns the date on which a rule with this offset fires for an event on `event_date`."""
+    if offset_unit == ReminderTimeUnit.MONTHS:
+        return _add_months(event_date, offset_value)
+    if offset_unit == ReminderTimeUnit.WEEKS:
+        return event_date + timedelta(weeks=offset_value)
+    return event_date + timedelta(days=offset_value)
+
+
+def _event_date_window(first_run_date: date, last_run_date: date, offset_value: int,
+                       offset_unit: ReminderTimeUnit) -> Optional[Tuple[date, date]]:
     """
-    Processes active lease renewal reminder rules for landlords.
+    Returns the (earliest, latest) event dates for which a rule fires on a day between
+    `first_run_date` and `last_run_date` inclusive, or None if no event date does.
+    `_offset_date` never decreases as the event date grows, so the window is contiguous.
+    Month-end clamping can make several event dates fire on one day (Jan 29-31 + 1 month
+    all fire on Feb 28) and none fire on others (nothing + 1 month fires on Mar 29-31).
+    """
+    if offset_unit != ReminderTimeUnit.MONTHS:
+        shift = _offset_date(first_run_date, offset_value, offset_unit) - first_run_date
+        return first_run_date - shift, last_run_date - shift
 
-    This job queries for `LandlordReminderRule`s that are active and set for the
-    `LEASE_END_DATE` event. For each rule, it calculates which leases should trigger
-    a reminder today based on the rule's offset (e.g., 60 days before lease end).
+    one_day = timedelta(days=1)
+    start = _add_months(first_run_date, -offset_value)
+    while _add_months(start, offset_value) < first_run_date:
+        start += one_day
+    while _add_months(start - one_day, offset_value) >= first_run_date:
+        start -= one_day
+    end = _add_months(last_run_date, -offset_value)
+    while _add_months(end, offset_value) > last_run_date:
+        end -= one_day
+    while _add_months(end + one_day, offset_value) <= last_run_date:
+        end += one_day
+    return (start, end) if start <= end else None
 
-    It checks against the `NotificationTriggerLog` to ensure that a reminder for a specific
-    rule, lease, and lease end date combination has not already been processed.
 
-    If a reminder is due, it fetches the associated `NotificationTemplate`, prepares
-    the context with lease, property, tenant, and landlord details, and creates a new
-    `Notification` record (typically with status 'SCHEDULED'). It also logs this action
-    in the `NotificationTriggerLog`.
+def _merge_date_windows(windows: Iterable[Tuple[date, date]]) -> List[Tuple[date, date]]:
+    """Merges overlapping or adjacent (start, end) windows so each contiguous span is one BETWEEN."""
+    merged = []
+    for start, end in sorted(windows):
+        if merged and start <= merged[-1][1] + timedelta(days=1):
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
 
-    The actual sending of notifications (email, SMS, etc.) is handled by a separate
-    dispatcher system that would process 'SCHEDULED' notifications.
 
-    This job is designed to be run periodically (e.g., daily via a cron job or
-    other task scheduler) using the Flask CLI command:
-    `flask run-lease-renewal-job`
+def _first_run_date(rule, run_date: date, since: Optional[date], catch_up: bool, max_catch_up_days: int) -> date:
+    """
+    First day processed for `rule`. An explicit `since` is used as given. Otherwise, when
+    catching up, it is the day after the rule's last run, at most `max_catch_up_days` back.
+    """
+    if since is not None:
+        return since
+    if not catch_up or rule.last_run_date is None or rule.last_run_date >= run_date:
+        return run_date
+    first = rule.last_run_date + timedelta(days=1)
+    oldest = run_date - timedelta(days=max_catch_up_days - 1)
+    if first < oldest:
+        current_app.logger.warning(f"Rule ID {rule.rule_id} last ran on {rule.last_run_date}: only catching up from {oldest} (max {max_catch_up_days} days). Run with since={first} to process the earlier days.")
+        return oldest
+    return first
 
-    Args:
-        job_run_id (Optional[str]): An optional unique identifier for this specific job run.
-                                    If not provided, a UUID will be generated.
+
+def _advance_last_run_date(rule_ids: List[int], run_date: date) -> None:
+    """Records `run_date` as the last fully processed day of the given rules."""
+    for chunk in chunked(sorted(rule_ids)):
+        db.session.query(LandlordReminderRule).filter(
+            LandlordReminderRule.rule_id.in_(chunk),
+            or_(LandlordReminderRule.last_run_date.is_(None), LandlordReminderRule.last_run_date < run_date)
+        ).update({LandlordReminderRule.last_run_date: run_date}, synchronize_session=False)
+    db.session.commit()
+
+
+def _shard_filter(landlord_column, shard: Optional[Tuple[int, int]]):
     """
-    if job_run_id is None:
-        job_run_id = str(uuid.uuid4())
+    SQL predicate restricting a query to one shard's landlords (`landlord_id % shard_count == shard_index`),
+    or None when the job is not sharded.
+    """
+    if shard is None:
+        return None
+    shard_index, shard_count = shard
+    return landlord_column % shard_count == shard_index
 
-    current_app.logger.info(f"Starting lease renewal reminder job (ID: {job_run_id}) for date: {date.today()}")
 
-    active_rules = db.session.query(LandlordReminderRule).filter(
+def _user_display_names(user_ids: Iterable[int]) -> Dict[int, str]:
+    """Loads `first_name last_name` for the given users with one IN query per chunk."""
+    names = {}
+    for chunk in chunked(sorted(set(uid for uid in user_ids if uid is not None))):
+        rows = db.session.query(User.user_id, User.first_name, User.last_name).filter(User.user_id.in_(chunk)).all()
+        for user_id, first_name, last_name in rows:
+            names[user_id] = f"{first_name} {last_name}".strip()
+    return names
+
+
+def _property_summaries(property_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+    """Loads the address/unit columns needed for reminder context with one IN query per chunk."""
+    summaries = {}
+    for chunk in chunked(sorted(set(property_ids))):
+        rows = db.session.query(
+            Property.property_id, Property.address_line_1, Property.unit_name, Property.unit_number
+        ).filter(Property.property_id.in_(chunk)).all()
+        for property_id, address_line_1, unit_name, unit_number in rows:
+            summaries[property_id] = {
+                "address_line_1": address_line_1,
+                "unit": unit_name or unit_number,
+            }
+    return summaries
+
+
+def _resolve_recipient_id(rule, lease) -> Optional[int]:
+    """Maps a rule's recipient_type to the user_id that should receive the reminder."""
+    # For LEASE_END_DATE, typically the tenant is the primary recipient.
+    # The rule.recipient_type can refine this.
+    if rule.recipient_type == ReminderRecipientType.TENANT:
+        return lease.tenant_id
+    if rule.recipient_type == ReminderRecipientType.LANDLORD:
+        return rule.landlord_id
+    if rule.recipient_type == ReminderRecipientType.PROPERTY_MANAGER:
+        # TODO: Implement logic if Property Manager role/assignment exists
+        current_app.logger.warning(f"RecipientType PROPERTY_MANAGER not yet implemented for Rule ID {rule.rule_id}. Defaulting to landlord.")
+        return rule.landlord_id
+    if rule.recipient_type == ReminderRecipientType.OTHER_USER and rule.specific_recipient_user_id:
+        return rule.specific_recipient_user_id
+    # Fallback or unhandled recipient type for this event
+    current_app.logger.warning(f"Unhandled or invalid recipient_type '{rule.recipient_type}' for Rule ID {rule.rule_id}. Defaulting to tenant if available.")
+    return lease.tenant_id
+
+
+def _load_rule_targets(summary: Dict[str, Any], since: Optional[date] = None, catch_up: bool = True,
+                       max_catch_up_days: int = DEFAULT_CATCH_UP_MAX_DAYS) -> Tuple[Dict[Tuple[int, date], List[Tuple[Any, date]]], List[int]]:
+    """
+    Loads every active LEASE_END_DATE rule in one query and computes, in a single pass,
+    the lease end dates each rule targets between its first run date (see `_first_run_date`)
+    and the summary's run_date, and the day the rule fires for each of them (several end
+    dates can fire on one day for month offsets that land on a month end).
+    Returns (a mapping of (landlord_id, target_lease_end_date) -> [(rule, fire_date), ...],
+    the ids of every loaded rule, for `_advance_last_run_date`).
+    """
+    run_date = summary["run_date"]
+    active_rules = db.session.query(
+        LandlordReminderRule.rule_id, LandlordReminderRule.landlord_id,
+        LandlordReminderRule.offset_value, LandlordReminderRule.offset_unit,
+        LandlordReminderRule.send_time, LandlordReminderRule.recipient_type,
+        LandlordReminderRule.specific_recipient_user_id, LandlordReminderRule.notification_template_id,
+        LandlordReminderRule.last_run_date
+    ).filter(
         LandlordReminderRule.is_active == True,
         LandlordReminderRule.event_type == ReminderRuleEvent.LEASE_END_DATE
-    ).all()
-
-    if not active_rules:
-        current_app.logger.info("No active lease renewal reminder rules found.")
-        return
+    )
+    if summary["shard"] is not None:
+        active_rules = active_rules.filter(_shard_filter(LandlordReminderRule.landlord_id, summary["shard"]))
+    active_rules = active_rules.all()
+    summary["rules"] = len(active_rules)
 
+    rules_by_target = {}
+    rule_ids = []
     for rule in active_rules:
-        current_app.logger.info(f"Processing rule ID: {rule.rule_id} ('{rule.name}') for landlord ID: {rule.landlord_id}")
-
-        # Calculate the target lease end_date for which reminders should be sent today
-        # Example: Rule is -60 DAYS. Today is D. Reminder is for leases ending on D + 60 DAYS.
-        # So, lease.end_date = today + abs(offset_value) if offset is negative (before event)
-        # Or, lease.end_date = today - offset_value if offset is positive (after event) - less common for renewals
-
-        offset_days = 0
-        if rule.offset_unit == ReminderTimeUnit.DAYS:
-            offset_days = rule.offset_value
-        elif rule.offset_unit == ReminderTimeUnit.WEEKS:
-            offset_days = rule.offset_value * 7
-        elif rule.offset_unit == ReminderTimeUnit.MONTHS:
-            # This is an approximation; month lengths vary. For precise month offsets,
-            # dateutil.relativedelta would be better. For simplicity, using 30 days.
-            offset_days = rule.offset_value * 30
-        else:
+        if rule.offset_unit not in DATE_OFFSET_UNITS:
             current_app.logger.warning(f"Unsupported offset_unit {rule.offset_unit} for Rule ID {rule.rule_id}. Skipping.")
             continue
+        rule_ids.append(rule.rule_id) # Rules without a window still get their last_run_date advanced
+        first_run_date = _first_run_date(rule, run_date, since, catch_up, max_catch_up_days)
+        if summary["catch_up_from"] is None or first_run_date < summary["catch_up_from"]:
+            summary["catch_up_from"] = first_run_date
+        # We want leases whose end date, shifted by the rule's offset, falls between the first
+        # run date and run_date. A -60 DAYS rule run on a single day targets leases ending 60 days later.
+        window = _event_date_window(first_run_date, run_date, rule.offset_value, rule.offset_unit)
+        if window is None:
+            continue
+        target_lease_end_date = window[0]
+        while target_lease_end_date <= window[1]:
+            fire_date = _offset_date(target_lease_end_date, rule.offset_value, rule.offset_unit)
+            rules_by_target.setdefault((rule.landlord_id, target_lease_end_date), []).append((rule, fire_date))
+            target_lease_end_date += timedelta(days=1)
+    return rules_by_target, rule_ids
+
 
-        # We want to find leases where (Lease.end_date + offset_days_as_timedelta) == today
-        # This means Lease.end_date == today - offset_days_as_timedelta
-        # If offset_days is -60 (60 days before), then target_lease_end_date = today - (-60 days) = today + 60 days
-        target_lease_end_date = date.today() - timedelta(days=offset_days)
+def _fetch_matching_leases(rules_by_target: Dict[Tuple[int, date], List[Tuple[Any, date]]],
+                           after_lease_id: int = 0, limit: Optional[int] = None,
+                           shard: Optional[Tuple[int, int]] = None) -> List[Any]:
+    """
+    Fetches active leases ending on any targeted date, with one range predicate per
+    contiguous span of dates, ordered by lease_id so that `after_lease_id`/`limit` can be
+    used as a keyset cursor.
+    The landlord filter is only pushed into SQL while it fits in a single IN clause;
+    beyond that the end_date predicate is the selective one and landlords are matched in Python.
+    In shard mode only the shard's landlords are fetched.
+    """
+    windows = _merge_date_windows({(target_date, target_date) for _, target_date in rules_by_target})
+    landlord_ids = sorted({landlord_id for landlord_id, _ in rules_by_target})
+    query = db.session.query(
+        Lease.lease_id, Lease.landlord_id, Lease.tenant_id, Lease.property_id,
+        Lease.end_date, Lease.tenant_name_manual
+    ).filter(
+        or_(*(Lease.end_date.between(start, end) for start, end in windows)),
+        Lease.status.in_(ACTIVE_LEASE_STATUSES), # Consider relevant active statuses
+        Lease.lease_id > after_lease_id
+    )
+    if len(landlord_ids) <= IN_CLAUSE_CHUNK_SIZE:
+        query = query.filter(Lease.landlord_id.in_(landlord_ids))
+    elif shard is not None:
+        query = query.filter(_shard_filter(Lease.landlord_id, shard))
+    query = query.order_by(Lease.lease_id)
+    if limit:
+        query = query.limit(limit)
+    return query.all()
 
-        current_app.logger.debug(f"Rule ID {rule.rule_id}: offset_days={offset_days}, target_lease_end_date={target_lease_end_date}")
 
-        leases_to_remind = db.session.query(Lease).filter(
-            Lease.landlord_id == rule.landlord_id,
-            Lease.end_date == target_lease_end_date,
-            Lease.status.in_([LeaseStatusType.ACTIVE, LeaseStatusType.ACTIVE_PENDING_MOVE_IN]) # Consider relevant active statuses
+def _match_rules(leases: List[Any], rules_by_target: Dict[Tuple[int, date], List[Tuple[Any, date]]]) -> List[Tuple[Any, date, Any]]:
+    """Pairs each lease with every rule of its landlord that targets its end date, and the date the rule fires on."""
+    matches = []
+    for lease in leases:
+        for rule, fire_date in rules_by_target.get((lease.landlord_id, lease.end_date), ()):
+            matches.append((rule, fire_date, lease))
+    return matches
+
+
+def _load_templates(template_ids: Iterable[int], template_cache: Dict[int, Any]) -> None:
+    """Adds the compiled templates missing from `template_cache` (see TemplateRenderer)."""
+    missing = set(template_ids) - set(template_cache)
+    if missing:
+        template_cache.update(template_renderer.compiled_templates(missing))
+
+
+def _template_placeholder_errors(template, context_keys: Iterable[str], checked: Dict[int, List[str]]) -> List[str]:
+    """
+    Returns the placeholders of `template` that `context_keys` cannot fill. Each template is
+    checked (and reported) once per batch; reminders using it are then skipped as invalid.
+    """
+    if template.template_id not in checked:
+        missing = template.missing_placeholders(context_keys)
+        if missing:
+            current_app.logger.error(f"NotificationTemplate ID {template.template_id} ('{template.name}') uses placeholders the reminder context does not provide: {', '.join(missing)}. Skipping its reminders.")
+        checked[template.template_id] = missing
+    return checked[template.template_id]
+
+
+def _build_reminder_rows(matches: List[Tuple[Any, date, Any]], summary: Dict[str, Any],
+                         template_cache: Dict[int, Any]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Filters out already-processed reminders and builds the Notification rows to insert.
+    Returns (notification_rows, trigger_rows) where trigger_rows[i] holds the
+    NotificationTriggerLog columns (minus notification_id/job_run_id) of notification_rows[i].
+    """
+    timings = summary["timings"]
+
+    # Idempotency check against existing trigger logs, in bulk
+    started = timer.perf_counter()
+    existing_keys = set()
+    rule_ids = {rule.rule_id for rule, _, _ in matches}
+    target_dates = sorted({lease.end_date for _, _, lease in matches})
+    for lease_chunk in chunked(sorted({lease.lease_id for _, _, lease in matches})):
+        rows = db.session.query(
+            NotificationTriggerLog.rule_id, NotificationTriggerLog.target_entity_id, NotificationTriggerLog.target_event_date
+        ).filter(
+            NotificationTriggerLog.target_entity_type == LEASE_ENTITY_TYPE,
+            NotificationTriggerLog.target_entity_id.in_(lease_chunk),
+            NotificationTriggerLog.target_event_date.in_(target_dates)
         ).all()
+        existing_keys.update((r.rule_id, r.target_entity_id, r.target_event_date) for r in rows if r.rule_id in rule_ids)
 
-        if not leases_to_remind:
-            current_app.logger.info(f"No leases found matching criteria for Rule ID {rule.rule_id} ending on {target_lease_end_date}.")
+    pending = []
+    for rule, fire_date, lease in matches:
+        if (rule.rule_id, lease.lease_id, lease.end_date) in existing_keys:
+            current_app.logger.debug(f"Reminder already processed for Rule ID {rule.rule_id}, Lease ID {lease.lease_id}, Event Date {lease.end_date}. Skipping.")
+            summary["skipped_existing"] += 1
             continue
+        pending.append((rule, fire_date, lease))
+    add_timing(timings, "filter_existing", started)
 
-        current_app.logger.info(f"Found {len(leases_to_remind)} leases for Rule ID {rule.rule_id} ending on {target_lease_end_date}.")
+    # Templates, recipients and properties for the whole batch
+    started = timer.perf_counter()
+    _load_templates((rule.notification_template_id for rule, _, _ in pending), template_cache)
+    user_ids = set()
+    for rule, _, lease in pending:
+        user_ids.update((lease.tenant_id, rule.landlord_id, rule.specific_recipient_user_id))
+    user_names = _user_display_names(user_ids)
+    properties = _property_summaries(lease.property_id for _, _, lease in pending)
+    add_timing(timings, "load_context", started)
 
-        for lease in leases_to_remind:
-            # Idempotency Check: Has this reminder been logged already?
-            existing_log = db.session.query(NotificationTriggerLog).filter_by(
-                rule_id=rule.rule_id,
-                lease_id=lease.lease_id,
-                target_event_date=lease.end_date # The actual end date of this lease
-            ).first()
+    started = timer.perf_counter()
+    notification_rows = []
+    trigger_rows = []
+    placeholder_errors = {}
+    for rule, fire_date, lease in pending:
+        template = template_cache.get(rule.notification_template_id)
+        if not template:
+            current_app.logger.error(f"NotificationTemplate ID {rule.notification_template_id} not found for Rule ID {rule.rule_id}. Skipping Lease ID {lease.lease_id}.")
+            summary["skipped_invalid"] += 1
+            continue
+        if not template.is_active:
+            current_app.logger.warning(f"NotificationTemplate ID {template.template_id} ('{template.name}') is inactive. Skipping for Rule ID {rule.rule_id}, Lease ID {lease.lease_id}.")
+            summary["skipped_invalid"] += 1
+            continue
+        if _template_placeholder_errors(template, LEASE_REMINDER_CONTEXT_KEYS, placeholder_errors):
+            summary["skipped_invalid"] += 1
+            continue
 
-            if existing_log:
-                current_app.logger.info(f"Reminder already processed for Rule ID {rule.rule_id}, Lease ID {lease.lease_id}, Event Date {lease.end_date}. Log ID: {existing_log.log_id}. Skipping.")
-                continue
+        recipient_id = _resolve_recipient_id(rule, lease)
+        if recipient_id is None or recipient_id not in user_names:
+            current_app.logger.error(f"Could not determine recipient for Rule ID {rule.rule_id}, Lease ID {lease.lease_id}. Skipping.")
+            summary["skipped_invalid"] += 1
+            continue
 
-            template = db.session.query(NotificationTemplate).get(rule.notification_template_id)
-            if not template:
-                current_app.logger.error(f"NotificationTemplate ID {rule.notification_template_id} not found for Rule ID {rule.rule_id}. Skipping Lease ID {lease.lease_id}.")
-                continue
+        property_summary = properties.get(lease.property_id)
+        context = {
+            "tenant_name": user_names.get(lease.tenant_id) or lease.tenant_name_manual or "Tenant",
+            "landlord_name": user_names.get(rule.landlord_id) or "Landlord/Property Manager",
+            "lease_end_date": lease.end_date.strftime("%Y-%m-%d") if lease.end_date else "N/A",
+            "event_date": lease.end_date.strftime("%Y-%m-%d") if lease.end_date else "N/A", # Same key as the scheduled reminders sweep
+            "days_offset": abs((fire_date - lease.end_date).days), # Make it positive for display "X days remaining"
+            "property_address": property_summary["address_line_1"] if property_summary else "N/A",
+            "property_unit": (property_summary["unit"] or "N/A") if property_summary else "N/A",
+            # Add other common placeholders
+        }
+
+        notification_rows.append({
+            "user_id": recipient_id,
+            "notification_type": template.template_type, # Use type from template
+            "channel": template.channel,
+            "template_id": template.template_id,
+            "template_context": context,
+            "status": NotificationStatus.SCHEDULED, # To be picked up by a dispatcher
+            # Reminders caught up from missed days keep their original time and are due straight away
+            "scheduled_send_time": datetime.combine(fire_date, rule.send_time or time(9, 0)),
+            "lease_id": lease.lease_id,
+        })
+        trigger_rows.append({
+            "rule_id": rule.rule_id,
+            "target_entity_type": LEASE_ENTITY_TYPE,
+            "target_entity_id": lease.lease_id,
+            "lease_id": lease.lease_id,
+            "target_event_date": lease.end_date, # The actual end date of this lease
+        })
+    add_timing(timings, "build", started)
+    return notification_rows, trigger_rows
+
+
+def _trigger_log_row(trigger_row: Dict[str, Any], notification_id: int, job_run_id: str) -> Dict[str, Any]:
+    return dict(trigger_row, notification_id=notification_id, job_run_id=job_run_id)
+
+
+def _already_triggered(trigger_row: Dict[str, Any]) -> bool:
+    """Whether a trigger log with the row's `_rule_entity_event_uc` key exists (another run got there first)."""
+    return db.session.query(NotificationTriggerLog.query.filter_by(
+        rule_id=trigger_row["rule_id"], target_entity_type=trigger_row["target_entity_type"],
+        target_entity_id=trigger_row["target_entity_id"], target_event_date=trigger_row["target_event_date"]
+    ).exists()).scalar()
 
-            if not template.is_active:
-                current_app.logger.warning(f"NotificationTemplate ID {template.template_id} ('{template.name}') is inactive. Skipping for Rule ID {rule.rule_id}, Lease ID {lease.lease_id}.")
-                continue
 
-            # Determine recipient
-            recipient_user = None
-            # For LEASE_END_DATE, typically the tenant is the primary recipient.
-            # The rule.recipient_type can refine this.
-            if rule.recipient_type == ReminderRecipientType.TENANT:
-                recipient_user = lease.tenant_user
-            elif rule.recipient_type == ReminderRecipientType.LANDLORD:
-                recipient_user = rule.landlord
-            elif rule.recipient_type == ReminderRecipientType.PROPERTY_MANAGER:
-                # TODO: Implement logic if Property Manager role/assignment exists
-                current_app.logger.warning(f"RecipientType PROPERTY_MANAGER not yet implemented for Rule ID {rule.rule_id}. Defaulting to landlord.")
-                recipient_user = rule.landlord
-            elif rule.recipient_type == ReminderRecipientType.OTHER_USER and rule.specific_recipient_user_id:
-                recipient_user = db.session.query(User).get(rule.specific_recipient_user_id)
-            else: # Fallback or unhandled recipient type for this event
-                 current_app.logger.warning(f"Unhandled or invalid recipient_type '{rule.recipient_type}' for Rule ID {rule.rule_id}. Defaulting to tenant if available.")
-                 recipient_user = lease.tenant_user
-
-            if not recipient_user:
-                current_app.logger.error(f"Could not determine recipient for Rule ID {rule.rule_id}, Lease ID {lease.lease_id}. Skipping.")
+def _insert_reminder_rows(notification_rows: List[Dict[str, Any]], trigger_rows: List[Dict[str, Any]],
+                          job_run_id: str, summary: Dict[str, Any]) -> Tuple[int, int, Set[int]]:
+    """
+    Bulk-inserts the notifications and their trigger logs inside a savepoint.
+    If the batch fails (e.g., one row violates `_rule_entity_event_uc` because another run
+    got there first), it is retried row by row so that only the offending rows are skipped.
+    Rows another run already triggered are counted in summary["skipped_existing"]; any other
+    rejected row is a failure. Returns (rows_inserted, rows_failed, ids of the rules with
+    failed rows), so that their last_run_date is not advanced. The caller commits.
+    """
+    started = timer.perf_counter()
+    try:
+        with db.session.begin_nested():
+            # return_defaults populates notification_id on each mapping for the trigger logs
+            db.session.bulk_insert_mappings(Notification, notification_rows, return_defaults=True)
+            db.session.bulk_insert_mappings(NotificationTriggerLog, [
+                _trigger_log_row(key, row["notification_id"], job_run_id)
+                for key, row in zip(trigger_rows, notification_rows)
+            ])
+        add_timing(summary["timings"], "insert", started)
+        return len(notification_rows), 0, set()
+    except Exception as e:
+        current_app.logger.warning(f"Bulk insert of {len(notification_rows)} reminders failed for job ID {job_run_id}: {e}. Retrying row by row.")
+
+    inserted = failed = 0
+    failed_rule_ids = set()
+    for key, row in zip(trigger_rows, notification_rows):
+        row.pop("notification_id", None)
+        try:
+            with db.session.begin_nested():
+                db.session.bulk_insert_mappings(Notification, [row], return_defaults=True)
+                db.session.bulk_insert_mappings(NotificationTriggerLog, [_trigger_log_row(key, row["notification_id"], job_run_id)])
+            inserted += 1
+        except Exception as row_error:
+            if isinstance(row_error, IntegrityError) and _already_triggered(key):
+                summary["skipped_existing"] += 1
                 continue
+            failed += 1
+            failed_rule_ids.add(key["rule_id"])
+            current_app.logger.error(f"Could not schedule reminder for Rule ID {key['rule_id']}, {key['target_entity_type']} ID {key['target_entity_id']}, Event Date {key['target_event_date']}: {row_error}")
+    add_timing(summary["timings"], "insert", started)
+    return inserted, failed, failed_rule_ids
+
+
+def _new_summary(job_run_id: str, run_date: date, shard: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+    return {
+        "job_run_id": job_run_id,
+        "run_date": run_date,
+        "shard": shard, # (shard_index, shard_count) in shard mode
+        "catch_up_from": None, # Earliest day processed for any rule
+        "rules": 0,
+        "leases_matched": 0,
+        "skipped_existing": 0,
+        "skipped_invalid": 0,
+        "rows_failed": 0,
+        "notifications_created": 0,
+        "chunks_committed": 0,
+        "resumed": False,
+        "timings": {},
+    }
 
-            # Prepare template context
-            property_obj = lease.property
-            context = {
-                "tenant_name": lease.tenant_user.full_name if lease.tenant_user else (lease.tenant_name_manual or "Tenant"),
-                "landlord_name": rule.landlord.full_name if rule.landlord else "Landlord/Property Manager",
-                "lease_end_date": lease.end_date.strftime("%Y-%m-%d") if lease.end_date else "N/A",
-                "days_offset": abs(offset_days), # Make it positive for display "X days remaining"
-                "property_address": property_obj.address_line_1 if property_obj else "N/A",
-                "property_unit": property_obj.unit_name or property_obj.unit_number if property_obj else "N/A",
-                # Add other common placeholders
-            }
 
-            # Create Notification object
-            scheduled_send_datetime = datetime.combine(date.today(), rule.send_time)
-
-            new_notification = Notification(
-                user_id=recipient_user.user_id,
-                notification_type=template.template_type, # Use type from template
-                channel=template.channel,
-                template_id=template.template_id,
-                template_context=context,
-                status=NotificationStatus.SCHEDULED, # To be picked up by a dispatcher
-                scheduled_send_time=scheduled_send_datetime,
-                lease_id=lease.lease_id,
-                # Potentially add more specific related_entity info if needed
-                # related_entity_type="LEASE_RENEWAL_REMINDER",
-                # related_entity_id=rule.rule_id
-            )
-            db.session.add(new_notification)
-            db.session.flush() # To get new_notification.notification_id for the log
-
-            # Log the trigger
-            new_log = NotificationTriggerLog(
-                rule_id=rule.rule_id,
-                lease_id=lease.lease_id,
-                target_event_date=lease.end_date, # The actual end date of this lease
-                notification_id=new_notification.notification_id,
-                job_run_id=job_run_id
-            )
-            db.session.add(new_log)
-
-            current_app.logger.info(f"Scheduled Notification ID {new_notification.notification_id} for Lease ID {lease.lease_id} (Rule ID {rule.rule_id}) to User ID {recipient_user.user_id} via {template.channel.value}.")
+def _log_completion(summary: Dict[str, Any]) -> None:
+    current_app.logger.info(
+        f"Lease renewal reminder job (ID: {summary['job_run_id']}) completed successfully: "
+        f"{summary['notifications_created']} notifications scheduled, {summary['skipped_existing']} already processed, "
+        f"{summary['rows_failed']} failed. "
+        f"Timings: {', '.join(f'{phase}={seconds:.3f}s' for phase, seconds in summary['timings'].items())}"
+    )
+
+
+def _run_single_transaction(summary: Dict[str, Any], **window_options) -> Dict[str, Any]:
+    """Schedules every due reminder and commits once at the end."""
+    job_run_id, run_date, timings = summary["job_run_id"], summary["run_date"], summary["timings"]
+
+    started = timer.perf_counter()
+    rules_by_target, rule_ids = _load_rule_targets(summary, **window_options)
+    add_timing(timings, "load_rules", started)
+    if not rule_ids:
+        current_app.logger.info("No active lease renewal reminder rules found.")
+        return summary
+
+    matches = []
+    if rules_by_target:
+        started = timer.perf_counter()
+        matches = _match_rules(_fetch_matching_leases(rules_by_target, shard=summary["shard"]), rules_by_target)
+        summary["leases_matched"] = len(matches)
+        add_timing(timings, "match_leases", started)
+    if not matches:
+        current_app.logger.info(f"No leases found matching any active rule for dates {summary['catch_up_from']} to {run_date}.")
+        _advance_last_run_date(rule_ids, run_date)
+        return summary
+
+    notification_rows, trigger_rows = _build_reminder_rows(matches, summary, {})
+    if not notification_rows:
+        current_app.logger.info(f"Lease renewal reminder job (ID: {job_run_id}) found no new reminders to schedule.")
+        _advance_last_run_date(rule_ids, run_date)
+        return summary
 
     try:
+        inserted, failed, failed_rule_ids = _insert_reminder_rows(notification_rows, trigger_rows, job_run_id, summary)
+        started = timer.perf_counter()
         db.session.commit()
-        current_app.logger.info(f"Lease renewal reminder job (ID: {job_run_id}) completed successfully.")
+        add_timing(timings, "commit", started)
+        summary["notifications_created"] = inserted
+        summary["rows_failed"] = failed
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Error committing changes for job ID {job_run_id}: {e}", exc_info=True)
+        return summary
+    # Rules with failed rows are retried from the same day on the next run
+    _advance_last_run_date([rule_id for rule_id in rule_ids if rule_id not in failed_rule_ids], run_date)
+    _log_completion(summary)
+    return summary
+
+
+def _update_checkpoint(checkpoint_id: int, values: Dict[Any, Any]) -> None:
+    db.session.query(ReminderJobCheckpoint).filter(
+        ReminderJobCheckpoint.checkpoint_id == checkpoint_id
+    ).update(values, synchronize_session=False)
+
+
+def _run_checkpointed(summary: Dict[str, Any], chunk_size: int, **window_options) -> Dict[str, Any]:
+    """
+    Walks the due leases in lease_id order, `chunk_size` leases at a time, and commits each
+    chunk's notifications together with the advanced `ReminderJobCheckpoint` cursor. Re-running
+    with the same job_run_id resumes after the last committed chunk. Only one chunk of rows is
+    held at a time, so memory stays flat regardless of how many leases are due.
+    """
+    job_run_id, timings = summary["job_run_id"], summary["timings"]
+
+    checkpoint = db.session.query(ReminderJobCheckpoint).filter_by(job_run_id=job_run_id).first()
+    if checkpoint is None:
+        checkpoint = ReminderJobCheckpoint(
+            job_run_id=job_run_id, job_name=REMINDER_JOB_NAME,
+            run_date=summary["run_date"], chunk_size=chunk_size
+        )
+        db.session.add(checkpoint)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another worker created the checkpoint first (job_run_id is unique) and owns this run
+            db.session.rollback()
+            current_app.logger.warning(f"Lease renewal reminder job (ID: {job_run_id}) is already being run by another worker. Skipping.")
+            return summary
+    else:
+        summary["resumed"] = True
+        summary["run_date"] = checkpoint.run_date # Resume with the original run's target dates
+        if checkpoint.status == JobRunStatus.COMPLETED:
+            current_app.logger.info(f"Lease renewal reminder job (ID: {job_run_id}) already completed. Nothing to resume.")
+            return summary
+        current_app.logger.info(f"Resuming lease renewal reminder job (ID: {job_run_id}) after Lease ID {checkpoint.last_lease_id} ({checkpoint.chunks_committed} chunks already committed).")
+
+    checkpoint_id = checkpoint.checkpoint_id
+    cursor = checkpoint.last_lease_id
+    run_date = summary["run_date"]
+    # The rules of rows that failed before a resume are not recorded, so none is advanced then
+    failures_before_resume = bool(checkpoint.rows_failed)
+    failed_rule_ids = set()
+    # From here on the checkpoint is only touched through UPDATE statements. Leases, rules and
+    # templates are read as plain rows and notifications are bulk-inserted, so nothing
+    # accumulates in the session's identity map between chunks.
+    db.session.expunge(checkpoint)
+
+    started = timer.perf_counter()
+    rules_by_target, rule_ids = _load_rule_targets(summary, **window_options)
+    add_timing(timings, "load_rules", started)
+
+    template_cache = {}
+    while rules_by_target:
+        started = timer.perf_counter()
+        leases = _fetch_matching_leases(rules_by_target, after_lease_id=cursor, limit=chunk_size, shard=summary["shard"])
+        if not leases:
+            break
+        cursor = leases[-1].lease_id
+        matches = _match_rules(leases, rules_by_target)
+        summary["leases_matched"] += len(matches)
+        add_timing(timings, "match_leases", started)
+
+        try:
+            inserted = failed = 0
+            if matches:
+                notification_rows, trigger_rows = _build_reminder_rows(matches, summary, template_cache)
+                if notification_rows:
+                    inserted, failed, chunk_failed_rule_ids = _insert_reminder_rows(notification_rows, trigger_rows, job_run_id, summary)
+                    failed_rule_ids.update(chunk_failed_rule_ids)
+            started = timer.perf_counter()
+            _update_checkpoint(checkpoint_id, {
+                ReminderJobCheckpoint.last_lease_id: cursor,
+                ReminderJobCheckpoint.chunks_committed: ReminderJobCheckpoint.chunks_committed + 1,
+                ReminderJobCheckpoint.notifications_created: ReminderJobCheckpoint.notifications_created + inserted,
+                ReminderJobCheckpoint.rows_failed: ReminderJobCheckpoint.rows_failed + failed,
+            })
+            db.session.commit()
+            add_timing(timings, "commit", started)
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error committing chunk ending at Lease ID {cursor} for job ID {job_run_id}: {e}", exc_info=True)
+            _update_checkpoint(checkpoint_id, {
+                ReminderJobCheckpoint.status: JobRunStatus.FAILED,
+                ReminderJobCheckpoint.error_message: str(e),
+            })
+            db.session.commit()
+            return summary
+
+        summary["notifications_created"] += inserted
+        summary["rows_failed"] += failed
+        summary["chunks_committed"] += 1
+
+    _update_checkpoint(checkpoint_id, {
+        ReminderJobCheckpoint.status: JobRunStatus.COMPLETED,
+        ReminderJobCheckpoint.error_message: None,
+        ReminderJobCheckpoint.completed_at: datetime.utcnow(),
+    })
+    db.session.commit()
+    if not failures_before_resume:
+        # Rules with failed rows are retried from the same day on the next run
+        _advance_last_run_date([rule_id for rule_id in rule_ids if rule_id not in failed_rule_ids], run_date)
+    _log_completion(summary)
+    return summary
+
+
+def process_lease_renewal_reminders_job(job_run_id: Optional[str] = None, run_date: Optional[date] = None,
+                                        chunk_size: Optional[int] = None, shard: Optional[Tuple[int, int]] = None,
+                                        since: Optional[date] = None, catch_up: bool = True,
+                                        max_catch_up_days: int = DEFAULT_CATCH_UP_MAX_DAYS) -> Dict[str, Any]:
+    """
+    Processes active lease renewal reminder rules for landlords.
+
+    This job queries for `LandlordReminderRule`s that are active and set for the
+    `LEASE_END_DATE` event and computes, in a single pass, the lease end date each
+    rule targets today (e.g., a -60 DAYS rule targets leases ending 60 days from now).
+
+    Like `process_scheduled_reminders_job`, each rule covers every day from the day after
+    its `last_run_date` up to `run_date` (at most `max_catch_up_days` days), so missed runs
+    are caught up with the same queries. Caught-up reminders keep the date they should have
+    fired on and are due immediately. `last_run_date` is advanced once the run has committed
+    everything, except for rules with rows that could not be inserted; both jobs share it, and
+    the trigger logs keep them from duplicating reminders.
+
+    All rules are then resolved with a handful of set-based queries instead of one
+    query per rule and per lease:
+      1. matching leases are fetched with a single query on the targeted end dates,
+      2. existing `NotificationTriggerLog` entries are fetched in bulk so that a
+         reminder for a specific rule, lease and lease end date combination is never
+         processed twice (the `_rule_entity_event_uc` constraint remains the final guard),
+      3. templates, recipients and properties are loaded once per batch,
+      4. `Notification` rows (status 'SCHEDULED') and their `NotificationTriggerLog`
+         entries are bulk-inserted. A failing batch is retried row by row so a single
+         bad row does not discard the others.
+
+    When `chunk_size` is given the job runs in checkpointed mode: leases are processed
+    and committed `chunk_size` at a time and progress is recorded in a
+    `ReminderJobCheckpoint` keyed by `job_run_id`. Re-running with the same
+    `job_run_id` resumes after the last committed chunk instead of rescanning.
+
+    When `shard` is given only the rules and leases of landlords with
+    `landlord_id % shard_count == shard_index` are processed, so several workers can split
+    a run between them (see `hermitta_app.jobs.sharding.run_sharded_job`).
+
+    The actual sending of notifications (email, SMS, etc.) is handled by a separate
+    dispatcher system that would process 'SCHEDULED' notifications.
+
+    This job is designed to be run periodically (e.g., daily via a cron job or
+    other task scheduler) using the Flask CLI command:
+    `flask run-lease-renewal-job`
+
+    Args:
+        job_run_id (Optional[str]): An optional unique identifier for this specific job run.
+                                    If not provided, a UUID will be generated.
+        run_date (Optional[date]): The date the reminders are computed for. Defaults to today.
+                                   Ignored when resuming a checkpointed run.
+        chunk_size (Optional[int]): Number of leases per committed chunk. None (or 0) commits
+                                    everything in a single transaction without a checkpoint.
+        shard (Optional[Tuple[int, int]]): (shard_index, shard_count) to process a single shard of landlords.
+        since (Optional[date]): Processes every rule from this day on, whatever its last_run_date. Not clamped
+                                to `max_catch_up_days`.
+        catch_up (bool): When False, only `run_date` is processed (unless `since` is given).
+        max_catch_up_days (int): Maximum number of days, including `run_date`, a rule is caught up on.
+
+    Returns:
+        Dict[str, Any]: A summary of the run with counters and per-phase timings (in seconds).
+    """
+    if job_run_id is None:
+        job_run_id = str(uuid.uuid4())
+    if run_date is None:
+        run_date = date.today()
+    if since is not None and since > run_date:
+        raise ValueError(f"since ({since}) is after run_date ({run_date}).")
+
+    summary = _new_summary(job_run_id, run_date, shard)
+    current_app.logger.info(f"Starting lease renewal reminder job (ID: {job_run_id}) for date: {run_date}")
+
+    window_options = dict(since=since, catch_up=catch_up, max_catch_up_days=max_catch_up_days)
+    if chunk_size:
+        return _run_checkpointed(summary, chunk_size, **window_options)
+    return _run_single_transaction(summary, **window_options)
 
 if __name__ == '__main__':
     # This is for local testing if you run this file directly.
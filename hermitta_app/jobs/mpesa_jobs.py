@@ -0,0 +1,435 @@
+import json
+import multiprocessing
+import time as timer
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from typing import Optional, Dict, Any, List, Tuple
+from flask import current_app
+from sqlalchemy import and_, or_
+from hermitta_app import db
+from models import GatewayTransaction, Lease, MpesaCallbackInbox, Notification, Payment
+from models.enums import (
+    CallbackInboxStatus, GatewayTransactionStatus, GatewayType, NotificationChannel, NotificationStatus,
+    NotificationType, PaymentMethod, PaymentStatus
+)
+from services.batching import chunked, add_timing
+
+# Callbacks a worker claims, resolves and applies per batch (and the size of its IN query)
+DEFAULT_CALLBACK_BATCH_SIZE = 500
+
+# Seconds after which a PROCESSING claim is considered abandoned (the worker crashed mid-batch)
+DEFAULT_CLAIM_TIMEOUT_SECONDS = 300
+
+# Claims of a callback before it is given up as FAILED
+DEFAULT_MAX_ATTEMPTS = 5
+
+# Daraja ResultCode of an STK prompt the customer dismissed; other non-zero codes are failures
+MPESA_CANCELLED_RESULT_CODE = 1032
+
+# Gateway transactions that already received their callback; later callbacks for them are duplicates
+FINAL_GATEWAY_STATUSES = (
+    GatewayTransactionStatus.SUCCESSFUL, GatewayTransactionStatus.FAILED, GatewayTransactionStatus.CANCELLED,
+    GatewayTransactionStatus.REFUNDED, GatewayTransactionStatus.PARTIALLY_REFUNDED,
+)
+
+# Payments a callback no longer changes (e.g. a failed retry of a payment another attempt settled)
+SETTLED_PAYMENT_STATUSES = (
+    PaymentStatus.COMPLETED, PaymentStatus.REFUNDED, PaymentStatus.PARTIALLY_REFUNDED, PaymentStatus.IN_DISPUTE,
+)
+
+SUMMED_COUNTERS = ("batches", "claimed", "succeeded", "failed", "cancelled", "duplicates", "unmatched", "malformed", "errors", "notifications_created")
+
+
+def parse_stk_callback(raw_body: str) -> Dict[str, Any]:
+    """
+    Extracts the fields of a Daraja STK callback (`Body.stkCallback`). The CallbackMetadata
+    items (Amount, MpesaReceiptNumber, TransactionDate, PhoneNumber) are only sent for
+    successful payments. Raises ValueError for a payload that is not an STK callback.
+    """
+    try:
+        callback = json.loads(raw_body)["Body"]["stkCallback"]
+        checkout_request_id = str(callback["CheckoutRequestID"])
+        result_code = int(callback["ResultCode"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Not an STK callback: {e}") from e
+
+    items = {}
+    for item in ((callback.get("CallbackMetadata") or {}).get("Item") or []):
+        if isinstance(item, dict) and "Name" in item:
+            items[item["Name"]] = item.get("Value")
+    try:
+        amount = Decimal(str(items["Amount"])) if items.get("Amount") is not None else None
+    except InvalidOperation as e:
+        raise ValueError(f"Invalid Amount {items['Amount']!r}.") from e
+    transaction_date = None
+    if items.get("TransactionDate") is not None:
+        try:
+            transaction_date = datetime.strptime(str(items["TransactionDate"]), "%Y%m%d%H%M%S")
+        except ValueError as e:
+            raise ValueError(f"Invalid TransactionDate {items['TransactionDate']!r}.") from e
+    return {
+        "checkout_request_id": checkout_request_id,
+        "merchant_request_id": callback.get("MerchantRequestID"),
+        "result_code": result_code,
+        "result_desc": callback.get("ResultDesc"),
+        "amount": amount,
+        "receipt_number": items.get("MpesaReceiptNumber"),
+        "transaction_date": transaction_date,
+        "phone_number": str(items["PhoneNumber"]) if items.get("PhoneNumber") is not None else None,
+        "payload": callback,
+    }
+
+
+def _load_transactions(checkout_request_ids) -> Dict[str, Any]:
+    """STK gateway transactions with their payment and lease, by checkout request ID, with one IN query per chunk."""
+    transactions = {}
+    for chunk in chunked(sorted(checkout_request_ids)):
+        for row in db.session.query(
+            GatewayTransaction.transaction_id, GatewayTransaction.gateway_specific_transaction_id,
+            Payment.payment_id, Payment.expected_amount, Payment.lease_id, Lease.tenant_id, Lease.landlord_id
+        ).join(
+            Payment, Payment.payment_id == GatewayTransaction.payment_id
+        ).join(
+            Lease, Lease.lease_id == Payment.lease_id
+        ).filter(
+            GatewayTransaction.gateway_type == GatewayType.MPESA_STK_PUSH,
+            GatewayTransaction.gateway_specific_transaction_id.in_(chunk)
+        ):
+            transactions[row.gateway_specific_transaction_id] = row
+    return transactions
+
+
+def _entry(inbox_id: int, inbox_update: Dict[str, Any], counter: str, transaction_update: Optional[Dict[str, Any]] = None,
+           payment_update: Optional[Dict[str, Any]] = None, notifications: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """The writes of one callback, see `MpesaCallbackProcessor._apply`."""
+    return {"inbox_id": inbox_id, "inbox": inbox_update, "counter": counter, "transaction": transaction_update,
+            "payment": payment_update, "notifications": notifications or []}
+
+
+def _lock_open_transactions(transaction_ids) -> Dict[int, PaymentStatus]:
+    """
+    Re-reads and locks (FOR UPDATE) the given gateway transactions that are still waiting for
+    their callback, and returns their payment's current status by transaction ID. A transaction
+    another worker applied a callback to since it was looked up is left out.
+    """
+    payment_statuses = {}
+    for chunk in chunked(sorted(transaction_ids)):
+        payment_statuses.update(db.session.query(GatewayTransaction.transaction_id, Payment.status).join(
+            Payment, Payment.payment_id == GatewayTransaction.payment_id
+        ).filter(
+            GatewayTransaction.transaction_id.in_(chunk), GatewayTransaction.status.notin_(FINAL_GATEWAY_STATUSES)
+        ).with_for_update().all())
+    return payment_statuses
+
+
+class MpesaCallbackProcessor:
+    """
+    Applies the M-Pesa STK callbacks stored in `MpesaCallbackInbox`.
+
+    Batches are claimed like the notification dispatcher's: RECEIVED rows (plus PROCESSING
+    rows whose claim timed out) are flipped to PROCESSING with a claim token in one
+    conditional UPDATE, so concurrent workers never apply the same callback twice.
+
+    Each batch resolves its checkout request IDs to gateway transactions with one IN query,
+    re-reads the matched transactions that are still open under a row lock, then writes the
+    gateway transactions, payments and inbox rows with one bulk update each and the tenant
+    and landlord notifications with one bulk insert, in a single commit. If that write fails,
+    the batch is written again callback by callback in savepoints, so only the callbacks
+    that cannot be written are released (or given up once out of attempts).
+    Callbacks for transactions that already received theirs (M-Pesa retries, or the same
+    payment's callback applied by another worker) are marked PROCESSED without changing
+    anything. Callbacks no transaction matches are marked UNMATCHED; setting them back to
+    RECEIVED has them retried.
+    """
+
+    def __init__(self, batch_size: int = DEFAULT_CALLBACK_BATCH_SIZE, claim_timeout_seconds: int = DEFAULT_CLAIM_TIMEOUT_SECONDS,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS, notification_channels: Optional[List[NotificationChannel]] = None,
+                 worker_id: Optional[str] = None):
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1.")
+        self.batch_size = batch_size
+        self.claim_timeout_seconds = claim_timeout_seconds
+        self.max_attempts = max_attempts
+        self.notification_channels = notification_channels if notification_channels is not None else [NotificationChannel.IN_APP]
+        self.worker_id = worker_id or uuid.uuid4().hex[:12]
+
+    def _claimable(self, now: datetime):
+        stale_before = now - timedelta(seconds=self.claim_timeout_seconds)
+        return or_(
+            MpesaCallbackInbox.status == CallbackInboxStatus.RECEIVED,
+            and_(MpesaCallbackInbox.status == CallbackInboxStatus.PROCESSING, MpesaCallbackInbox.claimed_at < stale_before)
+        )
+
+    def claim_batch(self, now: datetime) -> Tuple[str, List[int]]:
+        """Claims up to `batch_size` callbacks, oldest first, and returns (claim token, claimed ids)."""
+        claimable = self._claimable(now)
+        candidate_ids = [row.inbox_id for row in db.session.query(MpesaCallbackInbox.inbox_id).filter(
+            claimable
+        ).order_by(MpesaCallbackInbox.inbox_id).limit(self.batch_size).with_for_update(skip_locked=True).all()]
+        if not candidate_ids:
+            db.session.rollback()
+            return None, []
+
+        claim_token = f"{self.worker_id}:{uuid.uuid4().hex[:8]}"
+        db.session.query(MpesaCallbackInbox).filter(
+            MpesaCallbackInbox.inbox_id.in_(candidate_ids), claimable
+        ).update({
+            MpesaCallbackInbox.status: CallbackInboxStatus.PROCESSING,
+            MpesaCallbackInbox.claimed_by: claim_token,
+            MpesaCallbackInbox.claimed_at: now,
+            MpesaCallbackInbox.attempts: MpesaCallbackInbox.attempts + 1,
+        }, synchronize_session=False)
+        db.session.commit()
+
+        claimed_ids = [row.inbox_id for row in db.session.query(MpesaCallbackInbox.inbox_id).filter(
+            MpesaCallbackInbox.claimed_by == claim_token
+        ).all()]
+        return claim_token, claimed_ids
+
+    def _notification_rows(self, transaction, callback: Dict[str, Any], succeeded: bool) -> List[Dict[str, Any]]:
+        if succeeded:
+            notification_type = NotificationType.PAYMENT_RECEIVED_CONFIRMATION
+            subject = "Payment received"
+            content = f"M-Pesa payment of KES {callback['amount']} received (receipt {callback['receipt_number']})."
+            recipients = [transaction.tenant_id, transaction.landlord_id]
+        else:
+            notification_type = NotificationType.PAYMENT_FAILED_ALERT
+            subject = "Payment not completed"
+            content = f"Your M-Pesa payment was not completed: {callback['result_desc'] or 'no reason given'}."
+            recipients = [transaction.tenant_id]
+        return [{
+            "user_id": user_id, "notification_type": notification_type, "channel": channel, "subject": subject,
+            "content": content, "status": NotificationStatus.PENDING, "lease_id": transaction.lease_id,
+            "payment_id": transaction.payment_id,
+        } for user_id in recipients if user_id for channel in self.notification_channels]
+
+    def _apply(self, rows, summary: Dict[str, Any], now: datetime) -> List[Dict[str, Any]]:
+        """
+        Builds the writes of a batch: one entry per callback with its inbox update, its gateway
+        transaction and payment updates (or None), its notifications and the counter it adds to.
+        """
+        timings = summary["timings"]
+        started = timer.perf_counter()
+        entries, callbacks = [], []
+        for row in rows:
+            if row.attempts > self.max_attempts:
+                entries.append(_entry(row.inbox_id, {"status": CallbackInboxStatus.FAILED, "error_message": f"Gave up after {self.max_attempts} attempts."}, "errors"))
+                continue
+            try:
+                callbacks.append((row.inbox_id, parse_stk_callback(row.raw_body)))
+            except ValueError as e:
+                entries.append(_entry(row.inbox_id, {"status": CallbackInboxStatus.FAILED, "error_message": str(e)}, "malformed"))
+        add_timing(timings, "parse", started)
+
+        started = timer.perf_counter()
+        transactions = _load_transactions({callback["checkout_request_id"] for _, callback in callbacks})
+        # Locked until the batch commits, so two workers never apply callbacks to the same transaction
+        open_payment_statuses = _lock_open_transactions({transaction.transaction_id for transaction in transactions.values()})
+        add_timing(timings, "resolve", started)
+
+        applied = set()
+        for inbox_id, callback in callbacks:
+            checkout_request_id = callback["checkout_request_id"]
+            update = {"checkout_request_id": checkout_request_id}
+            transaction = transactions.get(checkout_request_id)
+            if transaction is None:
+                update.update(status=CallbackInboxStatus.UNMATCHED, error_message="No M-Pesa gateway transaction has this CheckoutRequestID.")
+                entries.append(_entry(inbox_id, update, "unmatched"))
+                continue
+            if transaction.transaction_id not in open_payment_statuses or checkout_request_id in applied:
+                update.update(status=CallbackInboxStatus.PROCESSED, error_message="Duplicate of an applied callback.")
+                entries.append(_entry(inbox_id, update, "duplicates"))
+                continue
+            applied.add(checkout_request_id)
+            update.update(status=CallbackInboxStatus.PROCESSED, error_message=None)
+            payment_status = open_payment_statuses[transaction.transaction_id]
+
+            succeeded = callback["result_code"] == 0
+            transaction_update = {
+                "transaction_id": transaction.transaction_id, "callback_payload": callback["payload"], "last_updated_at": now,
+                "error_code": None if succeeded else str(callback["result_code"]),
+                "error_message": None if succeeded else callback["result_desc"],
+            }
+            payment_update = {"payment_id": transaction.payment_id, "gateway_transaction_id": transaction.transaction_id, "updated_at": now}
+            if succeeded:
+                transaction_update.update(status=GatewayTransactionStatus.SUCCESSFUL, payment_method_detail="MPESA")
+                amount = callback["amount"]
+                payment_update.update(
+                    status=PaymentStatus.PARTIALLY_PAID if amount is not None and amount < transaction.expected_amount else PaymentStatus.COMPLETED,
+                    amount_paid=amount, payment_method=PaymentMethod.MPESA_ONLINE_STK, reference_number=callback["receipt_number"],
+                    payment_date=(callback["transaction_date"] or now).date(),
+                )
+                counter = "succeeded"
+            elif callback["result_code"] == MPESA_CANCELLED_RESULT_CODE:
+                transaction_update["status"] = GatewayTransactionStatus.CANCELLED
+                payment_update["status"] = PaymentStatus.CANCELLED
+                counter = "cancelled"
+            else:
+                transaction_update["status"] = GatewayTransactionStatus.FAILED
+                payment_update["status"] = PaymentStatus.FAILED
+                counter = "failed"
+            # A failed retry does not undo a partial payment, and nothing changes a settled one
+            if payment_status in SETTLED_PAYMENT_STATUSES or (not succeeded and payment_status == PaymentStatus.PARTIALLY_PAID):
+                payment_update = None
+            entries.append(_entry(inbox_id, update, counter, transaction_update, payment_update,
+                                  self._notification_rows(transaction, callback, succeeded)))
+        return entries
+
+    def _write(self, entries: List[Dict[str, Any]], processed_at: datetime) -> None:
+        db.session.bulk_update_mappings(GatewayTransaction, [entry["transaction"] for entry in entries if entry["transaction"]])
+        db.session.bulk_update_mappings(Payment, [entry["payment"] for entry in entries if entry["payment"]])
+        db.session.bulk_insert_mappings(Notification, [row for entry in entries for row in entry["notifications"]])
+        db.session.bulk_update_mappings(MpesaCallbackInbox, [
+            dict(entry["inbox"], inbox_id=entry["inbox_id"], claimed_by=None, processed_at=processed_at) for entry in entries
+        ])
+
+    def _release(self, claim_token: str, error_message: str, inbox_ids: Optional[List[int]] = None) -> None:
+        """Releases claimed callbacks (all of the batch's by default) for another attempt; rows out of attempts are given up."""
+        for status, attempts in ((CallbackInboxStatus.FAILED, MpesaCallbackInbox.attempts >= self.max_attempts),
+                                 (CallbackInboxStatus.RECEIVED, MpesaCallbackInbox.attempts < self.max_attempts)):
+            query = db.session.query(MpesaCallbackInbox).filter(MpesaCallbackInbox.claimed_by == claim_token, attempts)
+            if inbox_ids is not None:
+                query = query.filter(MpesaCallbackInbox.inbox_id.in_(inbox_ids))
+            query.update({
+                MpesaCallbackInbox.status: status, MpesaCallbackInbox.claimed_by: None, MpesaCallbackInbox.error_message: error_message,
+            }, synchronize_session=False)
+
+    def _write_each(self, claim_token: str, entries: List[Dict[str, Any]], processed_at: datetime) -> List[Dict[str, Any]]:
+        """Writes the entries one by one in savepoints, releasing the callbacks that fail. Returns the written entries."""
+        written = []
+        for entry in entries:
+            try:
+                with db.session.begin_nested():
+                    self._write([entry], processed_at)
+                written.append(entry)
+            except Exception as e:
+                current_app.logger.error(f"Could not apply M-Pesa callback inbox ID {entry['inbox_id']}: {e}")
+                self._release(claim_token, str(e), [entry["inbox_id"]])
+        return written
+
+    def process_batch(self, summary: Dict[str, Any], now: Optional[datetime] = None) -> int:
+        """Claims, resolves and applies one batch. Returns the number of callbacks claimed."""
+        timings = summary["timings"]
+        now = now or datetime.utcnow()
+        started = timer.perf_counter()
+        claim_token, claimed_ids = self.claim_batch(now)
+        add_timing(timings, "claim", started)
+        if not claimed_ids:
+            return 0
+        summary["claimed"] += len(claimed_ids)
+
+        try:
+            rows = db.session.query(
+                MpesaCallbackInbox.inbox_id, MpesaCallbackInbox.raw_body, MpesaCallbackInbox.attempts
+            ).filter(MpesaCallbackInbox.claimed_by == claim_token).order_by(MpesaCallbackInbox.inbox_id).all()
+            entries = self._apply(rows, summary, now)
+
+            started = timer.perf_counter()
+            processed_at = datetime.utcnow()
+            try:
+                with db.session.begin_nested():
+                    self._write(entries, processed_at)
+                written = entries
+            except Exception as e:
+                current_app.logger.warning(f"Writing M-Pesa callback batch {claim_token} failed: {e}. Retrying callback by callback.")
+                written = self._write_each(claim_token, entries, processed_at)
+            db.session.commit()
+            add_timing(timings, "update", started)
+            for entry in written:
+                summary[entry["counter"]] += 1
+                summary["notifications_created"] += len(entry["notifications"])
+            summary["errors"] += len(entries) - len(written)
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error applying M-Pesa callback batch {claim_token}: {e}", exc_info=True)
+            self._release(claim_token, str(e))
+            db.session.commit()
+            summary["errors"] += len(claimed_ids)
+        summary["batches"] += 1
+        return len(claimed_ids)
+
+    def run(self, max_batches: Optional[int] = None, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Processes batches until the inbox is drained (or `max_batches` batches were processed)."""
+        summary = {"worker_id": self.worker_id, "timings": {}, **{counter: 0 for counter in SUMMED_COUNTERS}}
+        while max_batches is None or summary["batches"] < max_batches:
+            if not self.process_batch(summary, now=now):
+                break
+        return summary
+
+
+def _callback_processor(worker_id: Optional[str], batch_size: Optional[int]) -> MpesaCallbackProcessor:
+    config = current_app.config
+    return MpesaCallbackProcessor(
+        batch_size=batch_size or config.get('MPESA_CALLBACK_BATCH_SIZE', DEFAULT_CALLBACK_BATCH_SIZE),
+        claim_timeout_seconds=config.get('MPESA_CALLBACK_CLAIM_TIMEOUT_SECONDS', DEFAULT_CLAIM_TIMEOUT_SECONDS),
+        max_attempts=config.get('MPESA_CALLBACK_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS),
+        notification_channels=[NotificationChannel(channel) for channel in config.get('MPESA_PAYMENT_NOTIFICATION_CHANNELS', ['IN_APP'])],
+        worker_id=worker_id,
+    )
+
+
+def _run_callback_worker(config_name: str, worker_id: str, batch_size: Optional[int], max_batches: Optional[int]) -> Dict[str, Any]:
+    """Worker process entry point. Builds its own app, so each worker has its own engine, connection pool and session."""
+    from hermitta_app import create_app
+
+    app = create_app(config_name)
+    with app.app_context():
+        try:
+            return _callback_processor(worker_id, batch_size).run(max_batches=max_batches)
+        finally:
+            db.session.remove()
+            db.engine.dispose()
+
+
+def drain_mpesa_callback_inbox_job(worker_id: Optional[str] = None, batch_size: Optional[int] = None,
+                                   max_batches: Optional[int] = None, workers: Optional[int] = None,
+                                   config_name: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Applies the M-Pesa STK callbacks waiting in the inbox (see `MpesaCallbackProcessor`).
+    Workers claim disjoint batches, so several can drain the inbox at once, either as
+    separate runs of this job or as the `workers` processes it starts.
+
+    Triggered via the Flask CLI command: `flask run-mpesa-callback-worker`
+
+    Args:
+        worker_id (Optional[str]): Prefix of the claim tokens. Generated if not provided; worker processes append their index.
+        batch_size (Optional[int]): Callbacks per batch. Defaults to MPESA_CALLBACK_BATCH_SIZE.
+        max_batches (Optional[int]): Stops each worker after this many batches. By default runs until the inbox is drained.
+        workers (Optional[int]): Worker processes. Defaults to MPESA_CALLBACK_WORKERS; 1 runs in this process.
+        config_name (Optional[str]): App config worker processes are created with. Defaults to the current one.
+
+    Returns:
+        Dict[str, Any]: Counters (claimed, succeeded, failed, cancelled, duplicates, unmatched, malformed, errors,
+                        notifications_created) and per-phase timings (in seconds), summed across workers.
+    """
+    worker_id = worker_id or uuid.uuid4().hex[:12]
+    workers = workers or current_app.config.get('MPESA_CALLBACK_WORKERS', 1)
+    started = timer.perf_counter()
+    current_app.logger.info(f"Starting M-Pesa callback worker (worker: {worker_id}, processes: {workers}).")
+    if workers <= 1:
+        summary = _callback_processor(worker_id, batch_size).run(max_batches=max_batches)
+    else:
+        if config_name is None:
+            from config import get_config_name
+            config_name = get_config_name()
+        summary = {"worker_id": worker_id, "timings": {}, **{counter: 0 for counter in SUMMED_COUNTERS}}
+        # "spawn" gives every worker a fresh interpreter: no database connections are inherited from this process
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = [executor.submit(_run_callback_worker, config_name, f"{worker_id}-{index}", batch_size, max_batches)
+                       for index in range(workers)]
+            for future in as_completed(futures):
+                worker_summary = future.result()
+                for counter in SUMMED_COUNTERS:
+                    summary[counter] += worker_summary[counter]
+                for phase, seconds in worker_summary["timings"].items():
+                    summary["timings"][phase] = summary["timings"].get(phase, 0.0) + seconds
+    summary["seconds"] = timer.perf_counter() - started
+    timings = ", ".join(f"{phase}={seconds:.3f}s" for phase, seconds in summary["timings"].items())
+    current_app.logger.info(
+        f"M-Pesa callback worker (worker: {worker_id}) completed in {summary['seconds']:.3f}s: {summary['succeeded']} succeeded, "
+        f"{summary['failed']} failed, {summary['cancelled']} cancelled, {summary['duplicates']} duplicates, "
+        f"{summary['unmatched']} unmatched, {summary['malformed']} malformed. Timings: {timings}"
+    )
+    return summary
@@ -0,0 +1,337 @@
+import time as timer
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Tuple
+from flask import current_app
+from sqlalchemy import and_, bindparam, or_, select
+from hermitta_app import db
+from hermitta_app.services.template_renderer import TemplateRenderer, template_renderer
+from hermitta_app.services.event_bus import queue_notification_events
+from hermitta_app.services.notification_backends import (
+    NotificationBackend, NotificationDeliveryError, OutgoingNotification, build_notification_backends
+)
+from models import Notification, NotificationUnreadCounter, User
+from models.user import PreferredLanguage
+from models.enums import NotificationStatus, NotificationChannel
+from services.batching import chunked, add_timing
+
+# Notifications a worker claims, renders, sends and updates per batch
+DEFAULT_DISPATCH_BATCH_SIZE = 200
+
+# Seconds after which a SENDING claim is considered abandoned (the worker crashed mid-batch)
+DEFAULT_CLAIM_TIMEOUT_SECONDS = 600
+
+# Statuses of notifications waiting to be sent
+DUE_STATUSES = (NotificationStatus.SCHEDULED, NotificationStatus.PENDING)
+
+DEFAULT_CHANNEL_CONCURRENCY = {
+    NotificationChannel.EMAIL: 8,
+    NotificationChannel.SMS: 4,
+    NotificationChannel.IN_APP: 1,
+}
+
+
+def _template_language(preferred_language: Optional[PreferredLanguage]) -> str:
+    return 'sw' if preferred_language == PreferredLanguage.SW_KE else 'en'
+
+
+def _load_recipients(user_ids) -> Dict[int, Any]:
+    """Contact details, names and languages of the recipients, with one IN query per chunk."""
+    recipients = {}
+    for chunk in chunked(sorted(user_ids)):
+        for user in db.session.query(
+            User.user_id, User.email, User.phone_number, User.first_name, User.last_name, User.preferred_language
+        ).filter(User.user_id.in_(chunk)):
+            recipients[user.user_id] = user
+    return recipients
+
+
+def _recipient_address(channel: NotificationChannel, user) -> Optional[str]:
+    if channel == NotificationChannel.EMAIL:
+        return user.email
+    if channel == NotificationChannel.SMS:
+        return user.phone_number
+    return str(user.user_id)
+
+
+class NotificationDispatcher:
+    """
+    Sends due notifications through one backend per channel.
+
+    Each batch is claimed first: due rows (SCHEDULED or PENDING with `scheduled_send_time`
+    in the past or unset, plus SENDING rows whose claim timed out) are flipped to SENDING
+    with a claim token in one conditional UPDATE. A row claimed by another worker in the
+    meantime no longer matches the UPDATE's WHERE clause, so concurrent dispatchers never
+    send the same notification twice. On PostgreSQL the candidate SELECT also uses
+    `FOR UPDATE SKIP LOCKED`, so workers do not even wait on each other's rows.
+
+    Claimed rows are rendered from their compiled `NotificationTemplate` (see
+    TemplateRenderer) and `template_context` in the recipient's preferred language
+    (recipients are loaded with one IN query), sent through the channel backends on thread pools capped at each channel's
+    concurrency limit, and written back with one conditional UPDATE per set of result columns.
+    The UPDATE only matches rows still holding the batch's claim token: if a batch outlives
+    its claim and another worker reclaims a row, that worker's result wins, and the row is
+    neither counted as unread nor pushed a second time.
+    """
+
+    def __init__(self, backends: Dict[NotificationChannel, NotificationBackend], batch_size: int = DEFAULT_DISPATCH_BATCH_SIZE,
+                 channel_concurrency: Optional[Dict[NotificationChannel, int]] = None,
+                 claim_timeout_seconds: int = DEFAULT_CLAIM_TIMEOUT_SECONDS, worker_id: Optional[str] = None,
+                 renderer: Optional[TemplateRenderer] = None):
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1.")
+        self.backends = backends
+        self.batch_size = batch_size
+        self.channel_concurrency = {**DEFAULT_CHANNEL_CONCURRENCY, **(channel_concurrency or {})}
+        self.claim_timeout_seconds = claim_timeout_seconds
+        self.worker_id = worker_id or uuid.uuid4().hex[:12]
+        self.renderer = renderer or template_renderer
+        # One pool per channel for the whole run: backends keep a connection per worker thread
+        # (e.g. SMTP sessions), so new pools per batch would open new connections every batch
+        self._executors: Dict[NotificationChannel, ThreadPoolExecutor] = {}
+
+    def _claimable(self, now: datetime):
+        stale_before = now - timedelta(seconds=self.claim_timeout_seconds)
+        return and_(
+            Notification.channel.in_(list(self.backends)),
+            or_(
+                and_(
+                    Notification.status.in_(DUE_STATUSES),
+                    or_(Notification.scheduled_send_time.is_(None), Notification.scheduled_send_time <= now)
+                ),
+                and_(Notification.status == NotificationStatus.SENDING, Notification.claimed_at < stale_before)
+            )
+        )
+
+    def claim_batch(self, now: datetime) -> Tuple[str, List[int]]:
+        """Claims up to `batch_size` due notifications and returns (claim token, claimed ids)."""
+        claimable = self._claimable(now)
+        candidate_ids = [row.notification_id for row in db.session.query(Notification.notification_id).filter(
+            claimable
+        ).order_by(
+            Notification.scheduled_send_time, Notification.notification_id
+        ).limit(self.batch_size).with_for_update(skip_locked=True).all()]
+        if not candidate_ids:
+            db.session.rollback()
+            return None, []
+
+        claim_token = f"{self.worker_id}:{uuid.uuid4().hex[:8]}"
+        db.session.query(Notification).filter(
+            Notification.notification_id.in_(candidate_ids), claimable
+        ).update({
+            Notification.status: NotificationStatus.SENDING,
+            Notification.claimed_by: claim_token,
+            Notification.claimed_at: now,
+        }, synchronize_session=False)
+        db.session.commit()
+
+        claimed_ids = [row.notification_id for row in db.session.query(Notification.notification_id).filter(
+            Notification.claimed_by == claim_token
+        ).all()]
+        return claim_token, claimed_ids
+
+    def _render(self, claimed_ids: List[int], summary: Dict[str, Any]) -> Tuple[List[OutgoingNotification], Dict[int, Dict[str, Any]]]:
+        """
+        Builds the outgoing messages of the claimed rows. Rows that cannot be rendered or
+        addressed get their final update mapping right away instead of a message.
+        """
+        rows = db.session.query(
+            Notification.notification_id, Notification.user_id, Notification.channel, Notification.template_id,
+            Notification.template_context, Notification.subject, Notification.content
+        ).filter(Notification.notification_id.in_(claimed_ids)).order_by(Notification.notification_id).all()
+        templates = self.renderer.compiled_templates(row.template_id for row in rows if row.template_id)
+        recipients = _load_recipients({row.user_id for row in rows})
+
+        messages, failed = [], {}
+        for row in rows:
+            recipient = recipients.get(row.user_id)
+            subject, body = row.subject, row.content
+            try:
+                if row.template_id:
+                    template = templates.get(row.template_id)
+                    if template is None:
+                        raise ValueError(f"NotificationTemplate ID {row.template_id} not found.")
+                    language = _template_language(recipient.preferred_language if recipient else None)
+                    rendered = template.render(row.template_context or {}, language=language)
+                    subject, body = rendered["subject"], rendered["body"]
+                if not body:
+                    raise ValueError("Notification has no content and no template.")
+            except ValueError as e:
+                failed[row.notification_id] = {"status": NotificationStatus.FAILED, "error_message": f"Render error: {e}"}
+                summary["failed"] += 1
+                continue
+
+            address = _recipient_address(row.channel, recipient) if recipient else None
+            if not address:
+                failed[row.notification_id] = {
+                    "status": NotificationStatus.INVALID_ADDRESS, "subject": subject, "content": body,
+                    "error_message": f"Recipient User ID {row.user_id} has no {row.channel.value} address.",
+                }
+                summary["invalid_address"] += 1
+                continue
+            messages.append(OutgoingNotification(row.notification_id, row.channel, row.user_id, address, subject, body))
+        return messages, failed
+
+    def _send_one(self, message: OutgoingNotification) -> Dict[str, Any]:
+        result = {"subject": message.subject, "content": message.body}
+        try:
+            result["external_id"] = self.backends[message.channel].send(message)
+            result["status"] = NotificationStatus.SENT
+            result["error_message"] = None
+        except NotificationDeliveryError as e:
+            result["status"] = NotificationStatus.INVALID_ADDRESS if e.invalid_address else NotificationStatus.FAILED
+            result["error_message"] = str(e)
+        except Exception as e:
+            current_app.logger.error(f"Unexpected error sending Notification ID {message.notification_id}: {e}", exc_info=True)
+            result["status"] = NotificationStatus.FAILED
+            result["error_message"] = f"Unexpected error: {e}"
+        result["sent_at"] = datetime.utcnow()
+        return result
+
+    def _executor(self, channel: NotificationChannel) -> ThreadPoolExecutor:
+        executor = self._executors.get(channel)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=max(1, self.channel_concurrency.get(channel, 1)),
+                                          thread_name_prefix=f"notify-{channel.value.lower()}")
+            self._executors[channel] = executor
+        return executor
+
+    def _send(self, messages: List[OutgoingNotification]) -> Dict[int, Dict[str, Any]]:
+        """Sends every channel concurrently, each on its own pool sized to the channel's limit."""
+        futures = {message.notification_id: self._executor(message.channel).submit(self._send_one, message) for message in messages}
+        return {notification_id: future.result() for notification_id, future in futures.items()}
+
+    def close(self) -> None:
+        """Stops the worker threads, then releases the backends' connections."""
+        for executor in self._executors.values():
+            executor.shutdown(wait=True)
+        self._executors.clear()
+        for backend in self.backends.values():
+            backend.close()
+
+    def _write_results(self, claim_token: str, results: Dict[int, Dict[str, Any]], updated_at: datetime) -> set:
+        """Writes the results to the rows still claimed with `claim_token` and returns the ids of those rows."""
+        table = Notification.__table__
+        by_columns = {}
+        for notification_id, result in results.items():
+            params = {f"v_{column}": value for column, value in result.items()}
+            by_columns.setdefault(tuple(sorted(result)), []).append(dict(params, b_notification_id=notification_id))
+        for columns, params in by_columns.items():
+            db.session.execute(table.update().where(
+                table.c.notification_id == bindparam("b_notification_id"), table.c.claimed_by == claim_token
+            ).values(updated_at=updated_at, **{column: bindparam(f"v_{column}", type_=table.c[column].type) for column in columns}), params)
+        # The claim is only replaced by another worker's while the row is SENDING, so the
+        # rows still holding this token are exactly those the updates above matched
+        return set(db.session.scalars(select(Notification.notification_id).where(
+            Notification.notification_id.in_(list(results)), Notification.claimed_by == claim_token
+        )))
+
+    def dispatch_batch(self, summary: Dict[str, Any], now: Optional[datetime] = None) -> int:
+        """Claims, renders, sends and updates one batch. Returns the number of notifications claimed."""
+        timings = summary["timings"]
+        started = timer.perf_counter()
+        claim_token, claimed_ids = self.claim_batch(now or datetime.utcnow())
+        add_timing(timings, "claim", started)
+        if not claimed_ids:
+            return 0
+        summary["claimed"] += len(claimed_ids)
+
+        started = timer.perf_counter()
+        messages, results = self._render(claimed_ids, summary)
+        add_timing(timings, "render", started)
+
+        started = timer.perf_counter()
+        in_app_users = {message.notification_id: message.user_id for message in messages if message.channel == NotificationChannel.IN_APP}
+        for notification_id, result in self._send(messages).items():
+            results[notification_id] = result
+            if result["status"] == NotificationStatus.SENT:
+                summary["sent"] += 1
+            elif result["status"] == NotificationStatus.INVALID_ADDRESS:
+                summary["invalid_address"] += 1
+            else:
+                summary["failed"] += 1
+        add_timing(timings, "send", started)
+
+        started = timer.perf_counter()
+        written = self._write_results(claim_token, results, datetime.utcnow())
+        summary["superseded"] += len(results) - len(written)
+        delivered_in_app = [notification_id for notification_id in in_app_users
+                            if notification_id in written and results[notification_id]["status"] == NotificationStatus.SENT]
+        unread_deltas = {}
+        for notification_id in delivered_in_app:
+            unread_deltas[in_app_users[notification_id]] = unread_deltas.get(in_app_users[notification_id], 0) + 1
+        # Set-based updates skip the flush listeners, so delivered in-app notifications are counted and pushed here
+        NotificationUnreadCounter.adjust(db.session.connection(), unread_deltas)
+        queue_notification_events(db.session, delivered_in_app)
+        db.session.commit()
+        add_timing(timings, "update", started)
+        summary["batches"] += 1
+        return len(claimed_ids)
+
+    def run(self, max_batches: Optional[int] = None, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Dispatches batches until nothing is due (or `max_batches` batches were processed)."""
+        summary = {
+            "worker_id": self.worker_id,
+            "batches": 0,
+            "claimed": 0,
+            "sent": 0,
+            "failed": 0,
+            "invalid_address": 0,
+            "superseded": 0,
+            "timings": {},
+        }
+        try:
+            while max_batches is None or summary["batches"] < max_batches:
+                if not self.dispatch_batch(summary, now=now):
+                    break
+        finally:
+            self.close()
+        return summary
+
+
+def dispatch_due_notifications_job(worker_id: Optional[str] = None, batch_size: Optional[int] = None,
+                                   max_batches: Optional[int] = None,
+                                   backends: Optional[Dict[NotificationChannel, NotificationBackend]] = None,
+                                   coalesce: Optional[bool] = None) -> Dict[str, Any]:
+    """
+    Sends every notification that is due, e.g. the reminders scheduled by the reminder jobs.
+    Several workers can run this job at the same time; each notification is claimed by
+    exactly one of them (see `NotificationDispatcher`).
+
+    Triggered via the Flask CLI command: `flask run-notification-dispatcher`
+
+    Args:
+        worker_id (Optional[str]): Prefix of this worker's claim tokens. Generated if not provided.
+        batch_size (Optional[int]): Notifications per batch. Defaults to NOTIFICATION_DISPATCH_BATCH_SIZE.
+        max_batches (Optional[int]): Stops after this many batches. By default runs until nothing is due.
+        backends (Optional[Dict]): Backend per channel. Built from the app config if not provided.
+        coalesce (Optional[bool]): Coalesce due notifications into digests first (see
+                                   `coalesce_pending_notifications_job`). Defaults to NOTIFICATION_DIGEST_ENABLED.
+
+    Returns:
+        Dict[str, Any]: Counters (claimed, sent, failed, invalid_address, superseded) and per-phase timings (in seconds),
+                        plus the digest summary when notifications were coalesced.
+    """
+    config = current_app.config
+    digest_summary = None
+    if coalesce if coalesce is not None else config.get('NOTIFICATION_DIGEST_ENABLED', False):
+        from hermitta_app.jobs.digest_jobs import coalesce_pending_notifications_job
+        digest_summary = coalesce_pending_notifications_job()
+    concurrency = {NotificationChannel(channel): limit for channel, limit in config.get('NOTIFICATION_CHANNEL_CONCURRENCY', {}).items()}
+    dispatcher = NotificationDispatcher(
+        backends if backends is not None else build_notification_backends(config),
+        batch_size=batch_size or config.get('NOTIFICATION_DISPATCH_BATCH_SIZE', DEFAULT_DISPATCH_BATCH_SIZE),
+        channel_concurrency=concurrency,
+        claim_timeout_seconds=config.get('NOTIFICATION_CLAIM_TIMEOUT_SECONDS', DEFAULT_CLAIM_TIMEOUT_SECONDS),
+        worker_id=worker_id,
+    )
+    current_app.logger.info(f"Starting notification dispatcher (worker: {dispatcher.worker_id}).")
+    summary = dispatcher.run(max_batches=max_batches)
+    summary["digest"] = digest_summary
+    timings = ", ".join(f"{phase}={seconds:.3f}s" for phase, seconds in summary["timings"].items())
+    current_app.logger.info(
+        f"Notification dispatcher (worker: {dispatcher.worker_id}) completed: {summary['sent']} sent, "
+        f"{summary['failed']} failed, {summary['invalid_address']} invalid addresses. Timings: {timings}"
+    )
+    return summary
@@ -0,0 +1,514 @@
+import time as timer
+import uuid
+from datetime import datetime, date, time
+from typing import Optional, Dict, Any, List, Iterable, Tuple, Callable, Set
+from flask import current_app
+from sqlalchemy import func, null, or_
+from hermitta_app import db
+from models import (
+    LandlordReminderRule, Lease, Payment, Document, MaintenanceRequest, FinancialTransaction,
+    NotificationTriggerLog, Property
+)
+from models.lease import LeaseStatusType
+from models.maintenance_request import MaintenanceRequestStatus
+from models.enums import ReminderRuleEvent, PaymentStatus, NotificationStatus
+from hermitta_app.jobs.lease_jobs import (
+    ACTIVE_LEASE_STATUSES, LEASE_ENTITY_TYPE, DATE_OFFSET_UNITS, DEFAULT_CATCH_UP_MAX_DAYS,
+    _offset_date, _event_date_window, _merge_date_windows, _first_run_date, _advance_last_run_date,
+    _shard_filter, _user_display_names, _property_summaries, _resolve_recipient_id, _load_templates,
+    _template_placeholder_errors, _insert_reminder_rows
+)
+from services.batching import IN_CLAUSE_CHUNK_SIZE, chunked, add_timing
+
+# Source rows fetched, matched and committed per batch of each event type
+DEFAULT_SWEEP_BATCH_SIZE = 500
+
+# Lease statuses for which a start date reminder is still relevant
+UPCOMING_LEASE_STATUSES = (LeaseStatusType.PENDING_SIGNATURES, LeaseStatusType.ACTIVE_PENDING_MOVE_IN, LeaseStatusType.ACTIVE)
+
+# Payments that are still owed
+OUTSTANDING_PAYMENT_STATUSES = (PaymentStatus.EXPECTED, PaymentStatus.PARTIALLY_PAID, PaymentStatus.OVERDUE)
+
+CLOSED_MAINTENANCE_STATUSES = (
+    MaintenanceRequestStatus.CLOSED_COMPLETED, MaintenanceRequestStatus.CLOSED_CANCELLED,
+    MaintenanceRequestStatus.CLOSED_REJECTED_BY_LANDLORD
+)
+
+
+def _format_date(value: Optional[date]) -> str:
+    return value.strftime("%Y-%m-%d") if value else "N/A"
+
+
+def _format_amount(value) -> str:
+    return str(value) if value is not None else "N/A"
+
+
+class ReminderEventSource:
+    """
+    Describes where the event dates of one ReminderRuleEvent live.
+
+    `build_query` returns a query selecting the labelled columns entity_id, landlord_id,
+    tenant_id, property_id, lease_id, tenant_name_manual and event_date (plus any columns
+    `context` needs). The sweep adds the date windows, landlord filter and keyset ordering.
+    `notification_link` names the Notification column that points at the entity; when None
+    the entity is recorded in related_entity_type/related_entity_id instead.
+    """
+
+    def __init__(self, event_type: ReminderRuleEvent, entity_type: str, id_column, date_column, landlord_column,
+                 build_query: Callable[[], Any], context: Callable[[Any], Dict[str, Any]],
+                 notification_link: Optional[str] = None):
+        self.event_type = event_type
+        self.entity_type = entity_type
+        self.id_column = id_column
+        self.date_column = date_column
+        self.landlord_column = landlord_column
+        self.build_query = build_query
+        self.context = context
+        self.notification_link = notification_link
+
+    def __repr__(self):
+        return f"<ReminderEventSource {self.event_type.value} -> {self.entity_type}>"
+
+
+def _source_columns(entity_id, landlord_id, tenant_id, property_id, lease_id, tenant_name_manual, event_date, **extra) -> List[Any]:
+    """Labels the columns every source must provide; None stands for a column the source does not have."""
+    columns = dict(
+        entity_id=entity_id, landlord_id=landlord_id, tenant_id=tenant_id, property_id=property_id,
+        lease_id=lease_id, tenant_name_manual=tenant_name_manual, event_date=event_date, **extra
+    )
+    return [(null() if column is None else column).label(name) for name, column in columns.items()]
+
+
+def _lease_query(date_column, statuses):
+    def build_query():
+        return db.session.query(*_source_columns(
+            Lease.lease_id, Lease.landlord_id, Lease.tenant_id, Lease.property_id, Lease.lease_id,
+            Lease.tenant_name_manual, date_column, rent_amount=Lease.rent_amount
+        )).filter(Lease.status.in_(statuses))
+    return build_query
+
+
+def _rent_due_query():
+    return db.session.query(*_source_columns(
+        Payment.payment_id, Lease.landlord_id, Lease.tenant_id, Lease.property_id, Payment.lease_id,
+        Lease.tenant_name_manual, Payment.due_date,
+        amount_due=Payment.expected_amount, payment_reference_code=Payment.payment_reference_code
+    )).join(Lease, Payment.lease_id == Lease.lease_id).filter(Payment.status.in_(OUTSTANDING_PAYMENT_STATUSES))
+
+
+def _invoice_due_query():
+    # Recurring bills and charges are tracked on the master FinancialTransaction's next_due_date
+    return db.session.query(*_source_columns(
+        FinancialTransaction.transaction_id, FinancialTransaction.landlord_id, Lease.tenant_id,
+        FinancialTransaction.property_id, FinancialTransaction.lease_id, Lease.tenant_name_manual,
+        FinancialTransaction.next_due_date,
+        amount_due=FinancialTransaction.amount, invoice_description=FinancialTransaction.description
+    )).outerjoin(Lease, FinancialTransaction.lease_id == Lease.lease_id).filter(
+        FinancialTransaction.is_recurring == True,
+        FinancialTransaction.parent_recurring_transaction_id.is_(None)
+    )
+
+
+# A document belongs to the landlord of its property, or of its lease for lease-only documents
+DOCUMENT_LANDLORD_ID = func.coalesce(Property.landlord_id, Lease.landlord_id)
+
+
+def _document_expiry_query():
+    return db.session.query(*_source_columns(
+        Document.document_id, DOCUMENT_LANDLORD_ID, Lease.tenant_id,
+        func.coalesce(Document.property_id, Lease.property_id), Document.lease_id,
+        Lease.tenant_name_manual, Document.expiry_date, document_name=Document.document_name
+    )).outerjoin(Property, Document.property_id == Property.property_id).outerjoin(
+        Lease, Document.lease_id == Lease.lease_id
+    )
+
+
+def _maintenance_scheduled_query():
+    return db.session.query(*_source_columns(
+        MaintenanceRequest.request_id, Property.landlord_id, MaintenanceRequest.tenant_id,
+        MaintenanceRequest.property_id, None, None, MaintenanceRequest.scheduled_date,
+        maintenance_description=MaintenanceRequest.description
+    )).join(Property, MaintenanceRequest.property_id == Property.property_id).filter(
+        MaintenanceRequest.status.notin_(CLOSED_MAINTENANCE_STATUSES)
+    )
+
+
+EVENT_SOURCES = {source.event_type: source for source in (
+    ReminderEventSource(
+        ReminderRuleEvent.LEASE_START_DATE, LEASE_ENTITY_TYPE, Lease.lease_id, Lease.start_date, Lease.landlord_id,
+        _lease_query(Lease.start_date, UPCOMING_LEASE_STATUSES),
+        lambda row: {"lease_start_date": _format_date(row.event_date), "rent_amount": _format_amount(row.rent_amount)},
+        notification_link="lease_id"
+    ),
+    ReminderEventSource(
+        ReminderRuleEvent.LEASE_END_DATE, LEASE_ENTITY_TYPE, Lease.lease_id, Lease.end_date, Lease.landlord_id,
+        _lease_query(Lease.end_date, ACTIVE_LEASE_STATUSES),
+        lambda row: {"lease_end_date": _format_date(row.event_date)},
+        notification_link="lease_id"
+    ),
+    ReminderEventSource(
+        ReminderRuleEvent.RENT_DUE_DATE, "PAYMENT", Payment.payment_id, Payment.due_date, Lease.landlord_id,
+        _rent_due_query,
+        lambda row: {
+            "due_date": _format_date(row.event_date), "amount_due": _format_amount(row.amount_due),
+            "payment_reference_code": row.payment_reference_code or "N/A",
+        },
+        notification_link="payment_id"
+    ),
+    ReminderEventSource(
+        ReminderRuleEvent.INVOICE_DUE_DATE, "FINANCIAL_TRANSACTION", FinancialTransaction.transaction_id,
+        FinancialTransaction.next_due_date, FinancialTransaction.landlord_id,
+        _invoice_due_query,
+        lambda row: {
+            "due_date": _format_date(row.event_date), "amount_due": _format_amount(row.amount_due),
+            "invoice_description": row.invoice_description,
+        }
+    ),
+    ReminderEventSource(
+        ReminderRuleEvent.DOCUMENT_EXPIRY_DATE, "DOCUMENT", Document.document_id, Document.expiry_date, DOCUMENT_LANDLORD_ID,
+        _document_expiry_query,
+        lambda row: {"document_name": row.document_name, "document_expiry_date": _format_date(row.event_date)},
+        notification_link="document_id"
+    ),
+    ReminderEventSource(
+        ReminderRuleEvent.MAINTENANCE_SCHEDULED_DATE, "MAINTENANCE_REQUEST", MaintenanceRequest.request_id,
+        MaintenanceRequest.scheduled_date, Property.landlord_id,
+        _maintenance_scheduled_query,
+        lambda row: {"maintenance_scheduled_date": _format_date(row.event_date), "maintenance_description": row.maintenance_description},
+        notification_link="maintenance_request_id"
+    ),
+)}
+
+
+def _load_sweep_rules(run_date: date, event_types: Iterable[ReminderRuleEvent], summary: Dict[str, Any],
+                      since: Optional[date] = None, catch_up: bool = True,
+                      max_catch_up_days: int = DEFAULT_CATCH_UP_MAX_DAYS) -> Dict[ReminderRuleEvent, Dict[int, List[Tuple[Any, date, date]]]]:
+    """
+    Loads every active rule of the requested event types in one query and computes the
+    window of event dates each rule fires for between its first run date and `run_date`.
+    Returns {event_type: {landlord_id: [(rule, first_event_date, last_event_date), ...]}}.
+    """
+    active_rules = db.session.query(
+        LandlordReminderRule.rule_id, LandlordReminderRule.landlord_id, LandlordReminderRule.event_type,
+        LandlordReminderRule.offset_value, LandlordReminderRule.offset_unit,
+        LandlordReminderRule.send_time, LandlordReminderRule.recipient_type,
+        LandlordReminderRule.specific_recipient_user_id, LandlordReminderRule.notification_template_id,
+        LandlordReminderRule.last_run_date
+    ).filter(
+        LandlordReminderRule.is_active == True,
+        LandlordReminderRule.event_type.in_(list(event_types))
+    )
+    if summary["shard"] is not None:
+        active_rules = active_rules.filter(_shard_filter(LandlordReminderRule.landlord_id, summary["shard"]))
+    active_rules = active_rules.all()
+    summary["rules"] = len(active_rules)
+
+    rules_by_event = {}
+    for rule in active_rules:
+        if rule.offset_unit not in DATE_OFFSET_UNITS:
+            current_app.logger.warning(f"Unsupported offset_unit {rule.offset_unit} for Rule ID {rule.rule_id}. Skipping.")
+            continue
+        first_run_date = _first_run_date(rule, run_date, since, catch_up, max_catch_up_days)
+        if summary["catch_up_from"] is None or first_run_date < summary["catch_up_from"]:
+            summary["catch_up_from"] = first_run_date
+        rules_by_landlord = rules_by_event.setdefault(rule.event_type, {})
+        window = _event_date_window(first_run_date, run_date, rule.offset_value, rule.offset_unit)
+        # Rules without a window still get their last_run_date advanced
+        rules_by_landlord.setdefault(rule.landlord_id, []).append((rule,) + window if window else (rule, None, None))
+    return rules_by_event
+
+
+def _fetch_due_rows(source: ReminderEventSource, rules_by_landlord: Dict[int, List[Tuple[Any, date, date]]],
+                    after_id: int = 0, limit: Optional[int] = None, shard: Optional[Tuple[int, int]] = None) -> List[Any]:
+    """
+    Fetches the source rows whose event date falls in any rule's window, with one indexed
+    range predicate per contiguous span of event dates, ordered by entity id so that
+    `after_id`/`limit` work as a keyset cursor. As in the lease job, the landlord filter is
+    only pushed into SQL while it fits in a single IN clause; beyond that a sharded sweep
+    still restricts the query to its shard's landlords.
+    """
+    windows = _merge_date_windows(
+        (start, end) for rules in rules_by_landlord.values() for _, start, end in rules if start is not None
+    )
+    if not windows:
+        return []
+    landlord_ids = sorted(rules_by_landlord)
+    query = source.build_query().filter(
+        or_(*(source.date_column.between(start, end) for start, end in windows)),
+        source.id_column > after_id
+    )
+    if len(landlord_ids) <= IN_CLAUSE_CHUNK_SIZE:
+        query = query.filter(source.landlord_column.in_(landlord_ids))
+    elif shard is not None:
+        query = query.filter(_shard_filter(source.landlord_column, shard))
+    query = query.order_by(source.id_column)
+    if limit:
+        query = query.limit(limit)
+    return query.all()
+
+
+def _match_event_rules(rows: List[Any], rules_by_landlord: Dict[int, List[Tuple[Any, date, date]]]) -> List[Tuple[Any, date, Any]]:
+    """Pairs each source row with every rule of its landlord whose window holds its event date, and the date the rule fires on."""
+    matches = []
+    for row in rows:
+        for rule, start, end in rules_by_landlord.get(row.landlord_id, ()):
+            if start is not None and start <= row.event_date <= end:
+                matches.append((rule, _offset_date(row.event_date, rule.offset_value, rule.offset_unit), row))
+    return matches
+
+
+def _existing_trigger_keys(source: ReminderEventSource, matches: List[Tuple[Any, date, Any]]) -> set:
+    """Loads the (rule_id, entity_id, event_date) keys already logged for the matched rows."""
+    existing_keys = set()
+    rule_ids = {rule.rule_id for rule, _, _ in matches}
+    event_dates = sorted({row.event_date for _, _, row in matches})
+    for entity_chunk in chunked(sorted({row.entity_id for _, _, row in matches})):
+        rows = db.session.query(
+            NotificationTriggerLog.rule_id, NotificationTriggerLog.target_entity_id, NotificationTriggerLog.target_event_date
+        ).filter(
+            NotificationTriggerLog.target_entity_type == source.entity_type,
+            NotificationTriggerLog.target_entity_id.in_(entity_chunk),
+            NotificationTriggerLog.target_event_date.in_(event_dates)
+        ).all()
+        existing_keys.update((r.rule_id, r.target_entity_id, r.target_event_date) for r in rows if r.rule_id in rule_ids)
+    return existing_keys
+
+
+def _build_event_rows(source: ReminderEventSource, matches: List[Tuple[Any, date, Any]],
+                      summary: Dict[str, Any], template_cache: Dict[int, Any]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Filters out already-processed reminders and builds the Notification and
+    NotificationTriggerLog rows for one batch of matches of a single event source.
+    """
+    timings = summary["timings"]
+
+    started = timer.perf_counter()
+    existing_keys = _existing_trigger_keys(source, matches)
+    pending = []
+    for rule, fire_date, row in matches:
+        if (rule.rule_id, row.entity_id, row.event_date) in existing_keys:
+            summary["skipped_existing"] += 1
+            continue
+        pending.append((rule, fire_date, row))
+    add_timing(timings, "filter_existing", started)
+
+    started = timer.perf_counter()
+    _load_templates((rule.notification_template_id for rule, _, _ in pending), template_cache)
+    user_ids = set()
+    for rule, _, row in pending:
+        user_ids.update((row.tenant_id, rule.landlord_id, rule.specific_recipient_user_id))
+    user_names = _user_display_names(user_ids)
+    properties = _property_summaries(row.property_id for _, _, row in pending if row.property_id is not None)
+    add_timing(timings, "load_context", started)
+
+    started = timer.perf_counter()
+    notification_rows = []
+    trigger_rows = []
+    placeholder_errors = {}
+    for rule, fire_date, row in pending:
+        template = template_cache.get(rule.notification_template_id)
+        if not template or not template.is_active:
+            current_app.logger.warning(f"NotificationTemplate ID {rule.notification_template_id} is missing or inactive. Skipping Rule ID {rule.rule_id} for {source.entity_type} ID {row.entity_id}.")
+            summary["skipped_invalid"] += 1
+            continue
+
+        recipient_id = _resolve_recipient_id(rule, row)
+        if recipient_id is None or recipient_id not in user_names:
+            current_app.logger.error(f"Could not determine recipient for Rule ID {rule.rule_id}, {source.entity_type} ID {row.entity_id}. Skipping.")
+            summary["skipped_invalid"] += 1
+            continue
+
+        property_summary = properties.get(row.property_id)
+        context = {
+            "tenant_name": user_names.get(row.tenant_id) or row.tenant_name_manual or "Tenant",
+            "landlord_name": user_names.get(rule.landlord_id) or "Landlord/Property Manager",
+            "event_date": _format_date(row.event_date),
+            "days_offset": abs((row.event_date - fire_date).days),
+            "property_address": property_summary["address_line_1"] if property_summary else "N/A",
+            "property_unit": (property_summary["unit"] or "N/A") if property_summary else "N/A",
+        }
+        context.update(source.context(row))
+        # Contexts of one source share their keys, so the first one checks the template for the batch
+        if _template_placeholder_errors(template, context, placeholder_errors):
+            summary["skipped_invalid"] += 1
+            continue
+
+        notification_row = {
+            "user_id": recipient_id,
+            "notification_type": template.template_type,
+            "channel": template.channel,
+            "template_id": template.template_id,
+            "template_context": context,
+            "status": NotificationStatus.SCHEDULED, # To be picked up by a dispatcher
+            # Reminders caught up from missed days keep their original time and are due straight away
+            "scheduled_send_time": datetime.combine(fire_date, rule.send_time or time(9, 0)),
+            "lease_id": row.lease_id,
+        }
+        if source.notification_link:
+            notification_row[source.notification_link] = row.entity_id
+        else:
+            notification_row["related_entity_type"] = source.entity_type
+            notification_row["related_entity_id"] = row.entity_id
+        notification_rows.append(notification_row)
+        trigger_rows.append({
+            "rule_id": rule.rule_id,
+            "target_entity_type": source.entity_type,
+            "target_entity_id": row.entity_id,
+            "lease_id": row.lease_id,
+            "target_event_date": row.event_date,
+        })
+    add_timing(timings, "build", started)
+    return notification_rows, trigger_rows
+
+
+def _new_sweep_summary(job_run_id: str, run_date: date, shard: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+    return {
+        "job_run_id": job_run_id,
+        "run_date": run_date,
+        "shard": shard, # (shard_index, shard_count) in shard mode
+        "catch_up_from": None, # Earliest day processed for any rule
+        "rules": 0,
+        "rows_matched": 0,
+        "skipped_existing": 0,
+        "skipped_invalid": 0,
+        "rows_failed": 0,
+        "notifications_created": 0,
+        "batches_committed": 0,
+        "events": {}, # event_type value -> {"rows_matched", "notifications_created", "seconds"}
+        "timings": {},
+    }
+
+
+def _sweep_event(source: ReminderEventSource, rules_by_landlord: Dict[int, List[Tuple[Any, date, date]]],
+                 summary: Dict[str, Any], batch_size: int, template_cache: Dict[int, Any], failed_rule_ids: Set[int]) -> bool:
+    """
+    Walks one event source in entity id order, committing each batch of reminders, and adds
+    the rules with rows that could not be inserted to `failed_rule_ids`.
+    Returns False if a batch could not be committed.
+    """
+    job_run_id, timings = summary["job_run_id"], summary["timings"]
+    event_summary = summary["events"].setdefault(source.event_type.value, {"rows_matched": 0, "notifications_created": 0, "seconds": 0.0})
+    event_started = timer.perf_counter()
+
+    completed = True
+    cursor = 0
+    while True:
+        started = timer.perf_counter()
+        rows = _fetch_due_rows(source, rules_by_landlord, after_id=cursor, limit=batch_size, shard=summary["shard"])
+        if not rows:
+            break
+        cursor = rows[-1].entity_id
+        matches = _match_event_rules(rows, rules_by_landlord)
+        summary["rows_matched"] += len(matches)
+        event_summary["rows_matched"] += len(matches)
+        add_timing(timings, "match", started)
+        if not matches:
+            continue
+
+        notification_rows, trigger_rows = _build_event_rows(source, matches, summary, template_cache)
+        if not notification_rows:
+            continue
+        try:
+            inserted, failed, batch_failed_rule_ids = _insert_reminder_rows(notification_rows, trigger_rows, job_run_id, summary)
+            started = timer.perf_counter()
+            db.session.commit()
+            add_timing(timings, "commit", started)
+            failed_rule_ids.update(batch_failed_rule_ids)
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error committing {source.event_type.value} reminders up to {source.entity_type} ID {cursor} for job ID {job_run_id}: {e}", exc_info=True)
+            completed = False
+            break
+        summary["notifications_created"] += inserted
+        summary["rows_failed"] += failed
+        summary["batches_committed"] += 1
+        event_summary["notifications_created"] += inserted
+
+    event_summary["seconds"] += timer.perf_counter() - event_started
+    return completed
+
+
+def process_scheduled_reminders_job(job_run_id: Optional[str] = None, run_date: Optional[date] = None,
+                                    event_types: Optional[Iterable[ReminderRuleEvent]] = None,
+                                    batch_size: int = DEFAULT_SWEEP_BATCH_SIZE, since: Optional[date] = None,
+                                    catch_up: bool = True, max_catch_up_days: int = DEFAULT_CATCH_UP_MAX_DAYS,
+                                    shard: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+    """
+    Schedules the reminders of every active `LandlordReminderRule`, whatever its event type,
+    in one sweep.
+
+    All rules of all landlords are loaded with a single query and bucketed by event type and
+    landlord. Each event type is then resolved against its source table (see
+    `EVENT_SOURCES`) with an indexed date-range query, so one daily run replaces a separate
+    job per event type:
+
+      - LEASE_START_DATE / LEASE_END_DATE: `Lease.start_date` / `Lease.end_date`
+      - RENT_DUE_DATE: `Payment.due_date` of outstanding payments
+      - INVOICE_DUE_DATE: `FinancialTransaction.next_due_date` of recurring bills and charges
+      - DOCUMENT_EXPIRY_DATE: `Document.expiry_date`
+      - MAINTENANCE_SCHEDULED_DATE: `MaintenanceRequest.scheduled_date` of open requests
+
+    Each rule covers every day from the day after its `last_run_date` up to `run_date`
+    (at most `max_catch_up_days` days), so runs skipped by the scheduler are caught up in
+    the same range queries instead of one job per missed day. Caught-up reminders keep the
+    date they should have fired on and are due immediately. `last_run_date` is only advanced
+    once every batch of the rule's event type has been committed, and not for rules with rows
+    that could not be inserted, so those are retried on the next run. MONTHS offsets use
+    calendar months, clamped to the end of shorter months.
+
+    Reminders are idempotent per (rule, entity, event date) through `NotificationTriggerLog`,
+    so overlapping windows, re-runs and LEASE_END_DATE reminders already created by
+    `process_lease_renewal_reminders_job` are never duplicated.
+
+    Triggered via the Flask CLI command: `flask run-scheduled-reminders-job`
+
+    Args:
+        job_run_id (Optional[str]): Identifier stamped on the trigger logs. A UUID is generated if not provided.
+        run_date (Optional[date]): The last day the reminders are computed for. Defaults to today.
+        event_types (Optional[Iterable[ReminderRuleEvent]]): Restricts the sweep to these event types.
+        batch_size (int): Source rows fetched and committed per batch.
+        since (Optional[date]): Processes every rule from this day on, whatever its last_run_date. Not clamped
+                                to `max_catch_up_days`.
+        catch_up (bool): When False, only `run_date` is processed (unless `since` is given).
+        max_catch_up_days (int): Maximum number of days, including `run_date`, a rule is caught up on.
+        shard (Optional[Tuple[int, int]]): (shard_index, shard_count) to sweep only the landlords with
+                                           `landlord_id % shard_count == shard_index`.
+
+    Returns:
+        Dict[str, Any]: A summary of the run with overall and per-event counters and per-phase timings (in seconds).
+    """
+    if job_run_id is None:
+        job_run_id = str(uuid.uuid4())
+    if run_date is None:
+        run_date = date.today()
+    event_types = list(event_types) if event_types else list(EVENT_SOURCES)
+    if since is not None and since > run_date:
+        raise ValueError(f"since ({since}) is after run_date ({run_date}).")
+
+    summary = _new_sweep_summary(job_run_id, run_date, shard)
+    current_app.logger.info(f"Starting scheduled reminders job (ID: {job_run_id}) for date: {run_date}")
+
+    started = timer.perf_counter()
+    rules_by_event = _load_sweep_rules(run_date, event_types, summary, since=since, catch_up=catch_up, max_catch_up_days=max_catch_up_days)
+    add_timing(summary["timings"], "load_rules", started)
+    if not rules_by_event:
+        current_app.logger.info("No active reminder rules found.")
+        return summary
+    if summary["catch_up_from"] < run_date:
+        current_app.logger.info(f"Scheduled reminders job (ID: {job_run_id}) catching up from {summary['catch_up_from']}.")
+
+    template_cache = {}
+    for event_type, rules_by_landlord in rules_by_event.items():
+        failed_rule_ids = set()
+        if _sweep_event(EVENT_SOURCES[event_type], rules_by_landlord, summary, batch_size, template_cache, failed_rule_ids):
+            _advance_last_run_date([
+                rule.rule_id for rules in rules_by_landlord.values() for rule, _, _ in rules if rule.rule_id not in failed_rule_ids
+            ], run_date)
+
+    current_app.logger.info(
+        f"Scheduled reminders job (ID: {job_run_id}) completed: "
+        f"{summary['notifications_created']} notifications scheduled, {summary['skipped_existing']} already processed, "
+        f"{summary['rows_failed']} failed. "
+        f"Timings: {', '.join(f'{phase}={seconds:.3f}s' for phase, seconds in summary['timings'].items())}"
+    )
+    return summary
@@ -0,0 +1,121 @@
+import importlib
+import multiprocessing
+import time as timer
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+from typing import Optional, Dict, Any
+from flask import current_app
+
+# Jobs that accept a `shard=(shard_index, shard_count)` argument, as "module:function"
+SHARDED_JOBS = {
+    "lease_renewal_reminders": "hermitta_app.jobs.lease_jobs:process_lease_renewal_reminders_job",
+    "scheduled_reminders": "hermitta_app.jobs.reminder_jobs:process_scheduled_reminders_job",
+}
+
+# Summary counters added up across shards
+SUMMED_COUNTERS = ("rules", "notifications_created", "skipped_existing", "skipped_invalid", "rows_failed")
+
+
+def _shard_job_run_id(job_run_id: str, shard_index: int, shard_count: int) -> str:
+    """Each shard gets its own job_run_id, so checkpointed runs keep one checkpoint per shard."""
+    return f"{job_run_id}-shard-{shard_index}-of-{shard_count}"
+
+
+def _run_shard(config_name: str, job_name: str, shard_index: int, shard_count: int, job_kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Worker process entry point. Builds its own app, so the shard has its own engine,
+    connection pool and session, and runs the job for one shard of landlords.
+    """
+    from hermitta_app import create_app, db
+
+    module_name, function_name = SHARDED_JOBS[job_name].split(":")
+    app = create_app(config_name)
+    with app.app_context():
+        job = getattr(importlib.import_module(module_name), function_name)
+        started = timer.perf_counter()
+        result = {"shard_index": shard_index, "job_run_id": job_kwargs["job_run_id"], "summary": None, "error": None}
+        try:
+            result["summary"] = job(shard=(shard_index, shard_count), **job_kwargs)
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Shard {shard_index}/{shard_count} of job '{job_name}' failed: {e}", exc_info=True)
+            result["error"] = str(e)
+        finally:
+            db.session.remove()
+            db.engine.dispose()
+        result["seconds"] = timer.perf_counter() - started
+        return result
+
+
+def run_sharded_job(job_name: str, shard_count: int, config_name: Optional[str] = None, job_run_id: Optional[str] = None,
+                    run_date: Optional[date] = None, max_workers: Optional[int] = None, **job_kwargs) -> Dict[str, Any]:
+    """
+    Runs a scheduled job as `shard_count` worker processes, each processing the landlords
+    with `landlord_id % shard_count == shard_index`, and collects their summaries.
+
+    Shards are disjoint, so they never compete for the same rows. If shards do overlap
+    (e.g. the shard count changed between a crashed run and its re-run), the
+    `NotificationTriggerLog` unique constraint still lets only one reminder per rule,
+    entity and event date through. The losing rows are counted in `skipped_existing`. A
+    checkpointed shard that is already being run by another worker is skipped.
+
+    Args:
+        job_name (str): A key of `SHARDED_JOBS`.
+        shard_count (int): Number of shards (and, by default, worker processes).
+        config_name (Optional[str]): App config the workers are created with. Defaults to the current one.
+        job_run_id (Optional[str]): Base identifier of the run; each shard appends its own suffix.
+        run_date (Optional[date]): Date passed to every shard, so they agree even across midnight. Defaults to today.
+        max_workers (Optional[int]): Worker processes to use. Defaults to `shard_count`.
+        **job_kwargs: Extra keyword arguments for the job (e.g. chunk_size, event_types).
+
+    Returns:
+        Dict[str, Any]: Per-shard results (summary, error, seconds) plus totals across shards.
+    """
+    if shard_count < 1:
+        raise ValueError("shard_count must be at least 1.")
+    if config_name is None:
+        from config import get_config_name
+        config_name = get_config_name()
+    if job_run_id is None:
+        job_run_id = str(uuid.uuid4())
+    if run_date is None:
+        run_date = date.today()
+
+    current_app.logger.info(f"Starting job '{job_name}' (ID: {job_run_id}) in {shard_count} shards.")
+    started = timer.perf_counter()
+    results = []
+    # "spawn" gives every worker a fresh interpreter: no database connections are inherited from the coordinator
+    with ProcessPoolExecutor(max_workers=max_workers or shard_count, mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = [
+            executor.submit(_run_shard, config_name, job_name, shard_index, shard_count,
+                            dict(job_kwargs, job_run_id=_shard_job_run_id(job_run_id, shard_index, shard_count), run_date=run_date))
+            for shard_index in range(shard_count)
+        ]
+        for future in as_completed(futures):
+            results.append(future.result())
+    results.sort(key=lambda result: result["shard_index"])
+
+    totals = {counter: 0 for counter in SUMMED_COUNTERS}
+    for result in results:
+        for counter in SUMMED_COUNTERS:
+            totals[counter] += (result["summary"] or {}).get(counter, 0)
+
+    report = {
+        "job_name": job_name,
+        "job_run_id": job_run_id,
+        "run_date": run_date,
+        "shard_count": shard_count,
+        "shards": results,
+        "failed_shards": [result["shard_index"] for result in results if result["error"]],
+        "totals": totals,
+        "seconds": timer.perf_counter() - started,
+    }
+    shard_timings = ", ".join(f"{result['shard_index']}={result['seconds']:.3f}s" for result in results)
+    current_app.logger.info(
+        f"Job '{job_name}' (ID: {job_run_id}) finished in {report['seconds']:.3f}s: "
+        f"{totals['notifications_created']} notifications scheduled. Shard timings: {shard_timings}"
+    )
+    if report["failed_shards"]:
+        current_app.logger.error(f"Job '{job_name}' (ID: {job_run_id}) shards {report['failed_shards']} failed; re-run them with the same job ID.")
+    return report
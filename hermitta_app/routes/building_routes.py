@@ -0,0 +1,50 @@
+from flask import Blueprint, request, jsonify, current_app
+from services.building_service import BuildingService
+from hermitta_app.routes.property_routes import auth_required_placeholder
+from hermitta_app.serializers import get_serializer, parse_fields, json_list_response, json_response
+from models.building import Building
+
+building_bp = Blueprint('building_bp', __name__, url_prefix='/api/v1/buildings')
+building_service = BuildingService()
+building_serializer = get_serializer(Building)
+
+
+@building_bp.route('', methods=['GET'])
+@auth_required_placeholder
+def get_buildings_route(current_user_id: int):
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 20, type=int)
+    fields = parse_fields(request.args.get('fields'))
+    try:
+        building_serializer.plan(fields) # Rejects unknown ?fields= before querying
+        buildings, total_items = building_service.get_buildings_for_landlord(current_user_id, page, per_page)
+        extra = {"total_items": total_items, "page": page, "per_page": per_page,
+                 "total_pages": (total_items + per_page - 1) // per_page}
+        return json_list_response("buildings", buildings, building_serializer, fields, extra=extra)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error in get_buildings_route: {e}", exc_info=True)
+        return jsonify({"message": "An error occurred while fetching buildings."}), 500
+
+
+@building_bp.route('/summary', methods=['GET'])
+@auth_required_placeholder
+def get_portfolio_summary_route(current_user_id: int):
+    # Portfolio dashboard: sums of the buildings' rollups
+    summary = building_service.get_portfolio_summary(current_user_id)
+    return json_response({key: str(value) if key in ('total_rent', 'active_lease_rent') else value for key, value in summary.items()})
+
+
+@building_bp.route('/<int:building_id>', methods=['GET'])
+@auth_required_placeholder
+def get_building_route(building_id: int, current_user_id: int):
+    fields = parse_fields(request.args.get('fields'))
+    try:
+        building_serializer.plan(fields)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    building = building_service.get_building_for_landlord(building_id, current_user_id)
+    if building is None:
+        return jsonify({"message": "Building not found or access denied"}), 404
+    return json_response(building_serializer.to_dict(building, fields))
@@ -0,0 +1,92 @@
+import time
+from flask import Blueprint, Response, request, jsonify, current_app
+from hermitta_app.services.event_bus import event_bus, RESET_EVENT
+from hermitta_app.routes.property_routes import auth_required_placeholder
+
+event_bp = Blueprint('event_bp', __name__, url_prefix='/api/v1/events')
+
+# How long an EventSource client waits before reconnecting after the stream ends
+SSE_RETRY_MILLISECONDS = 3000
+
+
+def _last_event_id():
+    """Event id to resume after: the Last-Event-ID header sent by EventSource on reconnect, or ?last_event_id=."""
+    value = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError("last_event_id must be an integer.")
+
+
+def _event_stream(subscription, max_seconds: float, heartbeat_seconds: float):
+    deadline = time.monotonic() + max_seconds
+    try:
+        yield f"retry: {SSE_RETRY_MILLISECONDS}\n\n"
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            events, reset_through = subscription.get(timeout=min(heartbeat_seconds, remaining))
+            if reset_through is not None:
+                yield f"id: {reset_through}\nevent: {RESET_EVENT}\ndata: {{}}\n\n"
+            for push_event in events:
+                yield push_event.to_sse()
+            if not events and reset_through is None:
+                yield ": keep-alive\n\n"
+    finally:
+        event_bus.unsubscribe(subscription)
+
+
+@event_bp.route('/stream', methods=['GET'])
+@auth_required_placeholder
+def event_stream_route(current_user_id: int):
+    """
+    Server-sent events of the user's new IN_APP notifications and messages. Events are
+    served from the bus, without database queries. The stream ends after
+    EVENT_STREAM_MAX_SECONDS and the client resumes with Last-Event-ID; a `reset` event
+    means events were missed and the client should refetch its inbox.
+    """
+    try:
+        last_event_id = _last_event_id()
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    config = current_app.config
+    subscription = event_bus.subscribe(current_user_id, last_event_id=last_event_id,
+                                       max_queued=config['EVENT_STREAM_MAX_QUEUED_EVENTS'])
+    stream = _event_stream(subscription, config['EVENT_STREAM_MAX_SECONDS'], config['EVENT_STREAM_HEARTBEAT_SECONDS'])
+    return Response(stream, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no', # Stop nginx from buffering the stream
+    })
+
+
+@event_bp.route('/poll', methods=['GET'])
+@auth_required_placeholder
+def event_poll_route(current_user_id: int):
+    """Long-poll fallback: waits up to ?timeout= seconds for events after last_event_id."""
+    try:
+        last_event_id = _last_event_id()
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    config = current_app.config
+    timeout = min(request.args.get('timeout', config['EVENT_LONG_POLL_TIMEOUT_SECONDS'], type=float), config['EVENT_LONG_POLL_TIMEOUT_SECONDS'])
+    subscription = event_bus.subscribe(current_user_id, last_event_id=last_event_id,
+                                       max_queued=config['EVENT_STREAM_MAX_QUEUED_EVENTS'])
+    try:
+        events, reset_through = subscription.get(timeout=max(timeout, 0))
+    finally:
+        event_bus.unsubscribe(subscription)
+
+    if reset_through is not None:
+        next_event_id = reset_through
+    elif events:
+        next_event_id = events[-1].event_id
+    else:
+        next_event_id = last_event_id
+    return jsonify({
+        "events": [push_event.to_dict() for push_event in events],
+        "reset": reset_through is not None,
+        "last_event_id": next_event_id,
+    }), 200
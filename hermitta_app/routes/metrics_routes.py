@@ -0,0 +1,34 @@
+from functools import wraps
+from flask import Blueprint, jsonify
+from hermitta_app import db
+from hermitta_app.routes.property_routes import auth_required_placeholder
+from hermitta_app.services.entity_cache import entity_cache
+from hermitta_app.services.webhook_dedup import webhook_deduplicator
+from models.user import User, UserRole
+
+metrics_bp = Blueprint('metrics_bp', __name__, url_prefix='/metrics')
+
+
+def admin_required(f):
+    """auth_required_placeholder, restricted to ADMIN users. The route does not get current_user_id."""
+    @wraps(f)
+    @auth_required_placeholder
+    def decorated_function(*args, current_user_id: int, **kwargs):
+        # Not through the entity cache, so reading the metrics does not change them
+        user = db.session.get(User, current_user_id)
+        if user is None or user.role != UserRole.ADMIN or not user.is_active:
+            return jsonify({"message": "Admin access required"}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+@metrics_bp.route('/entity-cache', methods=['GET'])
+@admin_required
+def entity_cache_metrics_route():
+    return jsonify(entity_cache.metrics())
+
+
+@metrics_bp.route('/webhook-dedup', methods=['GET'])
+@admin_required
+def webhook_dedup_metrics_route():
+    return jsonify(webhook_deduplicator.metrics())
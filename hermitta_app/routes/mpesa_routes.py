@@ -0,0 +1,40 @@
+import hmac
+from flask import Blueprint, request, jsonify, current_app
+from hermitta_app import db
+from hermitta_app.services.webhook_dedup import webhook_deduplicator
+from models.enums import GatewayType
+from models.mpesa_callback_inbox import MpesaCallbackInbox
+
+mpesa_bp = Blueprint('mpesa_bp', __name__, url_prefix='/api/v1/mpesa')
+
+# Daraja only needs to know the callback was received; the inbox worker applies it
+ACCEPTED = {"ResultCode": 0, "ResultDesc": "Accepted"}
+
+
+@mpesa_bp.route('/callback', methods=['POST'])
+def mpesa_stk_callback_route():
+    # External, unauthenticated endpoint hit by M-Pesa. The body is stored as received and
+    # applied later by `flask run-mpesa-callback-worker`, so nothing here waits on payments.
+    expected_token = current_app.config.get('MPESA_CALLBACK_TOKEN')
+    if expected_token and not hmac.compare_digest(request.args.get('token', ''), expected_token):
+        return jsonify({"ResultCode": 1, "ResultDesc": "Rejected"}), 403
+    max_bytes = current_app.config.get('MPESA_CALLBACK_MAX_BYTES')
+    if max_bytes and (request.content_length or 0) > max_bytes:
+        return jsonify({"ResultCode": 1, "ResultDesc": "Payload too large"}), 413
+    raw_body = request.get_data(as_text=True)
+    if not raw_body.strip():
+        return jsonify({"ResultCode": 1, "ResultDesc": "Empty payload"}), 400
+    try:
+        connection = db.session.connection()
+        # A retry of a stored callback is acknowledged again without storing it twice
+        if webhook_deduplicator.is_duplicate(connection, GatewayType.MPESA_STK_PUSH, raw_body):
+            db.session.rollback()
+            return jsonify(ACCEPTED)
+        MpesaCallbackInbox.append(connection, raw_body, remote_addr=request.remote_addr)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error storing M-Pesa callback: {e}", exc_info=True)
+        # Not acknowledged, so M-Pesa retries the callback
+        return jsonify({"ResultCode": 1, "ResultDesc": "Temporarily unavailable"}), 500
+    return jsonify(ACCEPTED)
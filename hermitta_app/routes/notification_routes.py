@@ -0,0 +1,62 @@
+from flask import Blueprint, request, jsonify, current_app
+from services.notification_service import NotificationService
+from hermitta_app.routes.property_routes import auth_required_placeholder
+from hermitta_app.serializers import get_serializer
+from models.notification import Notification
+
+notification_bp = Blueprint('notification_bp', __name__, url_prefix='/api/v1/notifications')
+notification_service = NotificationService()
+
+notification_serializer = get_serializer(Notification) # The inbox fields only
+
+
+@notification_bp.route('', methods=['GET'])
+@auth_required_placeholder
+def get_inbox_route(current_user_id: int):
+    limit = request.args.get('limit', 20, type=int)
+    cursor = request.args.get('cursor')
+    unread_only = request.args.get('unread_only', 'false').lower() in ('1', 'true', 'yes')
+
+    try:
+        notifications, next_cursor = notification_service.get_inbox(current_user_id, limit=limit, cursor=cursor, unread_only=unread_only)
+        return jsonify({
+            "notifications": notification_serializer.to_list(notifications),
+            "next_cursor": next_cursor,
+            "unread_count": notification_service.get_unread_count(current_user_id),
+        }), 200
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error in get_inbox_route: {e}", exc_info=True)
+        return jsonify({"message": "An error occurred while fetching notifications."}), 500
+
+
+@notification_bp.route('/unread-count', methods=['GET'])
+@auth_required_placeholder
+def get_unread_count_route(current_user_id: int):
+    # Badge poll: a single primary key lookup on the user's counter
+    return jsonify({"unread_count": notification_service.get_unread_count(current_user_id)}), 200
+
+
+@notification_bp.route('/<int:notification_id>/read', methods=['POST'])
+@auth_required_placeholder
+def mark_notification_as_read_route(current_user_id: int, notification_id: int):
+    try:
+        notification = notification_service.mark_as_read(current_user_id, notification_id)
+    except ValueError as e:
+        current_app.logger.error(f"Error in mark_notification_as_read_route: {e}", exc_info=True)
+        return jsonify({"message": "An error occurred while updating the notification."}), 500
+    if notification is None:
+        return jsonify({"message": "Notification not found or access denied"}), 404
+    return jsonify(notification_serializer.to_dict(notification)), 200
+
+
+@notification_bp.route('/read-all', methods=['POST'])
+@auth_required_placeholder
+def mark_all_notifications_as_read_route(current_user_id: int):
+    try:
+        marked = notification_service.mark_all_as_read(current_user_id)
+    except ValueError as e:
+        current_app.logger.error(f"Error in mark_all_notifications_as_read_route: {e}", exc_info=True)
+        return jsonify({"message": "An error occurred while updating notifications."}), 500
+    return jsonify({"marked_read": marked, "unread_count": 0}), 200
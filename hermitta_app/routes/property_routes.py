@@ -1,12 +1,16 @@
 from flask import Blueprint, request, jsonify, current_app # Added current_app
 from services.property_service import PropertyService
-from models.property import PropertyType, PropertyStatus # For input validation
+from services.property_import_service import PropertyImportService, read_csv_rows, read_json_rows
+from models.property import Property, PropertyType, PropertyStatus # For input validation
 from decimal import Decimal # For handling decimal fields if any in request
-from enum import Enum as PyEnum # For generic Enum type check, aliased to avoid clash if needed
 from functools import wraps # For placeholder decorator
+from hermitta_app.serializers import get_serializer, parse_fields, json_list_response
+from hermitta_app.http_cache import make_etag, not_modified, add_validators
 
 property_bp = Blueprint('property_bp', __name__, url_prefix='/api/v1/properties')
 property_service = PropertyService()
+property_import_service = PropertyImportService()
+property_serializer = get_serializer(Property)
 
 # --- Placeholder Auth ---
 # In a real app, this would use Flask-Login, Flask-JWT-Extended, etc.
@@ -63,36 +67,66 @@ def create_property_route(current_user_id: int): # Added current_user_id from de
     try:
         # PropertyService's _prepare_property_data handles enum conversion
         new_property = property_service.create_property(property_data=data)
-        prop_dict = {column.name: getattr(new_property, column.name) for column in new_property.__table__.columns}
-
-        # Convert Enums and Decimals to string for JSON
-        for key, value in prop_dict.items():
-            if isinstance(value, PyEnum): # Use aliased PyEnum
-                prop_dict[key] = value.value
-            elif isinstance(value, Decimal):
-                prop_dict[key] = str(value)
-
-        return jsonify(prop_dict), 201
+        return jsonify(property_serializer.to_dict(new_property)), 201
     except ValueError as e:
         return jsonify({"message": str(e)}), 400
     except Exception as e:
         # Log error e
         return jsonify({"message": "An internal error occurred"}), 500
 
+# --- Bulk Import ---
+@property_bp.route('/import', methods=['POST'])
+@auth_required_placeholder
+def import_properties_route(current_user_id: int):
+    """
+    Imports the landlord's properties from a CSV or JSON (array or JSON Lines) file, sent as
+    the multipart field 'file' or as the request body. The format comes from ?format=, else
+    from the file name or Content-Type. Invalid rows are listed in the response; the others are imported.
+    A file that cannot be read to the end is answered with 400 and the summary of the rows read before.
+    """
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+    file_format = request.args.get('format')
+    if not file_format:
+        name, content_type = (upload.filename or '') if upload else '', (upload.mimetype if upload else request.mimetype) or ''
+        file_format = 'csv' if name.lower().endswith('.csv') or 'csv' in content_type else 'json'
+    if file_format not in ('csv', 'json'):
+        return jsonify({"message": "format must be csv or json"}), 400
+    dry_run = request.args.get('dry_run', 'false').lower() == 'true'
+
+    try:
+        rows = read_csv_rows(stream) if file_format == 'csv' else read_json_rows(stream)
+        summary = property_import_service.import_properties(current_user_id, rows, dry_run=dry_run)
+    except (ValueError, UnicodeDecodeError) as e: # Unreadable file
+        return jsonify({"message": f"Could not read the {file_format} file: {e}"}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error in import_properties_route: {e}", exc_info=True)
+        return jsonify({"message": "An internal error occurred during property import"}), 500
+    if summary["read_error"]:
+        return jsonify(dict(summary, message=f"Could not read the {file_format} file: {summary['read_error']}")), 400
+    return jsonify(summary), 200
+
 @property_bp.route('/<int:property_id>', methods=['GET'])
 @auth_required_placeholder
 def get_property_route(current_user_id: int, property_id: int): # Added current_user_id
+    fields = parse_fields(request.args.get('fields'))
+    try:
+        property_serializer.plan(fields) # Rejects unknown ?fields=
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    # Conditional GET: answered from updated_at alone, before the row is loaded
+    updated_at = property_service.get_property_updated_at_for_landlord(property_id, current_user_id)
+    if updated_at is not None:
+        unchanged = not_modified(make_etag('property', property_id, updated_at.isoformat(), fields), updated_at)
+        if unchanged:
+            return unchanged
+
     # Use the service method that checks ownership
     prop = property_service.get_property_by_id_for_landlord(property_id, current_user_id)
     if prop:
-        prop_dict = {column.name: getattr(prop, column.name) for column in prop.__table__.columns}
-        # Convert Enums and Decimals to string for JSON
-        for key, value in prop_dict.items():
-            if isinstance(value, PyEnum): # Use aliased PyEnum
-                prop_dict[key] = value.value
-            elif isinstance(value, Decimal):
-                prop_dict[key] = str(value)
-        return jsonify(prop_dict), 200
+        response = jsonify(property_serializer.to_dict(prop, fields))
+        return add_validators(response, make_etag('property', property_id, prop.updated_at.isoformat(), fields), prop.updated_at), 200
     # If not found for this landlord, it's either not their property or doesn't exist
     return jsonify({"message": "Property not found or access denied"}), 404
 
@@ -101,32 +135,90 @@ def get_property_route(current_user_id: int, property_id: int): # Added current_
 def get_properties_by_landlord_route(current_user_id: int): # Uses current_user_id
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
+    # Cursor mode: pass `cursor` (empty for the first page, then the returned next_cursor)
+    cursor = request.args.get('cursor')
+    include_total = request.args.get('include_total', 'false').lower() == 'true'
+    fields = parse_fields(request.args.get('fields'))
 
     try:
+        property_serializer.plan(fields) # Rejects unknown ?fields= before querying
+        # Collection ETag: changes with any insert, update or delete of the landlord's properties
+        count, last_updated_at = property_service.get_properties_version_for_landlord(current_user_id)
+        etag = make_etag('properties', current_user_id, count, last_updated_at and last_updated_at.isoformat(),
+                         page, per_page, cursor, include_total, fields)
+        unchanged = not_modified(etag)
+        if unchanged:
+            return unchanged
+
         # Use current_user_id from auth context
-        properties, total_items = property_service.get_properties_by_landlord(current_user_id, page, per_page)
-
-        results = []
-        for prop in properties:
-            prop_dict = {column.name: getattr(prop, column.name) for column in prop.__table__.columns}
-            for key, value in prop_dict.items():
-                if isinstance(value, PyEnum): # Correctly use aliased PyEnum
-                    prop_dict[key] = value.value
-                elif isinstance(value, Decimal):
-                    prop_dict[key] = str(value)
-            results.append(prop_dict)
-
-        return jsonify({
-            "properties": results,
-            "total_items": total_items,
-            "page": page,
-            "per_page": per_page,
-            "total_pages": (total_items + per_page - 1) // per_page
-        }), 200
+        if cursor is not None:
+            properties, next_cursor, total_items = property_service.get_properties_by_landlord_keyset(
+                current_user_id, limit=per_page, cursor=cursor or None, include_total=include_total
+            )
+        else:
+            properties, total_items = property_service.get_properties_by_landlord(current_user_id, page, per_page)
+
+        if cursor is not None:
+            extra = {"next_cursor": next_cursor, "per_page": per_page}
+            if total_items is not None:
+                extra["total_items"] = total_items
+        else:
+            extra = {
+                "total_items": total_items,
+                "page": page,
+                "per_page": per_page,
+                "total_pages": (total_items + per_page - 1) // per_page
+            }
+        return add_validators(json_list_response("properties", properties, property_serializer, fields, extra=extra), etag)
+    except ValueError as ve:
+        return jsonify({"message": str(ve)}), 400
     except Exception as e:
         current_app.logger.error(f"Error in get_properties_by_landlord_route: {e}", exc_info=True) # Explicit log
         return jsonify({"message": "An error occurred while fetching properties."}), 500
 
+# --- Public Listing Search ---
+@property_bp.route('/public', methods=['GET'])
+def search_public_listings_route():
+    # Public endpoint: no authentication, only vacant properties are listed
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 10, type=int)
+    sort_by = request.args.get('sort_by')
+    filters = {key: request.args.get(key) for key in ('q', 'city', 'county', 'estate', 'building', 'property_type', 'amenities',
+                                                      'latitude', 'longitude', 'radius_km', 'bbox') if request.args.get(key)}
+    try:
+        for key in ('min_bedrooms', 'max_bedrooms'):
+            if request.args.get(key):
+                filters[key] = int(request.args[key])
+        for key in ('min_rent', 'max_rent'):
+            if request.args.get(key):
+                filters[key] = Decimal(request.args[key])
+    except (ValueError, ArithmeticError):
+        return jsonify({"message": "Bedroom filters must be integers and rent filters numbers"}), 400
+
+    fields = parse_fields(request.args.get('fields'))
+    try:
+        property_serializer.plan(fields) # Rejects unknown ?fields= before searching
+        result = property_service.search_public_listings(filters, sort_by=sort_by, page=page, per_page=per_page)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error in search_public_listings_route: {e}", exc_info=True)
+        return jsonify({"message": "An error occurred while searching properties."}), 500
+
+    def decorate(prop, prop_dict):
+        if prop.property_id in result["highlights"]:
+            prop_dict["highlights"] = result["highlights"][prop.property_id] # HTML-escaped; matched words wrapped in <mark>
+        if prop.property_id in result["distances"]:
+            prop_dict["distance_km"] = result["distances"][prop.property_id]
+
+    return json_list_response("properties", result["items"], property_serializer, fields, decorate=decorate, extra={
+        "total_items": result["total"],
+        "page": page,
+        "per_page": per_page,
+        "total_pages": (result["total"] + per_page - 1) // per_page,
+        "facets": result["facets"],
+    })
+
 # --- Update Property ---
 @property_bp.route('/<int:property_id>', methods=['PUT'])
 @auth_required_placeholder
@@ -149,14 +241,7 @@ def update_property_route(current_user_id: int, property_id: int):
 
     try:
         updated_property = property_service.update_property(property_obj=property_to_update, update_data=data)
-        prop_dict = {column.name: getattr(updated_property, column.name) for column in updated_property.__table__.columns}
-        # Convert Enums and Decimals
-        for key, value in prop_dict.items():
-            if isinstance(value, PyEnum):
-                prop_dict[key] = value.value
-            elif isinstance(value, Decimal):
-                prop_dict[key] = str(value)
-        return jsonify(prop_dict), 200
+        return jsonify(property_serializer.to_dict(updated_property)), 200
     except ValueError as e:
         return jsonify({"message": str(e)}), 400
     except Exception as e:
@@ -221,14 +306,7 @@ def upload_property_photos_route(current_user_id: int, property_id: int):
             property_obj=property_to_update,
             new_photo_urls=new_photo_urls
         )
-        # Prepare response
-        prop_dict = {column.name: getattr(updated_property, column.name) for column in updated_property.__table__.columns}
-        for key, value in prop_dict.items():
-            if isinstance(value, PyEnum):
-                prop_dict[key] = value.value
-            elif isinstance(value, Decimal):
-                prop_dict[key] = str(value)
-        return jsonify(prop_dict), 200
+        return jsonify(property_serializer.to_dict(updated_property)), 200
 
     except ValueError as e: # Catch errors from service like invalid input type
         return jsonify({"message": str(e)}), 400
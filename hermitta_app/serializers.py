@@ -0,0 +1,181 @@
+"""
+Model-to-JSON serialization for the API routes.
+
+Each registered model gets a ModelSerializer whose field plan (column attributes, plus a
+converter for each Enum, Decimal, date and datetime column) is compiled once at import,
+instead of inspecting `__table__.columns` and isinstance-checking every value of every row.
+List endpoints stream their rows with `json_list_response`.
+"""
+from operator import attrgetter
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence, Tuple
+import json
+import sqlalchemy as sa
+from flask import Response, stream_with_context
+from models.property import Property
+from models.building import Building
+from models.lease import Lease
+from models.user import User
+from models.payment import Payment
+from models.notification import Notification
+
+try:
+    import orjson
+except ImportError: # Optional: the standard library encoder is used without it
+    orjson = None
+
+# A list response is encoded and sent this many rows at a time
+STREAM_CHUNK_SIZE = 200
+# Compiled plans kept per serializer for ?fields= selections; other selections are compiled per request
+MAX_CACHED_FIELD_PLANS = 256
+
+# Column attributes never sent to clients
+USER_PRIVATE_FIELDS = (
+    'password_hash', 'phone_verification_otp', 'phone_verification_otp_expires_at', 'otp_secret', 'otp_backup_codes',
+)
+# Fields of a notification shown in the inbox (delivery bookkeeping such as claimed_by stays internal)
+NOTIFICATION_INBOX_FIELDS = (
+    'notification_id', 'notification_type', 'subject', 'content', 'status', 'sent_at', 'read_at', 'created_at',
+    'lease_id', 'payment_id', 'message_id', 'maintenance_request_id', 'document_id',
+    'related_entity_type', 'related_entity_id',
+)
+
+
+def json_dumps(value: Any) -> bytes:
+    """Encodes already-serialized data (str/int/float/bool/None, lists and dicts) as compact JSON."""
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _converter(column_type) -> Optional[Callable[[Any], Any]]:
+    """Converter of a column's non-null values to JSON types, or None when they already are."""
+    if isinstance(column_type, sa.Enum) and column_type.enum_class is not None:
+        return attrgetter('value')
+    if isinstance(column_type, sa.Numeric) and column_type.asdecimal: # Float is a Numeric without asdecimal
+        return str
+    if isinstance(column_type, (sa.Date, sa.DateTime, sa.Time)):
+        return lambda value: value.isoformat()
+    return None
+
+
+class _FieldPlan:
+    """Names of the selected fields, one getter fetching all of their values, and the converting positions."""
+
+    def __init__(self, fields: Sequence[Tuple[str, str, Optional[Callable]]]):
+        self.names = tuple(name for name, _, _ in fields)
+        getter = attrgetter(*[key for _, key, _ in fields])
+        # attrgetter of a single attribute returns the value itself rather than a 1-tuple
+        self.getter = getter if len(fields) > 1 else (lambda obj: (getter(obj),))
+        self.converters = tuple((index, convert) for index, (_, _, convert) in enumerate(fields) if convert is not None)
+
+
+class ModelSerializer:
+    """Serializes instances of one model to dicts of JSON types, optionally restricted to some fields."""
+
+    def __init__(self, model, only: Optional[Sequence[str]] = None, exclude: Sequence[str] = ()):
+        self.model = model
+        fields = [
+            (attr.columns[0].name, attr.key, _converter(attr.columns[0].type))
+            for attr in sa.inspect(model).column_attrs
+            if attr.columns[0].name not in exclude
+        ]
+        if only is not None:
+            by_name = {field[0]: field for field in fields}
+            fields = [by_name[name] for name in only]
+        self._fields = {field[0]: field for field in fields}
+        self._plan = _FieldPlan(fields)
+        self._plans: Dict[Tuple[str, ...], _FieldPlan] = {}
+
+    @property
+    def field_names(self) -> Tuple[str, ...]:
+        return self._plan.names
+
+    def plan(self, fields: Optional[Sequence[str]] = None) -> _FieldPlan:
+        """The compiled plan of a field selection (all fields if None). Raises ValueError for unknown fields."""
+        if not fields:
+            return self._plan
+        key = tuple(fields)
+        plan = self._plans.get(key)
+        if plan is None:
+            unknown = [name for name in fields if name not in self._fields]
+            if unknown:
+                raise ValueError(f"Unknown field(s) for {self.model.__name__}: {', '.join(unknown)}")
+            plan = _FieldPlan([self._fields[name] for name in dict.fromkeys(fields)])
+            if len(self._plans) < MAX_CACHED_FIELD_PLANS:
+                self._plans[key] = plan
+        return plan
+
+    def to_dict(self, obj, fields: Optional[Sequence[str]] = None, plan: Optional[_FieldPlan] = None) -> Dict[str, Any]:
+        plan = plan or self.plan(fields)
+        values = list(plan.getter(obj))
+        for index, convert in plan.converters:
+            if values[index] is not None:
+                values[index] = convert(values[index])
+        return dict(zip(plan.names, values))
+
+    def to_list(self, objs: Iterable, fields: Optional[Sequence[str]] = None) -> list:
+        plan = self.plan(fields)
+        return [self.to_dict(obj, plan=plan) for obj in objs]
+
+
+_serializers: Dict[type, ModelSerializer] = {}
+
+
+def register_serializer(model, only: Optional[Sequence[str]] = None, exclude: Sequence[str] = ()) -> ModelSerializer:
+    serializer = ModelSerializer(model, only=only, exclude=exclude)
+    _serializers[model] = serializer
+    return serializer
+
+
+def get_serializer(model) -> ModelSerializer:
+    """The registered serializer of a model. Raises KeyError if the model has none."""
+    return _serializers[model]
+
+
+def parse_fields(value: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """Parses a `?fields=a,b` selection; None (all fields) when it is missing or empty."""
+    if not value:
+        return None
+    fields = tuple(name.strip() for name in value.split(',') if name.strip())
+    return fields or None
+
+
+def json_response(data: Any, status: int = 200) -> Response:
+    return Response(json_dumps(data), status=status, mimetype='application/json')
+
+
+def json_list_response(key: str, objs: Sequence, serializer: ModelSerializer, fields: Optional[Sequence[str]] = None,
+                       extra: Optional[Dict[str, Any]] = None, decorate: Optional[Callable[[Any, Dict[str, Any]], None]] = None,
+                       status: int = 200) -> Response:
+    """
+    Streams `{"<key>": [rows...], **extra}`, encoding STREAM_CHUNK_SIZE rows at a time.
+    `decorate(obj, row_dict)` may add per-row entries (e.g. search highlights).
+    The field selection is validated before the response starts (ValueError).
+    """
+    plan = serializer.plan(fields)
+
+    def generate():
+        yield b'{' + json_dumps(key) + b':['
+        for start in range(0, len(objs), STREAM_CHUNK_SIZE):
+            rows = []
+            for obj in objs[start:start + STREAM_CHUNK_SIZE]:
+                row = serializer.to_dict(obj, plan=plan)
+                if decorate is not None:
+                    decorate(obj, row)
+                rows.append(row)
+            chunk = json_dumps(rows)[1:-1]
+            yield (b',' + chunk) if start else chunk
+        yield b']'
+        if extra:
+            yield b',' + json_dumps(extra)[1:-1]
+        yield b'}'
+
+    return Response(stream_with_context(generate()), status=status, mimetype='application/json')
+
+
+register_serializer(Property)
+register_serializer(Lease)
+register_serializer(User, exclude=USER_PRIVATE_FIELDS)
+register_serializer(Payment)
+register_serializer(Notification, only=NOTIFICATION_INBOX_FIELDS)
+register_serializer(Building)
@@ -0,0 +1,386 @@
+import copy
+import importlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, time as time_of_day
+from decimal import Decimal
+from typing import Optional, Dict, Any, Iterable, Tuple
+import sqlalchemy as sa
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy.orm.attributes import set_committed_value
+from models.property import Property
+from models.lease import Lease
+from models.user import User
+
+try:
+    import redis
+except ImportError: # Optional: only needed for ENTITY_CACHE_BACKEND = 'shared' with ENTITY_CACHE_REDIS_URL
+    redis = None
+
+DEFAULT_TTL_SECONDS = 60 # Bounds staleness from writes that bypass the ORM (and from other processes with 'memory')
+DEFAULT_MAX_ENTRIES = 10000
+
+# Models served by the read-through cache: their rows are looked up by primary key on most requests
+CACHED_MODELS = (Property, Lease, User)
+
+# Columns never copied into a snapshot. A cache hit leaves them unloaded, so reading one
+# (e.g. to check a password) loads it from the database.
+UNCACHED_COLUMNS = {
+    User: frozenset({'password_hash', 'phone_verification_otp', 'phone_verification_otp_expires_at',
+                     'otp_secret', 'otp_backup_codes'}),
+}
+
+
+class CacheBackend:
+    """Storage of entity snapshots (dicts of column values) by key."""
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def set(self, key: str, snapshot: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def delete(self, keys: Iterable[str]) -> None:
+        raise NotImplementedError
+
+    def delete_prefix(self, prefix: str) -> None:
+        """Drops every key starting with `prefix` (a whole model, after a set-based UPDATE or DELETE)."""
+        raise NotImplementedError
+
+
+class NullCacheBackend(CacheBackend):
+    """Caches nothing: every lookup goes to the database."""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, snapshot):
+        pass
+
+    def delete(self, keys):
+        pass
+
+    def delete_prefix(self, prefix):
+        pass
+
+
+class MemoryCacheBackend(CacheBackend):
+    """In-process LRU with a TTL. Each process has its own: writes elsewhere show up after the TTL at the latest."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, snapshot = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return snapshot
+
+    def set(self, key, snapshot):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, snapshot)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+
+
+class LocalSharedStore:
+    """
+    Stand-in for a shared key-value server (the subset of the redis-py client the shared
+    backend uses), for development and tests without one. Values are bytes with an expiry.
+    """
+
+    def __init__(self):
+        self._values: Dict[str, Tuple[float, bytes]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                self._values.pop(key, None)
+                return None
+            return entry[1]
+
+    def set(self, key: str, value: bytes, ex: Optional[float] = None) -> None:
+        with self._lock:
+            self._values[key] = (time.monotonic() + ex if ex else float('inf'), value)
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._values.pop(key, None)
+
+    def scan_iter(self, match: str):
+        prefix = match.rstrip('*')
+        with self._lock:
+            keys = [key for key in self._values if key.startswith(prefix)]
+        return iter(keys)
+
+
+def _encode_value(column_type, value):
+    if value is None:
+        return None
+    if isinstance(column_type, sa.Enum) and column_type.enum_class is not None:
+        return value.name
+    if isinstance(value, (date, time_of_day)): # datetime is a date
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _decode_value(column_type, value):
+    if value is None:
+        return None
+    if isinstance(column_type, sa.Enum) and column_type.enum_class is not None:
+        return column_type.enum_class[value]
+    if isinstance(column_type, sa.DateTime):
+        return datetime.fromisoformat(value)
+    if isinstance(column_type, sa.Date):
+        return date.fromisoformat(value)
+    if isinstance(column_type, sa.Time):
+        return time_of_day.fromisoformat(value)
+    if isinstance(column_type, sa.Numeric) and column_type.asdecimal:
+        return Decimal(value)
+    return value
+
+
+def dump_snapshot(model, snapshot: Dict[str, Any]) -> bytes:
+    """Serializes a snapshot of `model` to JSON, converting values by the column's type."""
+    columns = inspect(model).columns
+    return json.dumps({key: _encode_value(columns[key].type, value) for key, value in snapshot.items()},
+                      separators=(',', ':')).encode()
+
+
+def load_snapshot(model, data: bytes) -> Dict[str, Any]:
+    """Inverse of `dump_snapshot`. Keys that are not columns of `model` are dropped."""
+    columns = inspect(model).columns
+    return {key: _decode_value(columns[key].type, value) for key, value in json.loads(data).items() if key in columns}
+
+
+class SharedCacheBackend(CacheBackend):
+    """
+    Cache in a key-value server shared by all processes (a redis-py client or a LocalSharedStore).
+    Snapshots are stored as JSON (see `dump_snapshot`): nothing read back from the server is executed.
+    """
+
+    def __init__(self, client, ttl_seconds: float = DEFAULT_TTL_SECONDS, namespace: str = 'entity:'):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.namespace = namespace
+        self._models = {model.__tablename__: model for model in CACHED_MODELS}
+
+    def _model(self, key: str):
+        return self._models[key.partition(':')[0]]
+
+    def get(self, key):
+        value = self.client.get(self.namespace + key)
+        if value is None:
+            return None
+        try:
+            return load_snapshot(self._model(key), value)
+        except (ValueError, KeyError, TypeError):
+            return None # Unreadable entry (e.g. written by an older release): treated as a miss
+
+    def set(self, key, snapshot):
+        self.client.set(self.namespace + key, dump_snapshot(self._model(key), snapshot), ex=self.ttl_seconds)
+
+    def delete(self, keys):
+        keys = [self.namespace + key for key in keys]
+        if keys:
+            self.client.delete(*keys)
+
+    def delete_prefix(self, prefix):
+        keys = list(self.client.scan_iter(match=self.namespace + prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+def build_cache_backend(config: Dict[str, Any]) -> CacheBackend:
+    """
+    Builds the backend named by ENTITY_CACHE_BACKEND: 'memory', 'shared' (the server at
+    ENTITY_CACHE_REDIS_URL, or a LocalSharedStore without one), 'none', or the import path
+    of a CacheBackend subclass ('package.module:ClassName'), which is given the app config.
+    """
+    name = config.get('ENTITY_CACHE_BACKEND', 'memory')
+    ttl_seconds = config.get('ENTITY_CACHE_TTL_SECONDS', DEFAULT_TTL_SECONDS)
+    if name == 'memory':
+        return MemoryCacheBackend(max_entries=config.get('ENTITY_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES), ttl_seconds=ttl_seconds)
+    if name == 'none':
+        return NullCacheBackend()
+    if name == 'shared':
+        url = config.get('ENTITY_CACHE_REDIS_URL')
+        if not url:
+            return SharedCacheBackend(LocalSharedStore(), ttl_seconds=ttl_seconds)
+        if redis is None:
+            raise ValueError("ENTITY_CACHE_REDIS_URL is set but the redis package is not installed.")
+        return SharedCacheBackend(redis.Redis.from_url(url), ttl_seconds=ttl_seconds)
+    module_name, _, class_name = name.partition(':')
+    if not class_name:
+        raise ValueError(f"Unknown ENTITY_CACHE_BACKEND '{name}'.")
+    return getattr(importlib.import_module(module_name), class_name)(config)
+
+
+def _copy_mutable(value):
+    # JSON columns hold lists and dicts: a cached snapshot must not share them with session instances
+    return copy.deepcopy(value) if isinstance(value, (list, dict)) else value
+
+
+def _cache_key(model, primary_key) -> str:
+    return f"{model.__tablename__}:{primary_key}"
+
+
+class EntityCache:
+    """
+    Read-through cache of CACHED_MODELS rows by primary key. Snapshots of the committed
+    column values are cached; a hit is attached to the session with merge(load=False), so
+    it behaves like a loaded row (lazy relationships, updates) without a SELECT.
+    Entries are invalidated when a change to the row is committed.
+    """
+
+    def __init__(self, backend: Optional[CacheBackend] = None):
+        self.backend = backend or MemoryCacheBackend()
+        self._metrics_lock = threading.Lock()
+        self.reset_metrics()
+
+    def init_app(self, app) -> None:
+        self.backend = build_cache_backend(app.config)
+        self.reset_metrics()
+        app.extensions['entity_cache'] = self
+
+    def reset_metrics(self) -> None:
+        with self._metrics_lock:
+            self._metrics = {model.__name__: {"hits": 0, "misses": 0, "invalidations": 0} for model in CACHED_MODELS}
+
+    def _count(self, model, metric: str, amount: int = 1) -> None:
+        with self._metrics_lock:
+            self._metrics[model.__name__][metric] += amount
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Hits, misses, invalidations and hit ratio per cached model, since the app started."""
+        with self._metrics_lock:
+            result = {}
+            for name, counts in self._metrics.items():
+                lookups = counts["hits"] + counts["misses"]
+                result[name] = dict(counts, hit_ratio=round(counts["hits"] / lookups, 4) if lookups else None)
+            return result
+
+    def get(self, session, model, primary_key):
+        """The row of `model` with this primary key (or None), from the session, the cache or the database."""
+        if primary_key is None:
+            return None
+        loaded = session.identity_map.get(identity_key(model, primary_key))
+        if loaded is not None:
+            return loaded # Already in this session (and possibly modified)
+        snapshot = self.backend.get(_cache_key(model, primary_key))
+        if snapshot is not None:
+            self._count(model, "hits")
+            return session.merge(self._detached(model, snapshot), load=False)
+        self._count(model, "misses")
+        instance = session.get(model, primary_key)
+        if instance is not None:
+            snapshot = self._snapshot(instance)
+            if snapshot is not None:
+                self.backend.set(_cache_key(model, primary_key), snapshot)
+        return instance
+
+    def invalidate(self, model, *primary_keys) -> None:
+        if primary_keys:
+            self.backend.delete([_cache_key(model, primary_key) for primary_key in primary_keys])
+            self._count(model, "invalidations", len(primary_keys))
+
+    def invalidate_model(self, model) -> None:
+        self.backend.delete_prefix(f"{model.__tablename__}:")
+        self._count(model, "invalidations")
+
+    @staticmethod
+    def _snapshot(instance) -> Optional[Dict[str, Any]]:
+        """Committed column values (except UNCACHED_COLUMNS) of a fully loaded, unmodified instance; None otherwise."""
+        state = inspect(instance)
+        if state.modified or state.expired_attributes or not state.has_identity:
+            return None
+        excluded = UNCACHED_COLUMNS.get(state.mapper.class_, ())
+        keys = [attr.key for attr in state.mapper.column_attrs if attr.key not in excluded]
+        if any(key not in state.dict for key in keys): # Deferred or expired columns
+            return None
+        return {key: _copy_mutable(state.dict[key]) for key in keys}
+
+    @staticmethod
+    def _detached(model, snapshot: Dict[str, Any]):
+        instance = inspect(model).class_manager.new_instance()
+        for key, value in snapshot.items():
+            set_committed_value(instance, key, _copy_mutable(value))
+        make_transient_to_detached(instance)
+        return instance
+
+
+entity_cache = EntityCache()
+
+
+def _cached_model(instance):
+    return next((model for model in CACHED_MODELS if isinstance(instance, model)), None)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_entities(session, flush_context):
+    """Remembers the cached rows written by this transaction, to invalidate them once it commits."""
+    changed = session.info.setdefault('entity_cache_changes', set())
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        model = _cached_model(instance)
+        if model is not None:
+            primary_key = inspect(model).primary_key_from_instance(instance)[0]
+            if primary_key is not None:
+                changed.add((model, primary_key))
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk_changes(orm_execute_state):
+    """Set-based UPDATE / DELETE statements do not say which rows they touch: the whole model is invalidated."""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    for mapper in orm_execute_state.all_mappers:
+        model = next((model for model in CACHED_MODELS if issubclass(mapper.class_, model)), None)
+        if model is not None:
+            orm_execute_state.session.info.setdefault('entity_cache_changes', set()).add((model, None))
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed_entities(session):
+    if session.in_nested_transaction():
+        return # Savepoint released; wait for the outer commit
+    for model, primary_key in session.info.pop('entity_cache_changes', ()):
+        if primary_key is None:
+            entity_cache.invalidate_model(model)
+        else:
+            entity_cache.invalidate(model, primary_key)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_rolled_back_changes(session, previous_transaction):
+    if previous_transaction.nested:
+        return
+    session.info.pop('entity_cache_changes', None)
@@ -0,0 +1,415 @@
+import importlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Tuple, Iterable
+from sqlalchemy import event, inspect, select, func
+from sqlalchemy.orm import Session
+from hermitta_app import db
+from models import Notification, Message, PushEventRecord
+from models.notification_unread_counter import _is_unread, _previous_value
+
+# Event types pushed to clients
+NOTIFICATION_EVENT = 'notification'
+MESSAGE_EVENT = 'message'
+# Sent instead of the events a client missed when they are no longer retained; the client refetches through the REST API
+RESET_EVENT = 'reset'
+
+DEFAULT_HISTORY_SIZE = 50 # Retained events per user, replayed on reconnect
+DEFAULT_HISTORY_USERS = 10000 # Users whose history is retained (least recently published to are forgotten first)
+DEFAULT_MAX_QUEUED_EVENTS = 100 # Undelivered events buffered per connection
+DEFAULT_POLL_SECONDS = 1.0 # How often the 'database' bus looks for events published by other processes
+DEFAULT_RETENTION_SECONDS = 3600 # How long the 'database' bus keeps events for reconnecting clients
+
+logger = logging.getLogger(__name__)
+
+
+class PushEvent:
+    """An event pushed to one user. Event ids increase monotonically within a bus."""
+
+    def __init__(self, event_id: int, user_id: int, event_type: str, data: Dict[str, Any]):
+        self.event_id = event_id
+        self.user_id = user_id
+        self.event_type = event_type
+        self.data = data
+
+    def __repr__(self):
+        return f'<PushEvent {self.event_id} {self.event_type} for User {self.user_id}>'
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"id": self.event_id, "type": self.event_type, "data": self.data}
+
+    def to_sse(self) -> str:
+        return f"id: {self.event_id}\nevent: {self.event_type}\ndata: {json.dumps(self.data, separators=(',', ':'))}\n\n"
+
+
+class Subscription:
+    """
+    One client connection. Buffers at most `max_queued` undelivered events; when a slow
+    client falls further behind, the buffer is dropped and the next `get` reports a reset.
+    """
+
+    def __init__(self, user_id: int, max_queued: int = DEFAULT_MAX_QUEUED_EVENTS):
+        self.user_id = user_id
+        self.max_queued = max_queued
+        self.reset_through: Optional[int] = None # Id of the newest event dropped since the last `get`
+        self._events = deque()
+        self._condition = threading.Condition()
+
+    def put(self, push_event: PushEvent) -> None:
+        with self._condition:
+            if len(self._events) >= self.max_queued:
+                self._events.clear()
+                self.reset_through = push_event.event_id
+            elif self.reset_through is not None:
+                self.reset_through = push_event.event_id
+            else:
+                self._events.append(push_event)
+            self._condition.notify_all()
+
+    def get(self, timeout: float) -> Tuple[List[PushEvent], Optional[int]]:
+        """
+        Waits up to `timeout` seconds for events. Returns (events, reset_through):
+        reset_through is set when events were dropped, and is the id to resume from after refetching.
+        """
+        with self._condition:
+            if not self._events and self.reset_through is None:
+                self._condition.wait(timeout)
+            events, reset_through = list(self._events), self.reset_through
+            self._events.clear()
+            self.reset_through = None
+            return events, reset_through
+
+
+class EventBusBackend:
+    """Delivers published events to the subscriptions of their user."""
+
+    def publish(self, user_id: int, event_type: str, data: Dict[str, Any]) -> PushEvent:
+        raise NotImplementedError
+
+    def subscribe(self, user_id: int, last_event_id: Optional[int] = None, max_queued: int = DEFAULT_MAX_QUEUED_EVENTS) -> Subscription:
+        """Registers a subscription; events after `last_event_id` that are still retained are queued on it first."""
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        raise NotImplementedError
+
+
+class MemoryEventBackend(EventBusBackend):
+    """
+    In-process bus: reaches the clients connected to this process only. Keeps the last
+    `history_size` events of each user so reconnecting clients can resume from their last event id.
+
+    Events published by other processes never arrive: IN_APP notifications sent by
+    `flask run-notification-dispatcher` or the M-Pesa worker are only pushed with the
+    'database' backend (the inbox and unread counter are correct either way).
+    """
+
+    def __init__(self, history_size: int = DEFAULT_HISTORY_SIZE, history_users: int = DEFAULT_HISTORY_USERS):
+        self.history_size = history_size
+        self.history_users = history_users
+        self._lock = threading.Lock()
+        # Start from the clock (microseconds) so ids stay increasing across restarts
+        self._last_event_id = time.time_ns() // 1000
+        # Events up to this id were not retained by this process (published before it started or forgotten)
+        self._forgotten_through = self._last_event_id
+        self._history: "OrderedDict[int, deque]" = OrderedDict()
+        self._dropped_through: Dict[int, int] = {} # user_id -> newest event id evicted from the user's history
+        self._subscriptions: Dict[int, set] = {}
+
+    def publish(self, user_id: int, event_type: str, data: Dict[str, Any]) -> PushEvent:
+        with self._lock:
+            self._last_event_id += 1
+            push_event = PushEvent(self._last_event_id, user_id, event_type, data)
+            history = self._history.pop(user_id, None)
+            if history is None:
+                history = deque()
+                # Anything the user got before their history started is not retained
+                self._dropped_through[user_id] = self._forgotten_through
+            if len(history) >= self.history_size:
+                self._dropped_through[user_id] = history.popleft().event_id
+            history.append(push_event)
+            self._history[user_id] = history
+            if len(self._history) > self.history_users:
+                forgotten_user, forgotten = self._history.popitem(last=False)
+                self._dropped_through.pop(forgotten_user, None)
+                self._forgotten_through = max(self._forgotten_through, forgotten[-1].event_id)
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.put(push_event)
+        return push_event
+
+    def subscribe(self, user_id: int, last_event_id: Optional[int] = None, max_queued: int = DEFAULT_MAX_QUEUED_EVENTS) -> Subscription:
+        subscription = Subscription(user_id, max_queued=max_queued)
+        with self._lock:
+            if last_event_id is not None:
+                history = self._history.get(user_id, ())
+                retained_after = self._dropped_through.get(user_id, self._forgotten_through)
+                if last_event_id < retained_after:
+                    subscription.reset_through = history[-1].event_id if history else self._last_event_id
+                else:
+                    for push_event in history:
+                        if push_event.event_id > last_event_id:
+                            subscription.put(push_event)
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+
+class DatabaseEventBackend(EventBusBackend):
+    """
+    Cross-process bus through the `push_events` table. Every process, web worker or CLI job,
+    publishes by inserting a row. Each process with connected clients runs a poller thread
+    that reads the new rows every `poll_seconds` and queues them on its subscriptions.
+    Event ids are row ids, shared by all processes, so a client can resume on any worker.
+    Pollers delete rows older than `retention_seconds`.
+
+    Each publish commits on its own, but on databases with concurrent writers a row can
+    become visible after one with a higher id. The poller therefore re-reads the last
+    `overlap_ids` ids on every poll and skips the rows it already delivered.
+    """
+
+    def __init__(self, engine=None, poll_seconds: float = DEFAULT_POLL_SECONDS, history_size: int = DEFAULT_HISTORY_SIZE,
+                 retention_seconds: float = DEFAULT_RETENTION_SECONDS, batch_size: int = 1000, overlap_ids: int = 100):
+        self._engine = engine # Defaults to the app's engine, looked up on first use
+        self.poll_seconds = poll_seconds
+        self.history_size = history_size
+        self.retention_seconds = retention_seconds
+        self.batch_size = batch_size
+        self.overlap_ids = overlap_ids
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._subscriptions: Dict[int, set] = {}
+        self._poller: Optional[threading.Thread] = None
+        self._cursor = 0 # Newest event id handed to subscriptions
+        self._start_id = 0 # Events up to this id existed when the poller started: replays cover them
+        self._recent_ids = set() # Ids delivered within the overlap window
+        self._pruned_at = 0.0
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            self._engine = db.engine
+        return self._engine
+
+    def publish(self, user_id: int, event_type: str, data: Dict[str, Any]) -> PushEvent:
+        table = PushEventRecord.__table__
+        with self.engine.begin() as connection:
+            event_id = connection.execute(table.insert().values(
+                user_id=user_id, event_type=event_type, data=data, created_at=datetime.utcnow()
+            )).inserted_primary_key[0]
+        self._wake.set() # Clients of this process get it without waiting for the next poll
+        return PushEvent(event_id, user_id, event_type, data)
+
+    def subscribe(self, user_id: int, last_event_id: Optional[int] = None, max_queued: int = DEFAULT_MAX_QUEUED_EVENTS) -> Subscription:
+        table = PushEventRecord.__table__
+        subscription = Subscription(user_id, max_queued=max_queued)
+        with self._lock:
+            with self.engine.connect() as connection:
+                if self._poller is None:
+                    self._cursor = self._start_id = connection.execute(select(func.max(table.c.event_id))).scalar() or 0
+                    self._recent_ids.clear()
+                if last_event_id is not None:
+                    self._replay(connection, subscription, last_event_id)
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll, name="event-bus-poller", daemon=True)
+                self._poller.start()
+        return subscription
+
+    def _replay(self, connection, subscription: Subscription, last_event_id: int) -> None:
+        """Queues the user's events after `last_event_id` up to the cursor; the poller delivers the later ones."""
+        table = PushEventRecord.__table__
+        oldest = connection.execute(select(func.min(table.c.event_id))).scalar()
+        rows = connection.execute(
+            select(table.c.event_id, table.c.event_type, table.c.data)
+            .where(table.c.user_id == subscription.user_id, table.c.event_id > last_event_id, table.c.event_id <= self._cursor)
+            .order_by(table.c.event_id.desc()).limit(self.history_size + 1)
+        ).all()
+        # Older events may have been deleted, or there are more than a reconnect replays
+        if (oldest is not None and last_event_id < oldest - 1) or len(rows) > self.history_size:
+            subscription.reset_through = self._cursor
+            return
+        for row in reversed(rows):
+            subscription.put(PushEvent(row.event_id, subscription.user_id, row.event_type, row.data))
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def _poll(self) -> None:
+        """Poller thread: runs while the process has subscriptions."""
+        while True:
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+            with self._lock:
+                if not self._subscriptions:
+                    self._poller = None
+                    return
+                after = self._cursor
+            try:
+                self._deliver(after)
+                self._prune()
+            except Exception:
+                logger.exception("Event bus poll failed; retrying.")
+
+    def _deliver(self, after: int) -> None:
+        table = PushEventRecord.__table__
+        with self.engine.connect() as connection:
+            rows = connection.execute(
+                select(table.c.event_id, table.c.user_id, table.c.event_type, table.c.data)
+                .where(table.c.event_id > max(after - self.overlap_ids, self._start_id)).order_by(table.c.event_id)
+                .limit(self.batch_size + self.overlap_ids)
+            ).all()
+        with self._lock:
+            deliveries = []
+            for row in rows:
+                if row.event_id in self._recent_ids:
+                    continue
+                self._recent_ids.add(row.event_id)
+                self._cursor = max(self._cursor, row.event_id)
+                push_event = PushEvent(row.event_id, row.user_id, row.event_type, row.data)
+                deliveries.extend((subscription, push_event) for subscription in self._subscriptions.get(row.user_id, ()))
+            horizon = self._cursor - self.overlap_ids
+            self._recent_ids = {event_id for event_id in self._recent_ids if event_id > horizon}
+        for subscription, push_event in deliveries:
+            subscription.put(push_event)
+
+    def _prune(self) -> None:
+        if time.monotonic() - self._pruned_at < min(60, self.retention_seconds):
+            return
+        self._pruned_at = time.monotonic()
+        table = PushEventRecord.__table__
+        with self.engine.begin() as connection:
+            connection.execute(table.delete().where(table.c.created_at < datetime.utcnow() - timedelta(seconds=self.retention_seconds)))
+
+
+def build_event_backend(config: Dict[str, Any]) -> EventBusBackend:
+    """
+    Builds the backend named by EVENT_BUS_BACKEND: 'memory', 'database', or the import path
+    of an EventBusBackend subclass ('package.module:ClassName'), which is given the app config.
+    """
+    name = config.get('EVENT_BUS_BACKEND', 'memory')
+    if name == 'memory':
+        return MemoryEventBackend(history_size=config.get('EVENT_BUS_HISTORY_SIZE', DEFAULT_HISTORY_SIZE),
+                                  history_users=config.get('EVENT_BUS_HISTORY_USERS', DEFAULT_HISTORY_USERS))
+    if name == 'database':
+        return DatabaseEventBackend(poll_seconds=config.get('EVENT_BUS_POLL_SECONDS', DEFAULT_POLL_SECONDS),
+                                    history_size=config.get('EVENT_BUS_HISTORY_SIZE', DEFAULT_HISTORY_SIZE),
+                                    retention_seconds=config.get('EVENT_BUS_RETENTION_SECONDS', DEFAULT_RETENTION_SECONDS))
+    module_name, _, class_name = name.partition(':')
+    if not class_name:
+        raise ValueError(f"Unknown EVENT_BUS_BACKEND '{name}'.")
+    return getattr(importlib.import_module(module_name), class_name)(config)
+
+
+class EventBus:
+    """Publishes events to connected clients through the configured backend."""
+
+    def __init__(self, backend: Optional[EventBusBackend] = None):
+        self.backend = backend or MemoryEventBackend()
+
+    def init_app(self, app) -> None:
+        self.backend = build_event_backend(app.config)
+        app.extensions['event_bus'] = self
+
+    def publish(self, user_id: int, event_type: str, data: Dict[str, Any]) -> PushEvent:
+        return self.backend.publish(user_id, event_type, data)
+
+    def subscribe(self, user_id: int, last_event_id: Optional[int] = None, max_queued: int = DEFAULT_MAX_QUEUED_EVENTS) -> Subscription:
+        return self.backend.subscribe(user_id, last_event_id=last_event_id, max_queued=max_queued)
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self.backend.unsubscribe(subscription)
+
+
+event_bus = EventBus()
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def notification_event_data(notification) -> Dict[str, Any]:
+    """Push payload of an IN_APP notification (a Notification or a row with the same attributes)."""
+    return {
+        "notification_id": notification.notification_id,
+        "notification_type": notification.notification_type.value,
+        "subject": notification.subject,
+        "content": notification.content,
+        "created_at": _isoformat(notification.created_at),
+    }
+
+
+def message_event_data(message: Message) -> Dict[str, Any]:
+    return {
+        "message_id": message.message_id,
+        "sender_id": message.sender_id,
+        "conversation_id": message.conversation_id,
+        "subject": message.subject,
+        "content": message.content,
+        "sent_at": _isoformat(message.sent_at),
+    }
+
+
+def queue_push_event(session, user_id: int, event_type: str, data: Dict[str, Any]) -> None:
+    """Queues an event on the session; it is published when the session commits and dropped on rollback."""
+    session.info.setdefault('push_events', []).append((user_id, event_type, data))
+
+
+def queue_notification_events(session, notification_ids: Iterable[int]) -> None:
+    """Queues the push of notifications written with set-based updates (which skip the flush listener)."""
+    notification_ids = list(notification_ids)
+    if not notification_ids:
+        return
+    rows = session.query(
+        Notification.notification_id, Notification.user_id, Notification.notification_type,
+        Notification.subject, Notification.content, Notification.created_at
+    ).filter(Notification.notification_id.in_(notification_ids)).order_by(Notification.notification_id).all()
+    for row in rows:
+        queue_push_event(session, row.user_id, NOTIFICATION_EVENT, notification_event_data(row))
+
+
+@event.listens_for(Session, 'after_flush')
+def _queue_flushed_events(session, flush_context):
+    """Queues pushes for IN_APP notifications reaching the inbox and for new messages."""
+    for instance in session.new:
+        if isinstance(instance, Message):
+            queue_push_event(session, instance.receiver_id, MESSAGE_EVENT, message_event_data(instance))
+        elif isinstance(instance, Notification) and _is_unread(instance.channel, instance.status, instance.read_at):
+            queue_push_event(session, instance.user_id, NOTIFICATION_EVENT, notification_event_data(instance))
+    for instance in session.dirty:
+        if not isinstance(instance, Notification) or not _is_unread(instance.channel, instance.status, instance.read_at):
+            continue
+        state = inspect(instance)
+        if not _is_unread(_previous_value(state, 'channel'), _previous_value(state, 'status'), _previous_value(state, 'read_at')):
+            queue_push_event(session, instance.user_id, NOTIFICATION_EVENT, notification_event_data(instance))
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_committed_events(session):
+    if session.in_nested_transaction():
+        return # Savepoint released; wait for the outer commit
+    for user_id, event_type, data in session.info.pop('push_events', ()):
+        event_bus.publish(user_id, event_type, data)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_rolled_back_events(session, previous_transaction):
+    if previous_transaction.nested:
+        return
+    session.info.pop('push_events', None)
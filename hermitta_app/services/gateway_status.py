@@ -0,0 +1,290 @@
+import http.client
+import importlib
+import json
+import ssl
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, Callable, Tuple, List
+from urllib.parse import urlsplit, quote
+from models.enums import GatewayType, GatewayTransactionStatus
+
+DEFAULT_HTTP_TIMEOUT_SECONDS = 10
+DEFAULT_MAX_IDLE_CONNECTIONS = 8 # Kept-alive connections per gateway host
+DEFAULT_TOKEN_REFRESH_MARGIN_SECONDS = 60 # Tokens are renewed this long before they expire
+
+
+class GatewayStatusError(Exception):
+    """
+    Raised when a gateway's status could not be obtained. `retryable` marks transient errors
+    (timeouts, 5xx, rate limiting): the transaction is checked again later.
+    """
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class KeepAliveHttpPool:
+    """
+    Thread-safe pool of persistent HTTP/1.1 connections, per scheme, host and port, so
+    status queries reuse the TLS connection instead of opening one per request. A kept-alive
+    connection the server has closed in the meantime is replaced and the request retried once.
+    """
+
+    def __init__(self, max_idle_per_host: int = DEFAULT_MAX_IDLE_CONNECTIONS, timeout: float = DEFAULT_HTTP_TIMEOUT_SECONDS,
+                 ssl_context: Optional[ssl.SSLContext] = None):
+        self.max_idle_per_host = max_idle_per_host
+        self.timeout = timeout
+        self.ssl_context = ssl_context or ssl.create_default_context()
+        self._idle: Dict[Tuple[str, str, int], List[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+        self.requests_sent = 0
+
+    def _acquire(self, origin: Tuple[str, str, int]) -> Tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            idle = self._idle.get(origin)
+            if idle:
+                return idle.pop(), True
+            self.connections_opened += 1
+        scheme, host, port = origin
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, port, timeout=self.timeout, context=self.ssl_context), False
+        return http.client.HTTPConnection(host, port, timeout=self.timeout), False
+
+    def _release(self, origin: Tuple[str, str, int], connection: http.client.HTTPConnection) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(origin, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def request(self, method: str, url: str, body: Optional[bytes] = None,
+                headers: Optional[Dict[str, str]] = None) -> Tuple[int, bytes]:
+        """Sends the request and returns (HTTP status, response body). Raises GatewayStatusError on connection errors."""
+        parts = urlsplit(url)
+        origin = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80))
+        path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        for attempt in range(2):
+            connection, reused = self._acquire(origin)
+            try:
+                connection.request(method, path, body=body, headers=headers or {})
+                response = connection.getresponse()
+                data = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+                connection.close()
+                if reused and not attempt:
+                    continue # Closed by the server while idle
+                raise GatewayStatusError(f"Connection to {parts.hostname} lost: {e}") from e
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                raise GatewayStatusError(f"Request to {parts.hostname} failed: {e}") from e
+            with self._lock:
+                self.requests_sent += 1
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(origin, connection)
+            return response.status, data
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+
+class RateLimiter:
+    """
+    Token bucket shared by the threads querying one gateway: at most `rate` requests per
+    second on average, in bursts of up to `burst`. A rate of None or 0 means unlimited.
+    """
+
+    def __init__(self, rate: Optional[float], burst: Optional[int] = None,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate or 1))
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Waits for a request slot and returns the seconds waited."""
+        if not self.rate:
+            return 0.0
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1 # Reserved now; waited for outside the lock
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            self._sleep(wait)
+        return wait
+
+
+class BearerTokenCache:
+    """
+    OAuth bearer tokens by key (e.g. gateway and consumer key), reused until shortly before
+    they expire. Concurrent callers of an expired key wait for a single token request.
+    """
+
+    def __init__(self, refresh_margin_seconds: float = DEFAULT_TOKEN_REFRESH_MARGIN_SECONDS, clock: Callable[[], float] = time.time):
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self._clock = clock
+        self._tokens: Dict[Any, Tuple[str, float]] = {}
+        self._key_locks: Dict[Any, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def get(self, key, fetch: Callable[[], Tuple[str, float]]) -> str:
+        """The cached token of `key`, or a new one from `fetch()`, which returns (token, expiry as a UNIX timestamp)."""
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            cached = self._tokens.get(key)
+            if cached and cached[1] - self.refresh_margin_seconds > self._clock():
+                return cached[0]
+            token, expires_at = fetch()
+            self._tokens[key] = (token, expires_at)
+            with self._lock:
+                self.requests += 1
+            return token
+
+    def invalidate(self, key) -> None:
+        """Forgets the token of `key`, e.g. after the gateway answered 401 with it."""
+        self._tokens.pop(key, None)
+
+
+class GatewayStatusResult:
+    """Status of a transaction as reported by its gateway. PENDING means the gateway has no final status yet."""
+
+    def __init__(self, status: GatewayTransactionStatus, amount=None, payment_method: Optional[str] = None,
+                 confirmation_code: Optional[str] = None, error_code: Optional[str] = None,
+                 error_message: Optional[str] = None, payload: Optional[Dict[str, Any]] = None):
+        self.status = status
+        self.amount = amount
+        self.payment_method = payment_method
+        self.confirmation_code = confirmation_code
+        self.error_code = error_code
+        self.error_message = error_message
+        self.payload = payload
+
+    def __repr__(self):
+        return f'<GatewayStatusResult {self.status.value}>'
+
+
+class GatewayStatusAdapter:
+    """
+    Queries one gateway's transaction status API. `query_status` is called concurrently from
+    the reconciler's worker threads (up to the gateway's concurrency limit), so adapters
+    must be thread-safe.
+    """
+
+    gateway_type: GatewayType = None
+
+    def query_status(self, transaction) -> GatewayStatusResult:
+        """Status of `transaction` (with gateway_specific_transaction_id and internal_merchant_ref). Raises GatewayStatusError."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Releases connections held by the adapter."""
+
+
+def _parse_expiry(value: Optional[str], default_seconds: float = 300) -> float:
+    """UNIX timestamp of an ISO 8601 UTC expiry such as Pesapal's '2024-03-01T09:05:00.5177702Z'."""
+    try:
+        return datetime.strptime(value[:19], "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+    except (TypeError, ValueError):
+        return time.time() + default_seconds
+
+
+class PesapalStatusAdapter(GatewayStatusAdapter):
+    """
+    Pesapal API 3.0: a bearer token from `POST /api/Auth/RequestToken` (cached until it
+    expires) and `GET /api/Transactions/GetTransactionStatus?orderTrackingId=...`.
+    `status_code` 1 is COMPLETED, 2 FAILED, 3 REVERSED; 0 (INVALID) means not paid yet.
+    """
+
+    gateway_type = GatewayType.PESAPAL
+
+    STATUS_CODES = {
+        1: GatewayTransactionStatus.SUCCESSFUL,
+        2: GatewayTransactionStatus.FAILED,
+        3: GatewayTransactionStatus.REFUNDED,
+    }
+
+    def __init__(self, base_url: str, consumer_key: str, consumer_secret: str, pool: KeepAliveHttpPool, token_cache: BearerTokenCache):
+        self.base_url = base_url.rstrip('/')
+        self.consumer_key = consumer_key
+        self.consumer_secret = consumer_secret
+        self.pool = pool
+        self.token_cache = token_cache
+
+    def _request_token(self) -> Tuple[str, float]:
+        status, body = self.pool.request('POST', f'{self.base_url}/api/Auth/RequestToken', body=json.dumps({
+            "consumer_key": self.consumer_key, "consumer_secret": self.consumer_secret,
+        }).encode('utf-8'), headers={"Content-Type": "application/json", "Accept": "application/json"})
+        try:
+            data = json.loads(body or b'{}')
+        except ValueError:
+            data = {}
+        if status != 200 or not data.get("token"):
+            raise GatewayStatusError(f"Pesapal token request failed (HTTP {status}).", retryable=status >= 500 or status == 429)
+        return data["token"], _parse_expiry(data.get("expiryDate"))
+
+    def query_status(self, transaction) -> GatewayStatusResult:
+        tracking_id = transaction.gateway_specific_transaction_id
+        if not tracking_id:
+            raise GatewayStatusError("Transaction has no Pesapal OrderTrackingId.", retryable=False)
+        token_key = (self.gateway_type, self.consumer_key)
+        url = f'{self.base_url}/api/Transactions/GetTransactionStatus?orderTrackingId={quote(tracking_id)}'
+        for attempt in range(2):
+            token = self.token_cache.get(token_key, self._request_token)
+            status, body = self.pool.request('GET', url, headers={"Authorization": f"Bearer {token}", "Accept": "application/json"})
+            if status == 401 and not attempt:
+                self.token_cache.invalidate(token_key) # Revoked or expired early
+                continue
+            break
+        if status >= 500 or status == 429:
+            raise GatewayStatusError(f"Pesapal returned HTTP {status}.")
+        if status != 200:
+            raise GatewayStatusError(f"Pesapal returned HTTP {status}.", retryable=False)
+        try:
+            data = json.loads(body)
+        except ValueError as e:
+            raise GatewayStatusError(f"Invalid Pesapal response: {e}") from e
+        error = data.get("error") or {}
+        return GatewayStatusResult(
+            self.STATUS_CODES.get(data.get("status_code"), GatewayTransactionStatus.PENDING),
+            amount=data.get("amount"), payment_method=data.get("payment_method"),
+            confirmation_code=data.get("confirmation_code"),
+            error_code=error.get("code") or None, error_message=error.get("message") or data.get("description") or None,
+            payload=data,
+        )
+
+
+def build_status_adapters(config: Dict[str, Any], pool: KeepAliveHttpPool, token_cache: BearerTokenCache) -> Dict[GatewayType, GatewayStatusAdapter]:
+    """
+    Builds the adapter of every gateway in GATEWAY_STATUS_ADAPTERS: 'pesapal' (PESAPAL_* settings;
+    skipped without a consumer key) or the import path of a GatewayStatusAdapter subclass
+    ('package.module:ClassName'), which is given the app config, the pool and the token cache.
+    """
+    adapters = {}
+    for gateway, name in config.get('GATEWAY_STATUS_ADAPTERS', {}).items():
+        gateway = GatewayType(gateway)
+        if name == 'pesapal':
+            if config.get('PESAPAL_CONSUMER_KEY'):
+                adapters[gateway] = PesapalStatusAdapter(config['PESAPAL_BASE_URL'], config['PESAPAL_CONSUMER_KEY'],
+                                                         config.get('PESAPAL_CONSUMER_SECRET'), pool, token_cache)
+            continue
+        module_name, _, class_name = name.partition(':')
+        if not class_name:
+            raise ValueError(f"Unknown gateway status adapter '{name}' for {gateway.value}.")
+        adapters[gateway] = getattr(importlib.import_module(module_name), class_name)(config, pool, token_cache)
+    return adapters
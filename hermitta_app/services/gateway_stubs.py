@@ -0,0 +1,147 @@
+"""
+Local stand-in for the Pesapal API 3.0 endpoints the gateway reconciler calls, for tests
+and local development. Listens on 127.0.0.1 (an ephemeral port by default) and speaks
+HTTP/1.1 with keep-alive, so connection reuse can be observed:
+
+    with LocalPesapalStub(statuses={"track-1": 1}) as pesapal:
+        adapter = PesapalStatusAdapter(pesapal.url, "key", "secret", KeepAliveHttpPool(), BearerTokenCache())
+"""
+import json
+import threading
+import uuid
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Dict, Any
+from urllib.parse import urlsplit, parse_qs
+
+# status_code -> payment_status_description, as Pesapal reports them
+PESAPAL_STATUS_DESCRIPTIONS = {0: "INVALID", 1: "COMPLETED", 2: "FAILED", 3: "REVERSED"}
+
+
+class _PesapalStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep-alive
+
+    def _send(self, status: int, body: Dict[str, Any]) -> None:
+        encoded = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def setup(self):
+        super().setup()
+        self.server.stub._count("connections")
+
+    def do_POST(self):
+        stub = self.server.stub
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if urlsplit(self.path).path != "/api/Auth/RequestToken":
+            return self._send(404, {"error": {"code": "not_found"}})
+        if payload.get("consumer_key") != stub.consumer_key or payload.get("consumer_secret") != stub.consumer_secret:
+            return self._send(401, {"error": {"code": "invalid_consumer_key_or_secret_provided"}})
+        token = uuid.uuid4().hex
+        expires_at = datetime.utcnow() + timedelta(seconds=stub.token_ttl_seconds)
+        stub._issue(token)
+        self._send(200, {"token": token, "expiryDate": expires_at.strftime("%Y-%m-%dT%H:%M:%S.0000000Z"), "status": "200"})
+
+    def do_GET(self):
+        stub = self.server.stub
+        parts = urlsplit(self.path)
+        if parts.path != "/api/Transactions/GetTransactionStatus":
+            return self._send(404, {"error": {"code": "not_found"}})
+        authorization = self.headers.get("Authorization", "")
+        if not stub._valid(authorization[len("Bearer "):]):
+            return self._send(401, {"error": {"code": "unauthorized"}})
+        stub._enter()
+        try:
+            if stub.delay_seconds:
+                threading.Event().wait(stub.delay_seconds)
+            tracking_id = parse_qs(parts.query).get("orderTrackingId", [""])[0]
+            status_code = stub.statuses.get(tracking_id)
+            if status_code is None or status_code >= 500:
+                return self._send(status_code or 500, {"error": {"code": "server_error", "message": "Try again later"}})
+            self._send(200, {
+                "payment_method": "MpesaKE" if status_code == 1 else None, "amount": stub.amounts.get(tracking_id),
+                "created_date": datetime.utcnow().isoformat(), "confirmation_code": f"PSP{tracking_id.upper()}" if status_code == 1 else "",
+                "payment_status_description": PESAPAL_STATUS_DESCRIPTIONS.get(status_code, "INVALID"),
+                "description": "Payment failed" if status_code == 2 else "", "status_code": status_code,
+                "merchant_reference": tracking_id, "currency": "KES", "error": {}, "status": "200",
+            })
+        finally:
+            stub._leave()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalPesapalStub:
+    """
+    A local Pesapal status API. `statuses` maps OrderTrackingIds to a Pesapal status_code
+    (0 INVALID, 1 COMPLETED, 2 FAILED, 3 REVERSED) or to an HTTP error status (>= 500);
+    unknown ids answer 500. Counts connections, token requests and status queries, and the
+    highest number of status queries served at the same time.
+    """
+
+    def __init__(self, statuses: Optional[Dict[str, int]] = None, amounts: Optional[Dict[str, float]] = None,
+                 consumer_key: str = "key", consumer_secret: str = "secret", token_ttl_seconds: int = 300,
+                 delay_seconds: float = 0, host: str = "127.0.0.1", port: int = 0):
+        self.statuses = dict(statuses or {})
+        self.amounts = dict(amounts or {})
+        self.consumer_key = consumer_key
+        self.consumer_secret = consumer_secret
+        self.token_ttl_seconds = token_ttl_seconds
+        self.delay_seconds = delay_seconds
+        self.counts = {"connections": 0, "token_requests": 0, "status_queries": 0}
+        self.max_concurrent_queries = 0
+        self._active = 0
+        self._tokens = set()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _PesapalStubHandler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self.host, self.port = self._server.server_address
+        self.url = f"http://{self.host}:{self.port}"
+        self._thread = None
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            self.counts[counter] += 1
+
+    def _issue(self, token: str) -> None:
+        with self._lock:
+            self._tokens.add(token)
+            self.counts["token_requests"] += 1
+
+    def _valid(self, token: str) -> bool:
+        with self._lock:
+            return token in self._tokens
+
+    def revoke_tokens(self) -> None:
+        with self._lock:
+            self._tokens.clear()
+
+    def _enter(self) -> None:
+        with self._lock:
+            self.counts["status_queries"] += 1
+            self._active += 1
+            self.max_concurrent_queries = max(self.max_concurrent_queries, self._active)
+
+    def _leave(self) -> None:
+        with self._lock:
+            self._active -= 1
+
+    def start(self) -> "LocalPesapalStub":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="pesapal-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,218 @@
+import json
+import smtplib
+import threading
+import urllib.error
+import urllib.request
+from email.message import EmailMessage
+from email.utils import make_msgid
+from typing import Optional, Dict, Any, List
+from models.enums import NotificationChannel
+
+# SMS gateway statuses that reject the recipient's number itself. Other errors (e.g. 401/403
+# for an expired API key, 429 when rate limited, 5xx) say nothing about the number and are retried.
+INVALID_NUMBER_HTTP_STATUSES = (400, 404, 422)
+
+
+class NotificationDeliveryError(Exception):
+    """
+    Raised by a backend when a notification could not be handed over to its gateway.
+    `invalid_address` marks permanent recipient errors (status INVALID_ADDRESS instead of FAILED).
+    """
+
+    def __init__(self, message: str, invalid_address: bool = False):
+        super().__init__(message)
+        self.invalid_address = invalid_address
+
+
+class OutgoingNotification:
+    """A rendered notification, ready to be sent to `address` through its channel's backend."""
+
+    def __init__(self, notification_id: int, channel: NotificationChannel, user_id: int, address: Optional[str],
+                 subject: Optional[str], body: str):
+        self.notification_id = notification_id
+        self.channel = channel
+        self.user_id = user_id
+        self.address = address
+        self.subject = subject
+        self.body = body
+
+    def __repr__(self):
+        return f'<OutgoingNotification {self.notification_id} via {self.channel.value} to {self.address}>'
+
+
+class NotificationBackend:
+    """
+    Sends notifications of one channel. `send` is called concurrently from the dispatcher's
+    worker threads (up to the channel's concurrency limit), so backends must be thread-safe.
+    """
+
+    channel: NotificationChannel = None
+
+    def send(self, message: OutgoingNotification) -> Optional[str]:
+        """Sends the message and returns the gateway's id for it (stored as Notification.external_id), if any."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Releases connections held by the backend."""
+
+
+class SmtpEmailBackend(NotificationBackend):
+    """Sends EMAIL notifications over SMTP, keeping one open connection per worker thread."""
+
+    channel = NotificationChannel.EMAIL
+
+    def __init__(self, host: str, port: int = 25, username: Optional[str] = None, password: Optional[str] = None,
+                 use_tls: bool = False, sender: str = "no-reply@hermitta.co.ke", timeout: float = 10):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.sender = sender
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connections: List[smtplib.SMTP] = []
+        self._lock = threading.Lock()
+
+    def _connection(self) -> smtplib.SMTP:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.use_tls:
+                connection.starttls()
+            if self.username:
+                connection.login(self.username, self.password)
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def _drop_connection(self) -> None:
+        connection = getattr(self._local, "connection", None)
+        self._local.connection = None
+        if connection is not None:
+            with self._lock:
+                if connection in self._connections:
+                    self._connections.remove(connection)
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def send(self, message: OutgoingNotification) -> Optional[str]:
+        if not message.address:
+            raise NotificationDeliveryError("Recipient has no email address.", invalid_address=True)
+        email = EmailMessage()
+        email["From"] = self.sender
+        email["To"] = message.address
+        email["Subject"] = message.subject or ""
+        email["Message-ID"] = make_msgid(domain=self.sender.split("@")[-1])
+        email.set_content(message.body)
+
+        # A kept-alive connection may have been closed by the server; reconnect once
+        for attempt in range(2):
+            try:
+                self._connection().send_message(email)
+                return email["Message-ID"]
+            except smtplib.SMTPRecipientsRefused as e:
+                raise NotificationDeliveryError(f"Recipient refused: {message.address}", invalid_address=True) from e
+            except (smtplib.SMTPServerDisconnected, ConnectionError) as e:
+                self._drop_connection()
+                if attempt:
+                    raise NotificationDeliveryError(f"SMTP connection lost: {e}") from e
+            except (smtplib.SMTPException, OSError) as e:
+                self._drop_connection()
+                raise NotificationDeliveryError(f"SMTP error: {e}") from e
+
+    def close(self) -> None:
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            try:
+                connection.quit()
+            except Exception:
+                pass
+        self._local = threading.local()
+
+
+class HttpSmsBackend(NotificationBackend):
+    """
+    Sends SMS notifications by POSTing JSON `{"to", "message", "sender_id"}` to an SMS gateway.
+    The gateway's `message_id` is returned as the external id.
+    """
+
+    channel = NotificationChannel.SMS
+
+    def __init__(self, url: str, api_key: Optional[str] = None, sender_id: Optional[str] = None, timeout: float = 10):
+        self.url = url
+        self.api_key = api_key
+        self.sender_id = sender_id
+        self.timeout = timeout
+
+    def send(self, message: OutgoingNotification) -> Optional[str]:
+        if not message.address:
+            raise NotificationDeliveryError("Recipient has no phone number.", invalid_address=True)
+        payload = json.dumps({"to": message.address, "message": message.body, "sender_id": self.sender_id}).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        request = urllib.request.Request(self.url, data=payload, headers=headers, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                body = json.loads(response.read() or b"{}")
+        except urllib.error.HTTPError as e:
+            raise NotificationDeliveryError(f"SMS gateway returned HTTP {e.code} for {message.address}",
+                                            invalid_address=e.code in INVALID_NUMBER_HTTP_STATUSES) from e
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            raise NotificationDeliveryError(f"SMS gateway error: {e}") from e
+        return body.get("message_id")
+
+
+class InAppBackend(NotificationBackend):
+    """IN_APP notifications are read from the Notification row itself; sending only marks them as sent."""
+
+    channel = NotificationChannel.IN_APP
+
+    def send(self, message: OutgoingNotification) -> Optional[str]:
+        return None
+
+
+class MemoryBackend(NotificationBackend):
+    """
+    Records messages instead of sending them (for tests and local development).
+    Addresses in `fail_addresses` raise a NotificationDeliveryError.
+    """
+
+    def __init__(self, channel: NotificationChannel, fail_addresses: Optional[Dict[str, bool]] = None):
+        self.channel = channel
+        self.fail_addresses = fail_addresses or {}  # address -> invalid_address
+        self.sent: List[OutgoingNotification] = []
+        self._lock = threading.Lock()
+
+    def send(self, message: OutgoingNotification) -> Optional[str]:
+        if message.address in self.fail_addresses:
+            raise NotificationDeliveryError(f"Delivery to {message.address} failed.", invalid_address=self.fail_addresses[message.address])
+        with self._lock:
+            self.sent.append(message)
+            return f"memory-{self.channel.value.lower()}-{len(self.sent)}"
+
+
+def build_notification_backends(config: Dict[str, Any]) -> Dict[NotificationChannel, NotificationBackend]:
+    """Builds the backend of every channel from the app config (NOTIFICATION_*_BACKEND, MAIL_*, SMS_*)."""
+    if config.get('NOTIFICATION_EMAIL_BACKEND', 'smtp') == 'memory':
+        email_backend = MemoryBackend(NotificationChannel.EMAIL)
+    else:
+        email_backend = SmtpEmailBackend(
+            config.get('MAIL_SERVER', 'localhost'), config.get('MAIL_PORT', 25),
+            username=config.get('MAIL_USERNAME'), password=config.get('MAIL_PASSWORD'),
+            use_tls=config.get('MAIL_USE_TLS', False), sender=config.get('MAIL_DEFAULT_SENDER', 'no-reply@hermitta.co.ke')
+        )
+    if config.get('NOTIFICATION_SMS_BACKEND', 'http') == 'memory':
+        sms_backend = MemoryBackend(NotificationChannel.SMS)
+    else:
+        sms_backend = HttpSmsBackend(config['SMS_GATEWAY_URL'], api_key=config.get('SMS_GATEWAY_API_KEY'), sender_id=config.get('SMS_SENDER_ID'))
+    return {
+        NotificationChannel.EMAIL: email_backend,
+        NotificationChannel.SMS: sms_backend,
+        NotificationChannel.IN_APP: InAppBackend(),
+    }
@@ -0,0 +1,179 @@
+"""
+Local stand-ins for the mail server and SMS gateway, for tests and local development.
+
+Both listen on 127.0.0.1 (an ephemeral port by default), record what they receive and
+can be told to reject given recipients (the SMS gateway can also answer every request
+with an error status, e.g. 401 or 429):
+
+    with LocalSmtpSink() as smtp, LocalSmsSink() as sms:
+        backends = {NotificationChannel.EMAIL: SmtpEmailBackend(smtp.host, smtp.port),
+                    NotificationChannel.SMS: HttpSmsBackend(sms.url)}
+"""
+import json
+import socketserver
+import threading
+from email import message_from_bytes, policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, List, Dict, Any, Iterable
+
+
+class _ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _SmtpSinkHandler(socketserver.StreamRequestHandler):
+    """Speaks just enough SMTP for smtplib: EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP and QUIT."""
+
+    def _reply(self, line: str) -> None:
+        self.wfile.write(f"{line}\r\n".encode("ascii"))
+
+    def handle(self):
+        sink = self.server.sink
+        mail_from, recipients = None, []
+        self._reply("220 hermitta-sink ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("utf-8", "replace").strip()
+            verb = command[:4].upper()
+            if verb in ("EHLO", "HELO"):
+                self._reply("250 hermitta-sink")
+            elif verb == "MAIL":
+                mail_from, recipients = command.split(":", 1)[1].strip().strip("<>"), []
+                self._reply("250 OK")
+            elif verb == "RCPT":
+                recipient = command.split(":", 1)[1].strip().strip("<>")
+                if recipient in sink.reject:
+                    self._reply("550 No such user")
+                else:
+                    recipients.append(recipient)
+                    self._reply("250 OK")
+            elif verb == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line in (b".\r\n", b".\n"):
+                        break
+                    lines.append(data_line[1:] if data_line.startswith(b"..") else data_line)
+                sink._record(mail_from, recipients, b"".join(lines))
+                mail_from, recipients = None, []
+                self._reply("250 OK: queued")
+            elif verb == "RSET":
+                mail_from, recipients = None, []
+                self._reply("250 OK")
+            elif verb == "NOOP":
+                self._reply("250 OK")
+            elif verb == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+class LocalSmtpSink:
+    """A minimal threaded SMTP server that keeps every accepted message in `messages`."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, reject: Optional[Iterable[str]] = None):
+        self.reject = set(reject or ())
+        self.messages: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._server = _ThreadingTCPServer((host, port), _SmtpSinkHandler)
+        self._server.sink = self
+        self.host, self.port = self._server.server_address
+        self._thread = None
+
+    def _record(self, mail_from: str, recipients: List[str], data: bytes) -> None:
+        message = message_from_bytes(data, policy=policy.default)
+        with self._lock:
+            self.messages.append({
+                "from": mail_from,
+                "to": list(recipients),
+                "subject": message["Subject"],
+                "body": message.get_content().strip() if not message.is_multipart() else None,
+                "message": message,
+            })
+
+    def start(self) -> "LocalSmtpSink":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="smtp-sink", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class _SmsSinkHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        sink = self.server.sink
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except ValueError:
+            payload = None
+        if sink.fail_status:
+            status, body = sink.fail_status, {"error": "Request refused"}
+        elif not isinstance(payload, dict) or not payload.get("to"):
+            status, body = 400, {"error": "Invalid payload"}
+        elif payload["to"] in sink.reject:
+            status, body = 422, {"error": "Invalid phone number"}
+        else:
+            status, body = 200, {"message_id": sink._record(payload, self.headers.get("Authorization"))}
+        encoded = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalSmsSink:
+    """
+    A local HTTP SMS gateway that keeps every accepted message in `messages` and answers with a message_id.
+    Numbers in `reject` are refused with HTTP 422; `fail_status`, when set, answers every request.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, reject: Optional[Iterable[str]] = None, path: str = "/sms",
+                 fail_status: Optional[int] = None):
+        self.reject = set(reject or ())
+        self.fail_status = fail_status
+        self.messages: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _SmsSinkHandler)
+        self._server.daemon_threads = True
+        self._server.sink = self
+        self.host, self.port = self._server.server_address
+        self.url = f"http://{self.host}:{self.port}{path}"
+        self._thread = None
+
+    def _record(self, payload: Dict[str, Any], authorization: Optional[str]) -> str:
+        with self._lock:
+            self.messages.append(dict(payload, authorization=authorization))
+            return f"sms-{len(self.messages)}"
+
+    def start(self) -> "LocalSmsSink":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="sms-sink", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
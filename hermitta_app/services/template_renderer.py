@@ -0,0 +1,198 @@
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Iterable, Tuple
+from sqlalchemy import event
+from hermitta_app import db
+from models import NotificationTemplate
+from services.batching import chunked
+
+# Placeholders are written {{name}}; the name is everything between the braces, as in NotificationTemplate.render_template
+PLACEHOLDER_PATTERN = re.compile(r"\{\{([^{}]+)\}\}")
+
+# Compiled templates kept by the shared renderer
+DEFAULT_TEMPLATE_CACHE_SIZE = 256
+
+
+class TemplatePlaceholderError(ValueError):
+    """Raised when a template uses placeholders the rendering context does not provide."""
+
+    def __init__(self, template_id: int, missing: List[str]):
+        super().__init__(f"NotificationTemplate ID {template_id} uses placeholders missing from the context: {', '.join(missing)}")
+        self.template_id = template_id
+        self.missing = missing
+
+
+def _compile_text(text: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """Splits a template text into literal and placeholder parts: (literal, key, literal, key, ..., literal)."""
+    if not text:
+        return None
+    return tuple(PLACEHOLDER_PATTERN.split(text))
+
+
+def _render_parts(parts: Tuple[str, ...], context: Dict[str, Any]) -> str:
+    rendered = list(parts)
+    for index in range(1, len(parts), 2):
+        key = parts[index]
+        # Unknown placeholders are left as they are, like NotificationTemplate.render_template does
+        rendered[index] = str(context[key]) if key in context else f"{{{{{key}}}}}"
+    return "".join(rendered)
+
+
+class CompiledTemplate:
+    """
+    A NotificationTemplate parsed once into literal and placeholder parts per language.
+    Renders the same output as `NotificationTemplate.render_template`, without re-scanning
+    the template text for every context.
+    """
+
+    def __init__(self, template: NotificationTemplate):
+        self.template_id = template.template_id
+        self.name = template.name
+        self.template_type = template.template_type
+        self.channel = template.channel
+        self.is_active = template.is_active
+        self.updated_at = template.updated_at
+        self.required_placeholders = frozenset(template.required_placeholders or ())
+
+        subject_en, body_en = _compile_text(template.subject_template_en), _compile_text(template.body_template_en)
+        self._variants = {
+            'en': (subject_en, body_en),
+            # Swahili falls back to English per field, as in NotificationTemplate.render_template
+            'sw': (_compile_text(template.subject_template_sw) or subject_en, _compile_text(template.body_template_sw) or body_en),
+        }
+        placeholders = set()
+        for variant in self._variants.values():
+            for parts in variant:
+                if parts:
+                    placeholders.update(parts[1::2])
+        self.placeholders = frozenset(placeholders)
+
+    @property
+    def cache_key(self) -> Tuple[int, datetime]:
+        return self.template_id, self.updated_at
+
+    def missing_placeholders(self, context_keys: Iterable[str]) -> List[str]:
+        """Placeholders (used in any language, or declared in required_placeholders) that `context_keys` lacks."""
+        return sorted((self.placeholders | self.required_placeholders) - set(context_keys))
+
+    def check_placeholders(self, context_keys: Iterable[str]) -> None:
+        """Raises TemplatePlaceholderError if the context cannot fill every placeholder of the template."""
+        missing = self.missing_placeholders(context_keys)
+        if missing:
+            raise TemplatePlaceholderError(self.template_id, missing)
+
+    def render(self, context: Dict[str, Any], language: str = 'en') -> Dict[str, Optional[str]]:
+        subject_parts, body_parts = self._variants['sw' if language == 'sw' else 'en']
+        if not body_parts:
+            raise ValueError(f"Body template for language '{language}' is missing for template ID {self.template_id}")
+        return {
+            "subject": _render_parts(subject_parts, context) if subject_parts else None,
+            "body": _render_parts(body_parts, context),
+        }
+
+    def render_many(self, contexts: Iterable[Dict[str, Any]], language: str = 'en') -> List[Dict[str, Optional[str]]]:
+        return [self.render(context, language) for context in contexts]
+
+    def __repr__(self):
+        return f"<CompiledTemplate {self.template_id} '{self.name}' Placeholders: {sorted(self.placeholders)}>"
+
+
+class TemplateRenderer:
+    """
+    LRU cache of compiled templates, keyed by template id and `updated_at`.
+
+    Every lookup checks the current `updated_at` of the requested templates with one
+    cheap IN query, so a template edited by another process is recompiled on its next
+    use. Edits made through the ORM in this process also evict the template right away
+    (see the NotificationTemplate listeners below).
+    """
+
+    def __init__(self, max_size: int = DEFAULT_TEMPLATE_CACHE_SIZE):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1.")
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._cache: "OrderedDict[int, CompiledTemplate]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._cache)
+
+    def invalidate(self, template_id: Optional[int] = None) -> None:
+        """Drops one template (or all of them) from the cache."""
+        with self._lock:
+            if template_id is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(template_id, None)
+
+    def _cached(self, template_id: int, updated_at: datetime) -> Optional[CompiledTemplate]:
+        with self._lock:
+            compiled = self._cache.get(template_id)
+            if compiled is None or compiled.updated_at != updated_at:
+                self.misses += 1
+                return None
+            self._cache.move_to_end(template_id)
+            self.hits += 1
+            return compiled
+
+    def _store(self, compiled: CompiledTemplate) -> None:
+        with self._lock:
+            self._cache[compiled.template_id] = compiled
+            self._cache.move_to_end(compiled.template_id)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+
+    def compiled_templates(self, template_ids: Iterable[int]) -> Dict[int, CompiledTemplate]:
+        """
+        Returns the compiled templates of `template_ids` that exist. Only templates that
+        are not cached, or changed since they were compiled, are loaded and compiled.
+        """
+        ids = sorted(set(template_ids))
+        result, stale_ids = {}, []
+        for chunk in chunked(ids):
+            for template_id, updated_at in db.session.query(
+                NotificationTemplate.template_id, NotificationTemplate.updated_at
+            ).filter(NotificationTemplate.template_id.in_(chunk)):
+                compiled = self._cached(template_id, updated_at)
+                if compiled is None:
+                    stale_ids.append(template_id)
+                else:
+                    result[template_id] = compiled
+
+        for chunk in chunked(stale_ids):
+            for template in NotificationTemplate.query.filter(NotificationTemplate.template_id.in_(chunk)):
+                compiled = CompiledTemplate(template)
+                self._store(compiled)
+                result[template.template_id] = compiled
+        return result
+
+    def get(self, template_id: int) -> Optional[CompiledTemplate]:
+        return self.compiled_templates([template_id]).get(template_id)
+
+    def render_batch(self, template_id: int, contexts: Iterable[Dict[str, Any]], language: str = 'en',
+                     context_keys: Optional[Iterable[str]] = None) -> List[Dict[str, Optional[str]]]:
+        """
+        Renders many contexts with one template. When `context_keys` is given, the
+        placeholders are checked once up front (TemplatePlaceholderError) instead of
+        leaving unfilled placeholders in every message.
+        """
+        compiled = self.get(template_id)
+        if compiled is None:
+            raise ValueError(f"NotificationTemplate ID {template_id} not found.")
+        if context_keys is not None:
+            compiled.check_placeholders(context_keys)
+        return compiled.render_many(contexts, language)
+
+
+# Shared by the reminder jobs and the notification dispatcher
+template_renderer = TemplateRenderer()
+
+
+@event.listens_for(NotificationTemplate, 'after_update')
+@event.listens_for(NotificationTemplate, 'after_delete')
+def _evict_changed_template(mapper, connection, target):
+    template_renderer.invalidate(target.template_id)
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, Callable, Union
+from models.enums import GatewayType
+from models.webhook_dedup_key import WebhookDedupKey
+
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600 # Gateways stop retrying well within a week
+DEFAULT_BLOOM_CAPACITY = 200000 # Keys per filter generation before the error rate degrades
+DEFAULT_BLOOM_ERROR_RATE = 0.001
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over byte strings. `key in filter` is False for every key never
+    added and True for added keys (plus about `error_rate` of the others once `capacity`
+    keys were added). Positions come from one BLAKE2b digest by double hashing.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_BLOOM_CAPACITY, error_rate: float = DEFAULT_BLOOM_ERROR_RATE):
+        if capacity < 1 or not 0 < error_rate < 1:
+            raise ValueError("capacity must be at least 1 and error_rate between 0 and 1.")
+        self.size = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.hash_count = max(1, int(round(self.size / capacity * math.log(2))))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: bytes):
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, key: bytes) -> None:
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: bytes) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+def _json_body(payload) -> Dict[str, Any]:
+    try:
+        body = json.loads(payload)
+    except (ValueError, TypeError):
+        return {}
+    return body if isinstance(body, dict) else {}
+
+
+def _mpesa_event_id(payload, args) -> Optional[str]:
+    callback = _json_body(payload).get("Body", {})
+    return (callback.get("stkCallback") or {}).get("CheckoutRequestID") if isinstance(callback, dict) else None
+
+
+def _pesapal_event_id(payload, args) -> Optional[str]:
+    # IPNs carry the tracking id as query parameters (GET) or in the JSON body (POST)
+    body = _json_body(payload)
+    for name in ("OrderTrackingId", "PesapalTransactionTrackingId", "pesapal_transaction_tracking_id"):
+        value = args.get(name) or body.get(name)
+        if value:
+            return value
+    return None
+
+
+def _flutterwave_event_id(payload, args) -> Optional[str]:
+    data = _json_body(payload).get("data")
+    return data.get("id") if isinstance(data, dict) else None
+
+
+def _stripe_event_id(payload, args) -> Optional[str]:
+    return _json_body(payload).get("id") # evt_...
+
+
+# Where each gateway puts the id its retries repeat
+WEBHOOK_EVENT_ID_EXTRACTORS: Dict[GatewayType, Callable[[Any, Dict[str, Any]], Optional[str]]] = {
+    GatewayType.MPESA_STK_PUSH: _mpesa_event_id,
+    GatewayType.PESAPAL: _pesapal_event_id,
+    GatewayType.FLUTTERWAVE: _flutterwave_event_id,
+    GatewayType.STRIPE: _stripe_event_id,
+}
+
+
+def webhook_event_id(gateway: GatewayType, payload: Union[bytes, str], args: Optional[Dict[str, Any]] = None) -> str:
+    """The gateway's event id of a webhook delivery, or '' if it has none (its payload hash still identifies it)."""
+    extractor = WEBHOOK_EVENT_ID_EXTRACTORS.get(gateway)
+    event_id = extractor(payload, args or {}) if extractor else None
+    return str(event_id)[:255] if event_id is not None else ''
+
+
+class WebhookDeduplicator:
+    """
+    Recognises repeated webhook deliveries before any processing.
+
+    A key is (gateway, event id, SHA-256 of the raw body): a retry repeats all three, while
+    a new event about the same transaction (e.g. a later status) has a different body.
+    New keys are stored in `WebhookDedupKey` by the caller's transaction, so a delivery
+    that fails to be stored is not remembered either.
+
+    An in-process Bloom filter fronts the table. A key the filter has never seen costs one
+    INSERT; only keys it reports as seen are confirmed with a SELECT, so false positives
+    never reject a delivery. The filter is rotated every TTL (the previous generation is
+    still consulted), so it only holds keys that can still be duplicates. Keys stored by
+    other processes are caught by the unique constraint on INSERT.
+    """
+
+    def __init__(self, ttl_seconds: int = DEFAULT_TTL_SECONDS, bloom_capacity: int = DEFAULT_BLOOM_CAPACITY,
+                 bloom_error_rate: float = DEFAULT_BLOOM_ERROR_RATE):
+        self._lock = threading.Lock()
+        self.configure(ttl_seconds, bloom_capacity, bloom_error_rate)
+
+    def configure(self, ttl_seconds: int, bloom_capacity: int, bloom_error_rate: float) -> None:
+        with self._lock:
+            self.ttl_seconds = ttl_seconds
+            self.bloom_capacity = bloom_capacity
+            self.bloom_error_rate = bloom_error_rate
+            self._current = BloomFilter(bloom_capacity, bloom_error_rate)
+            self._previous = None
+            self._rotated_at = time.monotonic()
+        self.reset_metrics()
+
+    def init_app(self, app) -> None:
+        config = app.config
+        self.configure(config.get('WEBHOOK_DEDUP_TTL_SECONDS', DEFAULT_TTL_SECONDS),
+                       config.get('WEBHOOK_DEDUP_BLOOM_CAPACITY', DEFAULT_BLOOM_CAPACITY),
+                       config.get('WEBHOOK_DEDUP_BLOOM_ERROR_RATE', DEFAULT_BLOOM_ERROR_RATE))
+        app.extensions['webhook_deduplicator'] = self
+
+    def reset_metrics(self) -> None:
+        with self._lock:
+            self._metrics = {"deliveries": 0, "duplicates": 0, "bloom_hits": 0, "bloom_false_positives": 0, "db_lookups": 0}
+
+    def metrics(self) -> Dict[str, Any]:
+        """Deliveries checked, duplicates, Bloom filter hits and false positives, and their rates, since the app started."""
+        with self._lock:
+            counts = dict(self._metrics)
+        deliveries = counts["deliveries"]
+        return dict(
+            counts,
+            duplicate_rate=round(counts["duplicates"] / deliveries, 4) if deliveries else None,
+            bloom_hit_rate=round(counts["bloom_hits"] / deliveries, 4) if deliveries else None,
+            bloom_false_positive_rate=round(counts["bloom_false_positives"] / counts["bloom_hits"], 4) if counts["bloom_hits"] else None,
+        )
+
+    def _count(self, **amounts: int) -> None:
+        with self._lock:
+            for metric, amount in amounts.items():
+                self._metrics[metric] += amount
+
+    def _filter_contains(self, key: bytes) -> bool:
+        with self._lock:
+            if time.monotonic() - self._rotated_at >= self.ttl_seconds:
+                self._previous, self._current = self._current, BloomFilter(self.bloom_capacity, self.bloom_error_rate)
+                self._rotated_at = time.monotonic()
+            return key in self._current or (self._previous is not None and key in self._previous)
+
+    def _filter_add(self, key: bytes) -> None:
+        with self._lock:
+            self._current.add(key)
+
+    def is_duplicate(self, connection, gateway: GatewayType, payload: Union[bytes, str],
+                     event_id: Optional[str] = None, args: Optional[Dict[str, Any]] = None,
+                     now: Optional[datetime] = None) -> bool:
+        """
+        True if this delivery was accepted before (within the TTL). Otherwise records it on
+        `connection` and returns False; the caller commits the key with its own writes.
+
+        Args:
+            connection: Connection of the transaction that stores the delivery (e.g. `db.session.connection()`).
+            gateway (GatewayType): Gateway that sent the webhook.
+            payload (bytes | str): Raw request body, hashed as received.
+            event_id (Optional[str]): The gateway's event id. Extracted from the payload and `args` if not given.
+            args (Optional[Dict]): Query parameters of the delivery (Pesapal IPNs).
+        """
+        body = payload.encode('utf-8') if isinstance(payload, str) else payload
+        if event_id is None:
+            event_id = webhook_event_id(gateway, body, args)
+        payload_hash = hashlib.sha256(body).hexdigest()
+        key = f"{gateway.value}\x00{event_id}\x00{payload_hash}".encode('utf-8')
+        now = now or datetime.utcnow()
+        self._count(deliveries=1)
+
+        if self._filter_contains(key):
+            self._count(bloom_hits=1, db_lookups=1)
+            if WebhookDedupKey.exists(connection, gateway, event_id, payload_hash, now):
+                self._count(duplicates=1)
+                return True
+            self._count(bloom_false_positives=1)
+        recorded = WebhookDedupKey.record(connection, gateway, event_id, payload_hash, now, now + timedelta(seconds=self.ttl_seconds))
+        self._filter_add(key)
+        if not recorded:
+            self._count(duplicates=1)
+        return not recorded
+
+    def purge_expired(self, connection, now: Optional[datetime] = None, batch_size: int = 1000) -> int:
+        """Deletes the expired keys (see `WebhookDedupKey.purge_expired`). The caller commits."""
+        return WebhookDedupKey.purge_expired(connection, now=now, batch_size=batch_size)
+
+
+webhook_deduplicator = WebhookDeduplicator()
@@ -0,0 +1,45 @@
+"""add property_text_index full-text table
+
+Revision ID: b4d8f2a6c0e3
+Revises: a7c3e9f1b5d2
+Create Date: 2026-10-18 20:48:13.295507
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4d8f2a6c0e3'
+down_revision = 'a7c3e9f1b5d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Not autogenerated: the table is managed outside the ORM metadata (models.property_listing_index.PropertyTextIndex)
+    dialect_name = op.get_bind().dialect.name
+    if dialect_name == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS property_text_index USING fts5(description, amenities, tokenize='unicode61 remove_diacritics 2')")
+        op.execute(
+            "INSERT INTO property_text_index (rowid, description, amenities) "
+            "SELECT property_id, description, (SELECT group_concat(value, ', ') FROM json_each(properties.amenities)) FROM properties"
+        )
+    elif dialect_name == 'postgresql':
+        op.execute(
+            "CREATE TABLE IF NOT EXISTS property_text_index ("
+            "property_id INTEGER PRIMARY KEY REFERENCES properties (property_id), description TEXT, amenities TEXT, "
+            "document TSVECTOR GENERATED ALWAYS AS (setweight(to_tsvector('simple', coalesce(amenities, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(description, '')), 'B')) STORED)"
+        )
+        op.execute("CREATE INDEX IF NOT EXISTS ix_property_text_index_document ON property_text_index USING GIN (document)")
+        op.execute(
+            "INSERT INTO property_text_index (property_id, description, amenities) "
+            "SELECT property_id, description, (SELECT string_agg(value, ', ') FROM json_array_elements_text(properties.amenities::json) AS value) "
+            "FROM properties"
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name in ('sqlite', 'postgresql'):
+        op.execute("DROP TABLE IF EXISTS property_text_index")
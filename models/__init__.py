@@ -4,7 +4,9 @@
 
 from .user import User
 from .property import Property, PropertyType, PropertyStatus
+from .property_listing_index import PropertyListingIndex, PropertyAmenityTerm
 from .lease import Lease, LeaseStatusType, LeaseSigningStatus # Corrected import
+from .building import Building
 from .lease_template import LeaseTemplate
 from .lease_amendment import LeaseAmendment
 from .rental_application import RentalApplication, RentalApplicationStatus, ApplicationFeeStatus # Corrected import
@@ -37,8 +39,9 @@ from .enums import (
     PaymentMethod, PaymentStatus,
     MessageType, MessageStatus,
     NotificationChannel, NotificationType, NotificationStatus as NotificationState,
-    GatewayType, GatewayTransactionStatus, MpesaShortcodeType, GatewayEnvironment,
-    ReminderRuleEvent, ReminderRecipientType, ReminderTimeUnit,
+    GatewayType, GatewayTransactionStatus, CallbackInboxStatus, MpesaShortcodeType, GatewayEnvironment,
+    BankReviewReason, BankReviewStatus,
+    ReminderRuleEvent, ReminderRecipientType, ReminderTimeUnit, JobRunStatus,
     BankAccountType,
     DocumentType,
     AuditActionCategory, AuditActionStatus, # Added for AuditLog model
@@ -47,13 +50,19 @@ from .enums import (
 from .payment import Payment
 # GatewayTransaction now imports its enums from models.enums
 from .gateway_transaction import GatewayTransaction
+from .mpesa_callback_inbox import MpesaCallbackInbox
+from .webhook_dedup_key import WebhookDedupKey
+from .bank_statement_review_item import BankStatementReviewItem
 from .message import Message
 from .notification_template import NotificationTemplate
 from .notification import Notification
+from .notification_unread_counter import NotificationUnreadCounter
+from .push_event import PushEventRecord
 from .landlord_mpesa_config import LandlordMpesaConfig
 from .landlord_gateway_config import LandlordGatewayConfig
 from .landlord_reminder_rule import LandlordReminderRule
 from .notification_trigger_log import NotificationTriggerLog # Added for NotificationTriggerLog
+from .reminder_job_checkpoint import ReminderJobCheckpoint
 
 # It's also common to define db.Model base class here if you have a custom one,
 # or re-export db from hermitta_app if models need it directly without importing hermitta_app.
@@ -0,0 +1,47 @@
+from datetime import datetime
+from hermitta_app import db
+from .enums import BankReviewReason, BankReviewStatus
+
+
+class BankStatementReviewItem(db.Model):
+    """
+    Bank statement credits the statement reconciler could not apply to a payment on its own
+    (services.bank_reconciliation_service), kept for the landlord to resolve or dismiss.
+
+    `candidate_payment_ids` lists the open payments that fit the line when it was imported.
+    `bank_reference` also lets a re-imported statement skip lines that are already queued.
+    """
+    __tablename__ = 'bank_statement_review_items'
+    # The landlord's open items, oldest first
+    __table_args__ = (db.Index('ix_bank_statement_review_items_landlord_id_status', 'landlord_id', 'status'),)
+
+    review_id = db.Column(db.Integer, primary_key=True)
+    landlord_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False)
+    landlord_bank_account_id = db.Column(db.Integer, db.ForeignKey('landlord_bank_accounts.account_id'), nullable=True)
+
+    # The statement line as imported
+    line_number = db.Column(db.Integer, nullable=False)
+    value_date = db.Column(db.Date, nullable=False)
+    amount = db.Column(db.Numeric(12, 2), nullable=False)
+    narration = db.Column(db.Text, nullable=True)
+    bank_reference = db.Column(db.String(255), nullable=True, index=True)
+
+    reason = db.Column(db.Enum(BankReviewReason), nullable=False)
+    candidate_payment_ids = db.Column(db.JSON, nullable=True, default=lambda: [])
+    status = db.Column(db.Enum(BankReviewStatus), default=BankReviewStatus.OPEN, nullable=False)
+    resolved_payment_id = db.Column(db.Integer, db.ForeignKey('payments.payment_id'), nullable=True)
+    resolved_at = db.Column(db.DateTime, nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __init__(self, **kwargs):
+        if 'status' not in kwargs:
+            kwargs['status'] = BankReviewStatus.OPEN
+        if 'candidate_payment_ids' not in kwargs:
+            kwargs['candidate_payment_ids'] = []
+        if 'created_at' not in kwargs:
+            kwargs['created_at'] = datetime.utcnow()
+        super().__init__(**kwargs)
+
+    def __repr__(self):
+        return f"<BankStatementReviewItem {self.review_id} - {self.reason.value} {self.amount} Status: {self.status.value}>"
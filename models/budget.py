@@ -19,8 +19,8 @@ class Budget:
                  # Optional: Link to a specific property if budget is property-specific
                  property_id: Optional[int] = None, # FK to Property
                  notes: Optional[str] = None,
-                 created_at: datetime = datetime.utcnow(),
-                 updated_at: datetime = datetime.utcnow()):
+                 created_at: Optional[datetime] = None,
+                 updated_at: Optional[datetime] = None):
 
         self.budget_id = budget_id
         self.landlord_id = landlord_id
@@ -29,8 +29,8 @@ class Budget:
         self.period_end_date = period_end_date
         self.property_id = property_id # If null, applies to landlord's overall finances for the period
         self.notes = notes
-        self.created_at = created_at
-        self.updated_at = updated_at
+        self.created_at = created_at or datetime.utcnow()
+        self.updated_at = updated_at or self.created_at
         # Budget line items will be in a separate model: BudgetItem
 
 class BudgetItem:
@@ -0,0 +1,286 @@
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Any, Optional, Iterable
+from sqlalchemy import event, inspect, select, func, case
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from hermitta_app import db
+from .property import Property, PropertyStatus
+from .lease import Lease, LeaseStatusType
+from .property_listing_index import normalize_search_text
+from .notification_unread_counter import _previous_value
+
+# Counter of each unit status
+UNIT_STATUS_COUNTERS = {
+    PropertyStatus.VACANT: 'vacant_units',
+    PropertyStatus.OCCUPIED: 'occupied_units',
+    PropertyStatus.UNDER_MAINTENANCE: 'under_maintenance_units',
+}
+# Leases counted as in force: signed, not ended
+ACTIVE_LEASE_STATUSES = (LeaseStatusType.ACTIVE_PENDING_MOVE_IN, LeaseStatusType.ACTIVE)
+ROLLUP_COUNTERS = ('total_units', 'vacant_units', 'occupied_units', 'under_maintenance_units', 'total_rent',
+                   'active_leases', 'active_lease_rent')
+
+
+def building_name_of(building_name: Optional[str], address_line_1: Optional[str]) -> Optional[str]:
+    """Name of a unit's building: its building_name, or its street address for units outside a named building."""
+    return building_name if normalize_search_text(building_name) else address_line_1
+
+
+def unit_rollup(status, monthly_rent) -> Dict[str, Any]:
+    """Counters one unit adds to its building."""
+    rollup = {"total_units": 1, "total_rent": monthly_rent or Decimal('0')}
+    rollup[UNIT_STATUS_COUNTERS[status or PropertyStatus.VACANT]] = 1
+    return rollup
+
+
+def lease_rollup(status, rent_amount) -> Dict[str, Any]:
+    """Counters one lease adds to the building of its unit."""
+    if status not in ACTIVE_LEASE_STATUSES:
+        return {}
+    return {"active_leases": 1, "active_lease_rent": rent_amount or Decimal('0')}
+
+
+def add_rollup(deltas: Dict[int, Dict[str, Any]], building_id: Optional[int], rollup: Dict[str, Any], sign: int = 1) -> None:
+    """Adds (sign=1) or removes (sign=-1) `rollup` to the pending counter changes of a building."""
+    if building_id is None:
+        return
+    counters = deltas.setdefault(building_id, {})
+    for key, value in rollup.items():
+        counters[key] = counters.get(key, 0) + sign * value
+
+
+class Building(db.Model):
+    """
+    A landlord's building and the rollups of its units (Property rows): unit counts by
+    status, total asking rent, and the number and rent of leases in force, so portfolio
+    views read precomputed numbers instead of grouping every unit.
+
+    Units are grouped by landlord and normalized building name (building_name, else
+    address_line_1); the flush listeners below assign each unit its building, creating it
+    on first use, and apply the counter changes of ORM writes to units and leases in the
+    same transaction. Set-based writers call `resolve`/`adjust` themselves; `rebuild`
+    recomputes everything from the properties and leases tables.
+    """
+    __tablename__ = 'buildings'
+    __table_args__ = (
+        db.UniqueConstraint('landlord_id', 'name_key', name='uq_buildings_landlord_id_name_key'),
+    )
+
+    building_id = db.Column(db.Integer, primary_key=True)
+    landlord_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False)
+    name = db.Column(db.String(255), nullable=False)
+    name_key = db.Column(db.String(255), nullable=False) # normalize_search_text(name)
+    estate_neighborhood = db.Column(db.String(100), nullable=True) # Of the first unit
+    city = db.Column(db.String(100), nullable=True)
+    county = db.Column(db.String(100), nullable=True)
+
+    total_units = db.Column(db.Integer, default=0, nullable=False)
+    vacant_units = db.Column(db.Integer, default=0, nullable=False)
+    occupied_units = db.Column(db.Integer, default=0, nullable=False)
+    under_maintenance_units = db.Column(db.Integer, default=0, nullable=False)
+    total_rent = db.Column(db.Numeric(14, 2), default=0, nullable=False) # Sum of the units' monthly_rent
+    active_leases = db.Column(db.Integer, default=0, nullable=False)
+    active_lease_rent = db.Column(db.Numeric(14, 2), default=0, nullable=False) # Sum of the rent_amount of leases in force
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    landlord = db.relationship('User', backref=db.backref('buildings', lazy='dynamic'))
+
+    def __init__(self, **kwargs):
+        for counter in ROLLUP_COUNTERS:
+            kwargs.setdefault(counter, 0)
+        super().__init__(**kwargs)
+
+    def __repr__(self):
+        return f"<Building {self.building_id}: {self.name} ({self.occupied_units}/{self.total_units} occupied)>"
+
+    @classmethod
+    def resolve(cls, connection, landlord_id: int, name: Optional[str], unit=None) -> Optional[int]:
+        """building_id of the landlord's building called `name`, created (located like `unit`) if missing."""
+        name_key = normalize_search_text(name)
+        if landlord_id is None or name_key is None:
+            return None
+        table = cls.__table__
+        query = select(table.c.building_id).where(table.c.landlord_id == landlord_id, table.c.name_key == name_key)
+        building_id = connection.execute(query).scalar()
+        if building_id is not None:
+            return building_id
+        now = datetime.utcnow()
+        try:
+            with connection.begin_nested():
+                return connection.execute(table.insert().values(
+                    landlord_id=landlord_id, name=" ".join(name.split()), name_key=name_key,
+                    estate_neighborhood=getattr(unit, 'estate_neighborhood', None), city=getattr(unit, 'city', None),
+                    county=getattr(unit, 'county', None), created_at=now, updated_at=now
+                )).inserted_primary_key[0]
+        except IntegrityError:
+            # Created concurrently by another transaction
+            return connection.execute(query).scalar()
+
+    @classmethod
+    def adjust(cls, connection, deltas: Dict[int, Dict[str, Any]]) -> None:
+        """Adds `deltas` (building_id -> {counter: change}) to the counters, with atomic in-place updates."""
+        table = cls.__table__
+        now = datetime.utcnow()
+        for building_id, counters in deltas.items():
+            values = {key: table.c[key] + delta for key, delta in counters.items() if delta}
+            if values:
+                connection.execute(table.update().where(table.c.building_id == building_id).values(updated_at=now, **values))
+
+    @classmethod
+    def lease_deltas(cls, connection, leases: Iterable[Any], sign: int = 1) -> Dict[int, Dict[str, Any]]:
+        """Counter changes of adding (or removing) `leases` (objects or rows with property_id, status and rent_amount)."""
+        leases = [lease for lease in leases if lease.status in ACTIVE_LEASE_STATUSES]
+        deltas: Dict[int, Dict[str, Any]] = {}
+        if leases:
+            buildings = _buildings_of(connection, {lease.property_id for lease in leases})
+            for lease in leases:
+                add_rollup(deltas, buildings.get(lease.property_id), lease_rollup(lease.status, lease.rent_amount), sign)
+        return deltas
+
+    @classmethod
+    def rebuild(cls, landlord_id: Optional[int] = None) -> int:
+        """
+        Assigns buildings to the units without one and recomputes the counters (of one
+        landlord's buildings, or of all) from the properties and leases tables. Caller commits.
+        """
+        connection = db.session.connection()
+        unassigned = db.session.query(
+            Property.property_id, Property.landlord_id, Property.building_name, Property.address_line_1,
+            Property.estate_neighborhood, Property.city, Property.county
+        ).filter(Property.building_id.is_(None))
+        if landlord_id is not None:
+            unassigned = unassigned.filter(Property.landlord_id == landlord_id)
+        units_by_building = defaultdict(list)
+        for unit in unassigned.all():
+            building_id = cls.resolve(connection, unit.landlord_id, building_name_of(unit.building_name, unit.address_line_1), unit)
+            units_by_building[building_id].append(unit.property_id)
+        for building_id, property_ids in units_by_building.items():
+            db.session.query(Property).filter(Property.property_id.in_(property_ids)).update(
+                {Property.building_id: building_id}, synchronize_session=False
+            )
+
+        units = db.session.query(
+            Property.building_id, func.count(Property.property_id),
+            *[func.sum(case((Property.status == status, 1), else_=0)) for status in UNIT_STATUS_COUNTERS],
+            func.sum(Property.monthly_rent)
+        ).filter(Property.building_id.isnot(None)).group_by(Property.building_id)
+        leases = db.session.query(
+            Property.building_id, func.count(Lease.lease_id), func.sum(Lease.rent_amount)
+        ).join(Property, Property.property_id == Lease.property_id).filter(
+            Property.building_id.isnot(None), Lease.status.in_(ACTIVE_LEASE_STATUSES)
+        ).group_by(Property.building_id)
+        buildings = db.session.query(cls.building_id)
+        if landlord_id is not None:
+            units, leases = units.filter(Property.landlord_id == landlord_id), leases.filter(Property.landlord_id == landlord_id)
+            buildings = buildings.filter(cls.landlord_id == landlord_id)
+
+        counters = {building_id: dict.fromkeys(ROLLUP_COUNTERS, 0) for building_id, in buildings}
+        for building_id, total, *by_status, rent in units:
+            counters[building_id].update(zip(('total_units', *UNIT_STATUS_COUNTERS.values(), 'total_rent'), (total, *by_status, rent or 0)))
+        for building_id, count, rent in leases:
+            counters[building_id].update(active_leases=count, active_lease_rent=rent or 0)
+        now = datetime.utcnow()
+        db.session.bulk_update_mappings(cls, [dict(values, building_id=building_id, updated_at=now) for building_id, values in counters.items()])
+        return len(counters)
+
+
+def _buildings_of(connection, property_ids) -> Dict[int, Optional[int]]:
+    """property_id -> building_id of the units."""
+    property_ids = [property_id for property_id in property_ids if property_id is not None]
+    if not property_ids:
+        return {}
+    table = Property.__table__
+    return dict(connection.execute(select(table.c.property_id, table.c.building_id).where(table.c.property_id.in_(property_ids))).all())
+
+
+def _changed(instance, *keys) -> bool:
+    state = inspect(instance)
+    return any(state.attrs[key].history.has_changes() for key in keys)
+
+
+def _load_previous_value(target, value, oldvalue, initiator):
+    pass
+
+
+# The counters need the value a change replaces, also when the attribute was expired (e.g. after a commit)
+for _attribute in (Property.building_id, Property.status, Property.monthly_rent, Lease.property_id, Lease.status, Lease.rent_amount):
+    event.listen(_attribute, 'set', _load_previous_value, active_history=True)
+
+
+def _merge(deltas: Dict[int, Dict[str, Any]], other: Dict[int, Dict[str, Any]]) -> None:
+    for building_id, counters in other.items():
+        add_rollup(deltas, building_id, counters)
+
+
+@event.listens_for(Session, 'before_flush')
+def _assign_buildings(session, flush_context, instances):
+    """Puts new and renamed units in their building, and counts deleted units and leases while they can still be loaded."""
+    for unit in list(session.new) + list(session.dirty):
+        if isinstance(unit, Property) and (unit in session.new or _changed(unit, 'building_name', 'address_line_1', 'landlord_id')):
+            unit.building_id = Building.resolve(session.connection(), unit.landlord_id,
+                                                building_name_of(unit.building_name, unit.address_line_1), unit)
+    deltas: Dict[int, Dict[str, Any]] = {}
+    deleted_leases = [lease for lease in session.deleted if isinstance(lease, Lease)]
+    if deleted_leases:
+        _merge(deltas, Building.lease_deltas(session.connection(), deleted_leases, sign=-1))
+    for unit in session.deleted:
+        if isinstance(unit, Property):
+            add_rollup(deltas, unit.building_id, unit_rollup(unit.status, unit.monthly_rent), -1)
+    if deltas:
+        session.info['building_rollup_deltas'] = deltas
+
+
+@event.listens_for(Session, 'after_flush')
+def _count_building_rollups(session, flush_context):
+    """Turns ORM writes of units and leases into building counter changes, applied in the same transaction."""
+    deltas = session.info.pop('building_rollup_deltas', {})
+    connection = session.connection()
+    changed_leases = []  # (property_id, rollup, sign)
+    moved_units = {}  # property_id -> (old building_id, new building_id)
+    for instance in session.new:
+        if isinstance(instance, Property):
+            add_rollup(deltas, instance.building_id, unit_rollup(instance.status, instance.monthly_rent))
+        elif isinstance(instance, Lease):
+            changed_leases.append((instance.property_id, lease_rollup(instance.status, instance.rent_amount), 1))
+    for instance in session.dirty:
+        if isinstance(instance, Property) and _changed(instance, 'building_id', 'status', 'monthly_rent'):
+            state = inspect(instance)
+            old_building_id = _previous_value(state, 'building_id')
+            add_rollup(deltas, old_building_id, unit_rollup(_previous_value(state, 'status'), _previous_value(state, 'monthly_rent')), -1)
+            add_rollup(deltas, instance.building_id, unit_rollup(instance.status, instance.monthly_rent))
+            if old_building_id != instance.building_id:
+                moved_units[instance.property_id] = (old_building_id, instance.building_id)
+        elif isinstance(instance, Lease) and _changed(instance, 'property_id', 'status', 'rent_amount'):
+            state = inspect(instance)
+            changed_leases.append((_previous_value(state, 'property_id'),
+                                   lease_rollup(_previous_value(state, 'status'), _previous_value(state, 'rent_amount')), -1))
+            changed_leases.append((instance.property_id, lease_rollup(instance.status, instance.rent_amount), 1))
+    changed_leases = [(property_id, rollup, sign) for property_id, rollup, sign in changed_leases if rollup]
+
+    if moved_units:
+        # A unit that changed building takes its leases in force along: the old building loses those
+        # in force before this flush, the new one gains those in force after it
+        in_force = select(Lease.property_id, func.count(Lease.lease_id), func.sum(Lease.rent_amount)).where(
+            Lease.property_id.in_(list(moved_units)), Lease.status.in_(ACTIVE_LEASE_STATUSES)
+        ).group_by(Lease.property_id)
+        after = {property_id: {"active_leases": count, "active_lease_rent": rent or Decimal('0')}
+                 for property_id, count, rent in connection.execute(in_force).all()}
+        for property_id, (old_building_id, new_building_id) in moved_units.items():
+            before: Dict[int, Dict[str, Any]] = {}
+            add_rollup(before, property_id, after.get(property_id, {}))
+            for changed_property_id, rollup, sign in changed_leases:
+                if changed_property_id == property_id:
+                    add_rollup(before, property_id, rollup, -sign)
+            add_rollup(deltas, old_building_id, before.get(property_id, {}), -1)
+            add_rollup(deltas, new_building_id, after.get(property_id, {}))
+        changed_leases = [change for change in changed_leases if change[0] not in moved_units]
+    if changed_leases:
+        buildings = _buildings_of(connection, {property_id for property_id, _, _ in changed_leases})
+        for property_id, rollup, sign in changed_leases:
+            add_rollup(deltas, buildings.get(property_id), rollup, sign)
+    if any(any(counters.values()) for counters in deltas.values()):
+        Building.adjust(connection, deltas)
@@ -92,11 +92,13 @@ class NotificationType(enum.Enum):
     # System & Other
     SYSTEM_ALERT = "SYSTEM_ALERT" # General system alerts
     BROADCAST_ANNOUNCEMENT = "BROADCAST_ANNOUNCEMENT" # To groups of users
+    NOTIFICATION_DIGEST = "NOTIFICATION_DIGEST" # Several pending notifications of one recipient coalesced into one message
     OTHER = "OTHER" # Generic catch-all
 
 class NotificationStatus(enum.Enum):
     SCHEDULED = "SCHEDULED"             # Notification is scheduled for future sending
     PENDING = "PENDING"                 # Queued for immediate sending by the notification dispatcher (renamed from PENDING_SEND)
+    SENDING = "SENDING"                 # Claimed by a dispatcher worker that is handing it to the gateway
     SENT = "SENT"                       # Successfully dispatched to the gateway (e.g., email server, SMS provider) (renamed from SENT_SUCCESS)
     FAILED = "FAILED"                   # Failed to dispatch to the gateway (renamed from SENT_FAIL)
     DELIVERED = "DELIVERED"             # Gateway confirmed delivery to recipient's device/server (renamed from DELIVERY_CONFIRMED)
@@ -104,6 +106,7 @@ class NotificationStatus(enum.Enum):
     READ = "READ"                       # User has marked the notification as read (primarily for IN_APP)
     ARCHIVED = "ARCHIVED"               # User has archived the notification
     CANCELLED = "CANCELLED"             # Scheduled notification was cancelled before sending
+    DIGESTED = "DIGESTED"               # Not sent on its own; delivered as part of the digest in digest_id
     INVALID_ADDRESS = "INVALID_ADDRESS" # e.g. Email bounced, invalid phone for SMS
 
 class GatewayType(enum.Enum): # Centralized GatewayType
@@ -149,6 +152,11 @@ class ReminderTimeUnit(enum.Enum):
     WEEKS = "WEEKS"
     MONTHS = "MONTHS"
 
+class JobRunStatus(enum.Enum): # Progress of a resumable background job run
+    IN_PROGRESS = "IN_PROGRESS" # Run started; chunks are still being committed
+    COMPLETED = "COMPLETED"     # All chunks committed
+    FAILED = "FAILED"           # Run stopped on an error; re-running the same job_run_id resumes it
+
 class BankAccountType(enum.Enum):
     CHECKING = "CHECKING"
     SAVINGS = "SAVINGS"
@@ -187,6 +195,24 @@ class GatewayTransactionStatus(enum.Enum):
     REFUNDED = "REFUNDED"         # Transaction was successfully refunded via the gateway
     PARTIALLY_REFUNDED = "PARTIALLY_REFUNDED" # Transaction was partially refunded
 
+class CallbackInboxStatus(enum.Enum):
+    RECEIVED = "RECEIVED"     # Stored by the callback endpoint, waiting for a worker
+    PROCESSING = "PROCESSING" # Claimed by a worker batch
+    PROCESSED = "PROCESSED"   # Applied to its gateway transaction and payment (or was a duplicate of an applied callback)
+    UNMATCHED = "UNMATCHED"   # No gateway transaction has the callback's checkout request ID
+    FAILED = "FAILED"         # Malformed payload, or processing failed on every attempt
+
+class BankReviewReason(enum.Enum):
+    AMBIGUOUS = "AMBIGUOUS"             # Several open payments fit the statement line
+    AMOUNT_MISMATCH = "AMOUNT_MISMATCH" # The reference code matches, the amount does not
+    ALREADY_MATCHED = "ALREADY_MATCHED" # The matching payment was settled by an earlier line of the statement
+    NO_MATCH = "NO_MATCH"               # No open payment fits the statement line
+
+class BankReviewStatus(enum.Enum):
+    OPEN = "OPEN"           # Waiting for the landlord
+    RESOLVED = "RESOLVED"   # Applied to a payment by the landlord
+    DISMISSED = "DISMISSED" # Not a rent payment, or handled elsewhere
+
 
 # It's good practice to also have general status enums if they are used across multiple models
 class GeneralStatus(enum.Enum):
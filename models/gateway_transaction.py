@@ -17,6 +17,8 @@ from .enums import GatewayType, GatewayTransactionStatus # Import centralized en
 
 class GatewayTransaction(db.Model):
     __tablename__ = 'gateway_transactions'
+    # Reconciliation queue: PENDING transactions whose next status check is due (hermitta_app.jobs.gateway_jobs)
+    __table_args__ = (db.Index('ix_gateway_transactions_status_next_status_check_at', 'status', 'next_status_check_at'),)
 
     transaction_id = db.Column(db.Integer, primary_key=True)
     # ForeignKey to payments.payment_id
@@ -49,6 +51,13 @@ class GatewayTransaction(db.Model):
 
     notes = db.Column(db.Text, nullable=True) # Internal notes regarding this gateway transaction
 
+    # Status queries by the reconciliation worker. While a worker holds the transaction, next_status_check_at is
+    # its claim's expiry, so a transaction abandoned by a crashed worker becomes due again on its own.
+    next_status_check_at = db.Column(db.DateTime, nullable=True) # Unset: due as soon as the callback grace period has passed
+    status_check_claimed_by = db.Column(db.String(100), nullable=True, index=True) # Claim token of the worker batch
+    status_check_attempts = db.Column(db.Integer, default=0, nullable=False)
+    last_status_check_at = db.Column(db.DateTime, nullable=True)
+
     initiated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False) # When this gateway transaction was initiated
     last_updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False) # When this record was last updated
 
@@ -64,6 +73,8 @@ class GatewayTransaction(db.Model):
         # Explicitly set defaults if not provided
         if 'status' not in kwargs:
             kwargs['status'] = GatewayTransactionStatus.PENDING
+        if 'status_check_attempts' not in kwargs:
+            kwargs['status_check_attempts'] = 0
         if 'initiated_at' not in kwargs:
             kwargs['initiated_at'] = datetime.utcnow()
         if 'last_updated_at' not in kwargs:
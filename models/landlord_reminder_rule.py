@@ -40,6 +40,10 @@ class LandlordReminderRule(db.Model):
 
     is_active = db.Column(db.Boolean, default=True, nullable=False, index=True)
 
+    # Last run date fully processed for this rule by the scheduled reminders sweep.
+    # The next sweep catches up on every day after it, so a missed run does not lose reminders.
+    last_run_date = db.Column(db.Date, nullable=True)
+
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
@@ -31,14 +31,20 @@ class LeaseStatusType(enum.Enum):
 
 class Lease(db.Model):
     __tablename__ = 'leases'
+    # Keyset pagination of the lease lists (services.lease_service): filter column, then (start_date, lease_id)
+    __table_args__ = (
+        db.Index('ix_leases_property_start_date', 'property_id', 'start_date', 'lease_id'),
+        db.Index('ix_leases_landlord_start_date', 'landlord_id', 'start_date', 'lease_id'),
+        db.Index('ix_leases_tenant_start_date', 'tenant_id', 'start_date', 'lease_id'),
+    )
 
     lease_id = db.Column(db.Integer, primary_key=True)
     property_id = db.Column(db.Integer, db.ForeignKey('properties.property_id'), nullable=False, index=True)
     landlord_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False, index=True) # Landlord who owns the lease
     tenant_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=True, index=True) # Tenant associated
 
-    start_date = db.Column(db.Date, nullable=False)
-    end_date = db.Column(db.Date, nullable=False)
+    start_date = db.Column(db.Date, nullable=False, index=True)
+    end_date = db.Column(db.Date, nullable=False, index=True)
     rent_amount = db.Column(db.Numeric(10, 2), nullable=False) # Assuming max 9,999,999.99
     rent_due_day = db.Column(db.Integer, nullable=False) # Day of the month rent is due
     move_in_date = db.Column(db.Date, nullable=False)
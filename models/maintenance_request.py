@@ -67,7 +67,7 @@ class MaintenanceRequest(db.Model):
     assigned_vendor_name_manual = db.Column(db.String(100), nullable=True) # If vendor not a system user
 
     vendor_assigned_at = db.Column(db.DateTime, nullable=True) # Date primary vendor was assigned
-    scheduled_date = db.Column(db.Date, nullable=True) # Overall scheduled date
+    scheduled_date = db.Column(db.Date, nullable=True, index=True) # Overall scheduled date
 
     resolution_notes = db.Column(db.Text, nullable=True)
     actual_cost = db.Column(db.Numeric(10, 2), nullable=True)
@@ -0,0 +1,55 @@
+from datetime import datetime
+from typing import Optional
+from hermitta_app import db
+from .enums import CallbackInboxStatus
+
+
+class MpesaCallbackInbox(db.Model):
+    """
+    Raw M-Pesa STK callbacks, appended by the callback endpoint exactly as received.
+
+    The endpoint only inserts the body and acknowledges, so its latency does not depend on
+    how busy the payments tables are. Workers (hermitta_app.jobs.mpesa_jobs) claim the
+    RECEIVED rows in batches and apply them; `raw_body` is never modified afterwards, only
+    the processing columns are.
+    """
+    __tablename__ = 'mpesa_callback_inbox'
+    # Workers claim the oldest RECEIVED rows first
+    __table_args__ = (db.Index('ix_mpesa_callback_inbox_status_inbox_id', 'status', 'inbox_id'),)
+
+    inbox_id = db.Column(db.Integer, primary_key=True)
+    raw_body = db.Column(db.Text, nullable=False) # Request body as received, parsed by the worker
+    remote_addr = db.Column(db.String(64), nullable=True)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    status = db.Column(db.Enum(CallbackInboxStatus), default=CallbackInboxStatus.RECEIVED, nullable=False)
+    # Set by the worker once parsed, for tracing a payment's callbacks
+    checkout_request_id = db.Column(db.String(255), nullable=True, index=True)
+    # Set when a worker claims the row (status PROCESSING); claims older than the worker's claim timeout are claimed again
+    claimed_by = db.Column(db.String(100), nullable=True, index=True)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    processed_at = db.Column(db.DateTime, nullable=True)
+    error_message = db.Column(db.Text, nullable=True)
+
+    def __init__(self, **kwargs):
+        if 'status' not in kwargs:
+            kwargs['status'] = CallbackInboxStatus.RECEIVED
+        if 'attempts' not in kwargs:
+            kwargs['attempts'] = 0
+        if 'received_at' not in kwargs:
+            kwargs['received_at'] = datetime.utcnow()
+        super().__init__(**kwargs)
+
+    def __repr__(self):
+        return f"<MpesaCallbackInbox {self.inbox_id} - Status: {self.status.value}>"
+
+    @classmethod
+    def append(cls, connection, raw_body: str, remote_addr: Optional[str] = None) -> int:
+        """Stores a callback with a single Core INSERT (no ORM unit of work) and returns its inbox_id."""
+        table = cls.__table__
+        result = connection.execute(table.insert().values(
+            raw_body=raw_body, remote_addr=remote_addr, received_at=datetime.utcnow(),
+            status=CallbackInboxStatus.RECEIVED, attempts=0
+        ))
+        return result.inserted_primary_key[0]
@@ -10,6 +10,8 @@ from .maintenance_request import MaintenanceRequest
 
 class Notification(db.Model):
     __tablename__ = 'notifications'
+    # Serves the inbox's keyset pagination: a user's IN_APP notifications ordered by (created_at, notification_id)
+    __table_args__ = (db.Index('ix_notifications_user_inbox', 'user_id', 'channel', 'created_at', 'notification_id'),)
 
     notification_id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False, index=True) # Recipient User ID
@@ -28,6 +30,10 @@ class Notification(db.Model):
     status = db.Column(db.Enum(NotificationStatus), default=NotificationStatus.PENDING, nullable=False, index=True)
 
     scheduled_send_time = db.Column(db.DateTime, nullable=True, index=True) # For prescheduled notifications
+    # Set when a dispatcher worker claims the notification (status SENDING). Claims older than the
+    # dispatcher's claim timeout are considered abandoned and can be claimed again.
+    claimed_by = db.Column(db.String(100), nullable=True, index=True) # Claim token of the worker batch
+    claimed_at = db.Column(db.DateTime, nullable=True)
     sent_at = db.Column(db.DateTime, nullable=True) # Actual time it was dispatched
     delivered_at = db.Column(db.DateTime, nullable=True) # Actual time delivery was confirmed by gateway (if applicable)
     read_at = db.Column(db.DateTime, nullable=True, index=True) # For IN_APP notifications primarily
@@ -40,6 +46,9 @@ class Notification(db.Model):
     maintenance_request_id = db.Column(db.Integer, db.ForeignKey('maintenance_requests.request_id'), nullable=True, index=True)
     document_id = db.Column(db.Integer, db.ForeignKey('documents.document_id'), nullable=True, index=True)
 
+    # Set on notifications coalesced into a digest (status DIGESTED); points at the digest notification that was sent instead
+    digest_id = db.Column(db.Integer, db.ForeignKey('notifications.notification_id'), nullable=True, index=True)
+
     # More generic way to link to any related entity if the above are not sufficient
     related_entity_type = db.Column(db.String(100), nullable=True) # e.g., 'PROPERTY', 'RENTAL_APPLICATION'
     related_entity_id = db.Column(db.Integer, nullable=True)   # ID of the related entity
@@ -61,6 +70,7 @@ class Notification(db.Model):
     message = db.relationship('Message', backref=db.backref('notifications', lazy='dynamic')) # e.g. a "new message" notification
     maintenance_request = db.relationship('MaintenanceRequest', backref=db.backref('notifications', lazy='dynamic'))
     document = db.relationship('Document', backref=db.backref('notifications', lazy='dynamic'))
+    digest = db.relationship('Notification', remote_side=[notification_id], backref=db.backref('digested_notifications', lazy='dynamic'))
     # reminder_rule = db.relationship('LandlordReminderRule', backref='triggered_notifications') # Future
 
     def __repr__(self):
@@ -9,9 +9,13 @@ class NotificationTriggerLog(db.Model):
     # Foreign key to the rule that triggered this notification
     rule_id = db.Column(db.Integer, db.ForeignKey('landlord_reminder_rules.rule_id'), nullable=False, index=True)
 
-    # Foreign key to the lease this notification pertains to (for lease-related rules)
-    lease_id = db.Column(db.Integer, db.ForeignKey('leases.lease_id'), nullable=False, index=True)
-    # Could be generalized with target_entity_type/id if rules apply to more than leases
+    # The record whose date triggered the rule, e.g. ('LEASE', 12), ('PAYMENT', 40), ('DOCUMENT', 7)
+    target_entity_type = db.Column(db.String(50), nullable=False, index=True)
+    target_entity_id = db.Column(db.Integer, nullable=False, index=True)
+
+    # Foreign key to the lease this notification pertains to, when there is one
+    # (the lease itself for lease events, the payment's lease for rent due dates, ...)
+    lease_id = db.Column(db.Integer, db.ForeignKey('leases.lease_id'), nullable=True, index=True)
 
     # The specific date of the event instance this log entry is for
     # (e.g., if a lease has end_date 2024-12-31, this would be 2024-12-31)
@@ -30,8 +34,8 @@ class NotificationTriggerLog(db.Model):
     lease = db.relationship('Lease', backref=db.backref('reminder_trigger_logs', lazy='dynamic'))
     notification = db.relationship('Notification', backref=db.backref('trigger_log', uselist=False, lazy='joined')) # One-to-one
 
-    # Unique constraint to prevent processing the same rule for the same lease and same event date multiple times
-    __table_args__ = (db.UniqueConstraint('rule_id', 'lease_id', 'target_event_date', name='_rule_lease_event_uc'),)
+    # Unique constraint to prevent processing the same rule for the same entity and same event date multiple times
+    __table_args__ = (db.UniqueConstraint('rule_id', 'target_entity_type', 'target_entity_id', 'target_event_date', name='_rule_entity_event_uc'),)
 
     def __repr__(self):
-        return f"<NotificationTriggerLog {self.log_id} - Rule: {self.rule_id}, Lease: {self.lease_id}, EventDate: {self.target_event_date}, Notification: {self.notification_id}>"
+        return f"<NotificationTriggerLog {self.log_id} - Rule: {self.rule_id}, Target: {self.target_entity_type} {self.target_entity_id}, EventDate: {self.target_event_date}, Notification: {self.notification_id}>"
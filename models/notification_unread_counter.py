@@ -0,0 +1,126 @@
+from datetime import datetime
+from typing import Dict
+from sqlalchemy import event, case, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from hermitta_app import db
+from .enums import NotificationChannel, NotificationStatus
+from .notification import Notification
+
+# Statuses of IN_APP notifications that have reached the user's inbox but were not read yet
+UNREAD_INBOX_STATUSES = (NotificationStatus.SENT, NotificationStatus.DELIVERED)
+
+
+class NotificationUnreadCounter(db.Model):
+    """
+    Number of unread IN_APP notifications in each user's inbox, so the badge poll is a
+    primary key lookup instead of a COUNT(*) over notifications.
+
+    Kept up to date incrementally: ORM inserts, updates and deletes of notifications are
+    counted by the flush listener below, and set-based writers (the dispatcher's bulk
+    update, mark-all-read) call `adjust`/`reset` in the same transaction. `rebuild`
+    recomputes the counters from the notifications table.
+    """
+    __tablename__ = 'notification_unread_counters'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), primary_key=True)
+    unread_count = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    def __init__(self, **kwargs):
+        if 'unread_count' not in kwargs:
+            kwargs['unread_count'] = 0
+        super().__init__(**kwargs)
+
+    def __repr__(self):
+        return f"<NotificationUnreadCounter User {self.user_id}: {self.unread_count}>"
+
+    @classmethod
+    def adjust(cls, connection, deltas: Dict[int, int]) -> None:
+        """Adds `deltas` (user_id -> change) to the counters, creating missing ones. Counters never go below 0."""
+        table = cls.__table__
+        now = datetime.utcnow()
+        for user_id, delta in deltas.items():
+            if not delta:
+                continue
+            new_count = table.c.unread_count + delta
+            update = table.update().where(table.c.user_id == user_id).values(
+                unread_count=case((new_count < 0, 0), else_=new_count), updated_at=now
+            )
+            if connection.execute(update).rowcount:
+                continue
+            try:
+                with connection.begin_nested():
+                    connection.execute(table.insert().values(user_id=user_id, unread_count=max(delta, 0), updated_at=now))
+            except IntegrityError:
+                # Created concurrently by another transaction
+                connection.execute(update)
+
+    @classmethod
+    def reset(cls, connection, user_id: int) -> None:
+        """Sets the user's counter to 0 (after all of their notifications were marked read)."""
+        table = cls.__table__
+        connection.execute(table.update().where(table.c.user_id == user_id).values(unread_count=0, updated_at=datetime.utcnow()))
+
+    @classmethod
+    def rebuild(cls, user_ids=None) -> int:
+        """Recomputes the counters (of `user_ids`, or of every user) from the notifications table. Caller commits."""
+        counts = db.session.query(Notification.user_id, db.func.count(Notification.notification_id)).filter(
+            Notification.channel == NotificationChannel.IN_APP,
+            Notification.status.in_(UNREAD_INBOX_STATUSES),
+            Notification.read_at.is_(None)
+        ).group_by(Notification.user_id)
+        existing = cls.query
+        if user_ids is not None:
+            user_ids = list(user_ids)
+            counts = counts.filter(Notification.user_id.in_(user_ids))
+            existing = existing.filter(cls.user_id.in_(user_ids))
+        counts = dict(counts.all())
+        existing.update({cls.unread_count: 0}, synchronize_session=False)
+        now = datetime.utcnow()
+        known = {row.user_id for row in db.session.query(cls.user_id).filter(cls.user_id.in_(list(counts)))} if counts else set()
+        db.session.bulk_update_mappings(cls, [{"user_id": user_id, "unread_count": count, "updated_at": now} for user_id, count in counts.items() if user_id in known])
+        db.session.bulk_insert_mappings(cls, [{"user_id": user_id, "unread_count": count, "updated_at": now} for user_id, count in counts.items() if user_id not in known])
+        return len(counts)
+
+
+def _is_unread(channel, status, read_at) -> bool:
+    return channel == NotificationChannel.IN_APP and status in UNREAD_INBOX_STATUSES and read_at is None
+
+
+def _previous_value(state, key):
+    history = state.attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    return state.attrs[key].value
+
+
+@event.listens_for(Session, 'before_flush')
+def _count_deleted_notifications(session, flush_context, instances):
+    # Deleted rows are inspected before the flush, while their (possibly expired) columns can still be loaded
+    deltas = {}
+    for notification in session.deleted:
+        if isinstance(notification, Notification) and _is_unread(notification.channel, notification.status, notification.read_at):
+            deltas[notification.user_id] = deltas.get(notification.user_id, 0) - 1
+    if deltas:
+        session.info['unread_counter_deltas'] = deltas
+
+
+@event.listens_for(Session, 'after_flush')
+def _count_unread_notifications(session, flush_context):
+    """Turns ORM writes of notifications into counter deltas, applied in the same transaction."""
+    deltas = session.info.pop('unread_counter_deltas', {})
+    for notification in session.new:
+        if isinstance(notification, Notification) and _is_unread(notification.channel, notification.status, notification.read_at):
+            deltas[notification.user_id] = deltas.get(notification.user_id, 0) + 1
+    for notification in session.dirty:
+        if not isinstance(notification, Notification):
+            continue
+        state = inspect(notification)
+        was_unread = _is_unread(_previous_value(state, 'channel'), _previous_value(state, 'status'), _previous_value(state, 'read_at'))
+        is_unread = _is_unread(notification.channel, notification.status, notification.read_at)
+        if was_unread != is_unread:
+            user_id = _previous_value(state, 'user_id') if was_unread else notification.user_id
+            deltas[user_id] = deltas.get(user_id, 0) + (1 if is_unread else -1)
+    if any(deltas.values()):
+        NotificationUnreadCounter.adjust(session.connection(), deltas)
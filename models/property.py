@@ -22,9 +22,16 @@ class PropertyStatus(enum.Enum):
 
 class Property(db.Model):
     __tablename__ = 'properties'
+    __table_args__ = (
+        # Keyset pagination of a landlord's properties (services.property_service), newest first
+        db.Index('ix_properties_landlord_created_at', 'landlord_id', 'created_at', 'property_id'),
+        # Collection ETag of a landlord's properties: count and max(updated_at)
+        db.Index('ix_properties_landlord_updated_at', 'landlord_id', 'updated_at'),
+    )
 
     property_id = db.Column(db.Integer, primary_key=True)
     landlord_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False, index=True)
+    building_id = db.Column(db.Integer, db.ForeignKey('buildings.building_id'), nullable=True, index=True) # Assigned on flush (models.building)
 
     address_line_1 = db.Column(db.String(255), nullable=False) # Street or building name
     city = db.Column(db.String(100), nullable=False, index=True)
@@ -44,6 +51,7 @@ class Property(db.Model):
     postal_code = db.Column(db.String(20), nullable=True)
 
     size_sqft = db.Column(db.Integer, nullable=True)
+    monthly_rent = db.Column(db.Numeric(10, 2), nullable=True) # Asking rent of the listing (KES); leases carry the agreed rent
     amenities = db.Column(db.JSON, nullable=True) # List of strings
     photos_urls = db.Column(db.JSON, nullable=True) # List of URLs
     main_photo_url = db.Column(db.String(512), nullable=True)
@@ -59,6 +67,7 @@ class Property(db.Model):
 
     # Relationship to User (Landlord)
     landlord = db.relationship('User', backref=db.backref('properties', lazy=True))
+    building = db.relationship('Building', backref=db.backref('units', lazy='dynamic'))
 
     # Relationship to Leases
     # leases = db.relationship('Lease', backref='property', lazy='dynamic', foreign_keys='Lease.property_id')
@@ -0,0 +1,350 @@
+import html
+import math
+import re
+from typing import Optional, Dict, Any, List, Tuple
+from sqlalchemy import event, func, literal_column, table, column, Integer, Text
+from hermitta_app import db
+from .property import Property, PropertyType, PropertyStatus
+
+
+def normalize_search_text(value: Optional[str]) -> Optional[str]:
+    """Lowercases and collapses whitespace, so 'Kilimani  ' and 'kilimani' are the same search key."""
+    if value is None:
+        return None
+    normalized = " ".join(str(value).lower().split())
+    return normalized or None
+
+
+def normalize_amenities(amenities) -> List[str]:
+    """Distinct normalized amenity terms of a Property.amenities list."""
+    terms = []
+    for amenity in amenities or []:
+        term = normalize_search_text(amenity) if isinstance(amenity, str) else None
+        if term and term not in terms:
+            terms.append(term[:100])
+    return terms
+
+
+# Spatial index: the map is cut into GEO_CELLS_PER_DEGREE x GEO_CELLS_PER_DEGREE cells per square degree
+# (0.01 degrees is about 1.1 km), numbered row by row so the cells of one row of a bounding box are one
+# contiguous range of geo_cell values that a B-tree index can scan.
+GEO_CELLS_PER_DEGREE = 100
+GEO_CELL_ROW_WIDTH = 360 * GEO_CELLS_PER_DEGREE + 1
+EARTH_RADIUS_KM = 6371.0088
+
+
+def _cell_row(latitude: float) -> int:
+    return math.floor(latitude * GEO_CELLS_PER_DEGREE) + 90 * GEO_CELLS_PER_DEGREE
+
+
+def _cell_column(longitude: float) -> int:
+    return math.floor(longitude * GEO_CELLS_PER_DEGREE) + 180 * GEO_CELLS_PER_DEGREE
+
+
+def geo_cell(latitude: Optional[float], longitude: Optional[float]) -> Optional[int]:
+    """Grid cell number of a point, or None when the point is unknown."""
+    if latitude is None or longitude is None:
+        return None
+    return _cell_row(latitude) * GEO_CELL_ROW_WIDTH + _cell_column(longitude)
+
+
+def geo_cell_ranges(south: float, west: float, north: float, east: float) -> List[Tuple[int, int]]:
+    """(first, last) geo_cell ranges covering a bounding box: one range per row of cells."""
+    first_column, last_column = _cell_column(west), _cell_column(east)
+    return [
+        (row * GEO_CELL_ROW_WIDTH + first_column, row * GEO_CELL_ROW_WIDTH + last_column)
+        for row in range(_cell_row(south), _cell_row(north) + 1)
+    ]
+
+
+def bounding_box(latitude: float, longitude: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """(south, west, north, east) of the box around a circle, clamped to valid coordinates."""
+    latitude_delta = math.degrees(radius_km / EARTH_RADIUS_KM)
+    longitude_delta = latitude_delta / max(math.cos(math.radians(latitude)), 1e-6)
+    return (max(latitude - latitude_delta, -90.0), max(longitude - longitude_delta, -180.0),
+            min(latitude + latitude_delta, 90.0), min(longitude + longitude_delta, 180.0))
+
+
+def haversine_km(latitude_1: float, longitude_1: float, latitude_2: float, longitude_2: float) -> float:
+    """Great-circle distance between two points, in km."""
+    phi_1, phi_2 = math.radians(latitude_1), math.radians(latitude_2)
+    a = (math.sin((phi_2 - phi_1) / 2) ** 2
+         + math.cos(phi_1) * math.cos(phi_2) * math.sin(math.radians(longitude_2 - longitude_1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class PropertyListingIndex(db.Model):
+    """
+    Search document of a property for the public listing search: the filterable and
+    sortable fields, normalized, with composite indexes matching the search filters.
+    One row per property, rewritten by the mapper listeners below whenever the property
+    is inserted or updated through the ORM. `rebuild` recreates it from the properties table.
+    """
+    __tablename__ = 'property_listing_index'
+
+    property_id = db.Column(db.Integer, db.ForeignKey('properties.property_id'), primary_key=True)
+    status = db.Column(db.Enum(PropertyStatus), nullable=False)
+    property_type = db.Column(db.Enum(PropertyType), nullable=False)
+    city = db.Column(db.String(100), nullable=True) # normalize_search_text(Property.city)
+    county = db.Column(db.String(100), nullable=True)
+    estate = db.Column(db.String(100), nullable=True) # Property.estate_neighborhood
+    building = db.Column(db.String(100), nullable=True) # Property.building_name
+    num_bedrooms = db.Column(db.Integer, nullable=False, default=0)
+    monthly_rent = db.Column(db.Numeric(10, 2), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False) # Property.created_at, for "newest" sorting
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
+    geo_cell = db.Column(db.Integer, nullable=True) # geo_cell(latitude, longitude)
+
+    __table_args__ = (
+        db.Index('ix_property_listing_index_location', 'status', 'county', 'city'),
+        db.Index('ix_property_listing_index_estate', 'status', 'estate'),
+        db.Index('ix_property_listing_index_building', 'status', 'building'),
+        db.Index('ix_property_listing_index_rent', 'status', 'monthly_rent'),
+        db.Index('ix_property_listing_index_bedrooms', 'status', 'num_bedrooms'),
+        db.Index('ix_property_listing_index_created_at', 'status', 'created_at'),
+        db.Index('ix_property_listing_index_geo_cell', 'status', 'geo_cell'),
+    )
+
+    def __repr__(self):
+        return f"<PropertyListingIndex Property {self.property_id}: {self.city}, {self.county}>"
+
+    @staticmethod
+    def document(property_obj) -> Dict[str, Any]:
+        """Index row of a property (a Property or a row with the same attributes)."""
+        return {
+            "property_id": property_obj.property_id,
+            "status": property_obj.status or PropertyStatus.VACANT,
+            "property_type": property_obj.property_type,
+            "city": normalize_search_text(property_obj.city),
+            "county": normalize_search_text(property_obj.county),
+            "estate": normalize_search_text(property_obj.estate_neighborhood),
+            "building": normalize_search_text(property_obj.building_name),
+            "num_bedrooms": property_obj.num_bedrooms or 0,
+            "monthly_rent": property_obj.monthly_rent,
+            "created_at": property_obj.created_at,
+            "latitude": property_obj.latitude,
+            "longitude": property_obj.longitude,
+            "geo_cell": geo_cell(property_obj.latitude, property_obj.longitude),
+        }
+
+    @classmethod
+    def write(cls, connection, properties) -> None:
+        """(Re)writes the index rows and amenity terms of `properties`."""
+        properties = list(properties)
+        if not properties:
+            return
+        property_ids = [property_obj.property_id for property_obj in properties]
+        connection.execute(PropertyAmenityTerm.__table__.delete().where(PropertyAmenityTerm.property_id.in_(property_ids)))
+        connection.execute(cls.__table__.delete().where(cls.property_id.in_(property_ids)))
+        connection.execute(cls.__table__.insert(), [cls.document(property_obj) for property_obj in properties])
+        terms = [
+            {"term": term, "property_id": property_obj.property_id}
+            for property_obj in properties for term in normalize_amenities(property_obj.amenities)
+        ]
+        if terms:
+            connection.execute(PropertyAmenityTerm.__table__.insert(), terms)
+        PropertyTextIndex.write(connection, properties)
+
+    @classmethod
+    def remove(cls, connection, property_ids) -> None:
+        property_ids = list(property_ids)
+        connection.execute(PropertyAmenityTerm.__table__.delete().where(PropertyAmenityTerm.property_id.in_(property_ids)))
+        connection.execute(cls.__table__.delete().where(cls.property_id.in_(property_ids)))
+        PropertyTextIndex.remove(connection, property_ids)
+
+    @classmethod
+    def rebuild(cls, batch_size: int = 1000) -> int:
+        """Recreates the whole index from the properties table, `batch_size` properties per statement. Caller commits."""
+        connection = db.session.connection()
+        connection.execute(PropertyAmenityTerm.__table__.delete())
+        connection.execute(cls.__table__.delete())
+        PropertyTextIndex.clear(connection)
+        indexed, last_id = 0, 0
+        while True:
+            batch = Property.query.filter(Property.property_id > last_id).order_by(Property.property_id).limit(batch_size).all()
+            if not batch:
+                return indexed
+            cls.write(connection, batch)
+            indexed += len(batch)
+            last_id = batch[-1].property_id
+            db.session.expunge_all()
+
+
+class PropertyAmenityTerm(db.Model):
+    """Inverted index of Property.amenities: one row per (normalized amenity, property)."""
+    __tablename__ = 'property_amenity_terms'
+
+    term = db.Column(db.String(100), primary_key=True)
+    property_id = db.Column(db.Integer, db.ForeignKey('properties.property_id'), primary_key=True, index=True)
+
+    def __repr__(self):
+        return f"<PropertyAmenityTerm '{self.term}' Property {self.property_id}>"
+
+
+TEXT_INDEX_TABLE = 'property_text_index'
+# SQLite: FTS5 table whose rowid is the property_id. PostgreSQL: tsvector column with a GIN index.
+_sqlite_text_index = table(TEXT_INDEX_TABLE, column('rowid', Integer), column('description', Text), column('amenities', Text))
+_postgresql_text_index = table(TEXT_INDEX_TABLE, column('property_id', Integer), column('description', Text),
+                               column('amenities', Text), column('document'))
+SQLITE_TEXT_INDEX_DDL = f"CREATE VIRTUAL TABLE IF NOT EXISTS {TEXT_INDEX_TABLE} USING fts5(description, amenities, tokenize='unicode61 remove_diacritics 2')"
+POSTGRESQL_TEXT_INDEX_DDL = (
+    f"CREATE TABLE IF NOT EXISTS {TEXT_INDEX_TABLE} ("
+    "property_id INTEGER PRIMARY KEY REFERENCES properties (property_id), description TEXT, amenities TEXT, "
+    "document TSVECTOR GENERATED ALWAYS AS (setweight(to_tsvector('simple', coalesce(amenities, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'B')) STORED)",
+    f"CREATE INDEX IF NOT EXISTS ix_{TEXT_INDEX_TABLE}_document ON {TEXT_INDEX_TABLE} USING GIN (document)",
+)
+HIGHLIGHT_START, HIGHLIGHT_END = '<mark>', '</mark>'
+# The database marks matches with these private-use characters; the snippet is then HTML-escaped
+# (descriptions are landlord-written) and only the markers become HIGHLIGHT_START/END
+_MATCH_START, _MATCH_END = '\ue000', '\ue001'
+_MATCH_MARKERS = re.compile(f'[{_MATCH_START}{_MATCH_END}]')
+
+
+def _escape_highlight(snippet: Optional[str]) -> Optional[str]:
+    if snippet is None:
+        return None
+    return html.escape(snippet).replace(_MATCH_START, HIGHLIGHT_START).replace(_MATCH_END, HIGHLIGHT_END)
+SNIPPET_WORDS = 16
+
+
+class PropertyTextIndex:
+    """
+    Full-text index of Property.description and amenities, written alongside the listing
+    index. Uses FTS5 (ranked with BM25) on SQLite and a weighted tsvector (ranked with
+    ts_rank_cd) on PostgreSQL; on other databases it is not maintained and `q` searches fail.
+    """
+
+    @staticmethod
+    def supported(dialect_name: str) -> bool:
+        return dialect_name in ('sqlite', 'postgresql')
+
+    @staticmethod
+    def _row(property_obj) -> Dict[str, Any]:
+        amenities = [amenity for amenity in property_obj.amenities or [] if isinstance(amenity, str)]
+        description = _MATCH_MARKERS.sub('', property_obj.description) if property_obj.description else property_obj.description
+        return {"description": description, "amenities": _MATCH_MARKERS.sub('', ", ".join(amenities))}
+
+    @classmethod
+    def create(cls, connection) -> None:
+        dialect_name = connection.dialect.name
+        if dialect_name == 'sqlite':
+            connection.exec_driver_sql(SQLITE_TEXT_INDEX_DDL)
+        elif dialect_name == 'postgresql':
+            for statement in POSTGRESQL_TEXT_INDEX_DDL:
+                connection.exec_driver_sql(statement)
+
+    @classmethod
+    def drop(cls, connection) -> None:
+        if cls.supported(connection.dialect.name):
+            connection.exec_driver_sql(f"DROP TABLE IF EXISTS {TEXT_INDEX_TABLE}")
+
+    @classmethod
+    def write(cls, connection, properties) -> None:
+        dialect_name = connection.dialect.name
+        if not cls.supported(dialect_name):
+            return
+        cls.remove(connection, [property_obj.property_id for property_obj in properties])
+        if dialect_name == 'sqlite':
+            rows = [dict(cls._row(property_obj), rowid=property_obj.property_id) for property_obj in properties]
+            connection.execute(_sqlite_text_index.insert(), rows)
+        else:
+            rows = [dict(cls._row(property_obj), property_id=property_obj.property_id) for property_obj in properties]
+            connection.execute(_postgresql_text_index.insert(), rows)
+
+    @classmethod
+    def remove(cls, connection, property_ids) -> None:
+        dialect_name = connection.dialect.name
+        if dialect_name == 'sqlite':
+            connection.execute(_sqlite_text_index.delete().where(_sqlite_text_index.c.rowid.in_(list(property_ids))))
+        elif dialect_name == 'postgresql':
+            connection.execute(_postgresql_text_index.delete().where(_postgresql_text_index.c.property_id.in_(list(property_ids))))
+
+    @classmethod
+    def clear(cls, connection) -> None:
+        dialect_name = connection.dialect.name
+        if dialect_name == 'sqlite':
+            connection.execute(_sqlite_text_index.delete())
+        elif dialect_name == 'postgresql':
+            connection.execute(_postgresql_text_index.delete())
+
+    @staticmethod
+    def search_terms(text: str) -> List[str]:
+        """Words of a user query; FTS operators and punctuation are dropped so any input is a valid query."""
+        return re.findall(r"\w+", (text or "").lower())
+
+    @classmethod
+    def _match(cls, dialect_name: str, text: str):
+        terms = cls.search_terms(text)
+        if not terms:
+            raise ValueError("The search query has no searchable words.")
+        if dialect_name == 'sqlite':
+            # Every word must match: "borehole" "dsq"
+            return literal_column(TEXT_INDEX_TABLE).op('MATCH')(" ".join(f'"{term}"' for term in terms))
+        if dialect_name == 'postgresql':
+            return _postgresql_text_index.c.document.op('@@')(func.plainto_tsquery('simple', " ".join(terms)))
+        raise ValueError(f"Full-text search is not available on {dialect_name}.")
+
+    @classmethod
+    def search(cls, query, property_id_column, dialect_name: str, text: str) -> Tuple[Any, Any]:
+        """
+        Restricts `query` to properties matching `text` (all words, in the description or
+        amenities). Returns (query, rank): ordering by rank ascending puts the best matches first.
+        """
+        match = cls._match(dialect_name, text)
+        if dialect_name == 'sqlite':
+            query = query.join(_sqlite_text_index, _sqlite_text_index.c.rowid == property_id_column).filter(match)
+            # Amenity matches weigh twice as much as description matches; bm25() is lower for better matches
+            return query, func.bm25(literal_column(TEXT_INDEX_TABLE), 1.0, 2.0)
+        query = query.join(_postgresql_text_index, _postgresql_text_index.c.property_id == property_id_column).filter(match)
+        return query, -func.ts_rank_cd(_postgresql_text_index.c.document, func.plainto_tsquery('simple', " ".join(cls.search_terms(text))))
+
+    @classmethod
+    def highlights(cls, session, dialect_name: str, text: str, property_ids: List[int]) -> Dict[int, Dict[str, str]]:
+        """
+        HTML-escaped snippets of the description and amenities of `property_ids`, with the
+        matched words (and nothing else) wrapped in HIGHLIGHT_START/END.
+        """
+        if not property_ids:
+            return {}
+        match = cls._match(dialect_name, text)
+        if dialect_name == 'sqlite':
+            fts = literal_column(TEXT_INDEX_TABLE)
+            rows = session.query(
+                _sqlite_text_index.c.rowid,
+                func.snippet(fts, 0, _MATCH_START, _MATCH_END, '…', SNIPPET_WORDS),
+                func.highlight(fts, 1, _MATCH_START, _MATCH_END)
+            ).filter(match, _sqlite_text_index.c.rowid.in_(property_ids)).all()
+        else:
+            tsquery = func.plainto_tsquery('simple', " ".join(cls.search_terms(text)))
+            options = f"StartSel={_MATCH_START}, StopSel={_MATCH_END}, MaxWords={SNIPPET_WORDS}, MinWords=4"
+            rows = session.query(
+                _postgresql_text_index.c.property_id,
+                func.ts_headline('simple', func.coalesce(_postgresql_text_index.c.description, ''), tsquery, options),
+                func.ts_headline('simple', _postgresql_text_index.c.amenities, tsquery, 'HighlightAll=true, ' + options)
+            ).filter(match, _postgresql_text_index.c.property_id.in_(property_ids)).all()
+        return {property_id: {"description": _escape_highlight(description), "amenities": _escape_highlight(amenities)}
+                for property_id, description, amenities in rows}
+
+
+# db.create_all/drop_all manage the text index too (migrations create it explicitly)
+@event.listens_for(db.metadata, 'after_create')
+def _create_text_index(target, connection, **kw):
+    PropertyTextIndex.create(connection)
+
+
+@event.listens_for(db.metadata, 'before_drop')
+def _drop_text_index(target, connection, **kw):
+    PropertyTextIndex.drop(connection)
+
+
+@event.listens_for(Property, 'after_insert')
+@event.listens_for(Property, 'after_update')
+def _index_property(mapper, connection, target):
+    PropertyListingIndex.write(connection, [target])
+
+
+@event.listens_for(Property, 'before_delete')
+def _unindex_property(mapper, connection, target):
+    PropertyListingIndex.remove(connection, [target.property_id])
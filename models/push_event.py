@@ -0,0 +1,25 @@
+from datetime import datetime
+from hermitta_app import db
+
+
+class PushEventRecord(db.Model):
+    """
+    Events published on the 'database' event bus (see hermitta_app.services.event_bus.DatabaseEventBackend).
+    The row id is the event id clients resume from, so ids must never be reused: on
+    SQLite the table is AUTOINCREMENT. Rows are transient and deleted after
+    EVENT_BUS_RETENTION_SECONDS, hence no foreign key to users.
+    """
+    __tablename__ = 'push_events'
+    __table_args__ = (
+        db.Index('ix_push_events_user_id_event_id', 'user_id', 'event_id'),
+        {'sqlite_autoincrement': True},
+    )
+
+    event_id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    event_type = db.Column(db.String(32), nullable=False)
+    data = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<PushEventRecord {self.event_id} {self.event_type} for User {self.user_id}>"
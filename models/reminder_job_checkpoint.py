@@ -0,0 +1,46 @@
+from datetime import datetime
+from hermitta_app import db
+from .enums import JobRunStatus
+
+class ReminderJobCheckpoint(db.Model):
+    __tablename__ = 'reminder_job_checkpoints'
+
+    checkpoint_id = db.Column(db.Integer, primary_key=True)
+
+    # Same identifier that is stamped on NotificationTriggerLog.job_run_id by the run
+    job_run_id = db.Column(db.String(255), nullable=False, unique=True, index=True)
+    job_name = db.Column(db.String(100), nullable=False, index=True) # e.g., "lease_renewal_reminders"
+
+    # The date the run computes reminders for. A resumed run reuses it even if resumed on a later day.
+    run_date = db.Column(db.Date, nullable=False)
+
+    # Keyset cursor: highest lease_id whose chunk has been committed. 0 means nothing committed yet.
+    last_lease_id = db.Column(db.Integer, default=0, nullable=False)
+
+    chunk_size = db.Column(db.Integer, nullable=False)
+    chunks_committed = db.Column(db.Integer, default=0, nullable=False)
+    notifications_created = db.Column(db.Integer, default=0, nullable=False)
+    rows_failed = db.Column(db.Integer, default=0, nullable=False) # Individual rows skipped after a failed chunk insert
+
+    status = db.Column(db.Enum(JobRunStatus), default=JobRunStatus.IN_PROGRESS, nullable=False, index=True)
+    error_message = db.Column(db.Text, nullable=True) # Last error that stopped the run, if any
+
+    started_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    completed_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    def __init__(self, **kwargs):
+        if 'status' not in kwargs:
+            kwargs['status'] = JobRunStatus.IN_PROGRESS
+        if 'last_lease_id' not in kwargs:
+            kwargs['last_lease_id'] = 0
+        if 'chunks_committed' not in kwargs:
+            kwargs['chunks_committed'] = 0
+        if 'notifications_created' not in kwargs:
+            kwargs['notifications_created'] = 0
+        if 'rows_failed' not in kwargs:
+            kwargs['rows_failed'] = 0
+        super().__init__(**kwargs)
+
+    def __repr__(self):
+        return f"<ReminderJobCheckpoint {self.checkpoint_id} Run: {self.job_run_id} Job: {self.job_name} LastLease: {self.last_lease_id} Status: {self.status.value}>"
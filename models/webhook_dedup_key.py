@@ -0,0 +1,78 @@
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import and_, select
+from sqlalchemy.exc import IntegrityError
+from hermitta_app import db
+from .enums import GatewayType
+
+
+class WebhookDedupKey(db.Model):
+    """
+    Webhook deliveries already accepted, keyed by (gateway, event id, payload hash), so
+    gateway retries are recognised without looking at the transactions they refer to.
+
+    A key is a duplicate until `expires_at`; expired keys are reused by the next delivery
+    with the same key and deleted by `purge_expired` (`flask purge-webhook-dedup-keys`).
+    The unique constraint is what makes a key accepted once across processes; the
+    in-memory Bloom filter in hermitta_app.services.webhook_dedup only saves lookups.
+    """
+    __tablename__ = 'webhook_dedup_keys'
+    __table_args__ = (
+        db.UniqueConstraint('gateway', 'event_id', 'payload_hash', name='uq_webhook_dedup_keys_gateway_event_id_payload_hash'),
+    )
+
+    dedup_id = db.Column(db.Integer, primary_key=True)
+    gateway = db.Column(db.Enum(GatewayType), nullable=False)
+    event_id = db.Column(db.String(255), nullable=False) # e.g. CheckoutRequestID, OrderTrackingId, Stripe event id
+    payload_hash = db.Column(db.String(64), nullable=False) # SHA-256 hex of the raw body
+    received_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<WebhookDedupKey {self.gateway.value}:{self.event_id} until {self.expires_at}>"
+
+    @classmethod
+    def _matches(cls, gateway: GatewayType, event_id: str, payload_hash: str):
+        table = cls.__table__
+        return and_(table.c.gateway == gateway, table.c.event_id == event_id, table.c.payload_hash == payload_hash)
+
+    @classmethod
+    def exists(cls, connection, gateway: GatewayType, event_id: str, payload_hash: str, now: datetime) -> bool:
+        """Whether an unexpired key is stored (a lookup on the unique index)."""
+        table = cls.__table__
+        return connection.execute(
+            select(table.c.dedup_id).where(cls._matches(gateway, event_id, payload_hash), table.c.expires_at > now).limit(1)
+        ).first() is not None
+
+    @classmethod
+    def record(cls, connection, gateway: GatewayType, event_id: str, payload_hash: str, now: datetime, expires_at: datetime) -> bool:
+        """
+        Stores the key. Returns False if an unexpired one exists already, e.g. inserted
+        concurrently by another process. Uses a savepoint, so the caller's transaction survives.
+        """
+        table = cls.__table__
+        try:
+            with connection.begin_nested():
+                connection.execute(table.insert().values(
+                    gateway=gateway, event_id=event_id, payload_hash=payload_hash, received_at=now, expires_at=expires_at
+                ))
+            return True
+        except IntegrityError:
+            # Only an expired key is taken over
+            return bool(connection.execute(table.update().where(
+                cls._matches(gateway, event_id, payload_hash), table.c.expires_at <= now
+            ).values(received_at=now, expires_at=expires_at)).rowcount)
+
+    @classmethod
+    def purge_expired(cls, connection, now: Optional[datetime] = None, batch_size: int = 1000) -> int:
+        """Deletes expired keys in batches of `batch_size`. Returns the number deleted. The caller commits."""
+        table = cls.__table__
+        now = now or datetime.utcnow()
+        deleted = 0
+        while True:
+            ids = [row.dedup_id for row in connection.execute(
+                select(table.c.dedup_id).where(table.c.expires_at <= now).limit(batch_size)
+            )]
+            if not ids:
+                return deleted
+            deleted += connection.execute(table.delete().where(table.c.dedup_id.in_(ids))).rowcount
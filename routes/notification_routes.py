@@ -1,5 +1,6 @@
 # Placeholder for Notification API Endpoints (Phase 2: Online Payments & Communication)
 # Actual implementation would use a web framework like Flask or FastAPI
+# The inbox endpoints below are implemented in hermitta_app/routes/notification_routes.py (notification_bp)
 
 # GET /notifications (Get notifications for the logged-in user)
 def get_user_notifications():
@@ -38,7 +38,9 @@ def initiate_mpesa_payment_for_lease(lease_id: int):
 
 # POST /mpesa/callback (External M-Pesa callback endpoint - platform-wide or landlord-specific if supported)
 def mpesa_stk_callback():
-    # TODO: Implement logic to handle M-Pesa STK push callback.
+    # Implemented in two stages: hermitta_app/routes/mpesa_routes.py (POST /api/v1/mpesa/callback) appends the raw
+    # payload to MpesaCallbackInbox and acknowledges; hermitta_app/jobs/mpesa_jobs.py applies steps 2-5 below in batches.
+    # GatewayTransaction (gateway_specific_transaction_id = CheckoutRequestID) stands in for MpesaPaymentLog.
     # This is an external, unauthenticated endpoint hit by M-Pesa.
     # IMPORTANT: Validate the source/authenticity of the callback if possible (e.g., IP whitelisting, request signature if provided by M-Pesa).
     # 1. Parses the M-Pesa JSON payload from the callback.
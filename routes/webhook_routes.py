@@ -13,6 +13,9 @@ def pesapal_webhook_handler():
     # - PesapalTransactionTrackingId (Pesapal's unique ID for the transaction)
     #
     # Logic:
+    # 0. DEDUPLICATION: before anything else, `webhook_deduplicator.is_duplicate(db.session.connection(), GatewayType.PESAPAL,
+    #    request.get_data(), args=request.args)` (hermitta_app/services/webhook_dedup.py). A retry is answered like the
+    #    original delivery without touching GatewayTransaction; the key is committed with the handler's writes.
     # 1. AUTHENTICATION/VERIFICATION:
     #    - Pesapal IPNs might not be signed. Relies on the uniqueness of the Notification ID if using IPN v2.
     #    - Check source IP if Pesapal provides a list of their IPs (less reliable).
@@ -33,6 +36,9 @@ def pesapal_webhook_handler():
     #    - If transaction already processed (e.g., status is SUCCESSFUL or FAILED), ignore duplicate callback (idempotency).
     #
     # 4. Query Pesapal for Status (Highly Recommended if not already done or if initial callback is just a notification):
+    #    - Not inline: leave the GatewayTransaction PENDING with `next_status_check_at` = now and answer Pesapal.
+    #      `flask run-gateway-reconciliation` (hermitta_app/jobs/gateway_jobs.py) queries it in its next batch over
+    #      kept-alive connections with a cached token, and applies step 5.
     #    - Call Pesapal's "GetTransactionStatus" API endpoint using the
     #      `PesapalTransactionTrackingId` and/or `PesapalMerchantReference`.
     #    - This API call will require authentication (OAuth Bearer Token with Pesapal).
@@ -67,6 +73,7 @@ def pesapal_webhook_handler():
 def flutterwave_webhook_handler():
     # TODO: Implement Flutterwave webhook handling.
     # 1. Verify webhook signature (Flutterwave sends a secret hash in headers).
+    #    Then drop retries: `webhook_deduplicator.is_duplicate(connection, GatewayType.FLUTTERWAVE, request.get_data())`.
     # 2. Parse payload.
     # 3. Update GatewayTransaction and Payment records.
     # 4. Respond with HTTP 200 OK.
@@ -76,6 +83,7 @@ def flutterwave_webhook_handler():
 def stripe_webhook_handler():
     # TODO: Implement Stripe webhook handling.
     # 1. Verify webhook signature (Stripe sends a signature in headers, use SDK to verify).
+    #    Then drop retries: `webhook_deduplicator.is_duplicate(connection, GatewayType.STRIPE, request.get_data())` (keyed by event id).
     # 2. Parse event object from payload.
     # 3. Handle different event types (e.g., 'payment_intent.succeeded', 'charge.failed').
     # 4. Update GatewayTransaction and Payment records.
@@ -2,6 +2,9 @@ import sys
 print("run.py script started", file=sys.stderr) # Immediate print
 
 import os
+import time
+from contextlib import contextmanager
+import click
 from flask import current_app # Added import
 from hermitta_app import create_app
 
@@ -12,12 +15,333 @@ try:
 
     # CLI command for jobs
     @app.cli.command("run-lease-renewal-job")
-    def run_lease_renewal_job_command():
+    @click.option("--job-run-id", default=None, help="Resume (or name) a checkpointed run.")
+    @click.option("--chunk-size", type=int, default=None, help="Leases per committed chunk; 0 commits once at the end.")
+    @click.option("--since", type=click.DateTime(formats=["%Y-%m-%d"]), default=None, help="Process every rule from this date (YYYY-MM-DD) on.")
+    @click.option("--catch-up/--no-catch-up", default=True, help="Catch up on the days missed since each rule's last run.")
+    @click.option("--shards", type=int, default=1, help="Split landlords across this many worker processes.")
+    def run_lease_renewal_job_command(job_run_id, chunk_size, since, catch_up, shards):
         """Processes lease renewal reminders based on defined rules."""
-        from hermitta_app.jobs.lease_jobs import process_lease_renewal_reminders_job
+        from hermitta_app.jobs.lease_jobs import process_lease_renewal_reminders_job, DEFAULT_CATCH_UP_MAX_DAYS
+        if chunk_size is None:
+            chunk_size = current_app.config.get('REMINDER_JOB_CHUNK_SIZE', 0)
         current_app.logger.info("Starting lease renewal reminder job via CLI...")
-        process_lease_renewal_reminders_job()
-        current_app.logger.info("Lease renewal reminder job finished via CLI.")
+        job_kwargs = dict(
+            chunk_size=chunk_size, since=since.date() if since else None, catch_up=catch_up,
+            max_catch_up_days=current_app.config.get('REMINDER_CATCH_UP_MAX_DAYS', DEFAULT_CATCH_UP_MAX_DAYS)
+        )
+        if shards > 1:
+            from hermitta_app.jobs.sharding import run_sharded_job
+            summary = run_sharded_job("lease_renewal_reminders", shards, job_run_id=job_run_id, **job_kwargs)
+        else:
+            summary = process_lease_renewal_reminders_job(job_run_id=job_run_id, **job_kwargs)
+        current_app.logger.info(f"Lease renewal reminder job finished via CLI (ID: {summary['job_run_id']}).")
+
+    @app.cli.command("run-scheduled-reminders-job")
+    @click.option("--job-run-id", default=None, help="Identifier stamped on the trigger logs of this run.")
+    @click.option("--event", "events", multiple=True, help="Only sweep these ReminderRuleEvent values (repeatable).")
+    @click.option("--batch-size", type=int, default=None, help="Source rows fetched and committed per batch.")
+    @click.option("--since", type=click.DateTime(formats=["%Y-%m-%d"]), default=None, help="Process every rule from this date (YYYY-MM-DD) on.")
+    @click.option("--catch-up/--no-catch-up", default=True, help="Catch up on the days missed since each rule's last run.")
+    @click.option("--shards", type=int, default=1, help="Split landlords across this many worker processes.")
+    def run_scheduled_reminders_job_command(job_run_id, events, batch_size, since, catch_up, shards):
+        """Schedules reminders for every reminder rule event type in one sweep."""
+        from models.enums import ReminderRuleEvent
+        from hermitta_app.jobs.reminder_jobs import process_scheduled_reminders_job, DEFAULT_SWEEP_BATCH_SIZE, DEFAULT_CATCH_UP_MAX_DAYS
+        event_types = [ReminderRuleEvent(event) for event in events]
+        current_app.logger.info("Starting scheduled reminders job via CLI...")
+        job_kwargs = dict(
+            event_types=event_types, batch_size=batch_size or DEFAULT_SWEEP_BATCH_SIZE,
+            since=since.date() if since else None, catch_up=catch_up,
+            max_catch_up_days=current_app.config.get('REMINDER_CATCH_UP_MAX_DAYS', DEFAULT_CATCH_UP_MAX_DAYS)
+        )
+        if shards > 1:
+            from hermitta_app.jobs.sharding import run_sharded_job
+            summary = run_sharded_job("scheduled_reminders", shards, job_run_id=job_run_id, **job_kwargs)
+        else:
+            summary = process_scheduled_reminders_job(job_run_id=job_run_id, **job_kwargs)
+        current_app.logger.info(f"Scheduled reminders job finished via CLI (ID: {summary['job_run_id']}).")
+
+    @app.cli.command("generate-rent-payments")
+    @click.option("--period", type=click.DateTime(formats=["%Y-%m"]), default=None, help="Month to bill (YYYY-MM); defaults to the current month.")
+    @click.option("--chunk-size", type=int, default=None, help="Leases billed and committed per statement.")
+    def generate_rent_payments_command(period, chunk_size):
+        """Creates the EXPECTED rent payment of every active lease for a month (safe to re-run)."""
+        from hermitta_app.jobs.billing_jobs import generate_rent_payments_job
+        current_app.logger.info("Starting rent billing job via CLI...")
+        summary = generate_rent_payments_job(period=period.date() if period else None, chunk_size=chunk_size)
+        current_app.logger.info(f"Rent billing job finished via CLI (period: {summary['period']:%Y-%m}, created: {summary['payments_created']}).")
+
+    @app.cli.command("run-notification-dispatcher")
+    @click.option("--worker-id", default=None, help="Prefix of this worker's claim tokens.")
+    @click.option("--batch-size", type=int, default=None, help="Notifications claimed and sent per batch.")
+    @click.option("--max-batches", type=int, default=None, help="Stop after this many batches.")
+    @click.option("--digest/--no-digest", default=None, help="Coalesce due notifications into digests first (default: NOTIFICATION_DIGEST_ENABLED).")
+    def run_notification_dispatcher_command(worker_id, batch_size, max_batches, digest):
+        """Sends due notifications through the configured email, SMS and in-app backends."""
+        from hermitta_app.jobs.notification_jobs import dispatch_due_notifications_job
+        current_app.logger.info("Starting notification dispatcher via CLI...")
+        summary = dispatch_due_notifications_job(worker_id=worker_id, batch_size=batch_size, max_batches=max_batches, coalesce=digest)
+        current_app.logger.info(f"Notification dispatcher finished via CLI (worker: {summary['worker_id']}, sent: {summary['sent']}).")
+
+    @app.cli.command("run-notification-digest")
+    @click.option("--window-minutes", type=int, default=None, help="Width of the windows notifications are grouped in.")
+    @click.option("--min-group-size", type=int, default=None, help="Smallest group of notifications turned into a digest.")
+    def run_notification_digest_command(window_minutes, min_group_size):
+        """Coalesces each recipient's due notifications into digest messages."""
+        from hermitta_app.jobs.digest_jobs import coalesce_pending_notifications_job
+        current_app.logger.info("Starting notification digest via CLI...")
+        summary = coalesce_pending_notifications_job(window_minutes=window_minutes, min_group_size=min_group_size)
+        current_app.logger.info(f"Notification digest finished via CLI ({summary['digests_created']} digests created).")
+
+    @app.cli.command("run-mpesa-callback-worker")
+    @click.option("--worker-id", default=None, help="Prefix of this worker's claim tokens.")
+    @click.option("--batch-size", type=int, default=None, help="Callbacks claimed and applied per batch.")
+    @click.option("--max-batches", type=int, default=None, help="Stop each worker after this many batches.")
+    @click.option("--workers", type=int, default=None, help="Worker processes draining the inbox (default: MPESA_CALLBACK_WORKERS).")
+    def run_mpesa_callback_worker_command(worker_id, batch_size, max_batches, workers):
+        """Applies the stored M-Pesa STK callbacks to their gateway transactions and payments."""
+        from hermitta_app.jobs.mpesa_jobs import drain_mpesa_callback_inbox_job
+        current_app.logger.info("Starting M-Pesa callback worker via CLI...")
+        summary = drain_mpesa_callback_inbox_job(worker_id=worker_id, batch_size=batch_size, max_batches=max_batches, workers=workers)
+        current_app.logger.info(f"M-Pesa callback worker finished via CLI (worker: {summary['worker_id']}, claimed: {summary['claimed']}).")
+
+    @app.cli.command("run-gateway-reconciliation")
+    @click.option("--worker-id", default=None, help="Prefix of this worker's claim tokens.")
+    @click.option("--batch-size", type=int, default=None, help="Pending transactions claimed and queried per batch.")
+    @click.option("--max-batches", type=int, default=None, help="Stop after this many batches.")
+    def run_gateway_reconciliation_command(worker_id, batch_size, max_batches):
+        """Settles pending gateway transactions by querying the gateways' status APIs."""
+        from hermitta_app.jobs.gateway_jobs import reconcile_pending_gateway_transactions_job
+        current_app.logger.info("Starting gateway reconciliation via CLI...")
+        summary = reconcile_pending_gateway_transactions_job(worker_id=worker_id, batch_size=batch_size, max_batches=max_batches)
+        current_app.logger.info(f"Gateway reconciliation finished via CLI (worker: {summary['worker_id']}, claimed: {summary['claimed']}).")
+
+    @app.cli.command("purge-webhook-dedup-keys")
+    @click.option("--batch-size", type=int, default=1000, help="Expired keys deleted per statement.")
+    def purge_webhook_dedup_keys_command(batch_size):
+        """Deletes the webhook deduplication keys whose TTL has passed."""
+        from hermitta_app import db
+        from hermitta_app.services.webhook_dedup import webhook_deduplicator
+        current_app.logger.info("Purging expired webhook dedup keys via CLI...")
+        purged = webhook_deduplicator.purge_expired(db.session.connection(), batch_size=batch_size)
+        db.session.commit()
+        current_app.logger.info(f"Webhook dedup keys purged via CLI ({purged} deleted).")
+
+    @app.cli.command("rebuild-listing-index")
+    @click.option("--batch-size", type=int, default=1000, help="Properties indexed per statement.")
+    def rebuild_listing_index_command(batch_size):
+        """Recreates the public listing search index from the properties table."""
+        from hermitta_app import db
+        from models.property_listing_index import PropertyListingIndex
+        current_app.logger.info("Rebuilding listing index via CLI...")
+        indexed = PropertyListingIndex.rebuild(batch_size=batch_size)
+        db.session.commit()
+        current_app.logger.info(f"Listing index rebuilt via CLI ({indexed} properties).")
+
+    @app.cli.command("rebuild-building-rollups")
+    @click.option("--landlord-id", type=int, default=None, help="Only this landlord's buildings.")
+    def rebuild_building_rollups_command(landlord_id):
+        """Assigns units to buildings and recomputes the building occupancy and rent rollups."""
+        from hermitta_app import db
+        from models.building import Building
+        current_app.logger.info("Rebuilding building rollups via CLI...")
+        rebuilt = Building.rebuild(landlord_id=landlord_id)
+        db.session.commit()
+        current_app.logger.info(f"Building rollups rebuilt via CLI ({rebuilt} buildings).")
+
+    @app.cli.command("import-properties")
+    @click.argument("path", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--landlord-id", type=int, required=True, help="Landlord the imported properties belong to.")
+    @click.option("--format", "file_format", type=click.Choice(["csv", "json"]), default=None, help="File format (default: from the file extension).")
+    @click.option("--chunk-size", type=int, default=None, help="Rows validated and committed per transaction.")
+    @click.option("--dry-run", is_flag=True, help="Validate the file without importing it.")
+    def import_properties_command(path, landlord_id, file_format, chunk_size, dry_run):
+        """Imports properties from a CSV or JSON (array or JSON Lines) file, reporting invalid rows."""
+        from services.property_import_service import PropertyImportService, read_csv_rows, read_json_rows, IMPORT_CHUNK_SIZE
+        file_format = file_format or ("csv" if path.lower().endswith(".csv") else "json")
+        current_app.logger.info(f"Importing properties from {path} via CLI...")
+        with open(path, "rb") as stream:
+            rows = read_csv_rows(stream) if file_format == "csv" else read_json_rows(stream)
+            summary = PropertyImportService().import_properties(landlord_id, rows, chunk_size=chunk_size or IMPORT_CHUNK_SIZE, dry_run=dry_run)
+        for error in summary["errors"]:
+            click.echo(f"row {error['row']}: {'; '.join(error['errors'])}", err=True)
+        if summary["read_error"]:
+            click.echo(summary["read_error"], err=True)
+        current_app.logger.info(f"Property import finished via CLI ({summary['imported']} imported, {summary['failed']} failed).")
+
+    @app.cli.command("reconcile-bank-statement")
+    @click.argument("path", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--landlord-id", type=int, required=True, help="Landlord whose open payments the statement settles.")
+    @click.option("--bank-account-id", type=int, default=None, help="LandlordBankAccount the statement belongs to.")
+    @click.option("--format", "file_format", type=click.Choice(["csv", "mt940"]), default=None, help="File format (default: csv for .csv files, else mt940).")
+    @click.option("--date-tolerance-days", type=int, default=None, help="Days between value date and due date for amount-and-date matches.")
+    @click.option("--dry-run", is_flag=True, help="Match the statement without completing payments or queueing reviews.")
+    def reconcile_bank_statement_command(path, landlord_id, bank_account_id, file_format, date_tolerance_days, dry_run):
+        """Completes open payments from a bank statement (CSV or MT940) and queues unclear credits for review."""
+        from services.bank_reconciliation_service import BankReconciliationService, read_statement_csv, read_statement_mt940, DATE_TOLERANCE_DAYS
+        file_format = file_format or ("csv" if path.lower().endswith(".csv") else "mt940")
+        service = BankReconciliationService(date_tolerance_days=DATE_TOLERANCE_DAYS if date_tolerance_days is None else date_tolerance_days)
+        current_app.logger.info(f"Reconciling bank statement {path} via CLI...")
+        with open(path, "rb") as stream:
+            lines = read_statement_csv(stream) if file_format == "csv" else read_statement_mt940(stream)
+            summary = service.reconcile_statement(landlord_id, lines, landlord_bank_account_id=bank_account_id, dry_run=dry_run)
+        for error in summary["errors"]:
+            click.echo(f"line {error['line']}: {'; '.join(error['errors'])}", err=True)
+        matched = summary["matched_by_reference"] + summary["matched_by_amount_and_date"]
+        current_app.logger.info(f"Bank statement reconciled via CLI ({matched} matched, {summary['queued_for_review']} queued for review, {summary['failed']} failed).")
+
+    @app.cli.command("benchmark-serializers")
+    @click.option("--rows", type=int, default=1000, help="Properties per serialized page.")
+    @click.option("--repeat", type=int, default=20, help="Pages serialized per measurement.")
+    def benchmark_serializers_command(rows, repeat):
+        """Compares the per-row column loop the routes used with the compiled Property serializer (no database needed)."""
+        import timeit
+        from datetime import datetime
+        from decimal import Decimal
+        from enum import Enum
+        from models.property import Property, PropertyType, PropertyStatus
+        from hermitta_app.serializers import get_serializer, json_dumps, orjson
+        properties = [
+            Property(property_id=n, landlord_id=1, address_line_1=f"{n} Benchmark Rd", city="Nairobi", county="Nairobi",
+                     property_type=PropertyType.APARTMENT_UNIT, status=PropertyStatus.VACANT, num_bedrooms=2, num_bathrooms=1,
+                     monthly_rent=Decimal("45000.00"), amenities=["Borehole", "Gym"], latitude=-1.29, longitude=36.78,
+                     description="Spacious apartment with a DSQ.", created_at=datetime(2024, 3, 1), updated_at=datetime(2024, 3, 1))
+            for n in range(rows)
+        ]
+
+        def column_loop():
+            results = []
+            for prop in properties:
+                prop_dict = {column.name: getattr(prop, column.name) for column in prop.__table__.columns}
+                for key, value in prop_dict.items():
+                    if isinstance(value, Enum):
+                        prop_dict[key] = value.value
+                    elif isinstance(value, Decimal):
+                        prop_dict[key] = str(value)
+                results.append(prop_dict)
+            return current_app.json.dumps({"properties": results})
+
+        serializer = get_serializer(Property)
+        timings = {
+            "column loop + jsonify": min(timeit.repeat(column_loop, number=repeat, repeat=3)),
+            "compiled serializer + " + ("orjson" if orjson else "json"): min(timeit.repeat(
+                lambda: json_dumps({"properties": serializer.to_list(properties)}), number=repeat, repeat=3)),
+            "compiled serializer, ?fields=property_id,city,monthly_rent": min(timeit.repeat(
+                lambda: json_dumps({"properties": serializer.to_list(properties, ("property_id", "city", "monthly_rent"))}),
+                number=repeat, repeat=3)),
+        }
+        baseline = timings["column loop + jsonify"]
+        for name, seconds in timings.items():
+            click.echo(f"{name:<60} {seconds / repeat * 1000:8.2f} ms/page  x{baseline / seconds:.1f}")
+
+    @contextmanager
+    def benchmark_database():
+        """App context on the emptied test database (TEST_DATABASE_URL), so benchmark rows never reach the app's own."""
+        from hermitta_app import db
+        with create_app('test').app_context():
+            db.drop_all()
+            db.create_all()
+            try:
+                yield db
+            finally:
+                db.session.remove()
+                db.drop_all()
+
+    def echo_benchmark(elapsed, summary):
+        click.echo(f"{'total':<20} {elapsed:8.2f} s")
+        for phase, seconds in summary.get("timings", {}).items():
+            click.echo(f"{phase:<20} {seconds:8.2f} s")
+
+    @app.cli.command("benchmark-rent-billing")
+    @click.option("--leases", type=int, default=50000, help="Active leases billed.")
+    @click.option("--chunk-size", type=int, default=None, help="Lease ids per statement.")
+    def benchmark_rent_billing_command(leases, chunk_size):
+        """Times one monthly rent billing run over many active leases (uses and empties the test database)."""
+        from datetime import date
+        from decimal import Decimal
+        from hermitta_app.jobs.billing_jobs import generate_rent_payments_job
+        from models import Lease
+        from models.user import User, UserRole
+        from models.property import Property, PropertyType
+        from models.lease import LeaseStatusType
+        with benchmark_database() as db:
+            landlord = User(email="benchmark_landlord@example.com", phone_number="+254700000000", password_hash="benchmark",
+                            first_name="Bench", last_name="Landlord", role=UserRole.LANDLORD)
+            db.session.add(landlord)
+            db.session.flush()
+            unit = Property(landlord_id=landlord.user_id, address_line_1="1 Benchmark Rd", city="Nairobi", county="Nairobi",
+                            property_type=PropertyType.APARTMENT_UNIT)
+            db.session.add(unit)
+            db.session.flush()
+            db.session.bulk_insert_mappings(Lease, [{
+                "property_id": unit.property_id, "landlord_id": landlord.user_id, "start_date": date(2023, 1, 1),
+                "end_date": date(2025, 1, 1), "rent_amount": Decimal(10000 + n), "rent_due_day": 1 + n % 31,
+                "move_in_date": date(2023, 1, 1), "rent_start_date": date(2024, 2, 1 + n % 29) if n % 10 == 0 else None,
+                "status": LeaseStatusType.ACTIVE,
+            } for n in range(leases)])
+            db.session.commit()
+            started = time.perf_counter()
+            summary = generate_rent_payments_job(period=date(2024, 2, 1), chunk_size=chunk_size)
+            elapsed = time.perf_counter() - started
+        click.echo(f"{summary['payments_created']} payments created for {leases} leases")
+        echo_benchmark(elapsed, summary)
+
+    @app.cli.command("benchmark-property-import")
+    @click.option("--rows", type=int, default=10000, help="Units in the imported CSV file.")
+    @click.option("--chunk-size", type=int, default=None, help="Rows validated and committed per transaction.")
+    def benchmark_property_import_command(rows, chunk_size):
+        """Times a CSV import of many units, search indexing included (uses and empties the test database)."""
+        import io
+        from services.property_import_service import PropertyImportService, read_csv_rows, IMPORT_CHUNK_SIZE
+        header = "address_line_1,unit_number,city,county,property_type,num_bedrooms,num_bathrooms,monthly_rent,amenities\n"
+        data = (header + "".join(f"{n // 100} Tower Rd,U{n},Nairobi,Nairobi,APARTMENT_UNIT,2,1,30000,Lift;Borehole\n"
+                                 for n in range(rows))).encode("utf-8")
+        with benchmark_database():
+            started = time.perf_counter()
+            summary = PropertyImportService().import_properties(1, read_csv_rows(io.BytesIO(data)), chunk_size=chunk_size or IMPORT_CHUNK_SIZE)
+            elapsed = time.perf_counter() - started
+        click.echo(f"{summary['imported']} units imported, {summary['failed']} failed")
+        echo_benchmark(elapsed, summary)
+
+    @app.cli.command("benchmark-bank-reconciliation")
+    @click.option("--lines", "line_count", type=int, default=50000, help="Statement credits, each settling one open payment.")
+    def benchmark_bank_reconciliation_command(line_count):
+        """Times the reconciliation of a long CSV bank statement (uses and empties the test database)."""
+        import io
+        from datetime import date
+        from decimal import Decimal
+        from services.bank_reconciliation_service import BankReconciliationService, read_statement_csv
+        from models import Lease, Payment
+        from models.user import User, UserRole
+        from models.property import Property, PropertyType
+        from models.lease import LeaseStatusType
+        from models.enums import PaymentStatus
+        statement = "\n".join(["Date,Narration,Reference,Amount"] + [
+            f"2024-03-0{1 + n % 5},RENT HMT-{n:06d} UNIT {n},BK{n},{10000 + n}" for n in range(line_count)])
+        with benchmark_database() as db:
+            landlord = User(email="benchmark_landlord@example.com", phone_number="+254700000000", password_hash="benchmark",
+                            first_name="Bench", last_name="Landlord", role=UserRole.LANDLORD)
+            db.session.add(landlord)
+            db.session.flush()
+            unit = Property(landlord_id=landlord.user_id, address_line_1="1 Benchmark Rd", city="Nairobi", county="Nairobi",
+                            property_type=PropertyType.APARTMENT_UNIT)
+            db.session.add(unit)
+            db.session.flush()
+            lease = Lease(property_id=unit.property_id, landlord_id=landlord.user_id, start_date=date(2024, 1, 1), end_date=date(2024, 12, 31),
+                          rent_amount=Decimal("15000"), rent_due_day=1, move_in_date=date(2024, 1, 1), status=LeaseStatusType.ACTIVE)
+            db.session.add(lease)
+            db.session.flush()
+            db.session.bulk_insert_mappings(Payment, [{
+                "lease_id": lease.lease_id, "expected_amount": Decimal(10000 + n), "due_date": date(2024, 3, 1),
+                "status": PaymentStatus.EXPECTED, "payment_reference_code": f"HMT-{n:06d}",
+            } for n in range(line_count)])
+            db.session.commit()
+            started = time.perf_counter()
+            summary = BankReconciliationService().reconcile_statement(landlord.user_id, read_statement_csv(io.StringIO(statement)))
+            elapsed = time.perf_counter() - started
+        click.echo(f"{summary['matched_by_reference']} of {line_count} lines matched by reference, {summary['failed']} failed")
+        echo_benchmark(elapsed, summary)
 
     if __name__ == '__main__':
         host = os.getenv('FLASK_RUN_HOST', '0.0.0.0')
@@ -0,0 +1,375 @@
+import csv
+import io
+import re
+from collections import defaultdict
+from datetime import datetime, date, timedelta
+from decimal import Decimal, InvalidOperation
+from typing import List, Optional, Dict, Any, Iterable, Iterator, Tuple
+import sqlalchemy as sa
+from hermitta_app import db # Import db instance
+from models.payment import Payment
+from models.lease import Lease
+from models.bank_statement_review_item import BankStatementReviewItem
+from models.enums import PaymentMethod, PaymentStatus, BankReviewReason, BankReviewStatus
+from services.batching import chunked, MAX_REPORTED_ROW_ERRORS
+
+RECONCILE_CHUNK_SIZE = 2000 # Statement lines matched, applied and committed together
+DATE_TOLERANCE_DAYS = 7 # Amount-and-date matches: value date within this many days of the due date
+# Candidate reference codes in a narration: words with letters and digits, optionally joined by
+# hyphens (e.g. "LEASE101-PAY202310", "REF-1"). Banks often drop or add separators, so codes are
+# compared with everything but letters and digits removed.
+REFERENCE_CODE_PATTERNS = (r'\b(?=[A-Z0-9-]*\d)(?=[A-Z0-9-]*[A-Z])[A-Z0-9]+(?:-[A-Z0-9]+)*\b',)
+OPEN_PAYMENT_STATUSES = (PaymentStatus.EXPECTED, PaymentStatus.OVERDUE)
+
+# Header names banks use for each statement field (compared lower-cased, spaces as underscores)
+CSV_COLUMN_ALIASES = {
+    'value_date': ('value_date', 'date', 'transaction_date', 'posting_date', 'txn_date', 'booking_date'),
+    'amount': ('amount', 'credit', 'credit_amount', 'paid_in', 'money_in', 'deposit'),
+    'debit': ('debit', 'debit_amount', 'paid_out', 'money_out', 'withdrawal'),
+    'narration': ('narration', 'description', 'details', 'narrative', 'particulars', 'transaction_details', 'payer_narration'),
+    'bank_reference': ('bank_reference', 'reference', 'transaction_id', 'bank_transaction_id', 'transaction_reference', 'ref'),
+}
+CSV_DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y', '%d %b %Y', '%d-%b-%Y', '%d/%m/%y')
+
+# :61: statement line: value date YYMMDD, optional entry date MMDD, debit/credit mark, optional
+# funds code, amount with a decimal comma, transaction type, customer reference [// bank reference]
+_MT940_STATEMENT_LINE = re.compile(
+    r':61:(?P<value_date>\d{6})(?:\d{4})?(?P<mark>R?[CD])[A-Z]?(?P<amount>\d+,\d*)'
+    r'[NSF][A-Z0-9]{3}(?P<customer_reference>[^/]*?)(?://(?P<bank_reference>[^\s]*))?\s*$'
+)
+_NOT_ALPHANUMERIC = re.compile(r'[^A-Z0-9]')
+
+
+def normalize_reference_code(code: str) -> str:
+    """A reference code as compared with statement narrations: upper case, letters and digits only."""
+    return _NOT_ALPHANUMERIC.sub('', code.upper())
+
+
+def read_statement_csv(stream) -> Iterator[Optional[Dict[str, Any]]]:
+    """
+    Lines of a bank statement CSV (binary or text stream) with a header line, one at a time, as
+    {"value_date", "amount", "narration", "bank_reference"} strings. Debits (a debit column, or a
+    negative amount) have a negative amount. ValueError if the header has no date or amount column.
+    """
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.reader(stream)
+    header = [name.strip().lower().replace(' ', '_') for name in next(reader, [])]
+    columns = {field: next((header.index(alias) for alias in aliases if alias in header), None)
+               for field, aliases in CSV_COLUMN_ALIASES.items()}
+    if columns['value_date'] is None or (columns['amount'] is None and columns['debit'] is None):
+        raise ValueError("Statement header needs a date column and an amount or credit column")
+
+    def cell(row, field):
+        index = columns[field]
+        return row[index].strip() if index is not None and index < len(row) else ''
+
+    for row in reader:
+        if not any(value.strip() for value in row):
+            continue
+        amount, debit = cell(row, 'amount'), cell(row, 'debit')
+        if not amount and debit:
+            amount = '-' + debit.lstrip('-')
+        yield {"value_date": cell(row, 'value_date'), "amount": amount,
+               "narration": cell(row, 'narration'), "bank_reference": cell(row, 'bank_reference')}
+
+
+def read_statement_mt940(stream) -> Iterator[Optional[Dict[str, Any]]]:
+    """
+    Statement lines of an MT940 file, one per :61: field, in the same shape as read_statement_csv:
+    the narration is the :61: supplementary details and the following :86: field (continuation
+    lines joined). Unparsable :61: fields are yielded as None and reported as line errors.
+    """
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig')
+    current, narration, in_information = None, [], False
+
+    def finish():
+        if current is not None:
+            current["narration"] = " ".join(part for part in narration if part).strip()
+        return current
+
+    for raw in stream:
+        line = raw.rstrip('\r\n')
+        if line.startswith(':61:'):
+            if current is not None or narration:
+                yield finish()
+            match = _MT940_STATEMENT_LINE.match(line)
+            narration, in_information = [], False
+            if match is None:
+                current, narration = None, [None] # Reported once, at the next field
+                continue
+            value_date = match['value_date']
+            customer_reference = match['customer_reference'].strip()
+            current = {
+                "value_date": f"20{value_date[:2]}-{value_date[2:4]}-{value_date[4:]}",
+                "amount": ('-' if match['mark'] in ('D', 'RC') else '') + match['amount'].replace(',', '.'),
+                "bank_reference": match['bank_reference'] or (customer_reference if customer_reference.upper() != 'NONREF' else ''),
+            }
+        elif line.startswith(':86:') and current is not None:
+            narration.append(line[4:].strip())
+            in_information = True
+        elif line.startswith(':') or line.startswith('-'):
+            if current is not None or narration:
+                yield finish()
+            current, narration, in_information = None, [], False
+        elif current is not None and line.strip():
+            if in_information: # Wrapped :86: text continues mid-word
+                narration[-1] += line.strip()
+            else: # Supplementary details of the :61: field
+                narration.append(line.strip())
+    if current is not None or narration:
+        yield finish()
+
+
+def _parse_date(value: str) -> date:
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        pass
+    for date_format in CSV_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid date: {value}")
+
+
+class BankReconciliationService:
+    """
+    Applies a landlord's bank statement to their open (EXPECTED or OVERDUE) payments. Each
+    credit is matched by the payment_reference_code tenants quote in the transfer narration,
+    looked up in an in-memory hash index of the open payments; credits without a known code
+    fall back to a unique open payment of the same amount due within DATE_TOLERANCE_DAYS.
+    Matched payments are completed with one bulk update per chunk of lines; credits that fit
+    several payments, none, or a payment of another amount go to the review queue
+    (BankStatementReviewItem). Lines whose bank reference is already on a payment or in the
+    queue are skipped, so a statement can be imported again.
+    """
+
+    def __init__(self, reference_patterns: Iterable[str] = REFERENCE_CODE_PATTERNS, date_tolerance_days: int = DATE_TOLERANCE_DAYS):
+        self.reference_patterns = [re.compile(pattern, re.IGNORECASE) for pattern in reference_patterns]
+        self.date_tolerance_days = date_tolerance_days
+
+    def reference_codes(self, narration: Optional[str]) -> List[str]:
+        """Normalized candidate reference codes in a narration, in order; adjacent words are also tried joined."""
+        if not narration:
+            return []
+        codes: Dict[str, None] = {}
+        for pattern in self.reference_patterns:
+            previous = None
+            for match in pattern.finditer(narration):
+                code = normalize_reference_code(match.group(0))
+                codes[code] = None
+                # "LEASE101 PAY202310" for "LEASE101-PAY202310"
+                if previous is not None and not narration[previous.end():match.start()].strip(' -/'):
+                    codes[normalize_reference_code(previous.group(0)) + code] = None
+                previous = match
+        return list(codes)
+
+    def _open_payments(self, landlord_id: int) -> Tuple[Dict[str, Any], Dict[Tuple[Decimal, date], List[Any]]]:
+        """The landlord's open payments indexed by normalized reference code and by (expected amount, due date)."""
+        rows = db.session.execute(
+            sa.select(Payment.payment_id, Payment.payment_reference_code, Payment.expected_amount, Payment.due_date)
+            .join(Lease, Lease.lease_id == Payment.lease_id)
+            .where(Lease.landlord_id == landlord_id, Payment.status.in_(OPEN_PAYMENT_STATUSES))
+        ).all()
+        by_code: Dict[str, Any] = {}
+        by_amount_and_date: Dict[Tuple[Decimal, date], List[Any]] = defaultdict(list)
+        for row in rows:
+            if row.payment_reference_code:
+                by_code[normalize_reference_code(row.payment_reference_code)] = row
+            if row.due_date is not None:
+                by_amount_and_date[(row.expected_amount, row.due_date)].append(row)
+        return by_code, by_amount_and_date
+
+    def _known_references(self, landlord_id: int) -> set:
+        """Bank references already recorded on the landlord's payments or review items."""
+        known = set(db.session.scalars(
+            sa.select(Payment.bank_transaction_id).join(Lease, Lease.lease_id == Payment.lease_id)
+            .where(Lease.landlord_id == landlord_id, Payment.bank_transaction_id.is_not(None))
+        ))
+        known.update(db.session.scalars(
+            sa.select(BankStatementReviewItem.bank_reference)
+            .where(BankStatementReviewItem.landlord_id == landlord_id, BankStatementReviewItem.bank_reference.is_not(None))
+        ))
+        return known
+
+    def _coerce(self, raw: Any) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+        """A statement line with parsed date and amount, and its errors."""
+        if not isinstance(raw, dict):
+            return None, ["Unreadable statement line"]
+        errors = []
+        line = {"narration": (raw.get('narration') or '').strip() or None,
+                "bank_reference": (raw.get('bank_reference') or '').strip()[:255] or None}
+        try:
+            line["value_date"] = _parse_date(str(raw.get('value_date') or '').strip())
+        except ValueError as e:
+            errors.append(str(e))
+        try:
+            amount = re.sub(r'[^0-9.\-]', '', str(raw.get('amount') or ''))
+            line["amount"] = Decimal(amount).quantize(Decimal('0.01'))
+        except (InvalidOperation, ValueError):
+            errors.append(f"Invalid amount: {raw.get('amount')}")
+        return line, errors
+
+    def _match(self, line: Dict[str, Any], by_code, by_amount_and_date, taken: set) -> Tuple[Optional[Any], str, Optional[BankReviewReason], List[int]]:
+        """(payment, how, None, []) for a match, else (None, '', review reason, candidate payment ids)."""
+        hits = {}
+        for code in self.reference_codes(line["narration"]):
+            row = by_code.get(code)
+            if row is not None:
+                hits[row.payment_id] = row
+        if len(hits) == 1:
+            row = next(iter(hits.values()))
+            if row.payment_id in taken:
+                return None, '', BankReviewReason.ALREADY_MATCHED, [row.payment_id]
+            if row.expected_amount != line["amount"]:
+                return None, '', BankReviewReason.AMOUNT_MISMATCH, [row.payment_id]
+            return row, 'reference', None, []
+        if hits:
+            return None, '', BankReviewReason.AMBIGUOUS, sorted(hits)
+        candidates = []
+        for offset in range(-self.date_tolerance_days, self.date_tolerance_days + 1):
+            for row in by_amount_and_date.get((line["amount"], line["value_date"] + timedelta(days=offset)), ()):
+                if row.payment_id not in taken:
+                    candidates.append(row)
+        if len(candidates) == 1:
+            return candidates[0], 'amount_and_date', None, []
+        if candidates:
+            return None, '', BankReviewReason.AMBIGUOUS, sorted(row.payment_id for row in candidates)
+        return None, '', BankReviewReason.NO_MATCH, []
+
+    def reconcile_statement(self, landlord_id: int, lines: Iterable[Any], landlord_bank_account_id: Optional[int] = None,
+                            chunk_size: int = RECONCILE_CHUNK_SIZE, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Reconciles `lines` (e.g. from read_statement_csv / read_statement_mt940) with the landlord's
+        open payments. Lines are numbered from 1; debits are skipped. With dry_run nothing is written.
+        Returns {"lines", "matched_by_reference", "matched_by_amount_and_date", "queued_for_review",
+        "skipped_debits", "already_reconciled", "failed", "errors": [{"line", "errors"}], "errors_truncated"}.
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1.")
+        summary = {"lines": 0, "matched_by_reference": 0, "matched_by_amount_and_date": 0, "queued_for_review": 0,
+                   "skipped_debits": 0, "already_reconciled": 0, "failed": 0, "errors": [], "errors_truncated": False}
+        by_code, by_amount_and_date = self._open_payments(landlord_id)
+        known_references = self._known_references(landlord_id) # Grows with this statement's lines
+        taken: set = set() # Payments matched by this statement
+
+        def fail(line_number: int, errors: List[str]) -> None:
+            summary["failed"] += 1
+            if len(summary["errors"]) < MAX_REPORTED_ROW_ERRORS:
+                summary["errors"].append({"line": line_number, "errors": errors})
+            else:
+                summary["errors_truncated"] = True
+
+        for chunk in chunked(lines, chunk_size):
+            credits = []
+            for raw in chunk:
+                summary["lines"] += 1
+                line, errors = self._coerce(raw)
+                if errors:
+                    fail(summary["lines"], errors)
+                elif line["amount"] <= 0:
+                    summary["skipped_debits"] += 1
+                else:
+                    credits.append((summary["lines"], line))
+
+            matches, reviews = [], []
+            for line_number, line in credits:
+                reference = line["bank_reference"]
+                if reference is not None:
+                    if reference in known_references:
+                        summary["already_reconciled"] += 1
+                        continue
+                    known_references.add(reference)
+                row, how, reason, candidates = self._match(line, by_code, by_amount_and_date, taken)
+                if row is not None:
+                    taken.add(row.payment_id)
+                    matches.append((line_number, line, row, how))
+                else:
+                    reviews.append((line_number, line, reason, candidates))
+            if not dry_run:
+                matches, reviews = self._apply_chunk(landlord_id, landlord_bank_account_id, matches, reviews, taken, fail)
+            for _, _, _, how in matches:
+                summary[f"matched_by_{how}"] += 1
+            summary["queued_for_review"] += len(reviews)
+        return summary
+
+    def _apply_chunk(self, landlord_id: int, landlord_bank_account_id: Optional[int], matches: List, reviews: List,
+                     taken: set, fail) -> Tuple[List, List]:
+        """Completes one chunk's matched payments and queues its review items in one transaction."""
+        now = datetime.utcnow()
+        try:
+            # Payments settled since the index was built (e.g. an M-Pesa callback) are left alone
+            matched_ids = [row.payment_id for _, _, row, _ in matches]
+            still_open = set()
+            for chunk in chunked(matched_ids):
+                still_open.update(db.session.scalars(sa.select(Payment.payment_id).where(
+                    Payment.payment_id.in_(chunk), Payment.status.in_(OPEN_PAYMENT_STATUSES)
+                ).with_for_update()))
+            reviews = reviews + [(line_number, line, BankReviewReason.ALREADY_MATCHED, [row.payment_id])
+                                 for line_number, line, row, _ in matches if row.payment_id not in still_open]
+            matches = [match for match in matches if match[2].payment_id in still_open]
+
+            db.session.bulk_update_mappings(Payment, [{
+                "payment_id": row.payment_id, "status": PaymentStatus.COMPLETED, "amount_paid": line["amount"],
+                "payment_date": line["value_date"], "payment_method": PaymentMethod.BANK_DEPOSIT_LANDLORD,
+                "bank_transaction_id": line["bank_reference"], "payer_narration": line["narration"],
+                "landlord_bank_account_id": landlord_bank_account_id, "updated_at": now,
+            } for _, line, row, _ in matches])
+            db.session.bulk_insert_mappings(BankStatementReviewItem, [{
+                "landlord_id": landlord_id, "landlord_bank_account_id": landlord_bank_account_id, "line_number": line_number,
+                "value_date": line["value_date"], "amount": line["amount"], "narration": line["narration"],
+                "bank_reference": line["bank_reference"], "reason": reason, "candidate_payment_ids": candidates,
+                "status": BankReviewStatus.OPEN, "created_at": now,
+            } for line_number, line, reason, candidates in reviews])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            taken.difference_update(row.payment_id for _, _, row, _ in matches)
+            for line_number, _ in sorted([(number, line) for number, line, _, _ in matches] + [(number, line) for number, line, _, _ in reviews]):
+                fail(line_number, [f"Error during bank reconciliation: {e}"])
+            return [], []
+        return matches, reviews
+
+    def get_review_items(self, landlord_id: int, status: BankReviewStatus = BankReviewStatus.OPEN) -> List[BankStatementReviewItem]:
+        return BankStatementReviewItem.query.filter_by(landlord_id=landlord_id, status=status)\
+            .order_by(BankStatementReviewItem.review_id).all()
+
+    def resolve_review_item(self, landlord_id: int, review_id: int, payment_id: Optional[int] = None) -> BankStatementReviewItem:
+        """
+        Applies an open review item to the landlord's open payment `payment_id` (completing it
+        with the line's amount, or marking it PARTIALLY_PAID if that is less than expected), or
+        dismisses the item when no payment is given.
+        """
+        item = BankStatementReviewItem.query.filter_by(review_id=review_id, landlord_id=landlord_id).first()
+        if item is None:
+            raise ValueError(f"Review item with ID {review_id} not found.")
+        if item.status != BankReviewStatus.OPEN:
+            raise ValueError(f"Review item {review_id} is already {item.status.value}.")
+        now = datetime.utcnow()
+        if payment_id is not None:
+            payment = Payment.query.join(Lease, Lease.lease_id == Payment.lease_id)\
+                .filter(Payment.payment_id == payment_id, Lease.landlord_id == landlord_id).first()
+            if payment is None:
+                raise ValueError(f"Payment with ID {payment_id} not found.")
+            if payment.status not in OPEN_PAYMENT_STATUSES:
+                raise ValueError(f"Payment {payment_id} is already {payment.status.value}.")
+            payment.status = PaymentStatus.PARTIALLY_PAID if item.amount < payment.expected_amount else PaymentStatus.COMPLETED
+            payment.amount_paid = item.amount
+            payment.payment_date = item.value_date
+            payment.payment_method = PaymentMethod.BANK_DEPOSIT_LANDLORD
+            payment.bank_transaction_id = item.bank_reference
+            payment.payer_narration = item.narration
+            payment.landlord_bank_account_id = item.landlord_bank_account_id
+            item.status, item.resolved_payment_id = BankReviewStatus.RESOLVED, payment_id
+        else:
+            item.status = BankReviewStatus.DISMISSED
+        item.resolved_at = now
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            raise ValueError(f"Error resolving review item: {e}")
+        return item
@@ -0,0 +1,26 @@
+import time as timer
+from typing import Any, Dict, Iterable, Iterator, List
+
+# Upper bound on the number of bound parameters per IN (...) clause.
+# Keeps every query well below SQLite's host parameter limit.
+IN_CLAUSE_CHUNK_SIZE = 500
+
+# Failed rows of an import or statement beyond this are counted but not listed
+MAX_REPORTED_ROW_ERRORS = 1000
+
+
+def chunked(values: Iterable[Any], size: int = IN_CLAUSE_CHUNK_SIZE) -> Iterator[List[Any]]:
+    """Yields successive lists of at most `size` items from `values`."""
+    chunk = []
+    for value in values:
+        chunk.append(value)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def add_timing(timings: Dict[str, float], phase: str, started: float) -> None:
+    """Accumulates the elapsed time of a phase since `started` (a perf_counter value); phases repeat once per chunk."""
+    timings[phase] = timings.get(phase, 0.0) + (timer.perf_counter() - started)
@@ -0,0 +1,32 @@
+from typing import List, Optional, Dict, Any, Tuple
+from sqlalchemy import func
+from hermitta_app import db # Import db instance
+from models.building import Building, ROLLUP_COUNTERS
+
+MAX_BUILDING_PAGE_SIZE = 100
+
+
+class BuildingService:
+    """Reads a landlord's buildings and their precomputed unit and lease rollups (see models.building)."""
+
+    def get_buildings_for_landlord(self, landlord_id: int, page: int = 1, per_page: int = 20) -> Tuple[List[Building], int]:
+        """The landlord's buildings by name, with pagination. Returns (buildings, total)."""
+        if per_page < 1 or per_page > MAX_BUILDING_PAGE_SIZE:
+            raise ValueError(f"per_page must be between 1 and {MAX_BUILDING_PAGE_SIZE}.")
+        query = Building.query.filter_by(landlord_id=landlord_id).order_by(Building.name_key, Building.building_id)
+        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        return pagination.items, pagination.total
+
+    def get_building_for_landlord(self, building_id: int, landlord_id: int) -> Optional[Building]:
+        building = db.session.get(Building, building_id)
+        return building if building and building.landlord_id == landlord_id else None
+
+    def get_portfolio_summary(self, landlord_id: int) -> Dict[str, Any]:
+        """Totals of the landlord's building rollups (one row per building is read, no unit is scanned) and the occupancy rate."""
+        totals = db.session.query(
+            func.count(Building.building_id), *[func.coalesce(func.sum(getattr(Building, counter)), 0) for counter in ROLLUP_COUNTERS]
+        ).filter(Building.landlord_id == landlord_id).one()
+        summary = {"buildings": totals[0]}
+        summary.update(zip(ROLLUP_COUNTERS, totals[1:]))
+        summary["occupancy_rate"] = round(summary["occupied_units"] / summary["total_units"], 4) if summary["total_units"] else None
+        return summary
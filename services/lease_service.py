@@ -1,10 +1,19 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime, date
 from decimal import Decimal
+from types import SimpleNamespace
+import sqlalchemy as sa
 from hermitta_app import db # Import db instance
 from models.lease import Lease, LeaseStatusType, LeaseSigningStatus # Import SQLAlchemy model
 from models.user import User # Needed for type checking landlord/tenant etc.
 from models.property import Property # Needed for type checking property
+from models.building import Building
+from services.batching import chunked
+from services.pagination import keyset_page
+from hermitta_app.services.entity_cache import entity_cache
+
+LEASE_REQUIRED_FIELDS = ['property_id', 'landlord_id', 'start_date', 'end_date', 'rent_amount', 'rent_due_day', 'move_in_date']
+BULK_LEASE_BATCH_SIZE = 1000 # Leases inserted and committed per transaction by create_leases_bulk
 
 class LeaseService:
 
@@ -18,6 +27,16 @@ class LeaseService:
                 raise ValueError(f"Invalid value for Decimal field '{field_name}': {value} - {e}")
         return value
 
+    def _ensure_int(self, value: Any, field_name: str) -> Optional[int]:
+        if value is None: # Allow optional id fields to be None
+            return None
+        if isinstance(value, bool):
+            raise ValueError(f"Invalid value for integer field '{field_name}': {value}")
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid value for integer field '{field_name}': {value}")
+
     def _ensure_date(self, value: Any, field_name: str) -> Optional[date]:
         if value is None: # Allow optional Date fields to be None
             return None
@@ -71,6 +90,12 @@ class LeaseService:
                 else: # Process as Date
                     prepared_data[field] = self._ensure_date(prepared_data[field], field)
 
+        # Handle foreign keys, so that e.g. "5" is looked up (and stored) as 5
+        id_fields = ['property_id', 'landlord_id', 'tenant_id', 'lease_document_uploaded_by_user_id']
+        for field in id_fields:
+            if field in prepared_data:
+                prepared_data[field] = self._ensure_int(prepared_data[field], field)
+
         # Handle Decimals
         decimal_fields = ['rent_amount', 'security_deposit']
         for field in decimal_fields:
@@ -89,29 +114,28 @@ class LeaseService:
         Creates a new lease.
         """
         # Validate presence of essential fields first
-        required_fields = ['property_id', 'landlord_id', 'start_date', 'end_date', 'rent_amount', 'rent_due_day', 'move_in_date']
-        missing_fields = [field for field in required_fields if field not in lease_data or lease_data[field] is None]
+        missing_fields = [field for field in LEASE_REQUIRED_FIELDS if field not in lease_data or lease_data[field] is None]
         if missing_fields:
             raise ValueError(f"Missing required fields for Lease creation: {', '.join(missing_fields)}")
 
         prepared_data = self._prepare_lease_data(lease_data)
 
-        # Basic validation for FK existence (DB will also enforce this)
+        # Basic validation for FK existence (DB will also enforce this), read through the entity cache
         # These checks can be made more robust or rely on DB constraints for final validation
         landlord_id = prepared_data.get('landlord_id')
-        if not User.query.get(landlord_id):
+        if not entity_cache.get(db.session, User, landlord_id):
             raise ValueError(f"Landlord user with ID {landlord_id} not found.")
 
         tenant_id = prepared_data.get('tenant_id')
-        if tenant_id and not User.query.get(tenant_id): # tenant_id is optional for a lease
+        if tenant_id and not entity_cache.get(db.session, User, tenant_id): # tenant_id is optional for a lease
             raise ValueError(f"Tenant user with ID {tenant_id} not found.")
 
         property_id = prepared_data.get('property_id')
-        if not Property.query.get(property_id):
+        if not entity_cache.get(db.session, Property, property_id):
             raise ValueError(f"Property with ID {property_id} not found.")
 
         uploader_id = prepared_data.get('lease_document_uploaded_by_user_id')
-        if uploader_id and not User.query.get(uploader_id):
+        if uploader_id and not entity_cache.get(db.session, User, uploader_id):
             raise ValueError(f"Uploader user with ID {uploader_id} not found.")
 
         try:
@@ -124,8 +148,117 @@ class LeaseService:
         db.session.commit()
         return new_lease
 
+    def _existing_ids(self, id_column, ids) -> set:
+        """The subset of `ids` present in `id_column`'s table, with one IN query per chunk of ids."""
+        existing = set()
+        for chunk in chunked(sorted(ids)):
+            existing.update(db.session.scalars(sa.select(id_column).where(id_column.in_(chunk))))
+        return existing
+
+    def create_leases_bulk(self, leases_data: List[Dict[str, Any]], batch_size: int = BULK_LEASE_BATCH_SIZE) -> Dict[str, Any]:
+        """
+        Creates many leases (e.g. a migration of historical leases) with the validation of
+        create_lease, but checking the referenced users and properties with one IN query per
+        table and inserting the valid leases `batch_size` at a time, one transaction per batch.
+        Invalid leases do not stop the others. Returns {"created", "failed", "results"}, with
+        one result per input in order: {"index", "lease_id"} or {"index", "error"}.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1.")
+        results: List[Dict[str, Any]] = [{"index": index} for index in range(len(leases_data))]
+        lease_columns = set(Lease.__table__.columns.keys())
+        prepared_rows: List[Tuple[int, Dict[str, Any]]] = []
+        for index, lease_data in enumerate(leases_data):
+            missing_fields = [field for field in LEASE_REQUIRED_FIELDS if lease_data.get(field) is None]
+            if missing_fields:
+                results[index]["error"] = f"Missing required fields for Lease creation: {', '.join(missing_fields)}"
+                continue
+            try:
+                prepared_data = self._prepare_lease_data(lease_data)
+            except ValueError as e:
+                results[index]["error"] = str(e)
+                continue
+            unknown_fields = sorted(set(prepared_data) - lease_columns)
+            if unknown_fields:
+                results[index]["error"] = f"Unknown Lease fields: {', '.join(unknown_fields)}"
+                continue
+            prepared_rows.append((index, prepared_data))
+
+        user_fields = (('landlord_id', "Landlord user"), ('tenant_id', "Tenant user"), ('lease_document_uploaded_by_user_id', "Uploader user"))
+        existing_users = self._existing_ids(User.user_id, {data[field] for _, data in prepared_rows
+                                                            for field, _ in user_fields if data.get(field)})
+        existing_properties = self._existing_ids(Property.property_id, {data['property_id'] for _, data in prepared_rows})
+        valid_rows = []
+        for index, prepared_data in prepared_rows:
+            missing = [f"{label} with ID {prepared_data[field]} not found." for field, label in user_fields
+                       if prepared_data.get(field) and prepared_data[field] not in existing_users]
+            if prepared_data['property_id'] not in existing_properties:
+                missing.append(f"Property with ID {prepared_data['property_id']} not found.")
+            if missing:
+                results[index]["error"] = " ".join(missing)
+            else:
+                valid_rows.append((index, prepared_data))
+
+        for start in range(0, len(valid_rows), batch_size):
+            self._insert_lease_batch(valid_rows[start:start + batch_size], results)
+        created = sum(1 for result in results if "lease_id" in result)
+        return {"created": created, "failed": len(results) - created, "results": results}
+
+    def _insert_lease_rows(self, mappings: List[Dict[str, Any]]) -> List[int]:
+        """Inserts leases with a single executemany statement and returns their ids, in order. The caller commits."""
+        lease_ids = db.session.scalars(
+            sa.insert(Lease).returning(Lease.lease_id, sort_by_parameter_order=True), mappings
+        ).all()
+        # Bulk inserts skip the flush listener that counts leases in force per building
+        connection = db.session.connection()
+        Building.adjust(connection, Building.lease_deltas(connection, [SimpleNamespace(**mapping) for mapping in mappings]))
+        return lease_ids
+
+    def _insert_lease_batch(self, batch: List[Tuple[int, Dict[str, Any]]], results: List[Dict[str, Any]]) -> None:
+        """
+        Inserts one batch with a single executemany statement and commits it. If the batch
+        fails, it is retried row by row in savepoints, so that only the offending leases fail.
+        """
+        now = datetime.utcnow()
+        mappings = []
+        for _, prepared_data in batch:
+            # Same defaults as Lease.__init__
+            mapping = {"status": LeaseStatusType.DRAFT, "signing_status": LeaseSigningStatus.NOT_STARTED,
+                       "lease_document_version": 1, "rent_start_date": prepared_data['move_in_date'],
+                       "created_at": now, "updated_at": now}
+            mapping.update(prepared_data)
+            if mapping.get('signature_requests') is None:
+                mapping['signature_requests'] = []
+            mappings.append(mapping)
+        try:
+            lease_ids = self._insert_lease_rows(mappings)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+        else:
+            for (index, _), lease_id in zip(batch, lease_ids):
+                results[index]["lease_id"] = lease_id
+            return
+
+        inserted = {}
+        for (index, _), mapping in zip(batch, mappings):
+            try:
+                with db.session.begin_nested():
+                    inserted[index] = self._insert_lease_rows([mapping])[0]
+            except Exception as e:
+                results[index]["error"] = f"Error during Lease creation: {e}"
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            for index in inserted:
+                results[index]["error"] = f"Error during Lease creation: {e}"
+            return
+        for index, lease_id in inserted.items():
+            results[index]["lease_id"] = lease_id
+
     def get_lease_by_id(self, lease_id: int) -> Optional[Lease]:
-        return Lease.query.get(lease_id)
+        return entity_cache.get(db.session, Lease, lease_id)
 
     def update_lease(self, lease_id: int, update_data: Dict[str, Any]) -> Optional[Lease]:
         lease_to_update = self.get_lease_by_id(lease_id)
@@ -138,6 +271,7 @@ class LeaseService:
                 setattr(lease_to_update, key, value)
 
         db.session.commit()
+        entity_cache.invalidate(Lease, lease_id)
         return lease_to_update
 
     def delete_lease(self, lease_id: int) -> bool:
@@ -147,24 +281,44 @@ class LeaseService:
             # For now, simple deletion.
             db.session.delete(lease_to_delete)
             db.session.commit()
+            entity_cache.invalidate(Lease, lease_id)
             return True
         return False
 
     def get_leases_for_property(self, property_id: int, page: int = 1, per_page: int = 10) -> (List[Lease], int):
-        query = Lease.query.filter_by(property_id=property_id).order_by(Lease.start_date.desc())
+        query = Lease.query.filter_by(property_id=property_id).order_by(Lease.start_date.desc(), Lease.lease_id.desc())
         pagination = query.paginate(page=page, per_page=per_page, error_out=False)
         return pagination.items, pagination.total
 
     def get_leases_for_landlord(self, landlord_id: int, page: int = 1, per_page: int = 10) -> (List[Lease], int):
-        query = Lease.query.filter_by(landlord_id=landlord_id).order_by(Lease.start_date.desc())
+        query = Lease.query.filter_by(landlord_id=landlord_id).order_by(Lease.start_date.desc(), Lease.lease_id.desc())
         pagination = query.paginate(page=page, per_page=per_page, error_out=False)
         return pagination.items, pagination.total
 
     def get_leases_for_tenant(self, tenant_id: int, page: int = 1, per_page: int = 10) -> (List[Lease], int):
-        query = Lease.query.filter_by(tenant_id=tenant_id).order_by(Lease.start_date.desc())
+        query = Lease.query.filter_by(tenant_id=tenant_id).order_by(Lease.start_date.desc(), Lease.lease_id.desc())
         pagination = query.paginate(page=page, per_page=per_page, error_out=False)
         return pagination.items, pagination.total
 
+    # Cursor-paginated variants, keyed on (start_date, lease_id): `cursor` is the next_cursor of the
+    # previous page, so deep pages cost the same as the first one.
+    # Each returns (leases, next_cursor, total); the total is only counted with include_total.
+
+    def _leases_keyset(self, query, limit: int, cursor: Optional[str], include_total: bool) -> Tuple[List[Lease], Optional[str], Optional[int]]:
+        return keyset_page(query, (Lease.start_date, Lease.lease_id), limit, cursor, include_total)
+
+    def get_leases_for_property_keyset(self, property_id: int, limit: int = 10, cursor: Optional[str] = None,
+                                       include_total: bool = False) -> Tuple[List[Lease], Optional[str], Optional[int]]:
+        return self._leases_keyset(Lease.query.filter_by(property_id=property_id), limit, cursor, include_total)
+
+    def get_leases_for_landlord_keyset(self, landlord_id: int, limit: int = 10, cursor: Optional[str] = None,
+                                       include_total: bool = False) -> Tuple[List[Lease], Optional[str], Optional[int]]:
+        return self._leases_keyset(Lease.query.filter_by(landlord_id=landlord_id), limit, cursor, include_total)
+
+    def get_leases_for_tenant_keyset(self, tenant_id: int, limit: int = 10, cursor: Optional[str] = None,
+                                     include_total: bool = False) -> Tuple[List[Lease], Optional[str], Optional[int]]:
+        return self._leases_keyset(Lease.query.filter_by(tenant_id=tenant_id), limit, cursor, include_total)
+
     # --- Methods related to e-signature and document management (stubs for now) ---
 
     def initiate_signing_process(self, lease_id: int, signers_data: List[Dict[str, Any]]) -> bool:
@@ -0,0 +1,91 @@
+from typing import List, Optional, Tuple
+from datetime import datetime
+from hermitta_app import db # Import db instance
+from models.notification import Notification
+from models.notification_unread_counter import NotificationUnreadCounter, UNREAD_INBOX_STATUSES
+from models.enums import NotificationChannel, NotificationStatus
+from services.pagination import keyset_page
+
+# IN_APP notifications shown in the inbox: delivered by the dispatcher, read or not
+INBOX_STATUSES = UNREAD_INBOX_STATUSES + (NotificationStatus.READ,)
+
+MAX_INBOX_PAGE_SIZE = 100
+
+
+class NotificationService:
+
+    def _inbox_query(self, user_id: int):
+        return Notification.query.filter(
+            Notification.user_id == user_id,
+            Notification.channel == NotificationChannel.IN_APP,
+            Notification.status.in_(INBOX_STATUSES)
+        )
+
+    def get_inbox(self, user_id: int, limit: int = 20, cursor: Optional[str] = None,
+                  unread_only: bool = False) -> Tuple[List[Notification], Optional[str]]:
+        """
+        Retrieves a page of the user's in-app inbox, newest first.
+        Pages are keyset-paginated on (created_at, notification_id): `cursor` is the
+        `next_cursor` of the previous page, so deep pages cost the same as the first one.
+        Returns a tuple of (notifications, next_cursor); next_cursor is None on the last page.
+        """
+        if limit < 1 or limit > MAX_INBOX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {MAX_INBOX_PAGE_SIZE}.")
+        query = self._inbox_query(user_id)
+        if unread_only:
+            query = query.filter(Notification.read_at.is_(None), Notification.status.in_(UNREAD_INBOX_STATUSES))
+        rows, next_cursor, _ = keyset_page(query, (Notification.created_at, Notification.notification_id), limit, cursor)
+        return rows, next_cursor
+
+    def get_unread_count(self, user_id: int) -> int:
+        """Number of unread inbox notifications, read from the user's counter (a primary key lookup)."""
+        count = db.session.query(NotificationUnreadCounter.unread_count).filter(NotificationUnreadCounter.user_id == user_id).scalar()
+        return count or 0
+
+    def mark_as_read(self, user_id: int, notification_id: int) -> Optional[Notification]:
+        """
+        Marks one of the user's notifications as read with a conditional UPDATE, so two
+        concurrent requests decrement the unread counter only once.
+        Returns None if the notification does not exist or belongs to another user.
+        """
+        now = datetime.utcnow()
+        try:
+            marked = Notification.query.filter(
+                Notification.notification_id == notification_id,
+                Notification.user_id == user_id,
+                Notification.channel == NotificationChannel.IN_APP,
+                Notification.status.in_(UNREAD_INBOX_STATUSES),
+                Notification.read_at.is_(None)
+            ).update({
+                Notification.read_at: now, Notification.status: NotificationStatus.READ, Notification.updated_at: now,
+            }, synchronize_session=False)
+            if marked:
+                NotificationUnreadCounter.adjust(db.session.connection(), {user_id: -1})
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            raise ValueError(f"Error marking Notification as read: {e}")
+        notification = Notification.query.filter_by(notification_id=notification_id, user_id=user_id).first()
+        if notification is not None and marked:
+            db.session.refresh(notification)
+        return notification
+
+    def mark_all_as_read(self, user_id: int) -> int:
+        """
+        Marks every unread inbox notification of the user as read with a single UPDATE and
+        resets the user's counter in the same transaction. Returns the number marked.
+        """
+        now = datetime.utcnow()
+        try:
+            marked = self._inbox_query(user_id).filter(
+                Notification.status.in_(UNREAD_INBOX_STATUSES),
+                Notification.read_at.is_(None)
+            ).update({
+                Notification.read_at: now, Notification.status: NotificationStatus.READ, Notification.updated_at: now,
+            }, synchronize_session=False)
+            NotificationUnreadCounter.reset(db.session.connection(), user_id)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            raise ValueError(f"Error marking Notifications as read: {e}")
+        return marked
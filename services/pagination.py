@@ -0,0 +1,68 @@
+import base64
+import json
+from datetime import datetime, date
+from typing import List, Any, Optional, Sequence, Tuple
+from sqlalchemy import and_, or_
+
+MAX_KEYSET_PAGE_SIZE = 100
+
+
+def encode_cursor(*values: Any) -> str:
+    """
+    Encodes the sort key of the last row of a page (e.g. its created_at and id) as an
+    opaque, URL-safe cursor. Datetimes and dates are stored in ISO format.
+    """
+    payload = [
+        {"dt": value.isoformat()} if isinstance(value, datetime) else {"d": value.isoformat()} if isinstance(value, date) else value
+        for value in values
+    ]
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_value(value: Any) -> Any:
+    if not isinstance(value, dict):
+        return value
+    if "dt" in value:
+        return datetime.fromisoformat(value["dt"])
+    return date.fromisoformat(value["d"])
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """Decodes a cursor made by `encode_cursor` holding `size` values. Raises ValueError if it is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(payload, list) or len(payload) != size:
+            raise ValueError
+        return [_decode_value(value) for value in payload]
+    except (ValueError, TypeError, KeyError, UnicodeError):
+        raise ValueError("Invalid pagination cursor.")
+
+
+def keyset_page(query, sort_columns: Sequence, limit: int, cursor: Optional[str] = None,
+                include_total: bool = False) -> Tuple[list, Optional[str], Optional[int]]:
+    """
+    Fetches one page of `query` in descending order of `sort_columns` (non-null columns,
+    the last one unique, e.g. created_at and the primary key), starting after `cursor`.
+    The cursor holds the sort key of the previous page's last row, so the page is a range
+    scan of an index on the filter and sort columns: deep pages cost the same as the first.
+    Returns (rows, next_cursor, total); next_cursor is None on the last page and total
+    (a COUNT(*) of the whole result) is None unless include_total is set.
+    """
+    if limit < 1 or limit > MAX_KEYSET_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_KEYSET_PAGE_SIZE}.")
+    total = query.order_by(None).count() if include_total else None
+    if cursor:
+        values = decode_cursor(cursor, len(sort_columns))
+        # (a, b) < (x, y) written out as a < x OR (a = x AND b < y), which every backend supports
+        query = query.filter(or_(*[
+            and_(*[sort_columns[i] == values[i] for i in range(position)], sort_columns[position] < values[position])
+            for position in range(len(sort_columns))
+        ]))
+    # One extra row tells whether there is a next page
+    rows = query.order_by(*[sort_column.desc() for sort_column in sort_columns]).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(*[getattr(rows[-1], sort_column.key) for sort_column in sort_columns])
+    return rows, next_cursor, total
@@ -0,0 +1,228 @@
+import csv
+import io
+import json
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from types import SimpleNamespace
+from typing import List, Dict, Any, Iterable, Iterator, Tuple
+import sqlalchemy as sa
+from hermitta_app import db # Import db instance
+from models.property import Property, PropertyType, PropertyStatus
+from models.property_listing_index import PropertyListingIndex, normalize_search_text
+from models.building import Building, building_name_of, unit_rollup, add_rollup
+from services.batching import chunked, MAX_REPORTED_ROW_ERRORS
+
+IMPORT_CHUNK_SIZE = 1000 # Rows validated, inserted and committed together
+
+IMPORT_REQUIRED_FIELDS = ('address_line_1', 'city', 'county', 'property_type', 'num_bedrooms', 'num_bathrooms')
+IMPORT_INTEGER_FIELDS = ('num_bedrooms', 'num_bathrooms', 'size_sqft')
+IMPORT_LIST_FIELDS = ('amenities', 'photos_urls') # In CSV files: values separated by ';'
+# Free-text columns and their maximum lengths (Text columns have none)
+IMPORT_TEXT_FIELDS = {
+    column.name: getattr(column.type, 'length', None)
+    for column in Property.__table__.columns
+    if isinstance(column.type, (sa.String, sa.Text)) and not isinstance(column.type, sa.Enum)
+}
+_PROPERTY_TYPES = {member.name: member for member in PropertyType}
+_PROPERTY_STATUSES = {member.name: member for member in PropertyStatus}
+
+
+def read_csv_rows(stream) -> Iterator[Dict[str, Any]]:
+    """Rows of a CSV file (binary or text stream) with a header line, one at a time."""
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    for row in csv.DictReader(stream):
+        yield {key.strip(): value for key, value in row.items() if key is not None}
+
+
+def read_json_rows(stream) -> Iterator[Dict[str, Any]]:
+    """
+    Rows of a JSON file: JSON Lines (one object per line) are streamed; a JSON array of
+    objects is loaded whole (ValueError if it is malformed). Unparsable lines and non-object
+    entries are yielded as None or as-is and reported as row errors.
+    """
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig')
+    first_line = stream.readline()
+    if first_line.lstrip().startswith('['):
+        yield from json.loads(first_line + stream.read())
+        return
+    for line in _prepend(first_line, stream):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+
+
+def _prepend(first, rest: Iterable) -> Iterator:
+    yield first
+    yield from rest
+
+
+def _blank(value) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+class PropertyImportService:
+    """
+    Imports many properties of one landlord from CSV or JSON rows: rows are validated a chunk
+    at a time and each chunk's valid rows are inserted with one executemany statement (and
+    indexed for the listing search) in one transaction. Invalid rows are reported, not fatal.
+    """
+
+    def _coerce(self, raw: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+        """Property column values of one row, and its errors."""
+        errors = [f"Missing required field: {field}" for field in IMPORT_REQUIRED_FIELDS if _blank(raw.get(field))]
+        data: Dict[str, Any] = {}
+        for field, max_length in IMPORT_TEXT_FIELDS.items():
+            value = raw.get(field)
+            if not _blank(value):
+                value = str(value).strip()
+                if max_length and len(value) > max_length:
+                    errors.append(f"{field} is longer than {max_length} characters")
+                data[field] = value
+        for field in IMPORT_INTEGER_FIELDS:
+            value = raw.get(field)
+            if not _blank(value):
+                try:
+                    data[field] = int(str(value).strip())
+                    if data[field] < 0:
+                        errors.append(f"{field} must not be negative")
+                except ValueError:
+                    errors.append(f"{field} must be an integer")
+        for field, members in (('property_type', _PROPERTY_TYPES), ('status', _PROPERTY_STATUSES)):
+            value = raw.get(field)
+            if not _blank(value):
+                member = members.get(str(value).strip().upper())
+                if member is None:
+                    errors.append(f"Invalid {field}: {value}")
+                data[field] = member
+        if not _blank(raw.get('monthly_rent')):
+            try:
+                data['monthly_rent'] = Decimal(str(raw['monthly_rent']).strip()).quantize(Decimal('0.01'))
+                if data['monthly_rent'] < 0 or not data['monthly_rent'].is_finite():
+                    errors.append("monthly_rent must be a non-negative amount")
+            except (InvalidOperation, ValueError):
+                errors.append("monthly_rent must be a number")
+        for field, limit in (('latitude', 90), ('longitude', 180)):
+            if not _blank(raw.get(field)):
+                try:
+                    data[field] = float(str(raw[field]).strip())
+                    if not -limit <= data[field] <= limit:
+                        errors.append(f"{field} must be between -{limit} and {limit}")
+                except ValueError:
+                    errors.append(f"{field} must be a number")
+        for field in IMPORT_LIST_FIELDS:
+            value = raw.get(field)
+            if isinstance(value, str):
+                value = [item.strip() for item in value.split(';') if item.strip()]
+            elif value is not None and not (isinstance(value, list) and all(isinstance(item, str) for item in value)):
+                errors.append(f"{field} must be a list of strings")
+                continue
+            data[field] = value or []
+        return data, errors
+
+    @staticmethod
+    def _duplicate_key(data: Dict[str, Any]) -> Tuple[str, str]:
+        return (" ".join((data.get('address_line_1') or '').lower().split()), (data.get('unit_number') or '').strip().lower())
+
+    def _existing_keys(self, landlord_id: int) -> set:
+        rows = db.session.query(Property.address_line_1, Property.unit_number).filter(Property.landlord_id == landlord_id).all()
+        return {self._duplicate_key({"address_line_1": row.address_line_1, "unit_number": row.unit_number}) for row in rows}
+
+    def import_properties(self, landlord_id: int, rows: Iterable[Any], chunk_size: int = IMPORT_CHUNK_SIZE,
+                          dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Imports `rows` (dicts of Property fields, e.g. from read_csv_rows / read_json_rows) for
+        the landlord. Rows are numbered from 1; a row duplicating an address and unit_number of
+        the landlord's properties (or of an earlier row) is rejected. With dry_run nothing is written.
+        If `rows` cannot be read to the end (e.g. a malformed byte mid-file), the rows read before
+        are still imported and the error is returned as "read_error".
+        Returns {"imported", "failed", "errors": [{"row", "errors"}], "errors_truncated", "read_error"}.
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1.")
+        summary = {"imported": 0, "failed": 0, "errors": [], "errors_truncated": False, "read_error": None}
+        seen_keys = self._existing_keys(landlord_id)
+
+        def fail(row_number: int, errors: List[str]) -> None:
+            summary["failed"] += 1
+            if len(summary["errors"]) < MAX_REPORTED_ROW_ERRORS:
+                summary["errors"].append({"row": row_number, "errors": errors})
+            else:
+                summary["errors_truncated"] = True
+
+        def readable(rows: Iterable[Any]) -> Iterator[Any]:
+            # Readers are lazy, so a bad input surfaces here, possibly after earlier chunks were committed
+            iterator, read = iter(rows), 0
+            while True:
+                try:
+                    raw = next(iterator)
+                except StopIteration:
+                    return
+                except (ValueError, csv.Error) as e: # Includes UnicodeDecodeError
+                    summary["read_error"] = f"Could not read past row {read}: {e}"
+                    return
+                read += 1
+                yield raw
+
+        row_number = 0
+        for chunk in chunked(readable(rows), chunk_size):
+            valid = []
+            for raw in chunk:
+                row_number += 1
+                if not isinstance(raw, dict):
+                    fail(row_number, ["Row must be an object of property fields"])
+                    continue
+                data, errors = self._coerce(raw)
+                key = self._duplicate_key(data)
+                if not errors and key in seen_keys:
+                    errors.append("Duplicate property: same address_line_1 and unit_number")
+                if errors:
+                    fail(row_number, errors)
+                    continue
+                seen_keys.add(key)
+                valid.append((row_number, data))
+            if valid:
+                summary["imported"] += len(valid) if dry_run else self._insert_chunk(landlord_id, valid, fail)
+        return summary
+
+    def _insert_chunk(self, landlord_id: int, valid: List[Tuple[int, Dict[str, Any]]], fail) -> int:
+        """Inserts and indexes one chunk of valid rows in one transaction; returns the number imported."""
+        now = datetime.utcnow()
+        mappings = []
+        for _, data in valid:
+            # Same defaults as Property.__init__
+            mapping = {"status": PropertyStatus.VACANT, "created_at": now, "updated_at": now}
+            mapping.update({key: value for key, value in data.items() if value is not None or key in IMPORT_LIST_FIELDS})
+            mapping["landlord_id"] = landlord_id
+            mappings.append(mapping)
+        try:
+            # Bulk inserts skip the flush listeners that assign buildings and count their units
+            connection = db.session.connection()
+            building_ids: Dict[str, int] = {}
+            rollups: Dict[int, Dict[str, Any]] = {}
+            for mapping in mappings:
+                name = building_name_of(mapping.get('building_name'), mapping['address_line_1'])
+                key = normalize_search_text(name)
+                if key not in building_ids:
+                    building_ids[key] = Building.resolve(connection, landlord_id, name, SimpleNamespace(**mapping))
+                mapping["building_id"] = building_ids[key]
+                add_rollup(rollups, mapping["building_id"], unit_rollup(mapping["status"], mapping.get('monthly_rent')))
+            property_ids = db.session.scalars(
+                sa.insert(Property).returning(Property.property_id, sort_by_parameter_order=True), mappings
+            ).all()
+            Building.adjust(connection, rollups)
+            # ...and the mapper events that maintain the listing search index
+            documents = [SimpleNamespace(**{column.key: None for column in Property.__table__.columns}) for _ in mappings]
+            for document, mapping, property_id in zip(documents, mappings, property_ids):
+                document.__dict__.update(mapping, property_id=property_id)
+            PropertyListingIndex.write(db.session.connection(), documents)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            for row_number, _ in valid:
+                fail(row_number, [f"Error during Property import: {e}"])
+            return 0
+        return len(property_ids)
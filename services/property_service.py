@@ -1,7 +1,34 @@
-from typing import List, Optional, Dict, Any
+import math
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime
 from hermitta_app import db # Import db instance
+from sqlalchemy import case, func, or_
 from models.property import Property, PropertyType, PropertyStatus # Import SQLAlchemy model
+from models.property_listing_index import (
+    PropertyListingIndex, PropertyAmenityTerm, PropertyTextIndex, normalize_search_text, normalize_amenities,
+    geo_cell_ranges, bounding_box, haversine_km, EARTH_RADIUS_KM
+)
+from services.pagination import keyset_page
+from hermitta_app.services.entity_cache import entity_cache
+
+# Public listing search: sort_by -> (PropertyListingIndex column, descending)
+LISTING_SORT_OPTIONS = {
+    'created_at_desc': ('created_at', True),
+    'created_at_asc': ('created_at', False),
+    'rent_asc': ('monthly_rent', False),
+    'rent_desc': ('monthly_rent', True),
+    'bedrooms_asc': ('num_bedrooms', False),
+    'bedrooms_desc': ('num_bedrooms', True),
+    'relevance': (None, False), # Full-text rank; only with a q= search, where it is the default
+    'distance': (None, False), # Only with a latitude/longitude/radius_km search, where it is the default without q
+}
+# Upper bounds (KES, exclusive) of the rent_range facet buckets; the last bucket is open-ended
+LISTING_RENT_BUCKETS = (10000, 20000, 35000, 50000, 100000)
+MAX_LISTING_PAGE_SIZE = 100
+MAX_LISTING_RESULT_WINDOW = 10000
+MAX_SEARCH_RADIUS_KM = 50
+# A box spanning more cell rows than this is scanned as one geo_cell range instead of one range per row
+MAX_GEO_CELL_RANGES = 64
 
 class PropertyService:
 
@@ -48,15 +75,31 @@ class PropertyService:
 
     def get_property_by_id(self, property_id: int) -> Optional[Property]:
         """
-        Retrieves a property by its ID.
+        Retrieves a property by its ID (read through the entity cache).
         """
-        return Property.query.get(property_id)
+        return entity_cache.get(db.session, Property, property_id)
 
     def get_property_by_id_for_landlord(self, property_id: int, landlord_id: int) -> Optional[Property]:
         """
         Retrieves a property by its ID, ensuring it belongs to the specified landlord.
         """
-        return Property.query.filter_by(property_id=property_id, landlord_id=landlord_id).first()
+        property_obj = self.get_property_by_id(property_id)
+        return property_obj if property_obj is not None and property_obj.landlord_id == landlord_id else None
+
+    def get_property_updated_at_for_landlord(self, property_id: int, landlord_id: int) -> Optional[datetime]:
+        """
+        updated_at of one of the landlord's properties (None if there is no such property),
+        without loading the row: enough to answer a conditional GET with 304.
+        """
+        return db.session.query(Property.updated_at).filter_by(property_id=property_id, landlord_id=landlord_id).scalar()
+
+    def get_properties_version_for_landlord(self, landlord_id: int) -> Tuple[int, Optional[datetime]]:
+        """
+        (count, max(updated_at)) of the landlord's properties, read from the
+        (landlord_id, updated_at) index. Any insert, update or delete changes it.
+        """
+        count, last_updated_at = db.session.query(func.count(), func.max(Property.updated_at)).filter(Property.landlord_id == landlord_id).one()
+        return count, last_updated_at
 
     def update_property(self, property_id: int, update_data: Dict[str, Any]) -> Optional[Property]:
         """
@@ -78,6 +121,7 @@ class PropertyService:
             db.session.rollback()
             # Consider more specific error handling or logging
             raise ValueError(f"Error during Property update: {e}")
+        entity_cache.invalidate(Property, property_id) # Also done on commit; explicit for writes outside the ORM session
         return property_obj
 
     def delete_property(self, property_id: int) -> bool:
@@ -96,6 +140,7 @@ class PropertyService:
         try:
             db.session.delete(property_obj)
             db.session.commit()
+            entity_cache.invalidate(Property, property_id)
             return True
         except Exception as e:
             db.session.rollback()
@@ -105,15 +150,205 @@ class PropertyService:
 
     def get_properties_by_landlord(self, landlord_id: int, page: int = 1, per_page: int = 10) -> (List[Property], int):
         """
-        Retrieves properties for a given landlord with pagination.
+        Retrieves properties for a given landlord with pagination, newest first.
         Returns a tuple of (properties_list, total_properties_count).
+        For deep pages use get_properties_by_landlord_keyset, which does not scan the skipped rows.
         """
-        query = Property.query.filter_by(landlord_id=landlord_id)
-        # Could add default ordering, e.g., query = query.order_by(Property.created_at.desc())
+        query = Property.query.filter_by(landlord_id=landlord_id).order_by(Property.created_at.desc(), Property.property_id.desc())
 
         pagination = query.paginate(page=page, per_page=per_page, error_out=False)
         return pagination.items, pagination.total
 
+    def get_properties_by_landlord_keyset(self, landlord_id: int, limit: int = 10, cursor: Optional[str] = None,
+                                          include_total: bool = False) -> Tuple[List[Property], Optional[str], Optional[int]]:
+        """
+        Cursor-paginated get_properties_by_landlord, keyed on (created_at, property_id): `cursor`
+        is the next_cursor of the previous page. Returns (properties, next_cursor, total); the total
+        is only counted with include_total.
+        """
+        query = Property.query.filter_by(landlord_id=landlord_id)
+        return keyset_page(query, (Property.created_at, Property.property_id), limit, cursor, include_total)
+
+    def _listing_search_query(self, filters: Dict[str, Any]):
+        """
+        Filters the listing index (not the properties table): location fields are matched
+        on their normalized value as a prefix, which the composite indexes can serve.
+        """
+        query = db.session.query(PropertyListingIndex.property_id).filter(PropertyListingIndex.status == PropertyStatus.VACANT)
+
+        for filter_key, column in (('city', PropertyListingIndex.city), ('county', PropertyListingIndex.county),
+                                   ('estate', PropertyListingIndex.estate), ('building', PropertyListingIndex.building)):
+            prefix = normalize_search_text(filters.get(filter_key))
+            if prefix:
+                # column >= 'kil' AND column < 'kim' instead of ILIKE '%kil%'
+                query = query.filter(column >= prefix, column < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+        if filters.get('property_type'):
+            try:
+                query = query.filter(PropertyListingIndex.property_type == PropertyType[filters['property_type'].upper()])
+            except KeyError:
+                pass # Invalid property type string, ignore or raise error
+        if filters.get('min_bedrooms') is not None:
+            query = query.filter(PropertyListingIndex.num_bedrooms >= filters['min_bedrooms'])
+        if filters.get('max_bedrooms') is not None:
+            query = query.filter(PropertyListingIndex.num_bedrooms <= filters['max_bedrooms'])
+        if filters.get('min_rent') is not None:
+            query = query.filter(PropertyListingIndex.monthly_rent >= filters['min_rent'])
+        if filters.get('max_rent') is not None:
+            query = query.filter(PropertyListingIndex.monthly_rent <= filters['max_rent'])
+
+        amenities = filters.get('amenities')
+        if isinstance(amenities, str):
+            amenities = amenities.split(',')
+        for term in normalize_amenities(amenities):
+            # Every requested amenity must be listed: one semi-join on the inverted index per term
+            query = query.filter(PropertyListingIndex.property_id.in_(
+                db.session.query(PropertyAmenityTerm.property_id).filter(PropertyAmenityTerm.term == term)
+            ))
+        return query
+
+    def _listing_facets(self, query) -> Dict[str, Any]:
+        """Facet counts of the whole result set, from a single GROUP BY over the listing index."""
+        bucket_conditions = [(PropertyListingIndex.monthly_rent.is_(None), -1)] + [
+            (PropertyListingIndex.monthly_rent < upper, index) for index, upper in enumerate(LISTING_RENT_BUCKETS)
+        ]
+        rent_bucket = case(*bucket_conditions, else_=len(LISTING_RENT_BUCKETS)).label('rent_bucket')
+        rows = query.with_entities(
+            PropertyListingIndex.property_type, PropertyListingIndex.num_bedrooms, PropertyListingIndex.county,
+            rent_bucket, func.count()
+        ).group_by(PropertyListingIndex.property_type, PropertyListingIndex.num_bedrooms, PropertyListingIndex.county, rent_bucket).all()
+
+        facets = {"property_type": {}, "num_bedrooms": {}, "county": {}, "rent_range": {}}
+        total = 0
+        for property_type, num_bedrooms, county, bucket, count in rows:
+            total += count
+            for facet, value in (("property_type", property_type.value), ("num_bedrooms", num_bedrooms), ("county", county)):
+                facets[facet][value] = facets[facet].get(value, 0) + count
+            if bucket >= 0:
+                lower = LISTING_RENT_BUCKETS[bucket - 1] if bucket > 0 else 0
+                upper = LISTING_RENT_BUCKETS[bucket] if bucket < len(LISTING_RENT_BUCKETS) else None
+                label = f"{lower}-{upper}" if upper is not None else f"{lower}+"
+                facets["rent_range"][label] = facets["rent_range"].get(label, 0) + count
+        facets["num_bedrooms"] = dict(sorted(facets["num_bedrooms"].items()))
+        return {"total": total, "facets": facets}
+
+    def _geo_search(self, query, filters: Dict[str, Any]):
+        """
+        Applies the map filters: a radius around latitude/longitude (radius_km) and/or a
+        viewport bbox (south, west, north, east). Candidates are found through the geo_cell
+        index, one index range per row of cells of the box, then filtered on their exact
+        coordinates. Returns (query, center, distance): `distance` is a squared planar
+        (equirectangular) distance the database computes for every candidate, to filter and
+        rank by; it is accurate to well under 1% at city scale.
+        """
+        center, boxes = None, []
+        if any(filters.get(key) is not None for key in ('latitude', 'longitude', 'radius_km')):
+            try:
+                latitude, longitude, radius_km = float(filters['latitude']), float(filters['longitude']), float(filters['radius_km'])
+            except (KeyError, TypeError, ValueError):
+                raise ValueError("A radius search needs numeric latitude, longitude and radius_km.")
+            if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                raise ValueError("latitude must be between -90 and 90 and longitude between -180 and 180.")
+            if not 0 < radius_km <= MAX_SEARCH_RADIUS_KM:
+                raise ValueError(f"radius_km must be greater than 0 and at most {MAX_SEARCH_RADIUS_KM}.")
+            center = (latitude, longitude, radius_km)
+            boxes.append(bounding_box(latitude, longitude, radius_km))
+        if filters.get('bbox') is not None:
+            bbox = filters['bbox']
+            try:
+                south, west, north, east = [float(value) for value in (bbox.split(',') if isinstance(bbox, str) else bbox)]
+            except (TypeError, ValueError):
+                raise ValueError("bbox must be four numbers: south,west,north,east.")
+            if not (-90 <= south <= north <= 90 and -180 <= west <= east <= 180):
+                raise ValueError("bbox must be south,west,north,east with south <= north and west <= east.")
+            boxes.append((south, west, north, east))
+        if not boxes:
+            return query, None, None
+
+        # Intersection of the viewport and the circle's bounding box
+        south, west = max(box[0] for box in boxes), max(box[1] for box in boxes)
+        north, east = min(box[2] for box in boxes), min(box[3] for box in boxes)
+        if south > north or west > east:
+            return query.filter(False), center, None
+        ranges = geo_cell_ranges(south, west, north, east)
+        if len(ranges) <= MAX_GEO_CELL_RANGES:
+            cell_filter = or_(*[PropertyListingIndex.geo_cell.between(first, last) for first, last in ranges])
+        else:
+            cell_filter = PropertyListingIndex.geo_cell.between(ranges[0][0], ranges[-1][1])
+        query = query.filter(cell_filter, PropertyListingIndex.latitude.between(south, north),
+                             PropertyListingIndex.longitude.between(west, east))
+        if center is None:
+            return query, None, None
+
+        latitude, longitude, radius_km = center
+        longitude_scale = math.cos(math.radians(latitude))
+        latitude_offset = PropertyListingIndex.latitude - latitude
+        longitude_offset = (PropertyListingIndex.longitude - longitude) * longitude_scale
+        distance = latitude_offset * latitude_offset + longitude_offset * longitude_offset
+        radius = math.degrees(radius_km / EARTH_RADIUS_KM)
+        return query.filter(distance <= radius * radius), center, distance
+
+    def search_public_listings(self, filters: Optional[Dict[str, Any]] = None, sort_by: Optional[str] = None,
+                               page: int = 1, per_page: int = 10, include_facets: bool = True) -> Dict[str, Any]:
+        """
+        Searches publicly listed (vacant) properties through the listing index.
+        Filters: city, county, estate, building (prefix of the normalized value), property_type,
+        min_bedrooms/max_bedrooms, min_rent/max_rent, amenities (list or comma-separated; all required)
+        q (full-text words, all required, in the description or amenities), latitude/longitude/radius_km
+        (within radius_km of the point) and bbox (south, west, north, east: inside the map viewport).
+        sort_by is one of LISTING_SORT_OPTIONS (default 'relevance' with q, else 'distance' with a
+        radius search, else 'created_at_desc').
+        Returns a dict with 'items' (Property objects), 'total', 'highlights' (property_id ->
+        marked description/amenities snippets, with q), 'distances' (property_id -> km, with a
+        radius search) and, with include_facets, 'facets' (counts per property_type,
+        num_bedrooms, county and rent_range over the whole result set).
+        """
+        filters = filters or {}
+        text_query = filters.get('q')
+        query, center, distance = self._geo_search(self._listing_search_query(filters), filters)
+        if sort_by is None:
+            sort_by = 'relevance' if text_query else ('distance' if center else 'created_at_desc')
+        if sort_by not in LISTING_SORT_OPTIONS:
+            raise ValueError(f"Invalid sort_by: {sort_by}. Use one of: {', '.join(LISTING_SORT_OPTIONS)}")
+        if sort_by == 'relevance' and not text_query:
+            raise ValueError("sort_by 'relevance' requires a q search.")
+        if sort_by == 'distance' and not center:
+            raise ValueError("sort_by 'distance' requires latitude, longitude and radius_km.")
+        if page < 1 or per_page < 1 or per_page > MAX_LISTING_PAGE_SIZE:
+            raise ValueError(f"page must be at least 1 and per_page between 1 and {MAX_LISTING_PAGE_SIZE}.")
+        if page * per_page > MAX_LISTING_RESULT_WINDOW:
+            # Deep OFFSET pages scan every skipped row; narrow the search instead
+            raise ValueError(f"Only the first {MAX_LISTING_RESULT_WINDOW} results can be paged through; refine the filters.")
+
+        dialect_name = db.session.get_bind().dialect.name
+        rank = None
+        if text_query:
+            query, rank = PropertyTextIndex.search(query, PropertyListingIndex.property_id, dialect_name, text_query)
+        result = self._listing_facets(query) if include_facets else {}
+
+        column, descending = LISTING_SORT_OPTIONS[sort_by]
+        if column:
+            sort_column = getattr(PropertyListingIndex, column)
+        else:
+            sort_column = rank if sort_by == 'relevance' else distance
+        order_by = [sort_column.is_(None)] if column == 'monthly_rent' else [] # Unpriced listings last
+        order_by += [sort_column.desc(), PropertyListingIndex.property_id.desc()] if descending else [sort_column.asc(), PropertyListingIndex.property_id.asc()]
+        page_query = query.order_by(*order_by).limit(per_page).offset((page - 1) * per_page)
+        if include_facets:
+            page_ids = [row.property_id for row in page_query.all()]
+        else:
+            # The total comes with the page (COUNT(*) OVER ()) instead of a separate COUNT query
+            rows = page_query.add_columns(func.count().over().label('total')).all()
+            page_ids = [row.property_id for row in rows]
+            result["total"] = rows[0].total if rows else (query.count() if page > 1 else 0)
+
+        properties = {prop.property_id: prop for prop in Property.query.filter(Property.property_id.in_(page_ids)).all()} if page_ids else {}
+        result["items"] = [properties[property_id] for property_id in page_ids if property_id in properties]
+        # Snippets are built for the page only
+        result["highlights"] = PropertyTextIndex.highlights(db.session, dialect_name, text_query, page_ids) if text_query else {}
+        result["distances"] = {
+            prop.property_id: round(haversine_km(center[0], center[1], prop.latitude, prop.longitude), 3) for prop in result["items"]
+        } if center else {}
+        return result
 
     def get_publicly_listed_properties(self, filters: Optional[Dict[str, Any]] = None,
                                        sort_by: Optional[str] = None,
@@ -121,34 +356,10 @@ class PropertyService:
         """
         Retrieves publicly listed properties with filtering, sorting, and pagination.
         Returns a tuple of (properties_list, total_properties_count).
+        See `search_public_listings` for the filters and sort options.
         """
-        query = Property.query
-
-        # Assuming a field `is_publicly_listed` or similar for public filtering
-        # For now, let's use status as a proxy if that field isn't on the model yet.
-        # query = query.filter_by(is_publicly_listed=True)
-        query = query.filter_by(status=PropertyStatus.VACANT) # Example basic filter for "public"
-
-        if filters:
-            if 'city' in filters and filters['city']:
-                query = query.filter(Property.city.ilike(f"%{filters['city']}%"))
-            if 'county' in filters and filters['county']:
-                query = query.filter(Property.county.ilike(f"%{filters['county']}%"))
-            if 'property_type' in filters and filters['property_type']:
-                try:
-                    ptype = PropertyType[filters['property_type'].upper()]
-                    query = query.filter(Property.property_type == ptype)
-                except KeyError:
-                    pass # Invalid property type string, ignore or raise error
-            if 'min_bedrooms' in filters and filters['min_bedrooms'] is not None:
-                query = query.filter(Property.num_bedrooms >= filters['min_bedrooms'])
-            # Add more filters: max_bedrooms, price range (requires rent field on Property or linked Lease)
-
-        # TODO: Implement sorting based on 'sort_by' string
-        # e.g., if sort_by == "created_at_desc": query = query.order_by(Property.created_at.desc())
-
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-        return pagination.items, pagination.total
+        result = self.search_public_listings(filters, sort_by=sort_by, page=page, per_page=per_page, include_facets=False)
+        return result["items"], result["total"]
 
     def get_property_by_slug(self, slug: str) -> Optional[Property]:
         """
@@ -3,6 +3,7 @@ from datetime import datetime
 from decimal import Decimal
 from hermitta_app import db # Import db instance
 from models.user import User, UserRole, PreferredLoginMethod, PreferredLanguage # Import SQLAlchemy model
+from hermitta_app.services.entity_cache import entity_cache
 
 # TODO: Implement actual password hashing and verification (e.g., using werkzeug.security)
 # For now, password_hash is treated as a plain string.
@@ -84,7 +85,7 @@ class UserService:
         return new_user
 
     def get_user_by_id(self, user_id: int) -> Optional[User]:
-        return User.query.get(user_id)
+        return entity_cache.get(db.session, User, user_id)
 
     def get_user_by_email(self, email: str) -> Optional[User]:
         return User.query.filter(User.email.ilike(email)).first()
@@ -119,6 +120,7 @@ class UserService:
         # it would have been set to None by the loop logic above if final_role was not LANDLORD.
 
         db.session.commit()
+        entity_cache.invalidate(User, user_id)
         return user
 
     def delete_user(self, user_id: int) -> bool:
@@ -126,6 +128,7 @@ class UserService:
         if user:
             db.session.delete(user)
             db.session.commit()
+            entity_cache.invalidate(User, user_id)
             return True
         return False
 
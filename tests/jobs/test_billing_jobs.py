@@ -0,0 +1,116 @@
+import unittest
+from datetime import date
+from decimal import Decimal
+from hermitta_app import create_app, db
+from hermitta_app.jobs.billing_jobs import generate_rent_payments_job, rent_reference_code
+from models import Building, Lease, Payment
+from models.user import User, UserRole
+from models.property import Property, PropertyType
+from models.lease import LeaseStatusType
+from models.enums import PaymentStatus
+
+
+class TestRentBillingJob(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('test')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        db.create_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    def setUp(self):
+        db.session.rollback()
+        for model in (Payment, Lease, Property, Building, User):
+            model.query.delete()
+        db.session.commit()
+        self.landlord = User(email="billing_landlord@example.com", phone_number="+254700000991", password_hash="test",
+                             first_name="Ben", last_name="Landlord", role=UserRole.LANDLORD)
+        db.session.add(self.landlord)
+        db.session.commit()
+        self.property = Property(landlord_id=self.landlord.user_id, address_line_1="Thika Road", unit_number="C3", city="Nairobi",
+                                 county="Nairobi", property_type=PropertyType.APARTMENT_UNIT)
+        db.session.add(self.property)
+        db.session.commit()
+
+    def _lease(self, rent, due_day, start=date(2023, 6, 1), end=date(2024, 12, 31), rent_start=None, status=LeaseStatusType.ACTIVE):
+        lease = Lease(property_id=self.property.property_id, landlord_id=self.landlord.user_id, start_date=start, end_date=end,
+                      rent_amount=Decimal(rent), rent_due_day=due_day, move_in_date=start, rent_start_date=rent_start, status=status)
+        db.session.add(lease)
+        db.session.commit()
+        return lease.lease_id
+
+    def _payment_of(self, lease_id):
+        return Payment.query.filter_by(lease_id=lease_id).one()
+
+    def test_bills_active_leases_for_the_month(self):
+        full = self._lease("15000", 5)
+        month_end = self._lease("20000", 31) # Due on the last day of a short month
+        prorated = self._lease("14500", 1, rent_start=date(2024, 2, 16)) # Rent starts after the due day
+        starts_mid_month = self._lease("10000", 20, start=date(2024, 2, 10))
+        pending_move_in = self._lease("9000", 1, status=LeaseStatusType.ACTIVE_PENDING_MOVE_IN)
+        self._lease("9000", 1, status=LeaseStatusType.EXPIRED)
+        self._lease("9000", 1, end=date(2024, 1, 31)) # Ended before the period
+        self._lease("9000", 1, start=date(2024, 3, 1)) # Starts after it
+
+        summary = generate_rent_payments_job(period=date(2024, 2, 14), chunk_size=3)
+
+        self.assertEqual((summary["period"], summary["leases_billable"], summary["payments_created"], summary["chunks_committed"]),
+                         (date(2024, 2, 1), 5, 5, 2))
+        payment = self._payment_of(full)
+        self.assertEqual((payment.status, payment.due_date, payment.expected_amount, payment.payment_reference_code),
+                         (PaymentStatus.EXPECTED, date(2024, 2, 5), Decimal("15000.00"), rent_reference_code(full, date(2024, 2, 1))))
+        self.assertEqual(self._payment_of(month_end).due_date, date(2024, 2, 29))
+        payment = self._payment_of(prorated)
+        self.assertEqual((payment.due_date, payment.expected_amount), (date(2024, 2, 16), Decimal("7000.00"))) # 14 of 29 days
+        payment = self._payment_of(starts_mid_month)
+        self.assertEqual((payment.due_date, payment.expected_amount), (date(2024, 2, 20), Decimal("6896.55"))) # 20 of 29 days
+        self.assertEqual(self._payment_of(pending_move_in).due_date, date(2024, 2, 1))
+
+    def test_is_idempotent_per_lease_and_period(self):
+        lease_ids = [self._lease("15000", day) for day in (1, 15, 28)]
+        first = generate_rent_payments_job(period=date(2024, 3, 1), chunk_size=2)
+        again = generate_rent_payments_job(period=date(2024, 3, 1))
+        self.assertEqual((first["payments_created"], again["payments_created"], again["skipped_existing"]), (3, 0, 3))
+
+        self._lease("15000", 10)
+        april = generate_rent_payments_job(period=date(2024, 4, 1), reference_prefix="HMT")
+        self.assertEqual(april["payments_created"], 4)
+        self.assertEqual(Payment.query.filter_by(payment_reference_code=f"HMT-{lease_ids[0]}-202404").count(), 1)
+        self.assertEqual(Payment.query.count(), 7)
+
+    def test_leases_with_a_payment_due_in_the_period_are_not_billed_again(self):
+        billed = self._lease("15000", 5)
+        manual = self._lease("12000", 5)
+        db.session.add(Payment(lease_id=manual, expected_amount=Decimal("12000"), due_date=date(2024, 5, 3), status=PaymentStatus.EXPECTED))
+        db.session.commit()
+        generate_rent_payments_job(period=date(2024, 5, 1))
+
+        again = generate_rent_payments_job(period=date(2024, 5, 1), reference_prefix="HMT")
+
+        self.assertEqual((again["payments_created"], again["skipped_existing"]), (0, 2))
+        self.assertEqual(Payment.query.filter_by(lease_id=billed).count(), 1)
+        self.assertEqual(Payment.query.filter_by(lease_id=manual).count(), 1)
+
+    def test_bills_bulk_inserted_leases_in_chunks(self):
+        # `flask benchmark-rent-billing` times the same data at scale
+        db.session.bulk_insert_mappings(Lease, [{
+            "property_id": self.property.property_id, "landlord_id": self.landlord.user_id, "start_date": date(2023, 1, 1),
+            "end_date": date(2025, 1, 1), "rent_amount": Decimal(10000 + n), "rent_due_day": 1 + n % 31,
+            "move_in_date": date(2023, 1, 1), "rent_start_date": date(2024, 2, 1 + n % 29) if n % 10 == 0 else None,
+            "status": LeaseStatusType.ACTIVE,
+        } for n in range(300)])
+        db.session.commit()
+        summary = generate_rent_payments_job(period=date(2024, 2, 1), chunk_size=128)
+        self.assertEqual((summary["leases_billable"], summary["payments_created"], summary["chunks_committed"]), (300, 300, 3))
+        self.assertEqual(Payment.query.filter(Payment.due_date.between(date(2024, 2, 1), date(2024, 2, 29))).count(), 300)
+
+
+if __name__ == '__main__':
+    unittest.main()
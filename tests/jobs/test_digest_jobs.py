@@ -0,0 +1,179 @@
+import unittest
+from datetime import datetime, timedelta
+from hermitta_app import create_app, db
+from hermitta_app.jobs.digest_jobs import coalesce_pending_notifications_job, _find_groups, _coalesce_groups
+from hermitta_app.jobs.notification_jobs import NotificationDispatcher, dispatch_due_notifications_job
+from hermitta_app.services.notification_backends import MemoryBackend
+from models import Notification, NotificationTemplate
+from models.user import User, UserRole, PreferredLanguage
+from models.enums import NotificationType, NotificationChannel, NotificationStatus
+
+
+class TestNotificationDigests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('test')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        db.create_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    def setUp(self):
+        db.session.rollback()
+        Notification.query.filter(Notification.digest_id.isnot(None)).update({Notification.digest_id: None})
+        for model in (Notification, NotificationTemplate, User):
+            model.query.delete()
+        db.session.commit()
+        db.session.expunge_all()
+
+        self.now = datetime(2024, 3, 1, 9, 0)
+        self.landlord = User(email="digest_landlord@example.com", phone_number="+254700000401", password_hash="test", first_name="Lara", last_name="Landlord", role=UserRole.LANDLORD)
+        self.other = User(email="digest_other@example.com", phone_number="+254700000402", password_hash="test", first_name="Juma", last_name="Mwenye", role=UserRole.LANDLORD, preferred_language=PreferredLanguage.SW_KE)
+        self.template = NotificationTemplate(
+            name="Lease ending", template_type=NotificationType.LEASE_EXPIRATION_REMINDER, channel=NotificationChannel.SMS,
+            subject_template_en="Lease of {{tenant_name}}", body_template_en="Lease of {{tenant_name}} ends soon.",
+            body_template_sw="Mkataba wa {{tenant_name}} unaisha."
+        )
+        db.session.add_all([self.landlord, self.other, self.template])
+        db.session.commit()
+
+    def _notifications(self, count, user=None, channel=NotificationChannel.SMS, send_time=None):
+        notifications = [
+            Notification(
+                user_id=(user or self.landlord).user_id, notification_type=NotificationType.LEASE_EXPIRATION_REMINDER, channel=channel,
+                status=NotificationStatus.SCHEDULED, scheduled_send_time=send_time or datetime(2024, 3, 1, 8, 30),
+                template_id=self.template.template_id, template_context={"tenant_name": f"Tenant {n}"}
+            )
+            for n in range(count)
+        ]
+        db.session.add_all(notifications)
+        db.session.commit()
+        return [notification.notification_id for notification in notifications]
+
+    def test_coalesces_notifications_per_recipient_channel_and_window(self):
+        grouped = self._notifications(4)
+        self._notifications(2, user=self.other) # Below the minimum group size
+        later_window = self._notifications(3, send_time=datetime(2024, 3, 1, 7, 15))
+        self._notifications(5, send_time=self.now + timedelta(hours=2)) # Not due yet
+
+        summary = coalesce_pending_notifications_job(run_time=self.now, window_minutes=60, min_group_size=3)
+
+        self.assertEqual(summary["groups"], 2)
+        self.assertEqual(summary["digests_created"], 2)
+        self.assertEqual(summary["notifications_digested"], 7)
+        self.assertEqual(summary["gateway_calls_saved"], 5)
+        digests = Notification.query.filter_by(notification_type=NotificationType.NOTIFICATION_DIGEST).order_by(Notification.scheduled_send_time).all()
+        self.assertEqual([digest.template_context["count"] for digest in digests], [3, 4])
+        digest = digests[1]
+        self.assertEqual(digest.status, NotificationStatus.PENDING)
+        self.assertEqual(digest.channel, NotificationChannel.SMS)
+        self.assertEqual(digest.user_id, self.landlord.user_id)
+        self.assertIn("Hello Lara Landlord, you have 4 new notifications:", digest.content)
+        self.assertIn("- Lease of Tenant 3 ends soon.", digest.content)
+        # The originals are kept and linked to their digest
+        for notification_id in grouped:
+            original = db.session.get(Notification, notification_id)
+            self.assertEqual(original.status, NotificationStatus.DIGESTED)
+            self.assertEqual(original.digest_id, digest.notification_id)
+            self.assertIsNone(original.claimed_by)
+        self.assertEqual(sorted(n.notification_id for n in digests[0].digested_notifications), later_window)
+        self.assertEqual(Notification.query.filter_by(status=NotificationStatus.SCHEDULED).count(), 7)
+
+    def test_uses_configured_digest_template_and_recipient_language(self):
+        digest_template = NotificationTemplate(
+            name="SMS digest", template_type=NotificationType.NOTIFICATION_DIGEST, channel=NotificationChannel.SMS,
+            body_template_en="{{count}} updates:\n{{items}}", body_template_sw="Taarifa {{count}}:\n{{items}}"
+        )
+        db.session.add(digest_template)
+        db.session.commit()
+        self._notifications(3, user=self.other)
+
+        coalesce_pending_notifications_job(run_time=self.now, min_group_size=3)
+
+        digest = Notification.query.filter_by(notification_type=NotificationType.NOTIFICATION_DIGEST).one()
+        self.assertEqual(digest.template_id, digest_template.template_id)
+        self.assertIsNone(digest.content) # Rendered by the dispatcher
+        self.assertIn("- Mkataba wa Tenant 0 unaisha.", digest.template_context["items"])
+
+        sms = MemoryBackend(NotificationChannel.SMS)
+        summary = NotificationDispatcher({NotificationChannel.SMS: sms}).run(now=self.now)
+
+        self.assertEqual(summary["sent"], 1)
+        self.assertTrue(sms.sent[0].body.startswith("Taarifa 3:\n- Mkataba wa Tenant 0 unaisha."))
+
+    def test_rerun_does_not_digest_twice(self):
+        self._notifications(3)
+        coalesce_pending_notifications_job(run_time=self.now, min_group_size=3)
+
+        summary = coalesce_pending_notifications_job(run_time=self.now, min_group_size=3)
+
+        self.assertEqual(summary["digests_created"], 0)
+        self.assertEqual(Notification.query.filter_by(notification_type=NotificationType.NOTIFICATION_DIGEST).count(), 1)
+
+    def test_rows_claimed_by_a_dispatcher_in_between_are_left_alone(self):
+        ids = self._notifications(4)
+        Notification.query.filter(Notification.notification_id == ids[-1]).update({Notification.status: NotificationStatus.PENDING})
+        db.session.commit()
+        groups, _ = _find_groups(self.now, [NotificationChannel.SMS], 60, 3)
+        # A dispatcher claims half of the group before the digest takes it
+        NotificationDispatcher({NotificationChannel.SMS: MemoryBackend(NotificationChannel.SMS)}, batch_size=2).claim_batch(self.now)
+        summary = {"digests_created": 0, "notifications_digested": 0, "timings": {}}
+
+        _coalesce_groups(groups, {NotificationChannel.SMS: None}, self.now, 60, 3, summary)
+
+        # Only two rows were left, fewer than the minimum, so they are handed back to the dispatcher as they were
+        self.assertEqual(summary["digests_created"], 0)
+        db.session.expunge_all()
+        notifications = [db.session.get(Notification, notification_id) for notification_id in ids]
+        self.assertEqual([n.status.value for n in notifications], ["SENDING", "SENDING", "SCHEDULED", "PENDING"])
+        self.assertEqual([n.claimed_by for n in notifications[2:]], [None, None])
+
+    def test_groups_that_cannot_be_rendered_are_handed_back(self):
+        swahili_only = NotificationTemplate(name="Rent", template_type=NotificationType.RENT_REMINDER, channel=NotificationChannel.SMS,
+                                            body_template_en="", body_template_sw="Kodi ya {{tenant_name}} inadaiwa.")
+        db.session.add(swahili_only)
+        db.session.commit()
+        unrenderable = self._notifications(3) # English, which the template lacks
+        Notification.query.filter(Notification.notification_id.in_(unrenderable)).update(
+            {Notification.template_id: swahili_only.template_id}, synchronize_session=False)
+        db.session.commit()
+        self._notifications(3, user=self.other)
+
+        summary = coalesce_pending_notifications_job(run_time=self.now, min_group_size=3)
+
+        self.assertEqual((summary["groups"], summary["groups_failed"], summary["digests_created"]), (2, 1, 1))
+        db.session.expunge_all()
+        for notification_id in unrenderable:
+            notification = db.session.get(Notification, notification_id)
+            self.assertEqual((notification.status, notification.claimed_by), (NotificationStatus.SCHEDULED, None))
+
+    def test_groups_are_found_page_by_page(self):
+        self._notifications(3)
+        self._notifications(3, user=self.other)
+
+        groups, last_user_id = _find_groups(self.now, [NotificationChannel.SMS], 60, 3, max_users=1)
+        self.assertEqual(([key[0] for key, _ in groups], last_user_id), ([self.landlord.user_id], self.landlord.user_id))
+        groups, last_user_id = _find_groups(self.now, [NotificationChannel.SMS], 60, 3, after_user_id=last_user_id, max_users=1)
+        self.assertEqual([key[0] for key, _ in groups], [self.other.user_id])
+        self.assertEqual(_find_groups(self.now, [NotificationChannel.SMS], 60, 3, after_user_id=last_user_id), ([], None))
+
+    def test_dispatch_job_coalesces_first_when_enabled(self):
+        self._notifications(3)
+        self._notifications(1, channel=NotificationChannel.EMAIL)
+        self.assertFalse(self.app.config['NOTIFICATION_DIGEST_ENABLED']) # Off by default
+
+        summary = dispatch_due_notifications_job(coalesce=True)
+
+        self.assertEqual(summary["digest"]["digests_created"], 1)
+        self.assertEqual(summary["sent"], 2)
+        self.assertEqual(Notification.query.filter_by(status=NotificationStatus.DIGESTED).count(), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
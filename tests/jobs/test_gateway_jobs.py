@@ -0,0 +1,224 @@
+import unittest
+import sqlalchemy as sa
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from hermitta_app import create_app, db
+from hermitta_app.jobs.gateway_jobs import GatewayReconciler, reconcile_pending_gateway_transactions_job
+from hermitta_app.services.gateway_status import (
+    BearerTokenCache, GatewayStatusAdapter, GatewayStatusResult, KeepAliveHttpPool, PesapalStatusAdapter, RateLimiter,
+    build_status_adapters
+)
+from hermitta_app.services.gateway_stubs import LocalPesapalStub
+from models import Building, GatewayTransaction, Payment
+from models.property import Property, PropertyType
+from models.lease import Lease, LeaseStatusType
+from models.user import User, UserRole
+from models.enums import GatewayTransactionStatus, GatewayType, PaymentMethod, PaymentStatus
+
+
+class SettlesEverythingAdapter(GatewayStatusAdapter):
+    """Adapter plugged in through GATEWAY_STATUS_ADAPTERS."""
+
+    gateway_type = GatewayType.FLUTTERWAVE
+
+    def __init__(self, config, pool, token_cache):
+        self.config = config
+
+    def query_status(self, transaction):
+        return GatewayStatusResult(GatewayTransactionStatus.SUCCESSFUL, amount="15000", payment_method="card", confirmation_code="FLW-1")
+
+
+class CallbackRaceAdapter(GatewayStatusAdapter):
+    """Reports every transaction as failed, after a callback settled some of them while it was being queried."""
+
+    gateway_type = GatewayType.PESAPAL
+
+    def __init__(self, engine, callback_updates):
+        self.engine = engine
+        self.callback_updates = callback_updates
+
+    def query_status(self, transaction):
+        statements = self.callback_updates.get(transaction.transaction_id, [])
+        if statements:
+            with self.engine.begin() as connection:
+                for statement in statements:
+                    connection.execute(statement)
+        return GatewayStatusResult(GatewayTransactionStatus.FAILED)
+
+
+class TestGatewayStatusClients(unittest.TestCase):
+
+    def test_rate_limiter_spaces_requests_after_the_burst(self):
+        clock = [0.0]
+        waits = []
+
+        def sleep(seconds):
+            waits.append(seconds)
+            clock[0] += seconds
+
+        limiter = RateLimiter(rate=2, burst=2, clock=lambda: clock[0], sleep=sleep)
+        for _ in range(5):
+            limiter.acquire()
+        self.assertEqual(waits, [0.5, 0.5, 0.5])
+        self.assertEqual(RateLimiter(rate=None).acquire(), 0.0)
+
+    def test_bearer_tokens_are_reused_until_they_expire(self):
+        clock = [1000.0]
+        cache = BearerTokenCache(refresh_margin_seconds=60, clock=lambda: clock[0])
+        issued = []
+
+        def fetch():
+            issued.append(f"token-{len(issued)}")
+            return issued[-1], clock[0] + 300
+
+        self.assertEqual([cache.get("pesapal", fetch) for _ in range(3)], ["token-0"] * 3)
+        clock[0] += 250 # Within the refresh margin
+        self.assertEqual(cache.get("pesapal", fetch), "token-1")
+        cache.invalidate("pesapal")
+        self.assertEqual(cache.get("pesapal", fetch), "token-2")
+
+    def test_pesapal_adapter_reuses_connections_and_tokens(self):
+        with LocalPesapalStub(statuses={"t1": 1, "t2": 2, "t3": 0}, amounts={"t1": 15000}) as pesapal:
+            pool = KeepAliveHttpPool()
+            adapter = PesapalStatusAdapter(pesapal.url, "key", "secret", pool, BearerTokenCache())
+            row = lambda tracking_id: type("Row", (), {"gateway_specific_transaction_id": tracking_id})
+            results = [adapter.query_status(row(tracking_id)).status for tracking_id in ("t1", "t2", "t3")]
+            self.assertEqual(results, [GatewayTransactionStatus.SUCCESSFUL, GatewayTransactionStatus.FAILED, GatewayTransactionStatus.PENDING])
+
+            pesapal.revoke_tokens() # 401: a new token is requested once
+            self.assertEqual(adapter.query_status(row("t1")).confirmation_code, "PSPT1")
+            pool.close()
+        self.assertEqual((pesapal.counts["token_requests"], pesapal.counts["connections"], pool.connections_opened), (2, 1, 1))
+
+
+class TestGatewayReconciler(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('test')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        db.create_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    def setUp(self):
+        db.session.rollback()
+        for model in (GatewayTransaction, Payment, Lease, Property, Building, User):
+            model.query.delete()
+        db.session.commit()
+        landlord = User(email="recon_landlord@example.com", phone_number="+254700000971", password_hash="test",
+                        first_name="Rita", last_name="Landlord", role=UserRole.LANDLORD)
+        db.session.add(landlord)
+        db.session.commit()
+        unit = Property(landlord_id=landlord.user_id, address_line_1="Ngong Road", unit_number="A1", city="Nairobi",
+                        county="Nairobi", property_type=PropertyType.APARTMENT_UNIT)
+        db.session.add(unit)
+        db.session.commit()
+        self.lease = Lease(property_id=unit.property_id, landlord_id=landlord.user_id, start_date=date(2024, 1, 1),
+                           end_date=date(2024, 12, 31), rent_amount=Decimal("15000"), rent_due_day=1,
+                           move_in_date=date(2024, 1, 1), status=LeaseStatusType.ACTIVE)
+        db.session.add(self.lease)
+        db.session.commit()
+        self.now = datetime.utcnow()
+
+    def _pending(self, tracking_id, gateway=GatewayType.PESAPAL, age_minutes=10):
+        payment = Payment(lease_id=self.lease.lease_id, expected_amount=Decimal("15000"), status=PaymentStatus.PENDING_CONFIRMATION)
+        db.session.add(payment)
+        db.session.flush()
+        transaction = GatewayTransaction(payment_id=payment.payment_id, gateway_type=gateway, gateway_specific_transaction_id=tracking_id,
+                                         amount=Decimal("15000"), currency="KES", initiated_at=self.now - timedelta(minutes=age_minutes))
+        db.session.add(transaction)
+        db.session.commit()
+        return transaction.transaction_id, payment.payment_id
+
+    def test_reconciles_pending_transactions_in_batches(self):
+        paid_tx, paid_payment = self._pending("paid")
+        failed_tx, failed_payment = self._pending("failed")
+        waiting_tx, _ = self._pending("waiting")
+        broken_tx, _ = self._pending("broken")
+        fresh_tx, _ = self._pending("fresh", age_minutes=0) # Still within the callback grace period
+        statuses = {"paid": 1, "failed": 2, "waiting": 0, "broken": 503, "fresh": 1}
+        for n in range(20):
+            self._pending(f"bulk-{n}")
+            statuses[f"bulk-{n}"] = 1
+
+        with LocalPesapalStub(statuses=statuses, amounts={"paid": 15000}, delay_seconds=0.01) as pesapal:
+            pool, token_cache = KeepAliveHttpPool(), BearerTokenCache()
+            adapter = PesapalStatusAdapter(pesapal.url, "key", "secret", pool, token_cache)
+            reconciler = GatewayReconciler({GatewayType.PESAPAL: adapter}, batch_size=10, concurrency={GatewayType.PESAPAL: 3})
+            summary = reconciler.run(now=self.now)
+            pool.close()
+
+        self.assertEqual({key: summary[key] for key in ("claimed", "successful", "failed", "still_pending", "errors", "batches")},
+                         {"claimed": 24, "successful": 21, "failed": 1, "still_pending": 1, "errors": 1, "batches": 3})
+        # One token for the whole run; connections kept alive, at most one per worker thread
+        self.assertEqual(pesapal.counts["token_requests"], 1)
+        self.assertLessEqual(pesapal.counts["connections"], 3)
+        self.assertLessEqual(pesapal.max_concurrent_queries, 3)
+
+        paid = db.session.get(Payment, paid_payment)
+        self.assertEqual((paid.status, paid.amount_paid, paid.payment_method, paid.reference_number),
+                         (PaymentStatus.COMPLETED, Decimal("15000.00"), PaymentMethod.GATEWAY_MOBILE_MONEY, "PSPPAID"))
+        self.assertEqual(db.session.get(GatewayTransaction, paid_tx).status, GatewayTransactionStatus.SUCCESSFUL)
+        self.assertEqual(db.session.get(Payment, failed_payment).status, PaymentStatus.FAILED)
+        for transaction_id in (waiting_tx, broken_tx):
+            transaction = db.session.get(GatewayTransaction, transaction_id)
+            self.assertEqual((transaction.status, transaction.status_check_attempts, transaction.status_check_claimed_by),
+                             (GatewayTransactionStatus.PENDING, 1, None))
+            self.assertEqual(transaction.next_status_check_at, self.now + timedelta(seconds=60))
+        self.assertIn("HTTP 503", db.session.get(GatewayTransaction, broken_tx).error_message)
+        self.assertIsNone(db.session.get(GatewayTransaction, fresh_tx).last_status_check_at)
+
+    def test_gives_up_after_max_checks(self):
+        transaction_id, _ = self._pending("waiting")
+        with LocalPesapalStub(statuses={"waiting": 0}) as pesapal:
+            adapter = PesapalStatusAdapter(pesapal.url, "key", "secret", KeepAliveHttpPool(), BearerTokenCache())
+            reconciler = GatewayReconciler({GatewayType.PESAPAL: adapter}, max_status_checks=2)
+            self.assertEqual(reconciler.run(now=self.now)["still_pending"], 1)
+            self.assertEqual(reconciler.run(now=self.now)["claimed"], 0) # Not due yet
+            summary = reconciler.run(now=self.now + timedelta(minutes=5))
+        self.assertEqual(summary["gave_up"], 1)
+        self.assertEqual(db.session.get(GatewayTransaction, transaction_id).status, GatewayTransactionStatus.UNKNOWN)
+
+    def test_does_not_overwrite_what_a_callback_settled_meanwhile(self):
+        settled_tx, settled_payment = self._pending("settled")
+        completed_tx, completed_payment = self._pending("completed")
+        failed_tx, failed_payment = self._pending("failed")
+        paid = {Payment.status: PaymentStatus.COMPLETED, Payment.amount_paid: Decimal("15000")}
+        adapter = CallbackRaceAdapter(db.engine, {
+            # The transaction's callback settled it and its payment
+            settled_tx: [sa.update(GatewayTransaction).where(GatewayTransaction.transaction_id == settled_tx)
+                         .values(status=GatewayTransactionStatus.SUCCESSFUL),
+                         sa.update(Payment).where(Payment.payment_id == settled_payment).values(paid)],
+            # The payment was completed some other way (e.g. a bank deposit)
+            completed_tx: [sa.update(Payment).where(Payment.payment_id == completed_payment).values(paid)],
+        })
+        summary = GatewayReconciler({GatewayType.PESAPAL: adapter}, concurrency={GatewayType.PESAPAL: 1}).run(now=self.now)
+        db.session.expire_all()
+
+        self.assertEqual((summary["claimed"], summary["superseded"], summary["failed"]), (3, 1, 2))
+        self.assertEqual(db.session.get(GatewayTransaction, settled_tx).status, GatewayTransactionStatus.SUCCESSFUL)
+        self.assertEqual(db.session.get(GatewayTransaction, settled_tx).status_check_attempts, 0)
+        self.assertEqual(db.session.get(Payment, settled_payment).status, PaymentStatus.COMPLETED)
+        self.assertEqual(db.session.get(GatewayTransaction, completed_tx).status, GatewayTransactionStatus.FAILED)
+        self.assertEqual(db.session.get(Payment, completed_payment).status, PaymentStatus.COMPLETED)
+        self.assertEqual(db.session.get(Payment, failed_payment).status, PaymentStatus.FAILED)
+
+    def test_adapters_are_pluggable(self):
+        _, payment_id = self._pending("flw-1", gateway=GatewayType.FLUTTERWAVE)
+        config = {'GATEWAY_STATUS_ADAPTERS': {'PESAPAL': 'pesapal', 'FLUTTERWAVE': f'{__name__}:SettlesEverythingAdapter'}}
+        adapters = build_status_adapters(config, KeepAliveHttpPool(), BearerTokenCache())
+        self.assertEqual(list(adapters), [GatewayType.FLUTTERWAVE]) # Pesapal has no consumer key here
+
+        summary = reconcile_pending_gateway_transactions_job(adapters=adapters)
+        self.assertEqual(summary["successful"], 1)
+        self.assertEqual(db.session.get(Payment, payment_id).payment_method, PaymentMethod.GATEWAY_CARD)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,272 @@
+import unittest
+from unittest import mock
+from datetime import date, time, timedelta
+from decimal import Decimal
+from hermitta_app import create_app, db
+from hermitta_app.jobs import lease_jobs
+from hermitta_app.jobs.lease_jobs import (
+    process_lease_renewal_reminders_job, _insert_reminder_rows, _new_summary, _add_months, _event_date_window
+)
+from models import (
+    LandlordReminderRule, Lease, Notification, NotificationTemplate, NotificationTriggerLog,
+    ReminderJobCheckpoint
+)
+from models.user import User, UserRole
+from models.property import Property, PropertyType
+from models.lease import LeaseStatusType
+from models.enums import (
+    ReminderRuleEvent, ReminderTimeUnit, ReminderRecipientType,
+    NotificationType, NotificationChannel, NotificationStatus, JobRunStatus
+)
+
+
+class TestLeaseRenewalRemindersJob(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('test')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        db.create_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    def setUp(self):
+        db.session.rollback()
+        for model in (ReminderJobCheckpoint, NotificationTriggerLog, Notification, LandlordReminderRule, NotificationTemplate, Lease, Property, User):
+            model.query.delete()
+        db.session.commit()
+        db.session.expunge_all()
+
+        self.run_date = date(2024, 1, 1)
+        self.landlord = User(email="landlord_job@example.com", phone_number="+254700000001", password_hash="test", first_name="Lara", last_name="Landlord", role=UserRole.LANDLORD)
+        self.tenant = User(email="tenant_job@example.com", phone_number="+254700000002", password_hash="test", first_name="Tom", last_name="Tenant", role=UserRole.TENANT)
+        db.session.add_all([self.landlord, self.tenant])
+        db.session.commit()
+
+        self.property = Property(landlord_id=self.landlord.user_id, address_line_1="1 Job St", city="Nairobi", county="Nairobi", property_type=PropertyType.APARTMENT_UNIT, unit_number="A1")
+        self.template = NotificationTemplate(name="Renewal 60d", template_type=NotificationType.LEASE_RENEWAL_REMINDER, channel=NotificationChannel.EMAIL, body_template_en="Hi {{tenant_name}}, your lease ends on {{lease_end_date}}.")
+        db.session.add_all([self.property, self.template])
+        db.session.commit()
+
+        self.rule = LandlordReminderRule(landlord_id=self.landlord.user_id, name="60 days before end", event_type=ReminderRuleEvent.LEASE_END_DATE, offset_value=-60, offset_unit=ReminderTimeUnit.DAYS, send_time=time(8, 30), recipient_type=ReminderRecipientType.TENANT, notification_template_id=self.template.template_id)
+        db.session.add(self.rule)
+        db.session.commit()
+
+    def _add_lease(self, end_date, status=LeaseStatusType.ACTIVE):
+        lease = Lease(property_id=self.property.property_id, landlord_id=self.landlord.user_id, tenant_id=self.tenant.user_id, start_date=end_date - timedelta(days=365), end_date=end_date, rent_amount=Decimal("1000.00"), rent_due_day=1, move_in_date=end_date - timedelta(days=365), status=status)
+        db.session.add(lease)
+        db.session.commit()
+        return lease
+
+    def test_schedules_notification_and_trigger_log(self):
+        lease = self._add_lease(self.run_date + timedelta(days=60))
+        self._add_lease(self.run_date + timedelta(days=61)) # Not targeted by the rule
+        self._add_lease(self.run_date + timedelta(days=60), status=LeaseStatusType.EXPIRED) # Not active
+
+        summary = process_lease_renewal_reminders_job(job_run_id="run-1", run_date=self.run_date)
+
+        self.assertEqual(summary["notifications_created"], 1)
+        self.assertIn("match_leases", summary["timings"])
+        notification = Notification.query.one()
+        self.assertEqual(notification.user_id, self.tenant.user_id)
+        self.assertEqual(notification.lease_id, lease.lease_id)
+        self.assertEqual(notification.status, NotificationStatus.SCHEDULED)
+        self.assertEqual(notification.channel, NotificationChannel.EMAIL)
+        self.assertEqual(notification.scheduled_send_time.time(), time(8, 30))
+        self.assertEqual(notification.template_context["tenant_name"], "Tom Tenant")
+        self.assertEqual(notification.template_context["landlord_name"], "Lara Landlord")
+        self.assertEqual(notification.template_context["property_unit"], "A1")
+        self.assertEqual(notification.template_context["days_offset"], 60)
+
+        log = NotificationTriggerLog.query.one()
+        self.assertEqual(log.notification_id, notification.notification_id)
+        self.assertEqual(log.target_event_date, lease.end_date)
+        self.assertEqual(log.job_run_id, "run-1")
+
+    def test_rerun_is_idempotent(self):
+        self._add_lease(self.run_date + timedelta(days=60))
+        process_lease_renewal_reminders_job(run_date=self.run_date)
+        summary = process_lease_renewal_reminders_job(run_date=self.run_date)
+
+        self.assertEqual(summary["notifications_created"], 0)
+        self.assertEqual(summary["skipped_existing"], 1)
+        self.assertEqual(Notification.query.count(), 1)
+
+    def test_landlord_recipient_and_inactive_template(self):
+        self._add_lease(self.run_date + timedelta(days=60))
+        self.rule.recipient_type = ReminderRecipientType.LANDLORD
+        db.session.commit()
+
+        process_lease_renewal_reminders_job(run_date=self.run_date)
+        self.assertEqual(Notification.query.one().user_id, self.landlord.user_id)
+
+        self._add_lease(self.run_date + timedelta(days=60))
+        self.template.is_active = False
+        db.session.commit()
+        summary = process_lease_renewal_reminders_job(run_date=self.run_date)
+        self.assertEqual(summary["notifications_created"], 0)
+        self.assertEqual(summary["skipped_invalid"], 1)
+
+    def test_template_with_unknown_placeholder_is_rejected_once(self):
+        self.template.body_template_en = "Hi {{tenant_name}}, pay {{rent_amount}} before {{lease_end_date}}."
+        db.session.commit()
+        self._add_lease(self.run_date + timedelta(days=60))
+        self._add_lease(self.run_date + timedelta(days=60))
+
+        with self.assertLogs(self.app.logger, level="ERROR") as logs:
+            summary = process_lease_renewal_reminders_job(run_date=self.run_date)
+
+        self.assertEqual(summary["notifications_created"], 0)
+        self.assertEqual(summary["skipped_invalid"], 2)
+        self.assertEqual(len([line for line in logs.output if "rent_amount" in line]), 1)
+
+    def test_no_rules(self):
+        self.rule.is_active = False
+        db.session.commit()
+        summary = process_lease_renewal_reminders_job(run_date=self.run_date)
+        self.assertEqual(summary["rules"], 0)
+        self.assertEqual(Notification.query.count(), 0)
+
+    def test_checkpointed_run_commits_in_chunks(self):
+        for _ in range(3):
+            self._add_lease(self.run_date + timedelta(days=60))
+
+        summary = process_lease_renewal_reminders_job(job_run_id="chunked", run_date=self.run_date, chunk_size=2)
+
+        self.assertEqual(summary["notifications_created"], 3)
+        self.assertEqual(summary["chunks_committed"], 2)
+        checkpoint = ReminderJobCheckpoint.query.filter_by(job_run_id="chunked").one()
+        self.assertEqual(checkpoint.status, JobRunStatus.COMPLETED)
+        self.assertEqual(checkpoint.notifications_created, 3)
+        self.assertEqual(checkpoint.chunks_committed, 2)
+        self.assertIsNotNone(checkpoint.completed_at)
+
+        # Re-running a completed run is a no-op
+        summary = process_lease_renewal_reminders_job(job_run_id="chunked", chunk_size=2)
+        self.assertTrue(summary["resumed"])
+        self.assertEqual(summary["notifications_created"], 0)
+        self.assertEqual(Notification.query.count(), 3)
+
+    def test_checkpointed_run_resumes_after_last_committed_chunk(self):
+        leases = [self._add_lease(self.run_date + timedelta(days=60)) for _ in range(3)]
+        # Simulate a run that died after committing the chunk ending at the first lease
+        db.session.add(ReminderJobCheckpoint(job_run_id="crashed", job_name="lease_renewal_reminders", run_date=self.run_date, chunk_size=1, last_lease_id=leases[0].lease_id, chunks_committed=1, status=JobRunStatus.FAILED))
+        db.session.commit()
+
+        # The checkpoint's run_date wins over the date passed on resume
+        summary = process_lease_renewal_reminders_job(job_run_id="crashed", run_date=self.run_date + timedelta(days=5), chunk_size=1)
+
+        self.assertTrue(summary["resumed"])
+        self.assertEqual(summary["notifications_created"], 2)
+        self.assertEqual(sorted(n.lease_id for n in Notification.query.all()), [leases[1].lease_id, leases[2].lease_id])
+        checkpoint = ReminderJobCheckpoint.query.filter_by(job_run_id="crashed").one()
+        self.assertEqual(checkpoint.status, JobRunStatus.COMPLETED)
+        self.assertEqual(checkpoint.chunks_committed, 3)
+        self.assertEqual(checkpoint.last_lease_id, leases[2].lease_id)
+
+    def test_bad_row_does_not_discard_the_batch(self):
+        lease = self._add_lease(self.run_date + timedelta(days=60))
+        good = {"user_id": self.tenant.user_id, "notification_type": NotificationType.LEASE_RENEWAL_REMINDER, "channel": NotificationChannel.EMAIL, "status": NotificationStatus.SCHEDULED, "lease_id": lease.lease_id}
+        bad = dict(good, user_id=None) # violates NOT NULL
+        summary = _new_summary("bad-row", self.run_date)
+
+        trigger = {"rule_id": self.rule.rule_id, "target_entity_type": "LEASE", "target_entity_id": lease.lease_id, "lease_id": lease.lease_id}
+        inserted, failed, failed_rule_ids = _insert_reminder_rows([bad, good], [dict(trigger, target_event_date=date(2024, 1, 1)), dict(trigger, target_event_date=lease.end_date)], "bad-row", summary)
+        db.session.commit()
+
+        self.assertEqual((inserted, failed, failed_rule_ids), (1, 1, {self.rule.rule_id}))
+        self.assertEqual(NotificationTriggerLog.query.one().target_event_date, lease.end_date)
+
+        # A row another run already triggered is skipped, not failed
+        retry = dict(good, template_context={})
+        inserted, failed, failed_rule_ids = _insert_reminder_rows([retry, dict(good)], [dict(trigger, target_event_date=lease.end_date), dict(trigger, target_event_date=lease.start_date)], "bad-row", summary)
+        db.session.commit()
+        self.assertEqual((inserted, failed, failed_rule_ids, summary["skipped_existing"]), (1, 0, set(), 1))
+
+    def test_last_run_date_is_kept_for_rules_with_failed_rows(self):
+        self.rule.last_run_date = self.run_date - timedelta(days=1)
+        db.session.commit()
+        rule_id = self.rule.rule_id
+        self._add_lease(self.run_date + timedelta(days=60))
+        insert_rows = lease_jobs._insert_reminder_rows
+
+        def insert_with_a_bad_row(notification_rows, trigger_rows, job_run_id, summary):
+            notification_rows[0]["user_id"] = None # violates NOT NULL
+            return insert_rows(notification_rows, trigger_rows, job_run_id, summary)
+
+        for chunk_size in (0, 1):
+            with mock.patch.object(lease_jobs, "_insert_reminder_rows", side_effect=insert_with_a_bad_row):
+                summary = process_lease_renewal_reminders_job(run_date=self.run_date, chunk_size=chunk_size)
+            self.assertEqual((summary["rows_failed"], summary["notifications_created"]), (1, 0))
+            self.assertEqual(db.session.get(LandlordReminderRule, rule_id).last_run_date, self.run_date - timedelta(days=1))
+
+        # The next run picks the day up again
+        summary = process_lease_renewal_reminders_job(run_date=self.run_date)
+        self.assertEqual(summary["notifications_created"], 1)
+        self.assertEqual(db.session.get(LandlordReminderRule, rule_id).last_run_date, self.run_date)
+
+
+    def test_catches_up_on_missed_days_and_advances_last_run_date(self):
+        self.rule.last_run_date = self.run_date - timedelta(days=4) # Runs on the three days before run_date were missed
+        db.session.commit()
+        for days_late in (0, 1, 3, 4): # The lease 4 days late was handled by the last run
+            self._add_lease(self.run_date + timedelta(days=60 - days_late))
+
+        summary = process_lease_renewal_reminders_job(run_date=self.run_date)
+
+        self.assertEqual(summary["catch_up_from"], self.run_date - timedelta(days=3))
+        self.assertEqual(summary["notifications_created"], 3)
+        send_dates = sorted(n.scheduled_send_time.date() for n in Notification.query.all())
+        self.assertEqual(send_dates, [self.run_date - timedelta(days=3), self.run_date - timedelta(days=1), self.run_date])
+        self.assertEqual({n.template_context["days_offset"] for n in Notification.query.all()}, {60})
+        self.assertEqual(db.session.get(LandlordReminderRule, self.rule.rule_id).last_run_date, self.run_date)
+
+        # The next day only processes that day
+        summary = process_lease_renewal_reminders_job(run_date=self.run_date + timedelta(days=1), chunk_size=2)
+        self.assertEqual(summary["catch_up_from"], self.run_date + timedelta(days=1))
+        self.assertEqual(db.session.get(LandlordReminderRule, self.rule.rule_id).last_run_date, self.run_date + timedelta(days=1))
+
+    def test_explicit_since_is_not_bounded_by_max_catch_up_days(self):
+        self._add_lease(self.run_date + timedelta(days=50))
+
+        summary = process_lease_renewal_reminders_job(run_date=self.run_date, max_catch_up_days=5, catch_up=False)
+        self.assertEqual(summary["notifications_created"], 0)
+
+        summary = process_lease_renewal_reminders_job(run_date=self.run_date, since=self.run_date - timedelta(days=10), max_catch_up_days=5)
+        self.assertEqual(summary["catch_up_from"], self.run_date - timedelta(days=10))
+        self.assertEqual(summary["notifications_created"], 1)
+        with self.assertRaises(ValueError):
+            process_lease_renewal_reminders_job(run_date=self.run_date, since=self.run_date + timedelta(days=1))
+
+    def test_month_offsets_use_calendar_months(self):
+        self.rule.offset_value = -1
+        self.rule.offset_unit = ReminderTimeUnit.MONTHS
+        db.session.commit()
+        run_date = date(2024, 2, 29)
+        for day in (28, 29, 30, 31):
+            self._add_lease(date(2024, 3, day))
+
+        summary = process_lease_renewal_reminders_job(run_date=run_date)
+
+        # Mar 28 fired on Feb 28; Mar 29-31 all clamp to Feb 29
+        self.assertEqual(summary["notifications_created"], 3)
+        self.assertEqual(sorted(n.template_context["days_offset"] for n in Notification.query.all()), [29, 30, 31])
+
+    def test_add_months_and_event_date_window(self):
+        self.assertEqual(_add_months(date(2024, 1, 31), 1), date(2024, 2, 29))
+        self.assertEqual(_add_months(date(2024, 11, 30), 3), date(2025, 2, 28))
+        self.assertEqual(_add_months(date(2024, 3, 31), -13), date(2023, 2, 28))
+        self.assertEqual(_event_date_window(date(2024, 1, 1), date(2024, 1, 7), -14, ReminderTimeUnit.DAYS), (date(2024, 1, 15), date(2024, 1, 21)))
+        self.assertEqual(_event_date_window(date(2024, 1, 1), date(2024, 1, 1), 2, ReminderTimeUnit.WEEKS), (date(2023, 12, 18), date(2023, 12, 18)))
+        self.assertEqual(_event_date_window(date(2023, 2, 28), date(2023, 2, 28), 1, ReminderTimeUnit.MONTHS), (date(2023, 1, 28), date(2023, 1, 31)))
+        # Nothing plus one month lands on Mar 29-31 of a non-leap year
+        self.assertIsNone(_event_date_window(date(2023, 3, 29), date(2023, 3, 31), 1, ReminderTimeUnit.MONTHS))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,198 @@
+import json
+import unittest
+from unittest import mock
+import sqlalchemy as sa
+from datetime import date, datetime
+from decimal import Decimal
+from sqlalchemy import event
+from hermitta_app import create_app, db
+from hermitta_app.jobs import mpesa_jobs
+from hermitta_app.jobs.mpesa_jobs import MpesaCallbackProcessor, drain_mpesa_callback_inbox_job, parse_stk_callback
+from models import Building, GatewayTransaction, MpesaCallbackInbox, Notification, Payment
+from models.property import Property, PropertyType
+from models.lease import Lease, LeaseStatusType
+from models.user import User, UserRole
+from models.enums import (
+    CallbackInboxStatus, GatewayTransactionStatus, GatewayType, NotificationChannel, NotificationType, PaymentMethod, PaymentStatus
+)
+
+
+def _callback(checkout_request_id, result_code=0, amount=15000, receipt="SBK7RT61SV"):
+    callback = {"MerchantRequestID": "29115-34620561-1", "CheckoutRequestID": checkout_request_id, "ResultCode": result_code,
+                "ResultDesc": "The service request is processed successfully." if result_code == 0 else "Request cancelled by user"}
+    if result_code == 0:
+        callback["CallbackMetadata"] = {"Item": [
+            {"Name": "Amount", "Value": amount}, {"Name": "MpesaReceiptNumber", "Value": receipt}, {"Name": "Balance"},
+            {"Name": "TransactionDate", "Value": 20240301102115}, {"Name": "PhoneNumber", "Value": 254708374149},
+        ]}
+    return json.dumps({"Body": {"stkCallback": callback}})
+
+
+class TestMpesaCallbackInbox(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('test')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        db.create_all()
+        cls.client = cls.app.test_client()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    def setUp(self):
+        db.session.rollback()
+        for model in (MpesaCallbackInbox, Notification, GatewayTransaction, Payment, Lease, Property, Building, User):
+            model.query.delete()
+        db.session.commit()
+        db.session.expunge_all()
+        self.landlord = User(email="stk_landlord@example.com", phone_number="+254700000951", password_hash="test",
+                             first_name="Lara", last_name="Landlord", role=UserRole.LANDLORD)
+        self.tenant = User(email="stk_tenant@example.com", phone_number="+254700000952", password_hash="test",
+                           first_name="Tom", last_name="Tenant", role=UserRole.TENANT)
+        db.session.add_all([self.landlord, self.tenant])
+        db.session.commit()
+        unit = Property(landlord_id=self.landlord.user_id, address_line_1="Ngong Road", unit_number="A1", city="Nairobi",
+                        county="Nairobi", property_type=PropertyType.APARTMENT_UNIT)
+        db.session.add(unit)
+        db.session.commit()
+        self.lease = Lease(property_id=unit.property_id, landlord_id=self.landlord.user_id, tenant_id=self.tenant.user_id,
+                           start_date=date(2024, 1, 1), end_date=date(2024, 12, 31), rent_amount=Decimal("15000"),
+                           rent_due_day=1, move_in_date=date(2024, 1, 1), status=LeaseStatusType.ACTIVE)
+        db.session.add(self.lease)
+        db.session.commit()
+
+    def _stk_payment(self, checkout_request_id, expected="15000"):
+        payment = Payment(lease_id=self.lease.lease_id, expected_amount=Decimal(expected), status=PaymentStatus.PENDING_CONFIRMATION)
+        db.session.add(payment)
+        db.session.flush()
+        transaction = GatewayTransaction(payment_id=payment.payment_id, gateway_type=GatewayType.MPESA_STK_PUSH,
+                                         gateway_specific_transaction_id=checkout_request_id, amount=Decimal(expected), currency="KES")
+        db.session.add(transaction)
+        db.session.commit()
+        return payment.payment_id, transaction.transaction_id
+
+    def _store(self, *bodies):
+        for body in bodies:
+            MpesaCallbackInbox.append(db.session.connection(), body)
+        db.session.commit()
+
+    def test_callback_endpoint_stores_the_raw_payload_and_acknowledges(self):
+        body = _callback("ws_CO_1")
+        response = self.client.post('/api/v1/mpesa/callback', data=body, content_type='application/json')
+        self.assertEqual((response.status_code, response.get_json()), (200, {"ResultCode": 0, "ResultDesc": "Accepted"}))
+        stored = MpesaCallbackInbox.query.one()
+        self.assertEqual((stored.raw_body, stored.status), (body, CallbackInboxStatus.RECEIVED))
+        # Stored as received: parsing is left to the worker
+        self.assertEqual(self.client.post('/api/v1/mpesa/callback', data="not json").status_code, 200)
+        self.assertEqual(self.client.post('/api/v1/mpesa/callback', data="").status_code, 400)
+
+        self.app.config['MPESA_CALLBACK_TOKEN'] = "s3cret"
+        try:
+            self.assertEqual(self.client.post('/api/v1/mpesa/callback?token=wrong', data=_callback("ws_CO_2")).status_code, 403)
+            self.assertEqual(self.client.post('/api/v1/mpesa/callback?token=s3cret', data=_callback("ws_CO_2")).status_code, 200)
+        finally:
+            self.app.config['MPESA_CALLBACK_TOKEN'] = None
+        self.assertEqual(MpesaCallbackInbox.query.count(), 3)
+
+    def test_parse_stk_callback(self):
+        parsed = parse_stk_callback(_callback("ws_CO_1", amount=1.5))
+        self.assertEqual((parsed["checkout_request_id"], parsed["result_code"], parsed["amount"], parsed["receipt_number"]),
+                         ("ws_CO_1", 0, Decimal("1.5"), "SBK7RT61SV"))
+        self.assertEqual(parsed["transaction_date"], datetime(2024, 3, 1, 10, 21, 15))
+        self.assertIsNone(parse_stk_callback(_callback("ws_CO_2", result_code=1032))["amount"])
+        with self.assertRaises(ValueError):
+            parse_stk_callback('{"Body": {}}')
+
+    def test_worker_applies_a_batch_with_one_lookup_query(self):
+        paid_id, paid_tx = self._stk_payment("ws_CO_paid")
+        partial_id, _ = self._stk_payment("ws_CO_partial", expected="20000")
+        cancelled_id, cancelled_tx = self._stk_payment("ws_CO_cancelled")
+        self._store(_callback("ws_CO_paid"), _callback("ws_CO_partial"), _callback("ws_CO_cancelled", result_code=1032),
+                    _callback("ws_CO_unknown"), "{broken")
+
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, "before_cursor_execute", listener)
+        try:
+            summary = MpesaCallbackProcessor(notification_channels=[NotificationChannel.IN_APP]).run()
+        finally:
+            event.remove(db.engine, "before_cursor_execute", listener)
+        lookups = [statement for statement in statements if "FROM gateway_transactions" in statement and statement.lstrip().startswith("SELECT")]
+        self.assertEqual(len(lookups), 2) # The lookup, and the locked re-read of the matched open transactions
+
+        self.assertEqual({key: summary[key] for key in ("claimed", "succeeded", "cancelled", "unmatched", "malformed", "batches")},
+                         {"claimed": 5, "succeeded": 2, "cancelled": 1, "unmatched": 1, "malformed": 1, "batches": 1})
+        paid = db.session.get(Payment, paid_id)
+        self.assertEqual((paid.status, paid.amount_paid, paid.reference_number, paid.payment_method, paid.payment_date, paid.gateway_transaction_id),
+                         (PaymentStatus.COMPLETED, Decimal("15000.00"), "SBK7RT61SV", PaymentMethod.MPESA_ONLINE_STK, date(2024, 3, 1), paid_tx))
+        self.assertEqual(db.session.get(GatewayTransaction, paid_tx).status, GatewayTransactionStatus.SUCCESSFUL)
+        self.assertEqual(db.session.get(Payment, partial_id).status, PaymentStatus.PARTIALLY_PAID)
+        self.assertEqual(db.session.get(Payment, cancelled_id).status, PaymentStatus.CANCELLED)
+        self.assertEqual(db.session.get(GatewayTransaction, cancelled_tx).error_code, "1032")
+
+        statuses = [row.status for row in MpesaCallbackInbox.query.order_by(MpesaCallbackInbox.inbox_id)]
+        self.assertEqual(statuses, [CallbackInboxStatus.PROCESSED] * 3 + [CallbackInboxStatus.UNMATCHED, CallbackInboxStatus.FAILED])
+        received = Notification.query.filter_by(notification_type=NotificationType.PAYMENT_RECEIVED_CONFIRMATION).all()
+        self.assertEqual(sorted(n.user_id for n in received if n.payment_id == paid_id), sorted([self.tenant.user_id, self.landlord.user_id]))
+        failed = Notification.query.filter_by(notification_type=NotificationType.PAYMENT_FAILED_ALERT).one()
+        self.assertEqual((failed.user_id, failed.payment_id), (self.tenant.user_id, cancelled_id))
+
+    def test_retried_callbacks_are_applied_once(self):
+        payment_id, _ = self._stk_payment("ws_CO_1")
+        self._store(_callback("ws_CO_1"), _callback("ws_CO_1"))
+        summary = drain_mpesa_callback_inbox_job(batch_size=1)
+        self.assertEqual((summary["succeeded"], summary["duplicates"], summary["batches"]), (1, 1, 2))
+
+        # M-Pesa retrying after the first callback was applied; a failed retry does not undo the payment
+        self._store(_callback("ws_CO_1", result_code=1))
+        summary = drain_mpesa_callback_inbox_job()
+        self.assertEqual((summary["duplicates"], summary["failed"]), (1, 0))
+        self.assertEqual(db.session.get(Payment, payment_id).status, PaymentStatus.COMPLETED)
+        self.assertEqual(Notification.query.filter_by(payment_id=payment_id).count(), 2 * len(self.app.config['MPESA_PAYMENT_NOTIFICATION_CHANNELS']))
+        self.assertEqual(MpesaCallbackInbox.query.filter_by(status=CallbackInboxStatus.PROCESSED).count(), 3)
+
+    def test_a_callback_that_cannot_be_written_fails_alone(self):
+        paid_id, _ = self._stk_payment("ws_CO_paid")
+        self._stk_payment("ws_CO_bad")
+        self._store(_callback("ws_CO_paid"), _callback("ws_CO_bad", receipt={"not": "a receipt"}))
+        processor = MpesaCallbackProcessor(max_attempts=2)
+
+        summary = processor.run(max_batches=1)
+
+        self.assertEqual((summary["succeeded"], summary["errors"]), (1, 1))
+        self.assertEqual(db.session.get(Payment, paid_id).status, PaymentStatus.COMPLETED)
+        statuses = [row.status for row in MpesaCallbackInbox.query.order_by(MpesaCallbackInbox.inbox_id)]
+        self.assertEqual(statuses, [CallbackInboxStatus.PROCESSED, CallbackInboxStatus.RECEIVED])
+        # Given up once out of attempts
+        processor.run()
+        self.assertEqual(MpesaCallbackInbox.query.filter_by(status=CallbackInboxStatus.FAILED).count(), 1)
+
+    def test_a_callback_applied_by_another_worker_meanwhile_is_a_duplicate(self):
+        payment_id, transaction_id = self._stk_payment("ws_CO_1")
+        self._store(_callback("ws_CO_1", result_code=1))
+        load_transactions = mpesa_jobs._load_transactions
+
+        def load_then_apply_elsewhere(checkout_request_ids):
+            transactions = load_transactions(checkout_request_ids)
+            # Another worker applies a different callback for the same payment and commits
+            with db.engine.begin() as connection:
+                connection.execute(sa.update(GatewayTransaction).where(GatewayTransaction.transaction_id == transaction_id)
+                                   .values(status=GatewayTransactionStatus.SUCCESSFUL))
+                connection.execute(sa.update(Payment).where(Payment.payment_id == payment_id).values(status=PaymentStatus.COMPLETED))
+            return transactions
+
+        with mock.patch.object(mpesa_jobs, "_load_transactions", load_then_apply_elsewhere):
+            summary = MpesaCallbackProcessor().run()
+
+        self.assertEqual((summary["duplicates"], summary["failed"], summary["notifications_created"]), (1, 0, 0))
+        self.assertEqual(db.session.get(Payment, payment_id).status, PaymentStatus.COMPLETED)
+        self.assertEqual(db.session.get(GatewayTransaction, transaction_id).status, GatewayTransactionStatus.SUCCESSFUL)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,268 @@
+import threading
+import unittest
+from datetime import datetime, timedelta
+from hermitta_app import create_app, db
+from hermitta_app.jobs.notification_jobs import NotificationDispatcher, dispatch_due_notifications_job
+from hermitta_app.services.notification_backends import (
+    MemoryBackend, InAppBackend, SmtpEmailBackend, HttpSmsBackend, NotificationBackend, NotificationDeliveryError,
+    OutgoingNotification
+)
+from hermitta_app.services.notification_sinks import LocalSmtpSink, LocalSmsSink
+from models import Notification, NotificationTemplate, NotificationUnreadCounter
+from models.user import User, UserRole, PreferredLanguage
+from models.enums import NotificationType, NotificationChannel, NotificationStatus
+
+
+class _SlowBackend(NotificationBackend):
+    """Records how many sends run at the same time."""
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        threading.Event().wait(0.02)
+        with self._lock:
+            self.active -= 1
+        return None
+
+
+class _CountingSmtpBackend(SmtpEmailBackend):
+    """Counts the SMTP connections opened over the backend's lifetime."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.opened = 0
+
+    def _connection(self):
+        if getattr(self._local, "connection", None) is None:
+            self.opened += 1
+        return super()._connection()
+
+
+class _ReclaimedInAppBackend(InAppBackend):
+    """Lets another worker reclaim each notification while it is being sent (as after a claim timeout)."""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def send(self, message):
+        table = Notification.__table__
+        with self.engine.begin() as connection:
+            connection.execute(table.update().where(table.c.notification_id == message.notification_id).values(claimed_by="other:late"))
+        return super().send(message)
+
+
+class TestNotificationDispatcher(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('test')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        db.create_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    def setUp(self):
+        db.session.rollback()
+        for model in (Notification, NotificationTemplate, User):
+            model.query.delete()
+        db.session.commit()
+        db.session.expunge_all()
+
+        self.now = datetime(2024, 3, 1, 9, 0)
+        self.tenant = User(email="dispatch_tenant@example.com", phone_number="+254700000301", password_hash="test", first_name="Tina", last_name="Tenant", role=UserRole.TENANT)
+        self.swahili_tenant = User(email="dispatch_sw@example.com", phone_number="+254700000302", password_hash="test", first_name="Juma", last_name="Mpangaji", role=UserRole.TENANT, preferred_language=PreferredLanguage.SW_KE)
+        self.template = NotificationTemplate(
+            name="Rent reminder", template_type=NotificationType.RENT_REMINDER, channel=NotificationChannel.EMAIL,
+            subject_template_en="Rent due {{due_date}}", body_template_en="Hi {{tenant_name}}, rent is due on {{due_date}}.",
+            subject_template_sw="Kodi {{due_date}}", body_template_sw="Habari {{tenant_name}}, kodi inadaiwa {{due_date}}."
+        )
+        db.session.add_all([self.tenant, self.swahili_tenant, self.template])
+        db.session.commit()
+
+        self.email = MemoryBackend(NotificationChannel.EMAIL)
+        self.sms = MemoryBackend(NotificationChannel.SMS)
+        self.backends = {NotificationChannel.EMAIL: self.email, NotificationChannel.SMS: self.sms, NotificationChannel.IN_APP: InAppBackend()}
+
+    def _notification(self, user=None, channel=NotificationChannel.EMAIL, status=NotificationStatus.SCHEDULED, send_time=None, **kwargs):
+        kwargs.setdefault("template_id", self.template.template_id)
+        kwargs.setdefault("template_context", {"tenant_name": "Tina", "due_date": "2024-03-05"})
+        notification = Notification(
+            user_id=(user or self.tenant).user_id, notification_type=NotificationType.RENT_REMINDER, channel=channel,
+            status=status, scheduled_send_time=send_time or self.now - timedelta(minutes=5), **kwargs
+        )
+        db.session.add(notification)
+        db.session.commit()
+        return notification.notification_id
+
+    def test_sends_due_notifications_and_updates_rows(self):
+        email_id = self._notification()
+        sms_id = self._notification(channel=NotificationChannel.SMS)
+        in_app_id = self._notification(channel=NotificationChannel.IN_APP, status=NotificationStatus.PENDING, send_time=None)
+        future_id = self._notification(send_time=self.now + timedelta(hours=1))
+
+        summary = NotificationDispatcher(self.backends).run(now=self.now)
+
+        self.assertEqual(summary["claimed"], 3)
+        self.assertEqual(summary["sent"], 3)
+        self.assertEqual([message.address for message in self.email.sent], ["dispatch_tenant@example.com"])
+        self.assertEqual(self.email.sent[0].subject, "Rent due 2024-03-05")
+        self.assertEqual(self.sms.sent[0].address, "+254700000301")
+        db.session.expunge_all()
+        email = db.session.get(Notification, email_id)
+        self.assertEqual(email.status, NotificationStatus.SENT)
+        self.assertIsNotNone(email.sent_at)
+        self.assertEqual(email.external_id, "memory-email-1")
+        self.assertEqual(email.content, "Hi Tina, rent is due on 2024-03-05.")
+        self.assertEqual(db.session.get(Notification, sms_id).status, NotificationStatus.SENT)
+        self.assertEqual(db.session.get(Notification, in_app_id).status, NotificationStatus.SENT)
+        self.assertEqual(db.session.get(Notification, future_id).status, NotificationStatus.SCHEDULED)
+
+    def test_renders_in_recipients_language(self):
+        self._notification(user=self.swahili_tenant)
+
+        NotificationDispatcher(self.backends).run(now=self.now)
+
+        self.assertEqual(self.email.sent[0].body, "Habari Tina, kodi inadaiwa 2024-03-05.")
+
+    def test_failures_are_recorded_per_row(self):
+        refused_id = self._notification()
+        broken_id = self._notification(template_id=None, template_context=None)
+        self.email.fail_addresses = {"dispatch_tenant@example.com": True}
+
+        summary = NotificationDispatcher(self.backends).run(now=self.now)
+
+        self.assertEqual(summary["invalid_address"], 1)
+        self.assertEqual(summary["failed"], 1)
+        db.session.expunge_all()
+        refused = db.session.get(Notification, refused_id)
+        self.assertEqual(refused.status, NotificationStatus.INVALID_ADDRESS)
+        self.assertIn("dispatch_tenant@example.com", refused.error_message)
+        broken = db.session.get(Notification, broken_id)
+        self.assertEqual(broken.status, NotificationStatus.FAILED)
+        self.assertIn("no content", broken.error_message)
+
+    def test_skips_rows_claimed_by_another_worker(self):
+        ids = [self._notification() for _ in range(4)]
+        other = NotificationDispatcher(self.backends, batch_size=2, worker_id="other")
+        _, claimed_by_other = other.claim_batch(self.now)
+
+        summary = NotificationDispatcher(self.backends, worker_id="me").run(now=self.now)
+
+        self.assertEqual(summary["sent"], 2)
+        self.assertEqual(sorted(message.notification_id for message in self.email.sent), sorted(set(ids) - set(claimed_by_other)))
+        db.session.expunge_all()
+        for notification_id in claimed_by_other:
+            notification = db.session.get(Notification, notification_id)
+            self.assertEqual(notification.status, NotificationStatus.SENDING)
+            self.assertTrue(notification.claimed_by.startswith("other:"))
+
+    def test_results_only_overwrite_rows_still_claimed(self):
+        notification_id = self._notification(channel=NotificationChannel.IN_APP)
+        email_id = self._notification()
+        tenant_id = self.tenant.user_id
+        backends = dict(self.backends)
+        backends[NotificationChannel.IN_APP] = _ReclaimedInAppBackend(db.engine)
+
+        summary = NotificationDispatcher(backends).run(now=self.now)
+
+        self.assertEqual((summary["sent"], summary["superseded"]), (2, 1))
+        db.session.expunge_all()
+        notification = db.session.get(Notification, notification_id)
+        self.assertEqual((notification.status, notification.claimed_by), (NotificationStatus.SENDING, "other:late"))
+        self.assertEqual(db.session.get(Notification, email_id).status, NotificationStatus.SENT)
+        self.assertIsNone(db.session.get(NotificationUnreadCounter, tenant_id))
+
+    def test_reclaims_stale_claims(self):
+        notification_id = self._notification()
+        crashed = NotificationDispatcher(self.backends, worker_id="crashed")
+        crashed.claim_batch(self.now - timedelta(hours=1))
+
+        summary = NotificationDispatcher(self.backends, claim_timeout_seconds=600).run(now=self.now)
+
+        self.assertEqual(summary["sent"], 1)
+        self.assertEqual(db.session.get(Notification, notification_id).status, NotificationStatus.SENT)
+
+    def test_channel_concurrency_limit(self):
+        for _ in range(6):
+            self._notification(channel=NotificationChannel.SMS)
+        slow_sms = _SlowBackend(NotificationChannel.SMS)
+
+        summary = NotificationDispatcher({NotificationChannel.SMS: slow_sms}, channel_concurrency={NotificationChannel.SMS: 2}).run(now=self.now)
+
+        self.assertEqual(summary["sent"], 6)
+        self.assertEqual(slow_sms.max_active, 2)
+
+    def test_sends_through_local_smtp_and_sms_sinks(self):
+        email_id = self._notification()
+        self._notification(user=self.swahili_tenant)
+        sms_id = self._notification(channel=NotificationChannel.SMS)
+        rejected_id = self._notification(user=self.swahili_tenant, channel=NotificationChannel.SMS)
+
+        with LocalSmtpSink() as smtp, LocalSmsSink(reject={"+254700000302"}) as sms:
+            backends = {
+                NotificationChannel.EMAIL: SmtpEmailBackend(smtp.host, smtp.port, sender="rent@hermitta.co.ke"),
+                NotificationChannel.SMS: HttpSmsBackend(sms.url, api_key="secret", sender_id="HERMITTA"),
+            }
+            summary = NotificationDispatcher(backends, channel_concurrency={NotificationChannel.EMAIL: 2}).run(now=self.now)
+
+            self.assertEqual(summary["sent"], 3)
+            self.assertEqual(summary["invalid_address"], 1)
+            self.assertEqual(sorted(recipient for message in smtp.messages for recipient in message["to"]),
+                             ["dispatch_sw@example.com", "dispatch_tenant@example.com"])
+            self.assertEqual({message["subject"] for message in smtp.messages}, {"Rent due 2024-03-05", "Kodi 2024-03-05"})
+            self.assertEqual(len(sms.messages), 1)
+            self.assertEqual(sms.messages[0]["to"], "+254700000301")
+            self.assertEqual(sms.messages[0]["authorization"], "Bearer secret")
+
+        db.session.expunge_all()
+        self.assertTrue(db.session.get(Notification, email_id).external_id.startswith("<"))
+        self.assertEqual(db.session.get(Notification, sms_id).external_id, "sms-1")
+        self.assertEqual(db.session.get(Notification, rejected_id).status, NotificationStatus.INVALID_ADDRESS)
+
+    def test_sms_gateway_errors_other_than_number_rejections_are_retryable(self):
+        message = OutgoingNotification(1, NotificationChannel.SMS, self.tenant.user_id, "+254700000301", None, "Rent is due")
+        for status, invalid_address in ((401, False), (403, False), (429, False), (503, False), (400, True), (422, True)):
+            with LocalSmsSink(fail_status=status) as sms:
+                with self.assertRaises(NotificationDeliveryError) as raised:
+                    HttpSmsBackend(sms.url, api_key="expired").send(message)
+            self.assertEqual(raised.exception.invalid_address, invalid_address, status)
+
+    def test_reuses_smtp_connections_across_batches(self):
+        for _ in range(6):
+            self._notification()
+
+        with LocalSmtpSink() as smtp:
+            email = _CountingSmtpBackend(smtp.host, smtp.port)
+            summary = NotificationDispatcher({NotificationChannel.EMAIL: email}, batch_size=2,
+                                             channel_concurrency={NotificationChannel.EMAIL: 2}).run(now=self.now)
+
+            self.assertEqual((summary["sent"], summary["batches"]), (6, 3))
+            self.assertEqual(len(smtp.messages), 6)
+        # One connection per pool thread for the whole run, all closed when it ends
+        self.assertLessEqual(email.opened, 2)
+        self.assertEqual(email._connections, [])
+
+    def test_job_uses_configured_backends(self):
+        self._notification()
+        self._notification(channel=NotificationChannel.SMS)
+
+        summary = dispatch_due_notifications_job(worker_id="cli")
+
+        self.assertEqual(summary["sent"], 2)
+        self.assertEqual(Notification.query.filter_by(status=NotificationStatus.SENT).count(), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
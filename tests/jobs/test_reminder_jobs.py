@@ -0,0 +1,209 @@
+import unittest
+from unittest import mock
+from datetime import date, time, timedelta
+from decimal import Decimal
+from hermitta_app import create_app, db
+from hermitta_app.jobs.lease_jobs import process_lease_renewal_reminders_job
+from hermitta_app.jobs import reminder_jobs
+from hermitta_app.jobs.reminder_jobs import process_scheduled_reminders_job, _merge_date_windows
+from models import (
+    LandlordReminderRule, Lease, Payment, Document, MaintenanceRequest, FinancialTransaction,
+    Notification, NotificationTemplate, NotificationTriggerLog
+)
+from models.user import User, UserRole
+from models.property import Property, PropertyType
+from models.lease import LeaseStatusType
+from models.maintenance_request import MaintenanceRequestCategory, MaintenanceRequestStatus
+from models.financial_transaction import FinancialTransactionType, RecurrenceFrequency
+from models.enums import (
+    ReminderRuleEvent, ReminderTimeUnit, ReminderRecipientType, PaymentStatus, DocumentType,
+    NotificationType, NotificationChannel, NotificationStatus
+)
+
+
+class TestScheduledRemindersJob(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('test')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        db.create_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    def setUp(self):
+        db.session.rollback()
+        for model in (NotificationTriggerLog, Notification, LandlordReminderRule, NotificationTemplate, Payment, Document,
+                      MaintenanceRequest, FinancialTransaction, Lease, Property, User):
+            model.query.delete()
+        db.session.commit()
+        db.session.expunge_all()
+
+        self.run_date = date(2024, 3, 1)
+        self.landlord = User(email="landlord_sweep@example.com", phone_number="+254700000011", password_hash="test", first_name="Lara", last_name="Landlord", role=UserRole.LANDLORD)
+        self.tenant = User(email="tenant_sweep@example.com", phone_number="+254700000012", password_hash="test", first_name="Tom", last_name="Tenant", role=UserRole.TENANT)
+        db.session.add_all([self.landlord, self.tenant])
+        db.session.commit()
+
+        self.property = Property(landlord_id=self.landlord.user_id, address_line_1="2 Sweep Rd", city="Nairobi", county="Nairobi", property_type=PropertyType.APARTMENT_UNIT, unit_number="B2")
+        self.template = NotificationTemplate(name="Generic reminder", template_type=NotificationType.RENT_REMINDER, channel=NotificationChannel.SMS, body_template_en="Reminder for {{event_date}}")
+        db.session.add_all([self.property, self.template])
+        db.session.commit()
+
+        self.lease = Lease(property_id=self.property.property_id, landlord_id=self.landlord.user_id, tenant_id=self.tenant.user_id, start_date=self.run_date + timedelta(days=7), end_date=self.run_date + timedelta(days=30), rent_amount=Decimal("1000.00"), rent_due_day=1, move_in_date=self.run_date + timedelta(days=7), status=LeaseStatusType.ACTIVE_PENDING_MOVE_IN)
+        db.session.add(self.lease)
+        db.session.commit()
+
+    def _add_rule(self, event_type, offset_days, recipient_type=ReminderRecipientType.TENANT):
+        rule = LandlordReminderRule(landlord_id=self.landlord.user_id, name=f"{event_type.value} {offset_days}", event_type=event_type, offset_value=offset_days, offset_unit=ReminderTimeUnit.DAYS, send_time=time(7, 0), recipient_type=recipient_type, notification_template_id=self.template.template_id)
+        db.session.add(rule)
+        db.session.commit()
+        return rule
+
+    def test_sweeps_every_event_type_in_one_run(self):
+        payment = Payment(lease_id=self.lease.lease_id, expected_amount=Decimal("1000.00"), due_date=self.run_date + timedelta(days=3), status=PaymentStatus.EXPECTED, payment_reference_code="REF-1")
+        paid = Payment(lease_id=self.lease.lease_id, expected_amount=Decimal("1000.00"), due_date=self.run_date + timedelta(days=3), status=PaymentStatus.COMPLETED)
+        document = Document(uploader_user_id=self.landlord.user_id, document_name="Insurance", document_type=DocumentType.INSURANCE_POLICY_PROPERTY, file_url="http://files/ins.pdf", property_id=self.property.property_id, expiry_date=self.run_date + timedelta(days=14))
+        request = MaintenanceRequest(property_id=self.property.property_id, created_by_user_id=self.tenant.user_id, tenant_id=self.tenant.user_id, description="Leaking tap", category=MaintenanceRequestCategory.PLUMBING, scheduled_date=self.run_date + timedelta(days=1))
+        closed = MaintenanceRequest(property_id=self.property.property_id, created_by_user_id=self.tenant.user_id, tenant_id=self.tenant.user_id, description="Old job", category=MaintenanceRequestCategory.PLUMBING, scheduled_date=self.run_date + timedelta(days=1), status=MaintenanceRequestStatus.CLOSED_CANCELLED)
+        bill = FinancialTransaction(landlord_id=self.landlord.user_id, type=FinancialTransactionType.EXPENSE, category_id=1, description="Water bill", amount=Decimal("50.00"), transaction_date=self.run_date, property_id=self.property.property_id, is_recurring=True, recurrence_frequency=RecurrenceFrequency.MONTHLY, next_due_date=self.run_date + timedelta(days=5))
+        db.session.add_all([payment, paid, document, request, closed, bill])
+        db.session.commit()
+
+        self._add_rule(ReminderRuleEvent.LEASE_START_DATE, -7)
+        self._add_rule(ReminderRuleEvent.LEASE_END_DATE, -30)
+        self._add_rule(ReminderRuleEvent.RENT_DUE_DATE, -3)
+        self._add_rule(ReminderRuleEvent.INVOICE_DUE_DATE, -5, recipient_type=ReminderRecipientType.LANDLORD)
+        self._add_rule(ReminderRuleEvent.DOCUMENT_EXPIRY_DATE, -14, recipient_type=ReminderRecipientType.LANDLORD)
+        self._add_rule(ReminderRuleEvent.MAINTENANCE_SCHEDULED_DATE, -1)
+
+        summary = process_scheduled_reminders_job(job_run_id="sweep-1", run_date=self.run_date)
+
+        self.assertEqual(summary["rules"], 6)
+        self.assertEqual(summary["notifications_created"], 6)
+        for event in ReminderRuleEvent:
+            self.assertEqual(summary["events"][event.value]["notifications_created"], 1, event)
+
+        logs = {log.target_entity_type: log for log in NotificationTriggerLog.query.filter_by(job_run_id="sweep-1")}
+        self.assertEqual(logs["PAYMENT"].target_entity_id, payment.payment_id)
+        self.assertEqual(logs["PAYMENT"].lease_id, self.lease.lease_id)
+        self.assertEqual(logs["DOCUMENT"].target_entity_id, document.document_id)
+        self.assertEqual(logs["MAINTENANCE_REQUEST"].target_entity_id, request.request_id)
+        self.assertEqual(logs["FINANCIAL_TRANSACTION"].target_entity_id, bill.transaction_id)
+
+        rent = Notification.query.filter_by(payment_id=payment.payment_id).one()
+        self.assertEqual(rent.user_id, self.tenant.user_id)
+        self.assertEqual(rent.status, NotificationStatus.SCHEDULED)
+        self.assertEqual(rent.scheduled_send_time.time(), time(7, 0))
+        self.assertEqual(rent.template_context["payment_reference_code"], "REF-1")
+        self.assertEqual(rent.template_context["property_unit"], "B2")
+        doc_notification = Notification.query.filter_by(document_id=document.document_id).one()
+        self.assertEqual(doc_notification.user_id, self.landlord.user_id)
+        self.assertEqual(doc_notification.template_context["document_name"], "Insurance")
+        invoice = Notification.query.filter_by(related_entity_type="FINANCIAL_TRANSACTION").one()
+        self.assertEqual(invoice.related_entity_id, bill.transaction_id)
+        self.assertEqual(invoice.template_context["invoice_description"], "Water bill")
+        self.assertEqual(Notification.query.filter_by(maintenance_request_id=request.request_id).one().template_context["maintenance_description"], "Leaking tap")
+
+    def test_rerun_and_lease_job_overlap_are_idempotent(self):
+        rule = self._add_rule(ReminderRuleEvent.LEASE_END_DATE, -30)
+        process_lease_renewal_reminders_job(run_date=self.run_date)
+        summary = process_scheduled_reminders_job(run_date=self.run_date)
+
+        self.assertEqual(summary["notifications_created"], 0)
+        self.assertEqual(summary["skipped_existing"], 1)
+        log = NotificationTriggerLog.query.one()
+        self.assertEqual((log.rule_id, log.target_entity_type, log.target_entity_id), (rule.rule_id, "LEASE", self.lease.lease_id))
+
+    def test_event_type_filter(self):
+        self._add_rule(ReminderRuleEvent.LEASE_START_DATE, -7)
+        self._add_rule(ReminderRuleEvent.LEASE_END_DATE, -30)
+
+        summary = process_scheduled_reminders_job(run_date=self.run_date, event_types=[ReminderRuleEvent.LEASE_START_DATE])
+
+        self.assertEqual(summary["rules"], 1)
+        notification = Notification.query.one()
+        self.assertEqual(notification.lease_id, self.lease.lease_id)
+        self.assertIn("lease_start_date", notification.template_context)
+
+    def test_batches_are_committed_separately(self):
+        self._add_rule(ReminderRuleEvent.LEASE_END_DATE, -30)
+        for _ in range(2):
+            db.session.add(Lease(property_id=self.property.property_id, landlord_id=self.landlord.user_id, tenant_id=self.tenant.user_id, start_date=self.run_date, end_date=self.lease.end_date, rent_amount=Decimal("1000.00"), rent_due_day=1, move_in_date=self.run_date, status=LeaseStatusType.ACTIVE))
+        db.session.commit()
+
+        summary = process_scheduled_reminders_job(run_date=self.run_date, batch_size=2)
+
+        self.assertEqual(summary["notifications_created"], 3)
+        self.assertEqual(summary["batches_committed"], 2)
+
+    def test_catches_up_on_missed_days_in_one_run(self):
+        rule = self._add_rule(ReminderRuleEvent.LEASE_END_DATE, -30)
+        rule.last_run_date = self.run_date - timedelta(days=4) # Runs on the three days before run_date were missed
+        db.session.commit()
+        for days_late in (1, 3):
+            db.session.add(Lease(property_id=self.property.property_id, landlord_id=self.landlord.user_id, tenant_id=self.tenant.user_id, start_date=self.run_date, end_date=self.lease.end_date - timedelta(days=days_late), rent_amount=Decimal("1000.00"), rent_due_day=1, move_in_date=self.run_date, status=LeaseStatusType.ACTIVE))
+        db.session.add(Lease(property_id=self.property.property_id, landlord_id=self.landlord.user_id, tenant_id=self.tenant.user_id, start_date=self.run_date, end_date=self.lease.end_date - timedelta(days=4), rent_amount=Decimal("1000.00"), rent_due_day=1, move_in_date=self.run_date, status=LeaseStatusType.ACTIVE)) # Already handled by the last run
+        db.session.commit()
+
+        summary = process_scheduled_reminders_job(run_date=self.run_date)
+
+        self.assertEqual(summary["catch_up_from"], self.run_date - timedelta(days=3))
+        self.assertEqual(summary["notifications_created"], 3)
+        send_dates = sorted(n.scheduled_send_time.date() for n in Notification.query.all())
+        self.assertEqual(send_dates, [self.run_date - timedelta(days=3), self.run_date - timedelta(days=1), self.run_date])
+        self.assertEqual(db.session.get(LandlordReminderRule, rule.rule_id).last_run_date, self.run_date)
+
+        # Re-processing an overlapping range only fills the gap and never double-sends
+        summary = process_scheduled_reminders_job(run_date=self.run_date + timedelta(days=1), since=self.run_date - timedelta(days=10))
+        self.assertEqual(summary["notifications_created"], 1)
+        self.assertEqual(summary["skipped_existing"], 3)
+
+    def test_last_run_date_is_kept_for_rules_with_failed_rows(self):
+        rule = self._add_rule(ReminderRuleEvent.LEASE_END_DATE, -30)
+        rule.last_run_date = self.run_date - timedelta(days=1)
+        db.session.commit()
+        rule_id = rule.rule_id
+        insert_rows = reminder_jobs._insert_reminder_rows
+
+        def insert_with_a_bad_row(notification_rows, trigger_rows, job_run_id, summary):
+            notification_rows[0]["user_id"] = None # violates NOT NULL
+            return insert_rows(notification_rows, trigger_rows, job_run_id, summary)
+
+        with mock.patch.object(reminder_jobs, "_insert_reminder_rows", side_effect=insert_with_a_bad_row):
+            summary = process_scheduled_reminders_job(run_date=self.run_date)
+        self.assertEqual((summary["rows_failed"], summary["notifications_created"]), (1, 0))
+        self.assertEqual(db.session.get(LandlordReminderRule, rule_id).last_run_date, self.run_date - timedelta(days=1))
+
+        summary = process_scheduled_reminders_job(run_date=self.run_date)
+        self.assertEqual(summary["notifications_created"], 1)
+        self.assertEqual(db.session.get(LandlordReminderRule, rule_id).last_run_date, self.run_date)
+
+    def test_catch_up_is_bounded_and_optional(self):
+        rule = self._add_rule(ReminderRuleEvent.LEASE_END_DATE, -30)
+        rule.last_run_date = self.run_date - timedelta(days=100)
+        db.session.commit()
+
+        summary = process_scheduled_reminders_job(run_date=self.run_date, max_catch_up_days=5)
+        self.assertEqual(summary["catch_up_from"], self.run_date - timedelta(days=4))
+
+        summary = process_scheduled_reminders_job(run_date=self.run_date + timedelta(days=3), catch_up=False)
+        self.assertEqual(summary["catch_up_from"], self.run_date + timedelta(days=3))
+
+        # An explicit since is processed in full
+        summary = process_scheduled_reminders_job(run_date=self.run_date, since=self.run_date - timedelta(days=60), max_catch_up_days=5)
+        self.assertEqual(summary["catch_up_from"], self.run_date - timedelta(days=60))
+
+    def test_merge_date_windows(self):
+        d = date(2024, 1, 1)
+        windows = [(d + timedelta(days=5), d + timedelta(days=5)), (d, d), (d + timedelta(days=1), d + timedelta(days=2))]
+        self.assertEqual(_merge_date_windows(windows), [(d, d + timedelta(days=2)), (d + timedelta(days=5), d + timedelta(days=5))])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+from datetime import date, time, timedelta
+from decimal import Decimal
+from hermitta_app import create_app, db
+from hermitta_app.jobs.lease_jobs import process_lease_renewal_reminders_job
+from hermitta_app.jobs.reminder_jobs import process_scheduled_reminders_job
+from hermitta_app.jobs.sharding import run_sharded_job
+from models import (
+    LandlordReminderRule, Lease, Notification, NotificationTemplate, NotificationTriggerLog,
+    ReminderJobCheckpoint
+)
+from models.user import User, UserRole
+from models.property import Property, PropertyType
+from models.lease import LeaseStatusType
+from models.enums import (
+    ReminderRuleEvent, ReminderTimeUnit, ReminderRecipientType, NotificationType, NotificationChannel
+)
+
+
+class TestShardedJobs(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('test')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        db.create_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    def setUp(self):
+        db.session.rollback()
+        for model in (ReminderJobCheckpoint, NotificationTriggerLog, Notification, LandlordReminderRule, NotificationTemplate, Lease, Property, User):
+            model.query.delete()
+        db.session.commit()
+        db.session.expunge_all()
+
+        self.run_date = date(2024, 1, 1)
+        self.template = NotificationTemplate(name="Renewal", template_type=NotificationType.LEASE_RENEWAL_REMINDER, channel=NotificationChannel.EMAIL, body_template_en="Hi {{tenant_name}}")
+        db.session.add(self.template)
+        db.session.commit()
+
+        # Landlords get consecutive ids, so two shards split them evenly
+        landlords = [User(email=f"shard_landlord{n}@example.com", phone_number=f"+25470000010{n}", password_hash="test", first_name="Lara", last_name=f"Landlord{n}", role=UserRole.LANDLORD) for n in range(4)]
+        tenants = [User(email=f"shard_tenant{n}@example.com", phone_number=f"+25470000020{n}", password_hash="test", first_name="Tom", last_name=f"Tenant{n}", role=UserRole.TENANT) for n in range(4)]
+        db.session.add_all(landlords + tenants)
+        db.session.commit()
+
+        self.landlord_ids = []
+        for n, (landlord, tenant) in enumerate(zip(landlords, tenants)):
+            prop = Property(landlord_id=landlord.user_id, address_line_1=f"{n} Shard St", city="Nairobi", county="Nairobi", property_type=PropertyType.APARTMENT_UNIT)
+            db.session.add(prop)
+            db.session.commit()
+            end_date = self.run_date + timedelta(days=60)
+            db.session.add(Lease(property_id=prop.property_id, landlord_id=landlord.user_id, tenant_id=tenant.user_id, start_date=end_date - timedelta(days=365), end_date=end_date, rent_amount=Decimal("1000.00"), rent_due_day=1, move_in_date=end_date - timedelta(days=365), status=LeaseStatusType.ACTIVE))
+            db.session.add(LandlordReminderRule(landlord_id=landlord.user_id, name="60 days before end", event_type=ReminderRuleEvent.LEASE_END_DATE, offset_value=-60, offset_unit=ReminderTimeUnit.DAYS, send_time=time(8, 30), recipient_type=ReminderRecipientType.TENANT, notification_template_id=self.template.template_id))
+            db.session.commit()
+            self.landlord_ids.append(landlord.user_id)
+
+    def test_shard_processes_only_its_landlords(self):
+        summary = process_lease_renewal_reminders_job(run_date=self.run_date, shard=(1, 2))
+
+        self.assertEqual(summary["rules"], 2)
+        landlords = {lease.landlord_id for lease in Lease.query.join(Notification, Notification.lease_id == Lease.lease_id)}
+        self.assertEqual(landlords, {landlord_id for landlord_id in self.landlord_ids if landlord_id % 2 == 1})
+
+    def test_sweep_shard_processes_only_its_landlords(self):
+        summary = process_scheduled_reminders_job(run_date=self.run_date, shard=(0, 2))
+
+        self.assertEqual(summary["rules"], 2)
+        self.assertEqual(summary["notifications_created"], 2)
+        self.assertTrue(all(log.lease.landlord_id % 2 == 0 for log in NotificationTriggerLog.query.all()))
+
+    def test_overlapping_shards_do_not_double_send(self):
+        process_lease_renewal_reminders_job(run_date=self.run_date, shard=(0, 2))
+        # A re-run with a different shard count overlaps the first shard
+        summary = process_lease_renewal_reminders_job(run_date=self.run_date, shard=(0, 1))
+
+        self.assertEqual(summary["notifications_created"], 2)
+        self.assertEqual(summary["skipped_existing"], 2)
+        self.assertEqual(Notification.query.count(), 4)
+
+    def test_coordinator_runs_shards_in_worker_processes(self):
+        report = run_sharded_job("lease_renewal_reminders", 2, config_name='test', job_run_id="nightly", run_date=self.run_date, chunk_size=1)
+
+        self.assertEqual(report["failed_shards"], [])
+        self.assertEqual(report["totals"]["notifications_created"], 4)
+        self.assertEqual([shard["summary"]["notifications_created"] for shard in report["shards"]], [2, 2])
+        self.assertTrue(all(shard["seconds"] > 0 for shard in report["shards"]))
+        checkpoints = sorted(checkpoint.job_run_id for checkpoint in ReminderJobCheckpoint.query.all())
+        self.assertEqual(checkpoints, ["nightly-shard-0-of-2", "nightly-shard-1-of-2"])
+        self.assertEqual(Notification.query.count(), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import unittest
+from datetime import date
+from models.reminder_job_checkpoint import ReminderJobCheckpoint
+from models.enums import JobRunStatus
+
+class TestReminderJobCheckpointModel(unittest.TestCase):
+
+    def test_checkpoint_defaults(self):
+        checkpoint = ReminderJobCheckpoint(
+            job_run_id="run-123",
+            job_name="lease_renewal_reminders",
+            run_date=date(2024, 1, 1),
+            chunk_size=500
+        )
+        self.assertEqual(checkpoint.job_run_id, "run-123")
+        self.assertEqual(checkpoint.run_date, date(2024, 1, 1))
+        self.assertEqual(checkpoint.status, JobRunStatus.IN_PROGRESS)
+        self.assertEqual(checkpoint.last_lease_id, 0)
+        self.assertEqual(checkpoint.chunks_committed, 0)
+        self.assertEqual(checkpoint.notifications_created, 0)
+        self.assertEqual(checkpoint.rows_failed, 0)
+        self.assertIsNone(checkpoint.completed_at)
+        self.assertIsNone(checkpoint.error_message)
+
+    def test_checkpoint_repr(self):
+        checkpoint = ReminderJobCheckpoint(
+            checkpoint_id=7, job_run_id="run-7", job_name="lease_renewal_reminders",
+            run_date=date(2024, 1, 1), chunk_size=100, last_lease_id=42, status=JobRunStatus.FAILED
+        )
+        self.assertEqual(repr(checkpoint), "<ReminderJobCheckpoint 7 Run: run-7 Job: lease_renewal_reminders LastLease: 42 Status: FAILED>")
+
+if __name__ == '__main__':
+    unittest.main()
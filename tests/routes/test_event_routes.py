@@ -0,0 +1,50 @@
+import unittest
+from hermitta_app import create_app, db
+from hermitta_app.services.event_bus import event_bus, NOTIFICATION_EVENT
+
+
+class TestEventRoutes(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('test')
+        cls.app.config['EVENT_STREAM_MAX_SECONDS'] = 0.2
+        cls.app.config['EVENT_STREAM_HEARTBEAT_SECONDS'] = 0.1
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        cls.client = cls.app.test_client()
+        cls.headers = {"X-Test-User-Id": "41"}
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        cls.app_context.pop()
+
+    def test_stream_requires_authentication(self):
+        self.assertEqual(self.client.get('/api/v1/events/stream').status_code, 401)
+
+    def test_stream_resumes_after_last_event_id(self):
+        first = event_bus.publish(41, NOTIFICATION_EVENT, {"notification_id": 1})
+        second = event_bus.publish(41, NOTIFICATION_EVENT, {"notification_id": 2})
+
+        response = self.client.get('/api/v1/events/stream', headers=dict(self.headers, **{"Last-Event-ID": str(first.event_id)}))
+
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        body = response.get_data(as_text=True)
+        self.assertIn(f'id: {second.event_id}\nevent: notification\ndata: {{"notification_id":2}}\n\n', body)
+        self.assertNotIn(f'id: {first.event_id}\n', body)
+
+    def test_long_poll_returns_events_and_next_id(self):
+        published = event_bus.publish(41, NOTIFICATION_EVENT, {"notification_id": 3})
+
+        response = self.client.get(f'/api/v1/events/poll?timeout=0&last_event_id={published.event_id - 1}', headers=self.headers)
+
+        data = response.get_json()
+        self.assertEqual(data["events"], [{"id": published.event_id, "type": "notification", "data": {"notification_id": 3}}])
+        self.assertEqual(data["last_event_id"], published.event_id)
+        self.assertFalse(data["reset"])
+        self.assertEqual(self.client.get('/api/v1/events/poll?last_event_id=abc', headers=self.headers).status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+from hermitta_app import create_app, db
+from models.user import User, UserRole
+
+
+class TestMetricsRoutes(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('test')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        db.create_all()
+        cls.client = cls.app.test_client()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    def setUp(self):
+        db.session.rollback()
+        User.query.delete()
+        admin = User(email="metrics_admin@example.com", phone_number="+254700000951", password_hash="test",
+                     first_name="Ada", last_name="Admin", role=UserRole.ADMIN)
+        landlord = User(email="metrics_landlord@example.com", phone_number="+254700000952", password_hash="test",
+                        first_name="Lee", last_name="Landlord", role=UserRole.LANDLORD)
+        db.session.add_all([admin, landlord])
+        db.session.commit()
+        self.admin_headers = {"X-Test-User-Id": str(admin.user_id)}
+        self.landlord_headers = {"X-Test-User-Id": str(landlord.user_id)}
+
+    def test_metrics_are_admin_only(self):
+        for path in ('/metrics/entity-cache', '/metrics/webhook-dedup'):
+            self.assertEqual(self.client.get(path).status_code, 401)
+            self.assertEqual(self.client.get(path, headers=self.landlord_headers).status_code, 403)
+            self.assertEqual(self.client.get(path, headers={"X-Test-User-Id": "999999"}).status_code, 403)
+            self.assertEqual(self.client.get(path, headers=self.admin_headers).status_code, 200)
+
+        self.assertIn("Property", self.client.get('/metrics/entity-cache', headers=self.admin_headers).get_json())
+        self.assertIn("duplicates", self.client.get('/metrics/webhook-dedup', headers=self.admin_headers).get_json())
+
+
+if __name__ == '__main__':
+    unittest.main()
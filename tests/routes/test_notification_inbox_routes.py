@@ -0,0 +1,78 @@
+import unittest
+from hermitta_app import create_app, db
+from models import Notification, NotificationUnreadCounter
+from models.user import User, UserRole
+from models.enums import NotificationType, NotificationChannel, NotificationStatus
+
+
+class TestNotificationInboxRoutes(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('test')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        db.create_all()
+        cls.client = cls.app.test_client()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    def setUp(self):
+        db.session.rollback()
+        Notification.query.filter(Notification.digest_id.isnot(None)).update({Notification.digest_id: None})
+        for model in (NotificationUnreadCounter, Notification, User):
+            model.query.delete()
+        db.session.commit()
+        db.session.expunge_all()
+
+        self.tenant = User(email="inbox_route_tenant@example.com", phone_number="+254700000601", password_hash="test", first_name="Tina", last_name="Tenant", role=UserRole.TENANT)
+        db.session.add(self.tenant)
+        db.session.commit()
+        self.headers = {"X-Test-User-Id": str(self.tenant.user_id)}
+        notifications = [
+            Notification(user_id=self.tenant.user_id, notification_type=NotificationType.BROADCAST_ANNOUNCEMENT,
+                         channel=NotificationChannel.IN_APP, status=NotificationStatus.SENT, content=f"Notice {n}")
+            for n in range(3)
+        ]
+        db.session.add_all(notifications)
+        db.session.commit()
+        self.notification_ids = [notification.notification_id for notification in notifications]
+
+    def test_inbox_requires_authentication(self):
+        self.assertEqual(self.client.get('/api/v1/notifications').status_code, 401)
+
+    def test_list_paginates_with_next_cursor(self):
+        response = self.client.get('/api/v1/notifications?limit=2', headers=self.headers)
+
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(len(data["notifications"]), 2)
+        self.assertEqual(data["unread_count"], 3)
+        self.assertEqual(data["notifications"][0]["status"], "SENT")
+
+        response = self.client.get(f'/api/v1/notifications?limit=2&cursor={data["next_cursor"]}', headers=self.headers)
+        data = response.get_json()
+        self.assertEqual(len(data["notifications"]), 1)
+        self.assertIsNone(data["next_cursor"])
+
+        self.assertEqual(self.client.get('/api/v1/notifications?cursor=bogus', headers=self.headers).status_code, 400)
+
+    def test_mark_read_and_read_all(self):
+        response = self.client.post(f'/api/v1/notifications/{self.notification_ids[0]}/read', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["status"], "READ")
+        self.assertEqual(self.client.get('/api/v1/notifications/unread-count', headers=self.headers).get_json(), {"unread_count": 2})
+
+        response = self.client.post('/api/v1/notifications/read-all', headers=self.headers)
+        self.assertEqual(response.get_json()["marked_read"], 2)
+        self.assertEqual(self.client.get('/api/v1/notifications/unread-count', headers=self.headers).get_json(), {"unread_count": 0})
+
+        self.assertEqual(self.client.post('/api/v1/notifications/999999/read', headers=self.headers).status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
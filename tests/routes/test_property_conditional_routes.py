@@ -0,0 +1,80 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from hermitta_app import create_app, db
+from models.property import Property, PropertyType
+
+
+class TestPropertyConditionalRoutes(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('test')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        db.create_all()
+        cls.client = cls.app.test_client()
+        cls.headers = {"X-Test-User-Id": "401"}
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    def setUp(self):
+        db.session.rollback()
+        Property.query.delete()
+        db.session.commit()
+        self.properties = [
+            Property(landlord_id=401, address_line_1=f"{n} Etag Rd", city="Nairobi", county="Nairobi",
+                     property_type=PropertyType.APARTMENT_UNIT, num_bedrooms=1, num_bathrooms=1,
+                     updated_at=datetime(2024, 3, 1) + timedelta(hours=n))
+            for n in range(2)
+        ]
+        db.session.add_all(self.properties)
+        db.session.commit()
+        self.url = f'/api/v1/properties/{self.properties[0].property_id}'
+
+    def _get(self, url, **headers):
+        return self.client.get(url, headers=dict(self.headers, **headers))
+
+    def test_property_revalidates_with_etag_and_last_modified(self):
+        first = self._get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.headers["Last-Modified"], "Fri, 01 Mar 2024 00:00:00 GMT")
+        etag = first.headers["ETag"]
+
+        # 304 without loading the full row
+        with patch('hermitta_app.routes.property_routes.property_service.get_property_by_id_for_landlord') as get_property:
+            response = self._get(self.url, **{"If-None-Match": etag})
+            get_property.assert_not_called()
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.get_data(), b"")
+        self.assertEqual(self._get(self.url, **{"If-Modified-Since": first.headers["Last-Modified"]}).status_code, 304)
+        # Another ?fields= selection is another representation
+        self.assertEqual(self._get(self.url + "?fields=city", **{"If-None-Match": etag}).status_code, 200)
+
+        self.properties[0].city = "Nakuru"
+        db.session.commit()
+        changed = self._get(self.url, **{"If-None-Match": etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.get_json()["city"], "Nakuru")
+        self.assertNotEqual(changed.headers["ETag"], etag)
+        # Other landlords still get a 404, whatever they send
+        self.assertEqual(self.client.get(self.url, headers={"X-Test-User-Id": "402", "If-None-Match": etag}).status_code, 404)
+
+    def test_landlord_list_etag_follows_updates_and_deletes(self):
+        etag = self._get('/api/v1/properties').headers["ETag"]
+        self.assertEqual(self._get('/api/v1/properties', **{"If-None-Match": etag}).status_code, 304)
+        self.assertEqual(self._get('/api/v1/properties?per_page=1', **{"If-None-Match": etag}).status_code, 200)
+
+        db.session.delete(self.properties[0]) # The newest updated_at stays the same; the count changes
+        db.session.commit()
+        response = self._get('/api/v1/properties', **{"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["total_items"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import io
+import unittest
+from datetime import date
+from decimal import Decimal
+from services.bank_reconciliation_service import BankReconciliationService, read_statement_csv, read_statement_mt940
+from models import BankStatementReviewItem, Building, Payment
+from models.property import Property, PropertyType
+from models.lease import Lease, LeaseStatusType
+from models.user import User, UserRole
+from models.enums import BankReviewReason, BankReviewStatus, PaymentMethod, PaymentStatus
+from hermitta_app import create_app, db
+
+CSV_STATEMENT = (
+    "Transaction Date,Description,Reference,Debit,Credit\n"
+    "01/03/2024,RENT LEASE1-MAR24 JANE,FT001,,15000.00\n"        # Reference code
+    "02/03/2024,rent lease2 mar24,FT002,,\"12,000.00\"\n"         # Code with the hyphen dropped
+    "03/03/2024,RENT LEASE3-MAR24,FT003,,9000.00\n"               # Code matches, amount does not
+    "04/03/2024,BANK CHARGES,FT004,150.00,\n"                     # Debit
+    "05/03/2024,JOHN K MONTHLY,FT005,,20000.00\n"                 # No code: the one 20000 payment due around then
+    "05/03/2024,PAYMENT,FT006,,30000.00\n"                        # No code: two 30000 payments fit
+    "06/03/2024,SALARY,FT007,,99999.00\n"                         # Nothing fits
+    "07/03/2024,RENT LEASE1-MAR24 AGAIN,FT008,,15000.00\n"        # Payment already matched above
+    "yesterday,RENT,FT009,,abc\n"
+)
+
+MT940_STATEMENT = (
+    ":20:STMT0324\n:25:01234567890\n:28C:00001/001\n:60F:C240301KES0,00\n"
+    ":61:2403010301C15000,00NTRFNONREF//FT101\nSUPP DETAILS\n"
+    ":86:RENT LEASE1-\nMAR24 JANE DOE\n"
+    ":61:2403020302D150,00NCHGNONREF//FT102\n:86:BANK CHARGES\n"
+    ":61:240303C12000,00NTRFCUSTREF7\n:86:LEASE2 MAR24\n"
+    ":61:garbage\n:86:IGNORED\n"
+    ":62F:C240331KES26850,00\n-\n"
+)
+
+
+class TestBankReconciliationService(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('test')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        db.create_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    def setUp(self):
+        self.service = BankReconciliationService()
+        db.session.rollback()
+        for model in (BankStatementReviewItem, Payment, Lease, Property, Building, User):
+            model.query.delete()
+        db.session.commit()
+        self.landlord = User(email="bank_landlord@example.com", phone_number="+254700000981", password_hash="test",
+                             first_name="Bea", last_name="Landlord", role=UserRole.LANDLORD)
+        db.session.add(self.landlord)
+        db.session.commit()
+        unit = Property(landlord_id=self.landlord.user_id, address_line_1="Kiambu Road", unit_number="B2", city="Nairobi",
+                        county="Nairobi", property_type=PropertyType.APARTMENT_UNIT)
+        db.session.add(unit)
+        db.session.commit()
+        self.lease = Lease(property_id=unit.property_id, landlord_id=self.landlord.user_id, start_date=date(2024, 1, 1),
+                           end_date=date(2024, 12, 31), rent_amount=Decimal("15000"), rent_due_day=1,
+                           move_in_date=date(2024, 1, 1), status=LeaseStatusType.ACTIVE)
+        db.session.add(self.lease)
+        db.session.commit()
+
+    def _payment(self, amount, code=None, due=date(2024, 3, 1), status=PaymentStatus.EXPECTED):
+        payment = Payment(lease_id=self.lease.lease_id, expected_amount=Decimal(amount), due_date=due, status=status, payment_reference_code=code)
+        db.session.add(payment)
+        db.session.commit()
+        return payment.payment_id
+
+    def test_reference_codes(self):
+        self.assertEqual(self.service.reference_codes("Rent LEASE101-PAY202310 via app"), ["LEASE101PAY202310"])
+        self.assertEqual(self.service.reference_codes("lease101 pay202310"), ["LEASE101", "PAY202310", "LEASE101PAY202310"])
+        self.assertEqual(self.service.reference_codes("RENT MARCH"), [])
+
+    def test_csv_statement_completes_matches_and_queues_the_rest(self):
+        first = self._payment("15000", "LEASE1-MAR24")
+        second = self._payment("12000", "LEASE2-MAR24", status=PaymentStatus.OVERDUE)
+        third = self._payment("10000", "LEASE3-MAR24")
+        fuzzy = self._payment("20000", due=date(2024, 3, 3))
+        twins = [self._payment("30000", due=date(2024, 3, 1)), self._payment("30000", due=date(2024, 3, 8))]
+        self._payment("20000", due=date(2024, 4, 1)) # Outside the date tolerance
+
+        summary = self.service.reconcile_statement(self.landlord.user_id, read_statement_csv(io.BytesIO(CSV_STATEMENT.encode())), chunk_size=3)
+
+        self.assertEqual({key: summary[key] for key in ("lines", "matched_by_reference", "matched_by_amount_and_date", "queued_for_review", "skipped_debits", "failed")},
+                         {"lines": 9, "matched_by_reference": 2, "matched_by_amount_and_date": 1, "queued_for_review": 4, "skipped_debits": 1, "failed": 1})
+        self.assertEqual(summary["errors"][0]["line"], 9)
+        paid = db.session.get(Payment, first)
+        self.assertEqual((paid.status, paid.amount_paid, paid.payment_date, paid.payment_method, paid.bank_transaction_id),
+                         (PaymentStatus.COMPLETED, Decimal("15000.00"), date(2024, 3, 1), PaymentMethod.BANK_DEPOSIT_LANDLORD, "FT001"))
+        self.assertEqual(db.session.get(Payment, second).status, PaymentStatus.COMPLETED)
+        self.assertEqual(db.session.get(Payment, fuzzy).bank_transaction_id, "FT005")
+        self.assertEqual(db.session.get(Payment, third).status, PaymentStatus.EXPECTED)
+
+        reviews = {item.bank_reference: item for item in self.service.get_review_items(self.landlord.user_id)}
+        self.assertEqual({reference: item.reason for reference, item in reviews.items()}, {
+            "FT003": BankReviewReason.AMOUNT_MISMATCH, "FT006": BankReviewReason.AMBIGUOUS,
+            "FT007": BankReviewReason.NO_MATCH, "FT008": BankReviewReason.ALREADY_MATCHED,
+        })
+        self.assertEqual(reviews["FT006"].candidate_payment_ids, twins)
+
+        # Importing the statement again changes nothing
+        again = self.service.reconcile_statement(self.landlord.user_id, read_statement_csv(io.BytesIO(CSV_STATEMENT.encode())))
+        self.assertEqual((again["already_reconciled"], again["queued_for_review"], BankStatementReviewItem.query.count()), (7, 0, 4))
+
+        # The landlord settles the mismatched transfer as a part payment
+        item = self.service.resolve_review_item(self.landlord.user_id, reviews["FT003"].review_id, payment_id=third)
+        self.assertEqual((item.status, db.session.get(Payment, third).status), (BankReviewStatus.RESOLVED, PaymentStatus.PARTIALLY_PAID))
+        self.assertEqual(self.service.resolve_review_item(self.landlord.user_id, reviews["FT007"].review_id).status, BankReviewStatus.DISMISSED)
+        with self.assertRaises(ValueError):
+            self.service.resolve_review_item(self.landlord.user_id, reviews["FT006"].review_id, payment_id=first)
+
+    def test_mt940_statement(self):
+        lines = list(read_statement_mt940(io.StringIO(MT940_STATEMENT)))
+        self.assertEqual(lines[0], {"value_date": "2024-03-01", "amount": "15000.00", "bank_reference": "FT101",
+                                    "narration": "SUPP DETAILS RENT LEASE1-MAR24 JANE DOE"})
+        self.assertEqual((lines[1]["amount"], lines[2]["bank_reference"], lines[3]), ("-150.00", "CUSTREF7", None))
+
+        self._payment("15000", "LEASE1-MAR24")
+        self._payment("12000", "LEASE2-MAR24")
+        summary = self.service.reconcile_statement(self.landlord.user_id, iter(lines), dry_run=True)
+        self.assertEqual((summary["matched_by_reference"], summary["skipped_debits"], summary["failed"]), (2, 1, 1))
+        self.assertEqual(Payment.query.filter_by(status=PaymentStatus.COMPLETED).count(), 0)
+
+    def test_long_statement_matches_every_line_by_reference(self):
+        # `flask benchmark-bank-reconciliation` times the same statement at scale
+        db.session.bulk_insert_mappings(Payment, [{
+            "lease_id": self.lease.lease_id, "expected_amount": Decimal(10000 + n), "due_date": date(2024, 3, 1),
+            "status": PaymentStatus.EXPECTED, "payment_reference_code": f"HMT-{n:06d}",
+        } for n in range(300)])
+        db.session.commit()
+        rows = ["Date,Narration,Reference,Amount"] + [f"2024-03-0{1 + n % 5},RENT HMT-{n:06d} UNIT {n},BK{n},{10000 + n}" for n in range(300)]
+        summary = self.service.reconcile_statement(self.landlord.user_id, read_statement_csv(io.StringIO("\n".join(rows))), chunk_size=128)
+        self.assertEqual((summary["matched_by_reference"], summary["failed"]), (300, 0))
+        self.assertEqual(Payment.query.filter_by(status=PaymentStatus.COMPLETED).count(), 300)
+
+
+if __name__ == '__main__':
+    unittest.main()
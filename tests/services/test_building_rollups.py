@@ -0,0 +1,179 @@
+import io
+import unittest
+from datetime import date
+from decimal import Decimal
+from hermitta_app import create_app, db
+from models.building import Building, ROLLUP_COUNTERS
+from models.property import Property, PropertyType, PropertyStatus
+from models.lease import Lease, LeaseStatusType
+from models.user import User, UserRole
+from services.building_service import BuildingService
+from services.lease_service import LeaseService
+from services.property_import_service import PropertyImportService, read_csv_rows
+
+
+class TestBuildingRollups(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('test')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        db.create_all()
+        cls.client = cls.app.test_client()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    def setUp(self):
+        db.session.rollback()
+        for model in (Lease, Property, Building, User):
+            model.query.delete()
+        db.session.commit()
+        self.landlord = User(email="rollup_landlord@example.com", phone_number="+254700000901", password_hash="test",
+                             first_name="Rolo", last_name="Landlord", role=UserRole.LANDLORD)
+        db.session.add(self.landlord)
+        db.session.commit()
+        self.landlord_id = self.landlord.user_id
+
+    def _unit(self, unit_number, building_name="Sunrise Tower", rent="20000", **kwargs):
+        return Property(landlord_id=self.landlord_id, address_line_1="Ngong Road", building_name=building_name,
+                        unit_number=unit_number, city="Nairobi", county="Nairobi", property_type=PropertyType.APARTMENT_UNIT,
+                        num_bedrooms=1, num_bathrooms=1, monthly_rent=Decimal(rent) if rent else None, **kwargs)
+
+    def _lease(self, unit, status=LeaseStatusType.ACTIVE, rent="19000"):
+        return Lease(property_id=unit.property_id, landlord_id=self.landlord_id, start_date=date(2024, 1, 1),
+                     end_date=date(2024, 12, 31), rent_amount=Decimal(rent), rent_due_day=1, move_in_date=date(2024, 1, 1),
+                     status=status)
+
+    def _counters(self, building_id):
+        building = db.session.get(Building, building_id, populate_existing=True)
+        return {counter: getattr(building, counter) for counter in ROLLUP_COUNTERS}
+
+    def _assert_matches_rebuild(self):
+        incremental = {building.building_id: self._counters(building.building_id) for building in Building.query.all()}
+        Building.rebuild()
+        db.session.commit()
+        self.assertEqual(incremental, {building.building_id: self._counters(building.building_id) for building in Building.query.all()})
+
+    def test_unit_writes_update_their_building(self):
+        units = [self._unit("A1"), self._unit("A2", building_name=" sunrise  TOWER"), self._unit("B1", building_name=None)]
+        db.session.add_all(units)
+        db.session.commit()
+
+        tower_id = units[0].building_id
+        self.assertEqual(units[1].building_id, tower_id)
+        self.assertEqual(units[2].building.name, "Ngong Road") # No building_name: grouped by street address
+        self.assertEqual(units[0].building.name, "Sunrise Tower")
+        self.assertEqual(self._counters(tower_id), {
+            "total_units": 2, "vacant_units": 2, "occupied_units": 0, "under_maintenance_units": 0,
+            "total_rent": Decimal("40000.00"), "active_leases": 0, "active_lease_rent": Decimal("0.00"),
+        })
+
+        units[0].status = PropertyStatus.OCCUPIED
+        units[1].monthly_rent = Decimal("25000")
+        db.session.commit()
+        counters = self._counters(tower_id)
+        self.assertEqual((counters["vacant_units"], counters["occupied_units"], counters["total_rent"]), (1, 1, Decimal("45000.00")))
+
+        # Moving a unit to another building moves its counters
+        units[1].building_name = "Ngong  road"
+        db.session.commit()
+        self.assertEqual(units[1].building_id, units[2].building_id)
+        self.assertEqual(self._counters(tower_id)["total_units"], 1)
+        self.assertEqual(self._counters(units[2].building_id)["total_rent"], Decimal("45000.00"))
+
+        db.session.delete(units[0])
+        db.session.commit()
+        self.assertEqual(self._counters(tower_id)["total_units"], 0)
+        self._assert_matches_rebuild()
+
+    def test_lease_writes_update_the_building_of_their_unit(self):
+        units = [self._unit("A1"), self._unit("A2"), self._unit("C1", building_name="Cedar Court")]
+        db.session.add_all(units)
+        db.session.commit()
+        tower_id, cedar_id = units[0].building_id, units[2].building_id
+
+        leases = [self._lease(units[0]), self._lease(units[1], status=LeaseStatusType.DRAFT)]
+        db.session.add_all(leases)
+        db.session.commit()
+        self.assertEqual((self._counters(tower_id)["active_leases"], self._counters(tower_id)["active_lease_rent"]), (1, Decimal("19000.00")))
+
+        leases[1].status = LeaseStatusType.ACTIVE
+        leases[0].rent_amount = Decimal("21000")
+        db.session.commit()
+        self.assertEqual((self._counters(tower_id)["active_leases"], self._counters(tower_id)["active_lease_rent"]), (2, Decimal("40000.00")))
+
+        leases[0].status = LeaseStatusType.EXPIRED
+        db.session.commit()
+        self.assertEqual(self._counters(tower_id)["active_leases"], 1)
+
+        # A unit changing building takes its leases in force along
+        units[1].building_name = "Cedar Court"
+        db.session.commit()
+        self.assertEqual(self._counters(tower_id)["active_leases"], 0)
+        self.assertEqual((self._counters(cedar_id)["active_leases"], self._counters(cedar_id)["total_units"]), (1, 2))
+
+        db.session.delete(leases[1])
+        db.session.commit()
+        self.assertEqual(self._counters(cedar_id)["active_lease_rent"], Decimal("0.00"))
+        self._assert_matches_rebuild()
+
+    def test_bulk_writers_keep_the_rollups(self):
+        csv_file = ("address_line_1,building_name,unit_number,city,county,property_type,num_bedrooms,num_bathrooms,monthly_rent,status\n"
+                    "Ngong Road,Sunrise Tower,A1,Nairobi,Nairobi,APARTMENT_UNIT,1,1,20000,OCCUPIED\n"
+                    "Ngong Road,Sunrise Tower,A2,Nairobi,Nairobi,APARTMENT_UNIT,1,1,30000,\n"
+                    "Lenana Road,,1,Nairobi,Nairobi,BUNGALOW,3,2,,UNDER_MAINTENANCE\n")
+        summary = PropertyImportService().import_properties(self.landlord_id, read_csv_rows(io.BytesIO(csv_file.encode("utf-8"))))
+        self.assertEqual(summary["imported"], 3)
+        unit = Property.query.filter_by(unit_number="A1").one()
+        report = LeaseService().create_leases_bulk([
+            {"property_id": unit.property_id, "landlord_id": self.landlord_id, "start_date": "2024-01-01", "end_date": "2024-12-31",
+             "rent_amount": "20000", "rent_due_day": 1, "move_in_date": "2024-01-01", "status": status}
+            for status in ("ACTIVE", "CANCELLED")
+        ])
+        self.assertEqual(report["created"], 2)
+
+        counters = self._counters(unit.building_id)
+        self.assertEqual((counters["total_units"], counters["occupied_units"], counters["total_rent"], counters["active_leases"]),
+                         (2, 1, Decimal("50000.00"), 1))
+        summary = BuildingService().get_portfolio_summary(self.landlord_id)
+        self.assertEqual((summary["buildings"], summary["total_units"], summary["under_maintenance_units"]), (2, 3, 1))
+        self.assertEqual(summary["occupancy_rate"], round(1 / 3, 4))
+        self._assert_matches_rebuild()
+
+    def test_rebuild_assigns_units_without_a_building(self):
+        db.session.add_all([self._unit("A1"), self._unit("A2", status=PropertyStatus.OCCUPIED)])
+        db.session.commit()
+        # Written set-based, as before buildings existed
+        Property.query.update({Property.building_id: None}, synchronize_session=False)
+        Building.query.delete()
+        db.session.commit()
+
+        self.assertEqual(Building.rebuild(landlord_id=self.landlord_id), 1)
+        db.session.commit()
+        building = Building.query.one()
+        self.assertEqual((building.total_units, building.occupied_units), (2, 1))
+        self.assertEqual(Property.query.filter(Property.building_id == building.building_id).count(), 2)
+
+    def test_building_routes(self):
+        db.session.add_all([self._unit("A1"), self._unit("A2", status=PropertyStatus.OCCUPIED)])
+        db.session.commit()
+        headers = {"X-Test-User-Id": str(self.landlord_id)}
+
+        buildings = self.client.get('/api/v1/buildings', headers=headers).get_json()
+        self.assertEqual(buildings["total_items"], 1)
+        self.assertEqual((buildings["buildings"][0]["name"], buildings["buildings"][0]["occupied_units"]), ("Sunrise Tower", 1))
+        building_id = buildings["buildings"][0]["building_id"]
+        detail = self.client.get(f'/api/v1/buildings/{building_id}?fields=total_units,total_rent', headers=headers).get_json()
+        self.assertEqual(detail, {"total_units": 2, "total_rent": "40000.00"})
+        self.assertEqual(self.client.get('/api/v1/buildings/summary', headers=headers).get_json()["occupancy_rate"], 0.5)
+        other = {"X-Test-User-Id": str(self.landlord_id + 1)}
+        self.assertEqual(self.client.get(f'/api/v1/buildings/{building_id}', headers=other).status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
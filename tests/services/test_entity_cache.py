@@ -0,0 +1,192 @@
+import json
+import pickle
+import unittest
+from datetime import date
+from decimal import Decimal
+from unittest.mock import patch
+from hermitta_app import create_app, db
+from hermitta_app.services.entity_cache import (
+    entity_cache, MemoryCacheBackend, SharedCacheBackend, LocalSharedStore
+)
+from services.property_service import PropertyService
+from services.lease_service import LeaseService
+from services.user_service import UserService
+from models.property import Property, PropertyType
+from models.lease import Lease
+from models.user import User, UserRole
+
+
+class TestMemoryCacheBackend(unittest.TestCase):
+
+    def test_lru_eviction_and_ttl(self):
+        backend = MemoryCacheBackend(max_entries=2, ttl_seconds=60)
+        backend.set("a", {"n": 1})
+        backend.set("b", {"n": 2})
+        backend.get("a") # Now the most recently used
+        backend.set("c", {"n": 3})
+
+        self.assertIsNone(backend.get("b"))
+        self.assertEqual(backend.get("a"), {"n": 1})
+        backend.delete_prefix("c")
+        self.assertIsNone(backend.get("c"))
+
+        expired = MemoryCacheBackend(ttl_seconds=0)
+        expired.set("a", {"n": 1})
+        self.assertIsNone(expired.get("a"))
+
+
+class TestEntityCache(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('test')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        db.create_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    def setUp(self):
+        db.session.rollback()
+        for model in (Lease, Property, User):
+            model.query.delete()
+        db.session.commit()
+        self.landlord = User(email="cache_landlord@example.com", phone_number="+254700000801", password_hash="test",
+                             first_name="Cara", last_name="Landlord", role=UserRole.LANDLORD)
+        db.session.add(self.landlord)
+        db.session.commit()
+        self.prop = Property(landlord_id=self.landlord.user_id, address_line_1="1 Cache Rd", city="Nairobi", county="Nairobi",
+                             property_type=PropertyType.APARTMENT_UNIT, num_bedrooms=1, num_bathrooms=1, amenities=["Gym"])
+        db.session.add(self.prop)
+        db.session.commit()
+        self.user_id, self.property_id = self.landlord.user_id, self.prop.property_id
+        self.landlord_created = self.landlord.created_at
+        db.session.remove() # Each lookup below starts from an empty session, like a new request
+        entity_cache.reset_metrics()
+
+    def _metrics(self, model):
+        return entity_cache.metrics()[model.__name__]
+
+    def _lookup_property(self):
+        prop = PropertyService().get_property_by_id(self.property_id)
+        db.session.remove()
+        return prop
+
+    def test_second_lookup_is_served_from_the_cache(self):
+        PropertyService().get_property_by_id(self.property_id)
+        db.session.remove()
+        with patch.object(db.session, 'get', side_effect=AssertionError("database hit")):
+            prop = PropertyService().get_property_by_id_for_landlord(self.property_id, self.user_id)
+            self.assertEqual(prop.city, "Nairobi")
+            self.assertEqual(prop.landlord.email, "cache_landlord@example.com") # Attached: relationships still load
+            # Already in the session: neither a cache nor a database lookup
+            self.assertIsNone(PropertyService().get_property_by_id_for_landlord(self.property_id, self.user_id + 1))
+
+        self.assertEqual(self._metrics(Property)["misses"], 1)
+        self.assertEqual(self._metrics(Property)["hits"], 1)
+        self.assertEqual(entity_cache.metrics()["Property"]["hit_ratio"], 0.5)
+
+    def test_commits_invalidate_cached_rows(self):
+        self._lookup_property()
+        PropertyService().update_property(self.property_id, {"city": "Nakuru"})
+        db.session.remove()
+        self.assertEqual(self._lookup_property().city, "Nakuru")
+
+        # Any ORM commit, not only the service methods
+        prop = db.session.get(Property, self.property_id)
+        prop.city = "Kisumu"
+        db.session.commit()
+        db.session.remove()
+        self.assertEqual(self._lookup_property().city, "Kisumu")
+
+        # Set-based updates invalidate the whole model; rolled back changes keep the entry
+        Property.query.filter_by(property_id=self.property_id).update({Property.city: "Eldoret"})
+        db.session.commit()
+        self.assertEqual(self._lookup_property().city, "Eldoret")
+        prop = db.session.get(Property, self.property_id)
+        prop.city = "Thika"
+        db.session.flush()
+        db.session.rollback()
+        db.session.remove()
+        hits = self._metrics(Property)["hits"]
+        self.assertEqual(self._lookup_property().city, "Eldoret")
+        self.assertEqual(self._metrics(Property)["hits"], hits + 1)
+
+        PropertyService().delete_property(self.property_id)
+        db.session.remove()
+        self.assertIsNone(self._lookup_property())
+
+    def test_cached_lists_are_not_shared_with_instances(self):
+        self._lookup_property()
+        prop = PropertyService().get_property_by_id(self.property_id)
+        prop.amenities.append("Pool")
+        db.session.rollback()
+        db.session.remove()
+        self.assertEqual(self._lookup_property().amenities, ["Gym"])
+
+    def test_create_lease_existence_checks_read_through_the_cache(self):
+        UserService().get_user_by_id(self.user_id)
+        self._lookup_property()
+        LeaseService().create_lease({
+            "property_id": self.property_id, "landlord_id": self.user_id, "start_date": date(2024, 1, 1),
+            "end_date": date(2024, 12, 31), "rent_amount": Decimal("20000"), "rent_due_day": 1, "move_in_date": date(2024, 1, 1),
+        })
+
+        self.assertEqual(self._metrics(User)["hits"], 1)
+        self.assertEqual(self._metrics(Property)["hits"], 1)
+
+    def test_shared_backend_round_trip(self):
+        store = LocalSharedStore()
+        with patch.object(entity_cache, 'backend', SharedCacheBackend(store, ttl_seconds=60)):
+            self._lookup_property()
+            self.assertEqual(self._lookup_property().amenities, ["Gym"])
+            self.assertEqual(self._metrics(Property)["hits"], 1)
+            self.assertIsInstance(store.get(f"entity:properties:{self.property_id}"), bytes)
+
+            PropertyService().update_property(self.property_id, {"city": "Nyeri"})
+            self.assertIsNone(store.get(f"entity:properties:{self.property_id}"))
+
+    def test_shared_backend_stores_typed_json_without_credentials(self):
+        store = LocalSharedStore()
+        user = db.session.get(User, self.user_id)
+        user.otp_secret, user.otp_backup_codes = "totp-secret", ["hashed-code"]
+        db.session.commit()
+        db.session.remove()
+        with patch.object(entity_cache, 'backend', SharedCacheBackend(store, ttl_seconds=60)):
+            UserService().get_user_by_id(self.user_id)
+            db.session.remove()
+            cached = json.loads(store.get(f"entity:users:{self.user_id}"))
+            self.assertEqual((cached["email"], cached["role"]), ("cache_landlord@example.com", "LANDLORD"))
+            for column in ("password_hash", "otp_secret", "otp_backup_codes", "phone_verification_otp"):
+                self.assertNotIn(column, cached)
+
+            user = UserService().get_user_by_id(self.user_id)
+            self.assertEqual(self._metrics(User)["hits"], 1)
+            self.assertEqual((user.role, user.created_at.year), (UserRole.LANDLORD, self.landlord_created.year))
+            self.assertEqual(user.password_hash, "test") # Loaded from the database on access
+            db.session.remove()
+
+            # Anything other than a JSON snapshot is a miss, never deserialized into objects
+            store.set(f"entity:users:{self.user_id}", pickle.dumps({"email": "evil"}))
+            self.assertEqual(UserService().get_user_by_id(self.user_id).email, "cache_landlord@example.com")
+            self.assertEqual(self._metrics(User)["misses"], 2)
+            db.session.remove()
+
+            lease_id = LeaseService().create_lease({
+                "property_id": self.property_id, "landlord_id": self.user_id, "start_date": date(2024, 1, 1),
+                "end_date": date(2024, 12, 31), "rent_amount": Decimal("20000.50"), "rent_due_day": 1, "move_in_date": date(2024, 1, 1),
+            }).lease_id
+            db.session.remove()
+            LeaseService().get_lease_by_id(lease_id)
+            db.session.remove()
+            lease = LeaseService().get_lease_by_id(lease_id)
+            self.assertEqual(self._metrics(Lease)["hits"], 1)
+            self.assertEqual((lease.rent_amount, lease.start_date), (Decimal("20000.50"), date(2024, 1, 1)))
+
+
+if __name__ == '__main__':
+    unittest.main()
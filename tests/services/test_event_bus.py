@@ -0,0 +1,214 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from hermitta_app import create_app, db
+from hermitta_app.jobs.notification_jobs import NotificationDispatcher
+from hermitta_app.services.event_bus import (
+    event_bus, MemoryEventBackend, DatabaseEventBackend, NOTIFICATION_EVENT, MESSAGE_EVENT
+)
+from hermitta_app.services.notification_backends import MemoryBackend
+from models import Notification, NotificationUnreadCounter, Message, PushEventRecord
+from models.user import User, UserRole
+from models.enums import NotificationType, NotificationChannel, NotificationStatus
+
+
+class TestMemoryEventBackend(unittest.TestCase):
+
+    def test_reconnect_replays_events_after_last_event_id(self):
+        backend = MemoryEventBackend(history_size=10)
+        first = backend.publish(1, NOTIFICATION_EVENT, {"n": 1})
+        backend.publish(1, NOTIFICATION_EVENT, {"n": 2})
+        backend.publish(2, NOTIFICATION_EVENT, {"n": 3}) # Another user
+
+        subscription = backend.subscribe(1, last_event_id=first.event_id)
+        backend.publish(1, MESSAGE_EVENT, {"n": 4})
+
+        events, reset_through = subscription.get(timeout=0)
+        self.assertIsNone(reset_through)
+        self.assertEqual([push_event.data["n"] for push_event in events], [2, 4])
+
+    def test_reconnect_past_retained_history_resets(self):
+        backend = MemoryEventBackend(history_size=2)
+        first = backend.publish(1, NOTIFICATION_EVENT, {"n": 1})
+        backend.publish(1, NOTIFICATION_EVENT, {"n": 2})
+        newest = backend.publish(1, NOTIFICATION_EVENT, {"n": 3})
+
+        events, reset_through = backend.subscribe(1, last_event_id=first.event_id - 1).get(timeout=0)
+
+        self.assertEqual(events, [])
+        self.assertEqual(reset_through, newest.event_id)
+        # An id from before the bus started (e.g. a restart) also resets
+        _, reset_through = backend.subscribe(5, last_event_id=1).get(timeout=0)
+        self.assertIsNotNone(reset_through)
+
+    def test_slow_connection_is_capped_and_reset(self):
+        backend = MemoryEventBackend()
+        subscription = backend.subscribe(1, max_queued=3)
+        for n in range(5):
+            newest = backend.publish(1, NOTIFICATION_EVENT, {"n": n})
+
+        events, reset_through = subscription.get(timeout=0)
+
+        self.assertEqual(events, [])
+        self.assertEqual(reset_through, newest.event_id)
+        backend.unsubscribe(subscription)
+        self.assertEqual(backend._subscriptions, {})
+
+
+class TestPublishOnCommit(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('test')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        db.create_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    def setUp(self):
+        db.session.rollback()
+        Notification.query.filter(Notification.digest_id.isnot(None)).update({Notification.digest_id: None})
+        for model in (NotificationUnreadCounter, Notification, Message, User):
+            model.query.delete()
+        db.session.commit()
+        db.session.expunge_all()
+
+        self.tenant = User(email="push_tenant@example.com", phone_number="+254700000701", password_hash="test", first_name="Tina", last_name="Tenant", role=UserRole.TENANT)
+        self.landlord = User(email="push_landlord@example.com", phone_number="+254700000702", password_hash="test", first_name="Lara", last_name="Landlord", role=UserRole.LANDLORD)
+        db.session.add_all([self.tenant, self.landlord])
+        db.session.commit()
+        self.subscription = event_bus.subscribe(self.tenant.user_id)
+
+    def tearDown(self):
+        event_bus.unsubscribe(self.subscription)
+
+    def _notification(self, channel=NotificationChannel.IN_APP, status=NotificationStatus.SENT):
+        return Notification(user_id=self.tenant.user_id, notification_type=NotificationType.BROADCAST_ANNOUNCEMENT,
+                            channel=channel, status=status, content="Water off tomorrow")
+
+    def test_in_app_notifications_and_messages_are_pushed_after_commit(self):
+        notification = self._notification()
+        db.session.add_all([notification, self._notification(channel=NotificationChannel.SMS)])
+        db.session.add(Message(sender_id=self.landlord.user_id, receiver_id=self.tenant.user_id, content="Hello"))
+        db.session.flush()
+        self.assertEqual(self.subscription.get(timeout=0)[0], []) # Nothing before the commit
+
+        db.session.commit()
+
+        events, _ = self.subscription.get(timeout=0)
+        self.assertEqual(sorted(push_event.event_type for push_event in events), [MESSAGE_EVENT, NOTIFICATION_EVENT])
+        pushed = next(push_event for push_event in events if push_event.event_type == NOTIFICATION_EVENT)
+        self.assertEqual(pushed.data["notification_id"], notification.notification_id)
+        self.assertEqual(pushed.data["content"], "Water off tomorrow")
+
+    def test_rolled_back_writes_are_not_pushed(self):
+        db.session.add(self._notification())
+        db.session.flush()
+        db.session.rollback()
+        db.session.commit()
+
+        self.assertEqual(self.subscription.get(timeout=0)[0], [])
+
+    def test_dispatched_in_app_notifications_are_pushed(self):
+        db.session.add(self._notification(status=NotificationStatus.PENDING))
+        db.session.commit()
+        self.assertEqual(self.subscription.get(timeout=0)[0], [])
+
+        NotificationDispatcher({channel: MemoryBackend(channel) for channel in NotificationChannel}).run()
+
+        events, _ = self.subscription.get(timeout=0)
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0].data["notification_type"], "BROADCAST_ANNOUNCEMENT")
+
+
+class TestDatabaseEventBackend(unittest.TestCase):
+    """Each backend instance stands in for one process sharing the database."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('test')
+        cls.app.config['EVENT_STREAM_MAX_SECONDS'] = 0.3
+        cls.app.config['EVENT_STREAM_HEARTBEAT_SECONDS'] = 0.1
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        db.create_all()
+        cls.client = cls.app.test_client()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    def setUp(self):
+        db.session.rollback()
+        for model in (PushEventRecord, NotificationUnreadCounter, Notification, User):
+            model.query.delete()
+        db.session.commit()
+        self.tenant = User(email="bus_tenant@example.com", phone_number="+254700000711", password_hash="test", first_name="Tina", last_name="Tenant", role=UserRole.TENANT)
+        db.session.add(self.tenant)
+        db.session.commit()
+        self.user_id = self.tenant.user_id
+        self.web = DatabaseEventBackend(db.engine, poll_seconds=0.05, history_size=3)
+        self.subscriptions = []
+
+    def tearDown(self):
+        for subscription in self.subscriptions:
+            self.web.unsubscribe(subscription)
+
+    def _subscribe(self, **kwargs):
+        subscription = self.web.subscribe(self.user_id, **kwargs)
+        self.subscriptions.append(subscription)
+        return subscription
+
+    def test_dispatcher_in_another_process_reaches_web_subscribers(self):
+        subscription = self._subscribe()
+        db.session.add(Notification(user_id=self.user_id, notification_type=NotificationType.BROADCAST_ANNOUNCEMENT,
+                                    channel=NotificationChannel.IN_APP, status=NotificationStatus.PENDING, content="Water off"))
+        db.session.commit()
+
+        with patch.object(event_bus, 'backend', DatabaseEventBackend(db.engine)): # The CLI dispatcher's own bus
+            NotificationDispatcher({channel: MemoryBackend(channel) for channel in NotificationChannel}).run()
+
+        events, reset_through = subscription.get(timeout=2)
+        self.assertIsNone(reset_through)
+        self.assertEqual([(push_event.event_type, push_event.data["content"]) for push_event in events], [(NOTIFICATION_EVENT, "Water off")])
+        self.assertEqual(events[0].event_id, PushEventRecord.query.one().event_id)
+
+    def test_stream_replays_events_published_by_other_processes(self):
+        dispatcher = DatabaseEventBackend(db.engine)
+        first = dispatcher.publish(self.user_id, NOTIFICATION_EVENT, {"notification_id": 1})
+        second = dispatcher.publish(self.user_id, NOTIFICATION_EVENT, {"notification_id": 2})
+
+        with patch.object(event_bus, 'backend', self.web):
+            response = self.client.get('/api/v1/events/stream', headers={"X-Test-User-Id": str(self.user_id), "Last-Event-ID": str(first.event_id)})
+            body = response.get_data(as_text=True)
+
+        self.assertIn(f'id: {second.event_id}\nevent: notification\ndata: {{"notification_id":2}}\n\n', body)
+        self.assertNotIn(f'id: {first.event_id}\n', body)
+
+    def test_reconnect_past_retained_events_resets(self):
+        dispatcher = DatabaseEventBackend(db.engine, retention_seconds=60)
+        first = dispatcher.publish(self.user_id, NOTIFICATION_EVENT, {"n": 1})
+        pushed = [dispatcher.publish(self.user_id, NOTIFICATION_EVENT, {"n": n}) for n in range(2, 7)]
+
+        # More events than a reconnect replays
+        self.assertEqual(self._subscribe(last_event_id=first.event_id).get(timeout=0), ([], pushed[-1].event_id))
+        self.assertEqual([e.data["n"] for e in self._subscribe(last_event_id=pushed[1].event_id).get(timeout=0)[0]], [4, 5, 6])
+
+        # Expired events are deleted by the poller; resuming from before them resets
+        PushEventRecord.query.filter(PushEventRecord.event_id <= pushed[2].event_id).update(
+            {PushEventRecord.created_at: datetime.utcnow() - timedelta(hours=1)})
+        db.session.commit()
+        dispatcher._prune()
+        self.assertEqual(PushEventRecord.query.count(), 2)
+        self.assertEqual(self._subscribe(last_event_id=pushed[1].event_id).get(timeout=0), ([], pushed[-1].event_id))
+
+
+if __name__ == '__main__':
+    unittest.main()
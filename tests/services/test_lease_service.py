@@ -218,5 +218,91 @@ class TestLeaseService(unittest.TestCase):
         delete_result = self.service.delete_lease(99999)
         self.assertFalse(delete_result)
 
+    def test_keyset_pages_follow_the_cursor_without_gaps(self):
+        # Two leases share each start date, so the lease_id tie-breaker matters
+        for n in range(5):
+            lease_data = self.base_lease_data.copy()
+            lease_data["start_date"] = date(2024, 1 + n // 2, 1)
+            self.service.create_lease(lease_data)
+        expected, total = self.service.get_leases_for_tenant(self.tenant.user_id, per_page=10)
+
+        leases, cursor, count = self.service.get_leases_for_tenant_keyset(self.tenant.user_id, limit=2, include_total=True)
+        seen = list(leases)
+        self.assertEqual(count, 5)
+        while cursor:
+            leases, cursor, count = self.service.get_leases_for_tenant_keyset(self.tenant.user_id, limit=2, cursor=cursor)
+            self.assertIsNone(count)
+            seen += leases
+
+        self.assertEqual([lease.lease_id for lease in seen], [lease.lease_id for lease in expected])
+        self.assertEqual(len(seen), total)
+        self.assertEqual(len(self.service.get_leases_for_property_keyset(self.property.property_id, limit=10)[0]), 5)
+        self.assertEqual(self.service.get_leases_for_landlord_keyset(self.landlord.user_id, limit=5)[1], None)
+        with self.assertRaises(ValueError):
+            self.service.get_leases_for_landlord_keyset(self.landlord.user_id, cursor="not-a-cursor")
+
+    def test_create_leases_bulk_reports_each_row(self):
+        missing_tenant = dict(self.required_lease_data, tenant_id=self.tenant.user_id + 1000)
+        leases_data = [
+            self.base_lease_data.copy(),
+            self.required_lease_data.copy(),
+            dict(self.required_lease_data, rent_amount=None),
+            missing_tenant,
+            dict(self.required_lease_data, property_id=self.property.property_id + 1000),
+            dict(self.required_lease_data, start_date="01/01/2025"),
+            dict(self.required_lease_data, colour="blue"),
+            self.required_lease_data.copy(),
+        ]
+        report = self.service.create_leases_bulk(leases_data, batch_size=2)
+
+        self.assertEqual((report["created"], report["failed"]), (3, 5))
+        results = report["results"]
+        self.assertEqual([result["index"] for result in results], list(range(8)))
+        self.assertTrue(all("lease_id" in results[index] for index in (0, 1, 7)))
+        self.assertIn("Missing required fields for Lease creation: rent_amount", results[2]["error"])
+        self.assertEqual(results[3]["error"], f"Tenant user with ID {missing_tenant['tenant_id']} not found.")
+        self.assertIn("Property with ID", results[4]["error"])
+        self.assertIn("Invalid date string for 'start_date'", results[5]["error"])
+        self.assertEqual(results[6]["error"], "Unknown Lease fields: colour")
+
+        lease = self.service.get_lease_by_id(results[1]["lease_id"])
+        # Same conversions and defaults as create_lease
+        self.assertEqual((lease.rent_amount, lease.start_date), (Decimal("2000.00"), date(2025, 1, 1)))
+        self.assertEqual((lease.status, lease.signing_status), (LeaseStatusType.DRAFT, LeaseSigningStatus.NOT_STARTED))
+        self.assertEqual((lease.rent_start_date, lease.signature_requests), (date(2025, 1, 1), []))
+        self.assertEqual(self.service.get_lease_by_id(results[0]["lease_id"]).status, LeaseStatusType.ACTIVE)
+
+    def test_create_leases_bulk_fails_only_the_rows_the_database_rejects(self):
+        leases_data = [
+            self.required_lease_data.copy(),
+            dict(self.required_lease_data, additional_signed_document_ids={1, 2}), # Passes validation, cannot be stored as JSON
+            dict(self.required_lease_data, property_id=str(self.property.property_id), landlord_id=str(self.landlord.user_id)),
+        ]
+        report = self.service.create_leases_bulk(leases_data)
+
+        self.assertEqual((report["created"], report["failed"]), (2, 1))
+        results = report["results"]
+        self.assertIn("Error during Lease creation", results[1]["error"])
+        self.assertEqual(self.service.get_lease_by_id(results[2]["lease_id"]).property_id, self.property.property_id)
+        self.assertEqual(Lease.query.count(), 2)
+        self.assertIn("Invalid value for integer field 'tenant_id'",
+                      self.service.create_leases_bulk([dict(self.required_lease_data, tenant_id="abc")])["results"][0]["error"])
+
+    def test_create_leases_bulk_checks_references_with_one_query_per_table(self):
+        from sqlalchemy import event
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, "before_cursor_execute", listener)
+        try:
+            report = self.service.create_leases_bulk([self.base_lease_data.copy() for _ in range(50)])
+        finally:
+            event.remove(db.engine, "before_cursor_execute", listener)
+
+        self.assertEqual(report["created"], 50)
+        # One existence check for users and one for properties, not one per lease (plus the units' buildings, for their rollups)
+        selects = [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+        self.assertEqual(len([s for s in selects if "building_id" not in s]), 2)
+        self.assertEqual(len(selects), 3)
+
 if __name__ == '__main__':
     unittest.main()
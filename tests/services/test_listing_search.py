@@ -0,0 +1,201 @@
+import unittest
+from datetime import datetime, timedelta
+from decimal import Decimal
+from services.property_service import PropertyService
+from models.property import Property, PropertyType, PropertyStatus
+from models.property_listing_index import PropertyListingIndex, PropertyAmenityTerm, PropertyTextIndex
+from hermitta_app import create_app, db
+
+
+class TestListingSearch(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('test')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        db.create_all()
+        cls.client = cls.app.test_client()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    def setUp(self):
+        self.service = PropertyService()
+        db.session.rollback()
+        for model in (PropertyAmenityTerm, PropertyListingIndex, Property):
+            model.query.delete()
+        PropertyTextIndex.clear(db.session.connection())
+        db.session.commit()
+
+        created = datetime(2024, 3, 1)
+        descriptions = [
+            "Spacious apartment with a DSQ and reliable borehole water.",
+            "Family home in a gated community. Borehole, DSQ and backup generator.",
+            "Affordable bedsitter close to the stage.",
+            "Beach maisonette with a large garden.",
+            "Occupied flat with a DSQ.",
+        ]
+        listings = [
+            # (city, county, estate, type, bedrooms, rent, amenities, status)
+            ("Nairobi", "Nairobi", "Kilimani", PropertyType.APARTMENT_UNIT, 2, "45000", ["Borehole", "Gym"], PropertyStatus.VACANT),
+            ("Nairobi ", "Nairobi", "Kileleshwa", PropertyType.APARTMENT_UNIT, 3, "80000", ["borehole", "Gated"], PropertyStatus.VACANT),
+            ("Nairobi", "Nairobi", "Umoja", PropertyType.BEDSITTER, 0, "9000", [], PropertyStatus.VACANT),
+            ("Mombasa", "Mombasa", "Nyali", PropertyType.MAISONETTE, 4, None, ["Borehole"], PropertyStatus.VACANT),
+            ("Nairobi", "Nairobi", "Kilimani", PropertyType.APARTMENT_UNIT, 2, "50000", ["Borehole"], PropertyStatus.OCCUPIED),
+        ]
+        self.properties = []
+        for n, (city, county, estate, ptype, bedrooms, rent, amenities, status) in enumerate(listings):
+            self.properties.append(Property(
+                landlord_id=101, address_line_1=f"{n} Search Rd", city=city, county=county, estate_neighborhood=estate,
+                property_type=ptype, num_bedrooms=bedrooms, num_bathrooms=1, monthly_rent=Decimal(rent) if rent else None,
+                amenities=amenities, status=status, created_at=created + timedelta(days=n), description=descriptions[n]
+            ))
+        db.session.add_all(self.properties)
+        db.session.commit()
+        self.ids = [prop.property_id for prop in self.properties]
+
+    def _search_ids(self, filters=None, sort_by=None, **kwargs):
+        return [prop.property_id for prop in self.service.search_public_listings(filters, sort_by=sort_by, **kwargs)["items"]]
+
+    def test_filters_use_normalized_prefixes_ranges_and_amenities(self):
+        self.assertEqual(sorted(self._search_ids({"city": "  NAIROBI"})), self.ids[:3])
+        self.assertEqual(sorted(self._search_ids({"estate": "kil"})), self.ids[:2])
+        self.assertEqual(self._search_ids({"min_rent": 40000, "max_rent": 60000}), [self.ids[0]])
+        self.assertEqual(sorted(self._search_ids({"min_bedrooms": 2, "max_bedrooms": 3})), self.ids[:2])
+        self.assertEqual(sorted(self._search_ids({"amenities": "borehole, GYM"})), [self.ids[0]])
+        self.assertEqual(sorted(self._search_ids({"amenities": ["Borehole"]})), [self.ids[0], self.ids[1], self.ids[3]])
+
+    def test_sorting(self):
+        self.assertEqual(self._search_ids(), list(reversed(self.ids[:4])))
+        # Listings without a rent come last
+        self.assertEqual(self._search_ids(sort_by="rent_asc"), [self.ids[2], self.ids[0], self.ids[1], self.ids[3]])
+        self.assertEqual(self._search_ids(sort_by="rent_desc"), [self.ids[1], self.ids[0], self.ids[2], self.ids[3]])
+        with self.assertRaises(ValueError):
+            self._search_ids(sort_by="price")
+
+    def test_facets_and_total_come_with_the_results(self):
+        result = self.service.search_public_listings({"county": "nairobi"}, per_page=1)
+
+        self.assertEqual(result["total"], 3)
+        self.assertEqual(len(result["items"]), 1)
+        self.assertEqual(result["facets"]["property_type"], {"APARTMENT_UNIT": 2, "BEDSITTER": 1})
+        self.assertEqual(result["facets"]["num_bedrooms"], {0: 1, 2: 1, 3: 1})
+        self.assertEqual(result["facets"]["rent_range"], {"0-10000": 1, "35000-50000": 1, "50000-100000": 1})
+
+    def test_get_publicly_listed_properties_pages_with_total(self):
+        items, total = self.service.get_publicly_listed_properties({"city": "nairobi"}, page=2, per_page=2)
+        self.assertEqual(total, 3)
+        self.assertEqual(len(items), 1)
+        self.assertEqual(self.service.get_publicly_listed_properties({"city": "nairobi"}, page=5, per_page=2), ([], 3))
+        with self.assertRaises(ValueError):
+            self.service.get_publicly_listed_properties(page=1000, per_page=100)
+
+    def test_index_follows_updates_and_deletes(self):
+        prop = self.properties[2]
+        self.service.update_property(prop.property_id, {"status": "OCCUPIED"})
+        self.properties[3].amenities = ["Gym"]
+        db.session.commit()
+        self.service.delete_property(self.ids[0])
+
+        self.assertEqual(self._search_ids({"amenities": ["gym"]}), [self.ids[3]])
+        self.assertEqual(self._search_ids({"city": "nairobi"}), [self.ids[1]])
+        self.assertIsNone(db.session.get(PropertyListingIndex, self.ids[0]))
+
+        PropertyListingIndex.rebuild(batch_size=2)
+        db.session.commit()
+        self.assertEqual(PropertyListingIndex.query.count(), 4)
+
+    def test_full_text_search_ranks_and_highlights(self):
+        result = self.service.search_public_listings({"q": "DSQ borehole"})
+
+        # Both words are required; the occupied listing is not public
+        self.assertEqual(sorted(prop.property_id for prop in result["items"]), self.ids[:2])
+        self.assertEqual(result["total"], 2)
+        self.assertIn("<mark>DSQ</mark>", result["highlights"][self.ids[0]]["description"])
+        self.assertIn("<mark>borehole</mark>", result["highlights"][self.ids[0]]["amenities"].lower())
+        # Amenities are searched too, and any sort order can replace the relevance ranking
+        self.assertEqual(self._search_ids({"q": "gated"}), [self.ids[1]])
+        self.assertEqual(sorted(self._search_ids({"q": "borehole"})), [self.ids[0], self.ids[1], self.ids[3]])
+        self.assertEqual(self._search_ids({"q": "borehole"}, sort_by="rent_asc"), [self.ids[0], self.ids[1], self.ids[3]])
+        self.assertEqual(self._search_ids({"q": "gym, \"borehole\"*"}), [self.ids[0]]) # FTS syntax is treated as plain words
+        with self.assertRaises(ValueError):
+            self._search_ids({"q": "  ** "})
+        with self.assertRaises(ValueError):
+            self._search_ids(sort_by="relevance")
+
+    def test_highlights_escape_landlord_markup(self):
+        self.service.update_property(self.ids[2], {"description": "Garden flat <script>alert('x')</script> <b>dsq</b>",
+                                                   "amenities": ["<img src=x onerror=alert(1)> Garden"]})
+        highlights = self.service.search_public_listings({"q": "garden"})["highlights"][self.ids[2]]
+
+        self.assertEqual(highlights["description"],
+                         "<mark>Garden</mark> flat &lt;script&gt;alert(&#x27;x&#x27;)&lt;/script&gt; &lt;b&gt;dsq&lt;/b&gt;")
+        self.assertEqual(highlights["amenities"], "&lt;img src=x onerror=alert(1)&gt; <mark>Garden</mark>")
+
+    def test_full_text_index_follows_updates(self):
+        self.service.update_property(self.ids[2], {"description": "Bedsitter with a borehole and a DSQ"})
+
+        self.assertEqual(sorted(self._search_ids({"q": "dsq borehole"})), self.ids[:3])
+        self.assertEqual(self._search_ids({"q": "stage"}), [])
+
+    def test_public_search_route(self):
+        response = self.client.get('/api/v1/properties/public?city=nairobi&sort_by=rent_asc&min_bedrooms=1')
+
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual([prop["property_id"] for prop in data["properties"]], [self.ids[0], self.ids[1]])
+        self.assertEqual(data["properties"][0]["monthly_rent"], "45000.00")
+        self.assertEqual(data["total_items"], 2)
+        self.assertEqual(data["facets"]["county"], {"nairobi": 2})
+        self.assertEqual(self.client.get('/api/v1/properties/public?min_rent=abc').status_code, 400)
+
+        data = self.client.get('/api/v1/properties/public?q=garden').get_json()
+        self.assertEqual(data["properties"][0]["highlights"]["description"], "Beach maisonette with a large <mark>garden</mark>.")
+
+    def _place(self):
+        coordinates = [(-1.2921, 36.7856), (-1.2784, 36.7781), (-1.2833, 36.8964), (-4.0435, 39.6682), (-1.2920, 36.7857)]
+        for prop, (latitude, longitude) in zip(self.properties, coordinates):
+            prop.latitude, prop.longitude = latitude, longitude
+        db.session.commit()
+
+    def test_radius_search_filters_and_sorts_by_distance(self):
+        self._place()
+        result = self.service.search_public_listings({"latitude": -1.2864, "longitude": 36.8172, "radius_km": 5})
+
+        # Kilimani (~3.6 km) then Kileleshwa (~4.5 km); Umoja is ~8.8 km away, the occupied unit is not public
+        self.assertEqual([prop.property_id for prop in result["items"]], self.ids[:2])
+        self.assertAlmostEqual(result["distances"][self.ids[0]], 3.57, places=1)
+        self.assertEqual(result["total"], 2)
+        self.assertEqual(len(self._search_ids({"latitude": -1.2864, "longitude": 36.8172, "radius_km": 10})), 3)
+        self.assertEqual(self._search_ids({"latitude": -1.2864, "longitude": 36.8172, "radius_km": 10}, sort_by="rent_desc"),
+                         [self.ids[1], self.ids[0], self.ids[2]])
+        for filters in ({"latitude": -1.2864, "longitude": 36.8172}, {"latitude": 91, "longitude": 0, "radius_km": 1},
+                        {"latitude": 0, "longitude": 0, "radius_km": 500}):
+            with self.assertRaises(ValueError):
+                self._search_ids(filters)
+        with self.assertRaises(ValueError):
+            self._search_ids(sort_by="distance")
+
+    def test_bbox_search_returns_listings_in_the_viewport(self):
+        self._place()
+
+        self.assertEqual(sorted(self._search_ids({"bbox": "-1.30,36.77,-1.27,36.80"})), self.ids[:2])
+        self.assertEqual(self._search_ids({"bbox": (-4.5, 39.0, -3.5, 40.0)}), [self.ids[3]])
+        # Combined with a radius, only the part of the viewport inside the circle counts
+        self.assertEqual(self._search_ids({"bbox": "-1.30,36.77,-1.27,36.80", "latitude": -1.2921, "longitude": 36.7856, "radius_km": 1}),
+                         [self.ids[0]])
+        with self.assertRaises(ValueError):
+            self._search_ids({"bbox": "-1.27,36.77,-1.30,36.80"})
+
+        data = self.client.get('/api/v1/properties/public?latitude=-1.2864&longitude=36.8172&radius_km=5').get_json()
+        self.assertEqual([prop["property_id"] for prop in data["properties"]], self.ids[:2])
+        self.assertIn("distance_km", data["properties"][0])
+        self.assertEqual(self.client.get('/api/v1/properties/public?bbox=1,2,3').status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
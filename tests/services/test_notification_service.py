@@ -0,0 +1,140 @@
+import unittest
+from datetime import datetime, timedelta
+from hermitta_app import create_app, db
+from hermitta_app.jobs.notification_jobs import NotificationDispatcher
+from hermitta_app.services.notification_backends import MemoryBackend
+from services.notification_service import NotificationService
+from models import Notification, NotificationUnreadCounter
+from models.user import User, UserRole
+from models.enums import NotificationType, NotificationChannel, NotificationStatus
+
+
+class TestNotificationService(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('test')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        db.create_all()
+        cls.service = NotificationService()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    def setUp(self):
+        db.session.rollback()
+        Notification.query.filter(Notification.digest_id.isnot(None)).update({Notification.digest_id: None})
+        for model in (NotificationUnreadCounter, Notification, User):
+            model.query.delete()
+        db.session.commit()
+        db.session.expunge_all()
+
+        self.tenant = User(email="inbox_tenant@example.com", phone_number="+254700000501", password_hash="test", first_name="Tina", last_name="Tenant", role=UserRole.TENANT)
+        self.other = User(email="inbox_other@example.com", phone_number="+254700000502", password_hash="test", first_name="Omar", last_name="Other", role=UserRole.TENANT)
+        db.session.add_all([self.tenant, self.other])
+        db.session.commit()
+
+    def _notifications(self, count, user=None, status=NotificationStatus.SENT, channel=NotificationChannel.IN_APP, created_at=None):
+        created_at = created_at or datetime(2024, 3, 1, 9, 0)
+        notifications = [
+            Notification(
+                user_id=(user or self.tenant).user_id, notification_type=NotificationType.BROADCAST_ANNOUNCEMENT, channel=channel,
+                status=status, content=f"Notice {n}", created_at=created_at + timedelta(minutes=n)
+            )
+            for n in range(count)
+        ]
+        db.session.add_all(notifications)
+        db.session.commit()
+        return [notification.notification_id for notification in notifications]
+
+    def _counter(self, user):
+        return db.session.get(NotificationUnreadCounter, user.user_id).unread_count
+
+    def test_inbox_pages_follow_the_cursor_without_gaps(self):
+        # Rows sharing a created_at are ordered by id, so the cursor must not skip or repeat them
+        ids = self._notifications(3) + self._notifications(4, created_at=datetime(2024, 3, 1, 9, 0))
+        self._notifications(2, channel=NotificationChannel.SMS)
+        self._notifications(2, status=NotificationStatus.PENDING)
+        self._notifications(2, user=self.other)
+
+        seen, cursor = [], None
+        while True:
+            page, cursor = self.service.get_inbox(self.tenant.user_id, limit=3, cursor=cursor)
+            seen.extend(notification.notification_id for notification in page)
+            if cursor is None:
+                break
+
+        expected = sorted(ids, key=lambda i: (db.session.get(Notification, i).created_at, i), reverse=True)
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor_and_limit_are_rejected(self):
+        with self.assertRaises(ValueError):
+            self.service.get_inbox(self.tenant.user_id, cursor="not-a-cursor")
+        with self.assertRaises(ValueError):
+            self.service.get_inbox(self.tenant.user_id, limit=0)
+
+    def test_counter_follows_inserts_reads_and_deletes(self):
+        ids = self._notifications(3)
+        self._notifications(2, status=NotificationStatus.PENDING) # Not in the inbox yet
+        self.assertEqual(self.service.get_unread_count(self.tenant.user_id), 3)
+        self.assertEqual(self.service.get_unread_count(self.other.user_id), 0)
+
+        notification = self.service.mark_as_read(self.tenant.user_id, ids[0])
+        self.assertEqual(notification.status, NotificationStatus.READ)
+        self.assertIsNotNone(notification.read_at)
+        # Marking it again does not decrement twice
+        self.service.mark_as_read(self.tenant.user_id, ids[0])
+        self.assertEqual(self.service.get_unread_count(self.tenant.user_id), 2)
+
+        # ORM writes are counted by the flush listener
+        db.session.get(Notification, ids[1]).mark_as_read()
+        db.session.delete(db.session.get(Notification, ids[2]))
+        db.session.commit()
+        self.assertEqual(self._counter(self.tenant), 0)
+
+    def test_mark_as_read_ignores_other_users_notifications(self):
+        ids = self._notifications(1, user=self.other)
+
+        self.assertIsNone(self.service.mark_as_read(self.tenant.user_id, ids[0]))
+        self.assertEqual(self.service.get_unread_count(self.other.user_id), 1)
+
+    def test_mark_all_as_read_resets_the_counter(self):
+        self._notifications(4)
+        self._notifications(1, user=self.other)
+
+        self.assertEqual(self.service.mark_all_as_read(self.tenant.user_id), 4)
+
+        self.assertEqual(self.service.get_unread_count(self.tenant.user_id), 0)
+        self.assertEqual(self.service.get_unread_count(self.other.user_id), 1)
+        page, _ = self.service.get_inbox(self.tenant.user_id, unread_only=True)
+        self.assertEqual(page, [])
+
+    def test_dispatcher_counts_delivered_in_app_notifications(self):
+        for channel in (NotificationChannel.IN_APP, NotificationChannel.SMS):
+            db.session.add(Notification(
+                user_id=self.tenant.user_id, notification_type=NotificationType.BROADCAST_ANNOUNCEMENT, channel=channel,
+                status=NotificationStatus.PENDING, content="Water off tomorrow"
+            ))
+        db.session.commit()
+
+        NotificationDispatcher({channel: MemoryBackend(channel) for channel in NotificationChannel}).run()
+
+        self.assertEqual(self.service.get_unread_count(self.tenant.user_id), 1)
+
+    def test_rebuild_recomputes_counters(self):
+        self._notifications(2)
+        NotificationUnreadCounter.query.update({NotificationUnreadCounter.unread_count: 7})
+        db.session.commit()
+
+        NotificationUnreadCounter.rebuild()
+        db.session.commit()
+
+        self.assertEqual(self.service.get_unread_count(self.tenant.user_id), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import io
+import json
+import unittest
+from decimal import Decimal
+from services.property_import_service import PropertyImportService, read_csv_rows, read_json_rows
+from services.property_service import PropertyService
+from models.property import Property, PropertyType, PropertyStatus
+from models.property_listing_index import PropertyListingIndex, PropertyAmenityTerm, PropertyTextIndex
+from hermitta_app import create_app, db
+
+CSV_FILE = (
+    "address_line_1,unit_number,city,county,property_type,num_bedrooms,num_bathrooms,monthly_rent,amenities,description\n"
+    "1 Import Rd,A1,Nairobi,Nairobi,apartment_unit,2,1,45000,Borehole;Gym,Bright flat with a DSQ\n"
+    "1 Import Rd,A2,Nairobi,Nairobi,APARTMENT_UNIT,3,2,60000,,\n"
+    "2 Import Rd,,Nairobi,Nairobi,castle,two,1,,,\n"
+    "1  import rd,a1,Nairobi,Nairobi,APARTMENT_UNIT,2,1,45000,,\n"
+    ",,Mombasa,Mombasa,BEDSITTER,0,1,-5,,\n"
+)
+
+
+class TestPropertyImportService(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('test')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        db.create_all()
+        cls.client = cls.app.test_client()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    def setUp(self):
+        self.service = PropertyImportService()
+        db.session.rollback()
+        for model in (PropertyAmenityTerm, PropertyListingIndex, Property):
+            model.query.delete()
+        PropertyTextIndex.clear(db.session.connection())
+        db.session.commit()
+
+    def test_csv_import_reports_invalid_rows_and_imports_the_rest(self):
+        summary = self.service.import_properties(501, read_csv_rows(io.BytesIO(CSV_FILE.encode("utf-8"))), chunk_size=2)
+
+        self.assertEqual((summary["imported"], summary["failed"]), (2, 3))
+        errors = {error["row"]: error["errors"] for error in summary["errors"]}
+        self.assertEqual(sorted(errors), [3, 4, 5])
+        self.assertIn("Invalid property_type: castle", errors[3])
+        self.assertIn("num_bedrooms must be an integer", errors[3])
+        self.assertEqual(errors[4], ["Duplicate property: same address_line_1 and unit_number"])
+        self.assertIn("Missing required field: address_line_1", errors[5])
+        self.assertIn("monthly_rent must be a non-negative amount", errors[5])
+
+        first = Property.query.filter_by(unit_number="A1").one()
+        self.assertEqual((first.landlord_id, first.status, first.monthly_rent), (501, PropertyStatus.VACANT, Decimal("45000.00")))
+        self.assertEqual(first.amenities, ["Borehole", "Gym"])
+        # Imported properties are searchable like ones created through the service
+        result = PropertyService().search_public_listings({"amenities": "gym", "q": "DSQ"})
+        self.assertEqual([prop.property_id for prop in result["items"]], [first.property_id])
+
+        # Importing the same file again only produces duplicates
+        again = self.service.import_properties(501, read_csv_rows(io.BytesIO(CSV_FILE.encode("utf-8"))))
+        self.assertEqual(again["imported"], 0)
+        self.assertEqual(Property.query.count(), 2)
+
+    def test_json_formats_and_dry_run(self):
+        row = {"address_line_1": "3 Json Rd", "city": "Nakuru", "county": "Nakuru", "property_type": "BUNGALOW",
+               "num_bedrooms": 3, "num_bathrooms": 2, "amenities": ["Garden"], "latitude": -0.3, "longitude": 36.07}
+        lines = "\n".join([json.dumps(row), "{not json", json.dumps([1, 2])]).encode("utf-8")
+        summary = self.service.import_properties(502, read_json_rows(io.BytesIO(lines)), dry_run=True)
+        self.assertEqual((summary["imported"], summary["failed"]), (1, 2))
+        self.assertEqual(Property.query.count(), 0)
+
+        array = json.dumps([row, dict(row, address_line_1="4 Json Rd", amenities=[5])]).encode("utf-8")
+        summary = self.service.import_properties(502, read_json_rows(io.BytesIO(array)))
+        self.assertEqual(summary["imported"], 1)
+        self.assertEqual(summary["errors"], [{"row": 2, "errors": ["amenities must be a list of strings"]}])
+        prop = Property.query.one()
+        self.assertEqual((prop.property_type, prop.latitude), (PropertyType.BUNGALOW, -0.3))
+
+        with self.assertRaises(ValueError):
+            list(read_json_rows(io.BytesIO(b'[{"address_line_1": ')))
+
+    def test_rows_read_before_an_unreadable_byte_are_imported(self):
+        header = "address_line_1,unit_number,city,county,property_type,num_bedrooms,num_bathrooms\n"
+        rows = "".join(f"{n} Broken Rd,B{n},Nairobi,Nairobi,BEDSITTER,0,1\n" for n in range(500))
+        data = (header + rows).encode("utf-8") + b"9 Broken Rd,\xff,Nairobi,Nairobi,BEDSITTER,0,1\n"
+
+        summary = self.service.import_properties(505, read_csv_rows(io.BytesIO(data)), chunk_size=100)
+
+        self.assertIn("utf-8", summary["read_error"])
+        self.assertGreater(summary["imported"], 0)
+        self.assertEqual(summary["failed"], 0)
+        self.assertEqual(Property.query.filter_by(landlord_id=505).count(), summary["imported"])
+
+        response = self.client.post('/api/v1/properties/import', headers={"X-Test-User-Id": "506"},
+                                    data={"file": (io.BytesIO(data), "units.csv")})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Could not read the csv file", response.get_json()["message"])
+        self.assertEqual(response.get_json()["imported"], Property.query.filter_by(landlord_id=506).count())
+
+    def test_import_route(self):
+        headers = {"X-Test-User-Id": "503"}
+        response = self.client.post('/api/v1/properties/import', headers=headers,
+                                    data={"file": (io.BytesIO(CSV_FILE.encode("utf-8")), "units.csv")})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.get_json()["imported"], response.get_json()["failed"]), (2, 3))
+
+        body = json.dumps({"address_line_1": "5 Raw Rd", "city": "Nairobi", "county": "Nairobi",
+                           "property_type": "BEDSITTER", "num_bedrooms": 0, "num_bathrooms": 1})
+        response = self.client.post('/api/v1/properties/import?dry_run=true', headers=headers, data=body,
+                                    content_type='application/x-ndjson')
+        self.assertEqual(response.get_json()["imported"], 1)
+        self.assertEqual(Property.query.filter_by(landlord_id=503).count(), 2)
+
+        self.assertEqual(self.client.post('/api/v1/properties/import?format=xml', headers=headers, data="<x/>").status_code, 400)
+        self.assertEqual(self.client.post('/api/v1/properties/import', data=body).status_code, 401)
+
+    def test_imports_and_indexes_units_in_chunks(self):
+        # `flask benchmark-property-import` times the same file at scale
+        header = "address_line_1,unit_number,city,county,property_type,num_bedrooms,num_bathrooms,monthly_rent,amenities\n"
+        rows = "".join(f"{n // 100} Tower Rd,U{n},Nairobi,Nairobi,APARTMENT_UNIT,2,1,30000,Lift;Borehole\n" for n in range(250))
+        summary = self.service.import_properties(504, read_csv_rows(io.BytesIO((header + rows).encode("utf-8"))), chunk_size=100)
+
+        self.assertEqual((summary["imported"], summary["failed"]), (250, 0))
+        self.assertEqual(PropertyListingIndex.query.count(), 250)
+
+
+if __name__ == '__main__':
+    unittest.main()
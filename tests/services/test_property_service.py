@@ -166,5 +166,28 @@ class TestPropertyService(unittest.TestCase):
         delete_result = self.service.delete_property(99999)
         self.assertFalse(delete_result)
 
+    def test_get_properties_by_landlord_keyset_pages(self):
+        created = datetime(2024, 5, 1)
+        for n in range(5):
+            data = dict(self.required_property_data, address_line_1=f"{n} Cursor Rd", created_at=created + timedelta(days=n // 2))
+            self.service.create_property(data)
+
+        first, cursor, total = self.service.get_properties_by_landlord_keyset(102, limit=3, include_total=True)
+        second, last_cursor, _ = self.service.get_properties_by_landlord_keyset(102, limit=3, cursor=cursor)
+
+        expected, _ = self.service.get_properties_by_landlord(102, per_page=10)
+        self.assertEqual([prop.property_id for prop in first + second], [prop.property_id for prop in expected])
+        self.assertEqual(total, 5)
+        self.assertIsNone(last_cursor)
+
+        client = self.app.test_client()
+        data = client.get('/api/v1/properties?cursor=&per_page=3', headers={"X-Test-User-Id": "102"}).get_json()
+        self.assertEqual(data["next_cursor"], cursor)
+        self.assertNotIn("total_items", data)
+        data = client.get(f'/api/v1/properties?cursor={cursor}&per_page=3', headers={"X-Test-User-Id": "102"}).get_json()
+        self.assertEqual([prop["property_id"] for prop in data["properties"]], [prop.property_id for prop in second])
+        self.assertEqual(client.get('/api/v1/properties?cursor=bad', headers={"X-Test-User-Id": "102"}).status_code, 400)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,96 @@
+import json
+import unittest
+from datetime import datetime
+from decimal import Decimal
+from hermitta_app import create_app, db
+from hermitta_app.serializers import get_serializer, parse_fields, json_list_response
+from models.property import Property, PropertyType, PropertyStatus
+from models.user import User, UserRole
+
+
+class TestSerializers(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('test')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        db.create_all()
+        cls.client = cls.app.test_client()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    def setUp(self):
+        db.session.rollback()
+        Property.query.delete()
+        db.session.commit()
+        self.prop = Property(
+            landlord_id=301, address_line_1="1 Serializer Rd", city="Nairobi", county="Nairobi",
+            property_type=PropertyType.BEDSITTER, status=PropertyStatus.VACANT, num_bedrooms=0, num_bathrooms=1,
+            monthly_rent=Decimal("9000.00"), amenities=["Borehole"], latitude=-1.28, created_at=datetime(2024, 3, 1, 8, 30)
+        )
+
+    def test_converts_enums_decimals_and_datetimes(self):
+        prop_dict = get_serializer(Property).to_dict(self.prop)
+
+        self.assertEqual(set(prop_dict), {column.name for column in Property.__table__.columns})
+        self.assertEqual(prop_dict["property_type"], "BEDSITTER")
+        self.assertEqual(prop_dict["monthly_rent"], "9000.00")
+        self.assertEqual(prop_dict["created_at"], "2024-03-01T08:30:00")
+        self.assertEqual(prop_dict["latitude"], -1.28)
+        self.assertEqual(prop_dict["amenities"], ["Borehole"])
+        self.assertIsNone(prop_dict["longitude"])
+
+    def test_field_selection(self):
+        serializer = get_serializer(Property)
+
+        self.assertEqual(serializer.to_dict(self.prop, ("city", "status")), {"city": "Nairobi", "status": "VACANT"})
+        self.assertEqual(serializer.to_dict(self.prop, parse_fields(" monthly_rent, ")), {"monthly_rent": "9000.00"})
+        self.assertIsNone(parse_fields(""))
+        with self.assertRaises(ValueError):
+            serializer.to_dict(self.prop, ("city", "secret"))
+
+    def test_user_secrets_are_never_serialized(self):
+        serializer = get_serializer(User)
+        user = User(email="s@example.com", phone_number="+254700000901", password_hash="hash", first_name="S", last_name="U",
+                    role=UserRole.TENANT, otp_secret="SECRET")
+
+        self.assertNotIn("password_hash", serializer.to_dict(user))
+        self.assertNotIn("otp_secret", serializer.to_dict(user))
+        self.assertEqual(serializer.to_dict(user)["role"], "TENANT")
+        with self.assertRaises(ValueError):
+            serializer.to_dict(user, ("password_hash",))
+
+    def test_list_response_streams_rows_in_chunks(self):
+        props = [self.prop] * 450 # More than two chunks
+        with self.app.test_request_context():
+            response = json_list_response("properties", props, get_serializer(Property), ("city",),
+                                          extra={"total_items": 450}, decorate=lambda prop, row: row.update(rank=1))
+            self.assertTrue(response.is_streamed)
+            data = json.loads(response.get_data())
+        self.assertEqual(data["total_items"], 450)
+        self.assertEqual(data["properties"][449], {"city": "Nairobi", "rank": 1})
+
+        with self.app.test_request_context():
+            self.assertEqual(json.loads(json_list_response("properties", [], get_serializer(Property)).get_data()), {"properties": []})
+
+    def test_property_routes_accept_fields(self):
+        db.session.add(self.prop)
+        db.session.commit()
+        headers = {"X-Test-User-Id": "301"}
+
+        data = self.client.get('/api/v1/properties?fields=property_id,monthly_rent', headers=headers).get_json()
+        self.assertEqual(data["properties"], [{"property_id": self.prop.property_id, "monthly_rent": "9000.00"}])
+        self.assertEqual(data["total_items"], 1)
+        data = self.client.get(f'/api/v1/properties/{self.prop.property_id}?fields=city', headers=headers).get_json()
+        self.assertEqual(data, {"city": "Nairobi"})
+        self.assertEqual(self.client.get('/api/v1/properties?fields=nope', headers=headers).status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/properties/public?fields=nope').status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
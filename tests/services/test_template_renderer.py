@@ -0,0 +1,112 @@
+import unittest
+from hermitta_app import create_app, db
+from hermitta_app.services.template_renderer import (
+    TemplateRenderer, TemplatePlaceholderError, CompiledTemplate, template_renderer
+)
+from models import NotificationTemplate
+from models.enums import NotificationType, NotificationChannel
+
+
+class TestTemplateRenderer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('test')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        db.create_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    def setUp(self):
+        db.session.rollback()
+        NotificationTemplate.query.delete()
+        db.session.commit()
+        db.session.expunge_all()
+        template_renderer.invalidate()
+
+        self.template = NotificationTemplate(
+            name="Renewal reminder", template_type=NotificationType.LEASE_RENEWAL_REMINDER, channel=NotificationChannel.EMAIL,
+            subject_template_en="Lease ends {{lease_end_date}}",
+            body_template_en="Hi {{tenant_name}}, your lease at {{property_address}} ends in {{days_offset}} days.",
+            body_template_sw="Habari {{tenant_name}}, mkataba wako unaisha baada ya siku {{days_offset}}."
+        )
+        db.session.add(self.template)
+        db.session.commit()
+        self.renderer = TemplateRenderer(max_size=2)
+
+    def test_renders_like_the_model(self):
+        context = {"tenant_name": "Tina", "property_address": "1 Main St", "days_offset": 60, "lease_end_date": "2024-03-01"}
+        compiled = self.renderer.get(self.template.template_id)
+
+        for language in ('en', 'sw'):
+            self.assertEqual(compiled.render(context, language), self.template.render_template(context, language))
+        # Unfilled placeholders are left untouched, as the model does
+        self.assertEqual(compiled.render({"tenant_name": "Tina"})["subject"], "Lease ends {{lease_end_date}}")
+
+    def test_compiles_once_per_version(self):
+        first = self.renderer.get(self.template.template_id)
+        self.assertIs(self.renderer.get(self.template.template_id), first)
+        self.assertEqual((self.renderer.hits, self.renderer.misses), (1, 1))
+
+        self.template.body_template_en = "Dear {{tenant_name}}"
+        db.session.commit()
+
+        recompiled = self.renderer.get(self.template.template_id)
+        self.assertIsNot(recompiled, first)
+        self.assertEqual(recompiled.render({"tenant_name": "Tina"})["body"], "Dear Tina")
+
+    def test_edits_evict_the_shared_renderer(self):
+        template_renderer.get(self.template.template_id)
+        self.assertEqual(len(template_renderer), 1)
+
+        self.template.is_active = False
+        db.session.commit()
+
+        self.assertEqual(len(template_renderer), 0)
+
+    def test_least_recently_used_templates_are_evicted(self):
+        others = [
+            NotificationTemplate(name=f"Other {n}", template_type=NotificationType.OTHER, channel=NotificationChannel.SMS, body_template_en="{{n}}")
+            for n in range(2)
+        ]
+        db.session.add_all(others)
+        db.session.commit()
+
+        self.renderer.get(self.template.template_id)
+        self.renderer.compiled_templates([others[0].template_id, others[1].template_id])
+
+        self.assertEqual(len(self.renderer), 2)
+        self.renderer.get(self.template.template_id)
+        self.assertEqual(self.renderer.misses, 4)
+
+    def test_placeholders_are_checked_at_compile_time(self):
+        compiled = CompiledTemplate(self.template)
+
+        self.assertEqual(compiled.placeholders, {"lease_end_date", "tenant_name", "property_address", "days_offset"})
+        self.assertEqual(compiled.missing_placeholders(["tenant_name", "days_offset"]), ["lease_end_date", "property_address"])
+        with self.assertRaises(TemplatePlaceholderError) as raised:
+            self.renderer.render_batch(self.template.template_id, [{}], context_keys=["tenant_name"])
+        self.assertEqual(raised.exception.missing, ["days_offset", "lease_end_date", "property_address"])
+
+        # Declared required_placeholders are checked too
+        self.template.required_placeholders = ["landlord_name"]
+        self.assertEqual(CompiledTemplate(self.template).missing_placeholders(compiled.placeholders), ["landlord_name"])
+
+    def test_render_batch(self):
+        contexts = [{"tenant_name": f"T{n}", "property_address": "1 Main St", "days_offset": n, "lease_end_date": "2024-03-01"} for n in range(1000)]
+
+        rendered = self.renderer.render_batch(self.template.template_id, contexts, language='sw', context_keys=contexts[0].keys())
+
+        self.assertEqual(len(rendered), 1000)
+        self.assertEqual(rendered[7]["body"], "Habari T7, mkataba wako unaisha baada ya siku 7.")
+        # No Swahili subject: falls back to English
+        self.assertEqual(rendered[7]["subject"], "Lease ends 2024-03-01")
+
+
+if __name__ == '__main__':
+    unittest.main()
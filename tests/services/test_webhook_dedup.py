@@ -0,0 +1,114 @@
+import json
+import unittest
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from hermitta_app import create_app, db
+from hermitta_app.services.webhook_dedup import BloomFilter, WebhookDeduplicator, webhook_deduplicator, webhook_event_id
+from models import MpesaCallbackInbox, WebhookDedupKey
+from models.enums import GatewayType
+
+
+class TestBloomFilter(unittest.TestCase):
+
+    def test_added_keys_are_always_found(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        keys = [f"evt_{n}".encode() for n in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in keys))
+        false_positives = sum(f"other_{n}".encode() in bloom for n in range(10000))
+        self.assertLess(false_positives, 300) # ~1% expected
+
+
+class TestWebhookDeduplicator(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('test')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        db.create_all()
+        cls.client = cls.app.test_client()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    def setUp(self):
+        db.session.rollback()
+        for model in (WebhookDedupKey, MpesaCallbackInbox):
+            model.query.delete()
+        db.session.commit()
+        self.dedup = WebhookDeduplicator(ttl_seconds=3600)
+        self.now = datetime(2024, 3, 1, 9, 0)
+
+    def _is_duplicate(self, dedup, payload, gateway=GatewayType.STRIPE, **kwargs):
+        duplicate = dedup.is_duplicate(db.session.connection(), gateway, payload, now=kwargs.pop("now", self.now), **kwargs)
+        db.session.commit()
+        return duplicate
+
+    def test_event_ids(self):
+        self.assertEqual(webhook_event_id(GatewayType.STRIPE, b'{"id": "evt_1", "type": "charge.failed"}'), "evt_1")
+        self.assertEqual(webhook_event_id(GatewayType.FLUTTERWAVE, '{"event": "charge.completed", "data": {"id": 285959875}}'), "285959875")
+        self.assertEqual(webhook_event_id(GatewayType.PESAPAL, b'', args={"OrderTrackingId": "b945e4af"}), "b945e4af")
+        self.assertEqual(webhook_event_id(GatewayType.MPESA_STK_PUSH, '{"Body": {"stkCallback": {"CheckoutRequestID": "ws_CO_1"}}}'), "ws_CO_1")
+        self.assertEqual(webhook_event_id(GatewayType.STRIPE, b'not json'), '')
+
+    def test_retries_are_duplicates_and_new_payloads_are_not(self):
+        payload = json.dumps({"id": "evt_1", "type": "payment_intent.succeeded"})
+        self.assertFalse(self._is_duplicate(self.dedup, payload))
+        self.assertTrue(self._is_duplicate(self.dedup, payload))
+        # Same event id, different body (e.g. a later status of the same transaction)
+        self.assertFalse(self._is_duplicate(self.dedup, json.dumps({"id": "evt_1", "type": "charge.refunded"})))
+        # Same body from another gateway
+        self.assertFalse(self._is_duplicate(self.dedup, payload, gateway=GatewayType.FLUTTERWAVE))
+        self.assertEqual(WebhookDedupKey.query.count(), 3)
+
+        metrics = self.dedup.metrics()
+        self.assertEqual((metrics["deliveries"], metrics["duplicates"], metrics["bloom_hits"]), (4, 1, 1))
+        self.assertEqual(metrics["duplicate_rate"], 0.25)
+
+    def test_new_deliveries_skip_the_lookup(self):
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, "before_cursor_execute", listener)
+        try:
+            self._is_duplicate(self.dedup, '{"id": "evt_2"}')
+        finally:
+            event.remove(db.engine, "before_cursor_execute", listener)
+        self.assertFalse([statement for statement in statements if statement.lstrip().startswith("SELECT")])
+
+    def test_keys_stored_by_other_processes_are_duplicates(self):
+        payload = '{"id": "evt_3"}'
+        self.assertFalse(self._is_duplicate(self.dedup, payload))
+        other_process = WebhookDeduplicator(ttl_seconds=3600) # Empty Bloom filter: the unique constraint decides
+        self.assertTrue(self._is_duplicate(other_process, payload))
+        self.assertEqual(other_process.metrics()["bloom_hits"], 0)
+
+    def test_keys_expire_and_are_purged(self):
+        payload = '{"id": "evt_4"}'
+        self.assertFalse(self._is_duplicate(self.dedup, payload))
+        later = self.now + timedelta(hours=2)
+        self.assertFalse(self._is_duplicate(self.dedup, payload, now=later)) # Expired key taken over
+        self.assertTrue(self._is_duplicate(self.dedup, payload, now=later))
+        self._is_duplicate(self.dedup, '{"id": "evt_5"}')
+
+        self.assertEqual(self.dedup.purge_expired(db.session.connection(), now=later + timedelta(minutes=30), batch_size=1), 1)
+        db.session.commit()
+        self.assertEqual([key.event_id for key in WebhookDedupKey.query.all()], ["evt_4"])
+
+    def test_mpesa_callback_retries_are_stored_once(self):
+        body = json.dumps({"Body": {"stkCallback": {"CheckoutRequestID": "ws_CO_9", "ResultCode": 0}}})
+        webhook_deduplicator.reset_metrics()
+        for _ in range(3):
+            response = self.client.post('/api/v1/mpesa/callback', data=body, content_type='application/json')
+            self.assertEqual(response.get_json(), {"ResultCode": 0, "ResultDesc": "Accepted"})
+        self.assertEqual(MpesaCallbackInbox.query.count(), 1)
+        metrics = webhook_deduplicator.metrics()
+        self.assertEqual((metrics["deliveries"], metrics["duplicates"]), (3, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()